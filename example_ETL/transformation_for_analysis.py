@@ -1,15 +1,33 @@
+from pathlib import Path
+import sys
 import pandas as pd
 import dotenv
 import os
 import psycopg
 from psycopg import sql
-import networkx as nx
+
+# resolves importation path issues
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utils.graph_utils import (
+    DATA_DIR,
+    EDGES_PATH,
+    NODES_PATH,
+    build_graph_tables,
+    load_graph,
+    write_gexf,
+    write_graph_tables,
+)
+from utils.rollup_utils import get_rollups
 
 """This is the logic used during analysis and transformation
     of the scraped data, used to create the graph object,
     taken from the jupyter notebooks and functionalised
     """
 
+COMMENT_COUNTS_PATH = f"{DATA_DIR}/subreddit_comment_counts.csv"
+ROLLUPS_PATH = f"{DATA_DIR}/subreddit_rollups_daily.parquet"
+
 
 def get_subreddit_comment_count():
     dotenv.load_dotenv(override=True)
@@ -24,17 +42,23 @@ def get_subreddit_comment_count():
         cur.execute(
             sql.SQL("SET search_path TO {}").format(sql.Identifier(schema))
         )
+    # summed from the daily rollups instead of a GROUP BY over comments
     query = """
-    SELECT subreddit, COUNT(*) as comment_count
-    FROM COMMENTS
-    GROUP BY subreddit"""
+    SELECT subreddit, SUM(comments)::bigint as comment_count
+    FROM subreddit_rollups
+    WHERE grain = 'day'
+    GROUP BY subreddit
+    HAVING SUM(comments) > 0"""
     subreddit_comments_count = pd.read_sql(
         query,
         conn,
     )
-    subreddit_comments_count.to_csv(
-        "presentation/data/subreddit_comment_counts.csv", index=False
-    )
+    subreddit_comments_count.to_csv(COMMENT_COUNTS_PATH, index=False)
+
+
+def get_subreddit_rollups():
+    """Daily rollups for the presentation pages' dataset figures."""
+    get_rollups("day").to_parquet(ROLLUPS_PATH, index=False)
 
 
 def get_edge_data():
@@ -73,74 +97,35 @@ def get_edge_data():
                 shared_commenters_hash[pair] = (
                     shared_commenters_hash.get(pair, 0) + 1
                 )
-    # make df
+    # make df with one column per subreddit, pairs are already sorted
     edge_weights = pd.DataFrame(
-        shared_commenters_hash.items(),
-        columns=["subreddit_pair", "shared_commenter_count"],
-    )
-    # sort rows by first then second subreddit alphabetically
-    edge_weights = (
-        edge_weights.assign(
-            sub1=edge_weights["subreddit_pair"].apply(lambda t: t[0]),
-            sub2=edge_weights["subreddit_pair"].apply(lambda t: t[1]),
-        )
-        .sort_values(["sub1", "sub2"])
-        .drop(columns=["sub1", "sub2"])
-        .reset_index(drop=True)
+        [(s1, s2, n) for (s1, s2), n in shared_commenters_hash.items()],
+        columns=["sub1", "sub2", "weight"],
     )
     # cleaning and filtering
     cleaned_edges = edge_weights[
-        edge_weights["subreddit_pair"].apply(
-            lambda x: x[0].startswith("r/") and x[1].startswith("r/")
-        )
-    ]
-    filtered_edges = cleaned_edges[
-        cleaned_edges["shared_commenter_count"] >= 5
+        edge_weights["sub1"].str.startswith("r/")
+        & edge_weights["sub2"].str.startswith("r/")
     ]
-    filtered_edges.to_csv(
-        "presentation/data/subreddit_edge_weights_cleaned_filtered.csv",
-        index=False,
+    filtered_edges = cleaned_edges[cleaned_edges["weight"] >= 5]
+    filtered_edges = filtered_edges.sort_values(["sub1", "sub2"])
+    # typed parquet tables keyed by integer subreddit id
+    comment_counts = (
+        pd.read_csv(COMMENT_COUNTS_PATH)
+        if os.path.exists(COMMENT_COUNTS_PATH)
+        else None
     )
+    edges, nodes = build_graph_tables(filtered_edges, comment_counts)
+    write_graph_tables(edges, nodes, EDGES_PATH, NODES_PATH)
 
 
 def make_graph():
-    edge_df = pd.read_csv(
-        "presentation/data/subreddit_edge_weights_cleaned_filtered.csv"
-    )
-    unformatted_edges = edge_df.values.tolist()
-    # make edge object
-    edges = []
-    for pair_str, weight in unformatted_edges:
-        subpair = tuple(pair_str.strip("()").replace("'", "").split(", "))
-        edges.append((subpair, weight))
-    # get list of all subs
-    subs_set = set()
-    for (sub1, sub2), weight in edges:
-        subs_set.add(sub1)
-        subs_set.add(sub2)
-    subs = list(subs_set)
-    G = nx.Graph()
-    G.add_nodes_from(subs)
-    for (sub1, sub2), weight in edges:
-        G.add_edge(sub1, sub2, weight=weight)
-    # enrich with comment_count attribute
-    subreddit_comment_counts_df = pd.read_csv(
-        "presentation/data/subreddit_comment_count.csv"
-    )
-    comment_count_dict = dict(subreddit_comment_counts_df.values)
-    for subreddit, count in comment_count_dict.items():
-        if subreddit in G.nodes():
-            G.nodes[subreddit]["comment_count"] = count
-    # ensure attributes are correct type for gephi
-    for node, data in G.nodes(data=True):
-        data["comment_count"] = int(data["comment_count"])
-
-    for u, v, data in G.edges(data=True):
-        data["weight"] = float(data["weight"])
-    nx.write_gexf(G, "../data/subreddit_network.gexf")
+    graph = load_graph(EDGES_PATH, NODES_PATH)
+    write_gexf(graph, f"{DATA_DIR}/subreddit_network.gexf")
 
 
 if __name__ == "__main__":
     get_subreddit_comment_count()
+    get_subreddit_rollups()
     get_edge_data()
     make_graph()
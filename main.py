@@ -1,5 +1,4 @@
 import logging
-from utils.prompt import prompt_loop
 import sys
 
 
@@ -18,6 +17,13 @@ def main():
     )
     logger = logging.getLogger(__name__)
     logger.info("started with args: %s", sys.argv[1:])
+    # one-shot commands skip prompt_toolkit entirely
+    if "--exit-after" in sys.argv[1:]:
+        from utils.commands import run_headless
+
+        sys.exit(run_headless(sys.argv[1:]))
+    from utils.prompt import prompt_loop
+
     prompt_loop()
 
 
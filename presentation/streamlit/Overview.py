@@ -1,4 +1,5 @@
 import streamlit as st
+from data_access import rollup_summary
 
 st.markdown(
     '<h1 style="color:#FF4500"><b>Scrapeddit</b></h1>', unsafe_allow_html=True
@@ -57,6 +58,18 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+summary = rollup_summary()
+if summary is not None:
+    with st.container(horizontal=True):
+        st.metric(label="Comments", value=f"{summary['comments']:,}")
+        st.metric(label="Submissions", value=f"{summary['submissions']:,}")
+        st.metric(label="Subreddits", value=f"{summary['subreddits']:,}")
+    st.caption(
+        f"scraped content from {summary['first_day']:%d %b %Y} "
+        f"to {summary['last_day']:%d %b %Y}"
+    )
+    st.line_chart(summary["daily"]["comments"], height=200)
+
 with st.expander("What is Reddit"):
     st.markdown(
         """[Reddit](https://www.reddit.com) is a social media site / forum hub where users can submit text,
@@ -0,0 +1,138 @@
+from pathlib import Path
+import os
+import sys
+import uuid
+import streamlit as st
+import pandas as pd
+import pyarrow.parquet as pq
+from PIL import Image
+
+# the repo's utils package is imported here only: graph_view and the
+# pages take what they need of it from this module, so the repo root is
+# put on sys.path in this one place
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from utils.graph_utils import (
+    EDGES_PATH,
+    MAX_VIEW_NODES,
+    NODES_PATH,
+    CSRGraph,
+    bounded_view,
+    load_graph,
+    to_vis_data,
+)
+
+"""Shared, cached data access for the presentation pages.
+
+Every loader takes the file's (mtime, size) as part of its cache key so
+results are reused across reruns and invalidated when the artifact on
+disk changes. Tables are read from Parquet; a CSV with the same name is
+converted whenever its Parquet copy is missing or older than it.
+"""
+
+DATA_DIR = "presentation/data"
+# daily subreddit rollups exported by the transformation ETL
+ROLLUPS_PATH = os.path.join(DATA_DIR, "subreddit_rollups_daily.parquet")
+
+
+def file_key(path: str) -> tuple[int, int]:
+    """Cheap cache key for a file: (mtime_ns, size)."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def artifact_path(name: str) -> str:
+    """Path to the Parquet artifact for name, converting a CSV if needed."""
+    parquet_path = os.path.join(DATA_DIR, f"{name}.parquet")
+    csv_path = os.path.join(DATA_DIR, f"{name}.csv")
+    if os.path.exists(csv_path) and (
+        not os.path.exists(parquet_path)
+        or os.stat(csv_path).st_mtime_ns > os.stat(parquet_path).st_mtime_ns
+    ):
+        _csv_to_parquet(csv_path, parquet_path)
+    return parquet_path
+
+
+def _csv_to_parquet(csv_path: str, parquet_path: str) -> None:
+    # not cached: artifact_path checks the files on every call, so a
+    # deleted or outdated Parquet copy is rebuilt. Written under another
+    # name and renamed so sessions never read a partial file.
+    tmp_path = f"{parquet_path}.{uuid.uuid4().hex[:8]}.tmp"
+    pd.read_csv(csv_path).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+
+
+@st.cache_data(show_spinner=False)
+def _read_table(path: str, columns: tuple | None, key) -> pd.DataFrame:
+    return pd.read_parquet(path, columns=list(columns) if columns else None)
+
+
+@st.cache_data(show_spinner=False)
+def _read_head(path: str, n: int, columns: tuple | None, key) -> pd.DataFrame:
+    # only decode the first batch rather than the whole file
+    batches = pq.ParquetFile(path).iter_batches(
+        batch_size=n, columns=list(columns) if columns else None
+    )
+    return next(batches).to_pandas().head(n)
+
+
+def load_table(name: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Load only the given columns of a Parquet artifact."""
+    path = artifact_path(name)
+    cols = tuple(columns) if columns else None
+    return _read_table(path, cols, file_key(path))
+
+
+def load_head(
+    name: str, n: int = 5, columns: list[str] | None = None
+) -> pd.DataFrame:
+    """First n rows of an artifact, independent of the artifact's size."""
+    path = artifact_path(name)
+    cols = tuple(columns) if columns else None
+    return _read_head(path, n, cols, file_key(path))
+
+
+@st.cache_data(show_spinner=False)
+def _summarise_rollups(key) -> dict:
+    rollups = pd.read_parquet(ROLLUPS_PATH)
+    daily = rollups.groupby("bucket")[["comments", "submissions"]].sum()
+    return {
+        "comments": int(rollups["comments"].sum()),
+        "submissions": int(rollups["submissions"].sum()),
+        "subreddits": int(rollups["subreddit"].nunique()),
+        "first_day": daily.index.min(),
+        "last_day": daily.index.max(),
+        "daily": daily,
+    }
+
+
+def rollup_summary() -> dict | None:
+    """Dataset totals and comments per day, from the daily rollups."""
+    if not os.path.exists(ROLLUPS_PATH):
+        return None
+    return _summarise_rollups(file_key(ROLLUPS_PATH))
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _open_image(path: str, key) -> Image.Image:
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def load_image(path: str) -> Image.Image:
+    """Decoded image, shared across reruns and sessions."""
+    return _open_image(path, file_key(path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_graph(edges_path: str, nodes_path: str, key) -> CSRGraph:
+    return load_graph(edges_path, nodes_path)
+
+
+def load_subreddit_graph() -> CSRGraph | None:
+    """The full CSR graph, or None if the artifacts haven't been built."""
+    if not (os.path.exists(EDGES_PATH) and os.path.exists(NODES_PATH)):
+        return None
+    key = (file_key(EDGES_PATH), file_key(NODES_PATH))
+    return _load_graph(EDGES_PATH, NODES_PATH, key)
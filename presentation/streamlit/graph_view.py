@@ -0,0 +1,56 @@
+from pathlib import Path
+import streamlit as st
+import streamlit.components.v1 as components
+from data_access import CSRGraph, to_vis_data
+
+"""Streamlit component rendering a bounded graph view with vis-network.
+
+Only the reduced view produced by graph_utils.bounded_view is sent to
+the browser. Labels are drawn only once zoomed in far enough. Clicking
+a node returns its subreddit to the page, which re-reduces the graph on
+the server to that node's ego network, as does selecting a different
+focus or detail level, rather than shipping more of the graph up front.
+Views of a graph with a precomputed layout (graph layout) render without
+physics.
+"""
+
+VIS_JS_PATH = "presentation/analysis/lib/vis-9.1.2/vis-network.min.js"
+
+PHYSICS = {
+    "solver": "barnesHut",
+    "stabilization": {"iterations": 150},
+}
+
+# static component (graph_component/index.html), no frontend build
+_graph_component = components.declare_component(
+    "graph_view", path=str(Path(__file__).parent / "graph_component")
+)
+
+
+@st.cache_resource(show_spinner=False)
+def vis_js() -> str:
+    with open(VIS_JS_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def render_graph(
+    view: CSRGraph, height: int = 600, key: str | None = None, on_click=None
+) -> dict | None:
+    """Render a (bounded) graph view in the page.
+
+    If the node table carries a precomputed layout, physics is switched
+    off and the view is drawn at those positions immediately. Returns
+    the last node clicked as {"label", "at"}, or None; on_click is
+    called (before the rerun) when a node is clicked, and can read that
+    value from st.session_state[key].
+    """
+    static = "x" in view.node_attrs and "y" in view.node_attrs
+    return _graph_component(
+        data=to_vis_data(view),
+        physics=False if static else PHYSICS,
+        height=height,
+        vis_js=vis_js(),
+        key=key,
+        on_change=on_click,
+        default=None,
+    )
@@ -2,12 +2,20 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from streamlit_image_zoom import image_zoom
-from PIL import Image
+from data_access import (
+    MAX_VIEW_NODES,
+    bounded_view,
+    load_head,
+    load_image,
+    load_subreddit_graph,
+    rollup_summary,
+)
+from graph_view import render_graph
 
 
 # @st.dialog("zoomable")
 def zoomable(img_path, zoom_factor=3.0):
-    image = Image.open(img_path)
+    image = load_image(img_path)
     return image_zoom(
         image,
         keep_resolution=True,
@@ -40,6 +48,13 @@ st.success(
 """
 )
 
+summary = rollup_summary()
+if summary is not None:
+    st.caption("The dataset now")
+    with st.container(horizontal=True):
+        st.metric(label="Comments", value=f"{summary['comments']:,}")
+        st.metric(label="Subreddits", value=f"{summary['subreddits']:,}")
+
 st.markdown(
     """
     ## Methodology-
@@ -97,8 +112,8 @@ st.markdown(
 """
 )
 
-redditors_with_subreddits = pd.read_csv(
-    "presentation/data/redditor_subreddit_list.csv"
+redditors_with_subreddits = load_head(
+    "redditor_subreddit_list", 5, columns=["author", "subreddit_list"]
 )
 
 st.write(redditors_with_subreddits.head(5))
@@ -204,6 +219,48 @@ with st.expander("Don't do big data on a potato"):
     st.image("presentation/assets/pyvis_time.png")
     st.image("presentation/assets/pyvis_time_big.png", width=500)
 
+
+def focus_on_clicked_node():
+    # runs before the rerun, so it can still set the selectbox
+    clicked = st.session_state.subreddit_graph
+    if clicked:
+        st.session_state.graph_focus = clicked["label"]
+
+
+st.markdown("#### Explore the network")
+graph = load_subreddit_graph()
+if graph is None:
+    st.info("Run the transformation ETL to build the graph data.")
+else:
+    with st.container(horizontal=True):
+        detail = st.slider("nodes shown", 50, MAX_VIEW_NODES, 150, step=50)
+        top_k = st.slider("edges per node", 1, 20, 5)
+        core = st.slider("k-core", 0, 20, 2)
+    focus = st.selectbox(
+        "focus on a subreddit",
+        [None] + sorted(graph.labels.tolist()),
+        format_func=lambda s: "whole graph" if s is None else s,
+        key="graph_focus",
+    )
+    communities = None
+    if "community" in graph.node_attrs:
+        ids = sorted(set(graph.node_attrs["community"].tolist()) - {-1})
+        chosen = st.multiselect("communities", ids)
+        communities = chosen or None
+    view = bounded_view(
+        graph,
+        max_nodes=detail,
+        core=0 if focus else core,
+        top_k=top_k,
+        communities=communities,
+        focus=focus,
+    )
+    st.caption(
+        f"showing {view.n_nodes} nodes and {view.n_edges} edges, "
+        "click a node to focus on it"
+    )
+    render_graph(view, key="subreddit_graph", on_click=focus_on_clicked_node)
+
 st.divider()
 
 st.markdown(
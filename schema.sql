@@ -23,3 +23,298 @@ CREATE TABLE submissions (
     subreddit TEXT NOT NULL,
     permalink TEXT NOT NULL
 );
+
+-- columns added since, each block safe to run against an existing
+-- database
+
+-- hash of body/title/selftext, edited and bucketed score; rescrapes
+-- skip equal rows, see utils/reddit_utils.py
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS fingerprint BIGINT;
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS fingerprint BIGINT;
+
+-- rescrape schedule, see utils/schedule_utils.py
+ALTER TABLE submissions
+    ADD COLUMN IF NOT EXISTS num_comments INT,
+    ADD COLUMN IF NOT EXISTS last_scraped_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS next_due TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS submissions_next_due ON submissions (next_due);
+
+-- place in the thread, see utils/thread_utils.py: 0 for top-level,
+-- the top-level ancestor, and the zero-padded ids from it down
+ALTER TABLE comments
+    ADD COLUMN IF NOT EXISTS depth INT,
+    ADD COLUMN IF NOT EXISTS root_id TEXT,
+    ADD COLUMN IF NOT EXISTS path TEXT COLLATE "C";
+-- a thread is one range of this index, read in path order; path isn't
+-- indexed itself as deep threads would exceed the btree row size
+CREATE INDEX IF NOT EXISTS comments_thread ON comments (submission_id);
+
+-- full-text search, see utils/search_utils.py
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS body_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(body, ''))) STORED;
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(selftext, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS comments_body_tsv
+    ON comments USING gin (body_tsv);
+CREATE INDEX IF NOT EXISTS submissions_search_tsv
+    ON submissions USING gin (search_tsv);
+
+-- newest listing item stored per (subreddit, sort); sort=new scrapes
+-- stop reading the listing when they reach it
+CREATE TABLE listing_watermarks (
+    subreddit TEXT NOT NULL,
+    sort TEXT NOT NULL,
+    newest_name TEXT NOT NULL,
+    newest_created_utc TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (subreddit, sort)
+);
+
+-- per redditor: newest comment stored and when they were last scraped
+CREATE TABLE redditor_watermarks (
+    redditor TEXT PRIMARY KEY,
+    newest_name TEXT,
+    newest_created_utc TIMESTAMPTZ,
+    last_scraped_at TIMESTAMPTZ NOT NULL
+);
+
+-- threads and redditors that still failed after in-run retries,
+-- run again by `retry-failed`
+CREATE TABLE failed_tasks (
+    kind TEXT NOT NULL, -- thread or redditor
+    target TEXT NOT NULL, -- submission id or username
+    params JSONB NOT NULL DEFAULT '{}',
+    error_class TEXT NOT NULL,
+    error_message TEXT,
+    attempts INT NOT NULL,
+    first_failed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_failed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (kind, target)
+);
+
+-- topics fitted by `analyze topics`, one model per scope (a subreddit
+-- or 'global'); refitting a scope replaces its model
+CREATE TABLE topic_models (
+    id SERIAL PRIMARY KEY,
+    scope TEXT NOT NULL UNIQUE,
+    n_topics INT NOT NULL,
+    n_docs BIGINT NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}',
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE topics (
+    model_id INT NOT NULL REFERENCES topic_models (id) ON DELETE CASCADE,
+    topic INT NOT NULL,
+    -- average share of the topic in the scope's comments
+    share REAL NOT NULL,
+    -- top three terms
+    label TEXT NOT NULL,
+    PRIMARY KEY (model_id, topic)
+);
+
+CREATE TABLE topic_terms (
+    model_id INT NOT NULL REFERENCES topic_models (id) ON DELETE CASCADE,
+    topic INT NOT NULL,
+    rank INT NOT NULL,
+    term TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (model_id, topic, rank)
+);
+
+CREATE TABLE subreddit_communities (
+    subreddit TEXT PRIMARY KEY,
+    community INT NOT NULL,
+    -- content hash of the pruned edge data the partition was computed from
+    edge_hash TEXT NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- per-subreddit activity by hour and by day, kept current on every
+-- insert and score change by the triggers below; `rollups backfill`
+-- rebuilds it from the comments and submissions tables
+CREATE TABLE subreddit_rollups (
+    grain TEXT NOT NULL, -- hour or day
+    subreddit TEXT NOT NULL, -- r/name, for comments and submissions alike
+    bucket TIMESTAMPTZ NOT NULL, -- start of the hour or day, UTC
+    comments BIGINT NOT NULL DEFAULT 0,
+    submissions BIGINT NOT NULL DEFAULT 0,
+    -- distinct commenters and posters
+    authors BIGINT NOT NULL DEFAULT 0,
+    comment_score BIGINT NOT NULL DEFAULT 0,
+    submission_score BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, subreddit, bucket)
+);
+
+-- authors already counted in a bucket, so repeat posters count once
+CREATE TABLE subreddit_rollup_authors (
+    grain TEXT NOT NULL,
+    subreddit TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    author TEXT NOT NULL,
+    PRIMARY KEY (grain, subreddit, bucket, author)
+);
+
+-- statement-level: one upsert per bucket per statement, not per row
+CREATE FUNCTION rollup_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    is_comment BOOLEAN := TG_TABLE_NAME = 'comments';
+BEGIN
+    WITH added AS (
+        SELECT g.grain,
+            CASE WHEN n.subreddit LIKE 'r/%' THEN n.subreddit
+                ELSE 'r/' || n.subreddit END AS subreddit,
+            date_trunc(g.grain, n.created_utc, 'UTC') AS bucket,
+            n.author,
+            coalesce(n.ups, 0) AS ups
+        FROM new_rows n CROSS JOIN (VALUES ('hour'), ('day')) g (grain)
+    ),
+    new_authors AS (
+        INSERT INTO subreddit_rollup_authors AS a
+        SELECT DISTINCT grain, subreddit, bucket, author FROM added
+        -- deleted authors are stored as 'None'
+        WHERE author IS NOT NULL AND author NOT IN ('None', '[deleted]')
+        ON CONFLICT DO NOTHING
+        RETURNING a.grain, a.subreddit, a.bucket
+    ),
+    deltas AS (
+        SELECT grain, subreddit, bucket, count(*) AS n, sum(ups) AS score,
+            0 AS authors
+        FROM added GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT grain, subreddit, bucket, 0, 0, count(*)
+        FROM new_authors GROUP BY 1, 2, 3
+    )
+    INSERT INTO subreddit_rollups AS r (
+        grain, subreddit, bucket, comments, submissions, authors,
+        comment_score, submission_score
+    )
+    SELECT grain, subreddit, bucket,
+        CASE WHEN is_comment THEN sum(n) ELSE 0 END,
+        CASE WHEN is_comment THEN 0 ELSE sum(n) END,
+        sum(authors),
+        CASE WHEN is_comment THEN sum(score) ELSE 0 END,
+        CASE WHEN is_comment THEN 0 ELSE sum(score) END
+    FROM deltas GROUP BY 1, 2, 3
+    ON CONFLICT (grain, subreddit, bucket) DO UPDATE SET
+        comments = r.comments + EXCLUDED.comments,
+        submissions = r.submissions + EXCLUDED.submissions,
+        authors = r.authors + EXCLUDED.authors,
+        comment_score = r.comment_score + EXCLUDED.comment_score,
+        submission_score = r.submission_score + EXCLUDED.submission_score;
+    RETURN NULL;
+END $$;
+
+-- rescrapes only change scores: add the difference
+CREATE FUNCTION rollup_updated() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    is_comment BOOLEAN := TG_TABLE_NAME = 'comments';
+BEGIN
+    INSERT INTO subreddit_rollups AS r (
+        grain, subreddit, bucket, comment_score, submission_score
+    )
+    SELECT g.grain,
+        CASE WHEN n.subreddit LIKE 'r/%' THEN n.subreddit
+            ELSE 'r/' || n.subreddit END,
+        date_trunc(g.grain, n.created_utc, 'UTC'),
+        -- as in rollup_inserted, NULL ups count as 0
+        CASE WHEN is_comment
+            THEN sum(coalesce(n.ups, 0) - coalesce(o.ups, 0)) ELSE 0 END,
+        CASE WHEN is_comment
+            THEN 0 ELSE sum(coalesce(n.ups, 0) - coalesce(o.ups, 0)) END
+    FROM new_rows n
+    JOIN old_rows o USING (name)
+    CROSS JOIN (VALUES ('hour'), ('day')) g (grain)
+    WHERE n.ups IS DISTINCT FROM o.ups
+    GROUP BY 1, 2, 3
+    ON CONFLICT (grain, subreddit, bucket) DO UPDATE SET
+        comment_score = r.comment_score + EXCLUDED.comment_score,
+        submission_score = r.submission_score + EXCLUDED.submission_score;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER comments_rollup_insert AFTER INSERT ON comments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_inserted();
+CREATE TRIGGER comments_rollup_update AFTER UPDATE ON comments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_updated();
+CREATE TRIGGER submissions_rollup_insert AFTER INSERT ON submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_inserted();
+CREATE TRIGGER submissions_rollup_update AFTER UPDATE ON submissions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_updated();
+
+-- comment texts stored once however many comments repeat them
+-- ([deleted], AutoModerator and bot boilerplate), keyed by body_hash;
+-- see utils/body_utils.py. Loaders add texts repeated within a batch
+-- and `bodies migrate` those repeated across the table; the trigger
+-- stores a comment whose text is here as a reference to it.
+-- body_id is set, with body NULL, when the comment's text is in bodies
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS body_id BIGINT;
+
+CREATE TABLE bodies (
+    id BIGINT PRIMARY KEY,
+    body TEXT NOT NULL,
+    -- search matches shared texts here and inline ones in comments
+    body_tsv tsvector GENERATED ALWAYS AS (
+        to_tsvector('english', body)
+    ) STORED
+);
+
+CREATE INDEX bodies_body_tsv ON bodies USING gin (body_tsv);
+CREATE INDEX comments_body_id ON comments (body_id)
+    WHERE body_id IS NOT NULL;
+
+CREATE FUNCTION body_hash(body TEXT) RETURNS BIGINT
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT ('x' || left(md5(body), 16))::bit(64)::bigint
+$$;
+
+CREATE FUNCTION share_body() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    shared_id BIGINT;
+BEGIN
+    -- NULL: no text, or already a reference (an upsert's EXCLUDED row)
+    IF NEW.body IS NULL THEN
+        RETURN NEW;
+    END IF;
+    -- the text is compared too, so a hash collision stores it inline
+    SELECT id INTO shared_id FROM bodies
+    WHERE id = body_hash(NEW.body) AND body = NEW.body;
+    IF FOUND THEN
+        NEW.body_id := shared_id;
+        NEW.body := NULL;
+    ELSE
+        NEW.body_id := NULL;
+    END IF;
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER comments_share_body BEFORE INSERT OR UPDATE OF body
+    ON comments FOR EACH ROW EXECUTE FUNCTION share_body();
+
+INSERT INTO bodies (id, body)
+SELECT body_hash(b), b FROM unnest(ARRAY['[deleted]', '[removed]']) b;
+
+-- optional, needs the pg_trgm extension: substring search (search
+-- --like) without a full table scan. The optional statements are kept
+-- last so they can fail alone.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX comments_body_trgm ON comments USING gin (body gin_trgm_ops);
+CREATE INDEX submissions_title_trgm
+    ON submissions USING gin (title gin_trgm_ops);
+CREATE INDEX submissions_selftext_trgm
+    ON submissions USING gin (selftext gin_trgm_ops);
+CREATE INDEX bodies_body_trgm ON bodies USING gin (body gin_trgm_ops);
+
+-- optional, needs a server built with lz4 (PostgreSQL 14+): compress
+-- shared texts with lz4 instead of pglz, faster at a similar ratio
+ALTER TABLE bodies ALTER COLUMN body SET COMPRESSION lz4;
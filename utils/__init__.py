@@ -1,8 +1,24 @@
-from dotenv import load_dotenv, find_dotenv
+"""Environment loading is deferred until a connection is first opened,
+so importing utils (e.g. from the presentation pages) has no side
+effects."""
 
-if env_path := find_dotenv(usecwd=True, raise_error_if_not_found=False):
-    load_dotenv(env_path, override=True)
-    print(f"Environment variables loaded from {env_path}")
+_env_loaded = False
 
-else:
-    raise FileNotFoundError(".env file not found")
+
+def load_env() -> None:
+    """Load the .env file once per process.
+
+    Raises FileNotFoundError if no .env can be found.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv, find_dotenv
+
+    if env_path := find_dotenv(usecwd=True, raise_error_if_not_found=False):
+        load_dotenv(env_path, override=True)
+        _env_loaded = True
+        print(f"Environment variables loaded from {env_path}")
+
+    else:
+        raise FileNotFoundError(".env file not found")
@@ -0,0 +1,192 @@
+import logging
+import time
+from collections import Counter
+from typing import Iterable
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for comment texts shared through the bodies table.
+
+Many comments carry the same text: [deleted], [removed], AutoModerator
+notices, bot replies. A text stored in bodies is kept once, keyed by
+body_hash (the first 64 bits of its md5), and the comments_share_body
+trigger stores every comment with that text as body NULL plus body_id,
+whichever loader wrote it. A text only goes into bodies once it repeats:
+loaders add the texts repeated within the batch they write, and
+migrate_bodies those repeated across the comments already stored, so a
+text seen once is stored inline as before. Texts shorter than
+MIN_BODY_LENGTH save about as much as the reference costs and are left
+inline, apart from SEEDED_BODIES.
+
+Readers get the text as COMMENT_BODY from COMMENTS_WITH_BODIES; search
+matches shared texts through bodies.body_tsv and its own indexes.
+"""
+
+logger = logging.getLogger(__name__)
+
+SEEDED_BODIES = ("[deleted]", "[removed]")
+MIN_REPEATS = 2
+MIN_BODY_LENGTH = 32
+# bytes a reference (body_id) takes in a comments row
+REFERENCE_BYTES = 8
+# params: (list of texts,)
+SHARE_BODIES = """
+    INSERT INTO bodies (id, body)
+    SELECT body_hash(b), b FROM unnest(%s::text[]) AS b
+    ON CONFLICT (id) DO NOTHING
+"""
+COMMENTS_WITH_BODIES = "comments c LEFT JOIN bodies b ON b.id = c.body_id"
+COMMENT_BODY = "coalesce(c.body, b.body)"
+
+
+def repeated_bodies(
+    bodies: Iterable[str | None], min_repeats: int = MIN_REPEATS
+) -> list[str]:
+    """Texts long enough to share that occur min_repeats times or more."""
+    counts = Counter(
+        body for body in bodies if body and len(body) >= MIN_BODY_LENGTH
+    )
+    return [body for body, n in counts.items() if n >= min_repeats]
+
+
+def space_report(conn) -> dict:
+    """Comments and texts shared, and the bytes sharing saves.
+
+    saved is the text the shared comments would hold inline, less the
+    texts as stored in bodies (compressed, if at all) and the references.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT count(*), coalesce(sum(octet_length(b.body)), 0)
+            FROM comments c JOIN bodies b ON b.id = c.body_id;
+            """
+        )
+        shared_comments, inline_bytes = cur.fetchone()
+        cur.execute(
+            "SELECT count(*), coalesce(sum(pg_column_size(body)), 0) "
+            "FROM bodies;"
+        )
+        bodies, stored_bytes = cur.fetchone()
+        cur.execute(
+            "SELECT pg_total_relation_size('comments'), "
+            "pg_total_relation_size('bodies');"
+        )
+        comments_size, bodies_size = cur.fetchone()
+    saved = inline_bytes - stored_bytes - REFERENCE_BYTES * shared_comments
+    return {
+        "shared_comments": shared_comments,
+        "bodies": bodies,
+        "inline_bytes": int(inline_bytes),
+        "stored_bytes": int(stored_bytes),
+        "saved_bytes": int(saved),
+        "comments_size": comments_size,
+        "bodies_size": bodies_size,
+    }
+
+
+def migrate_bodies(
+    conn,
+    min_repeats: int = MIN_REPEATS,
+    min_length: int = MIN_BODY_LENGTH,
+) -> dict:
+    """Share the texts stored min_repeats times or more, in one transaction.
+
+    Adds them (and SEEDED_BODIES) to bodies, turns the comments holding
+    them into references and drops texts no comment references any more.
+    Returns the counts of texts added, comments moved and texts dropped.
+    """
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO bodies (id, body)
+            SELECT body_hash(body), body FROM comments
+            WHERE body IS NOT NULL AND length(body) >= %s
+            GROUP BY body HAVING count(*) >= %s
+            ON CONFLICT (id) DO NOTHING;
+            """,
+            (min_length, min_repeats),
+        )
+        added = cur.rowcount
+        cur.execute(SHARE_BODIES, (list(SEEDED_BODIES),))
+        added += cur.rowcount
+        # the trigger keeps body_id when body is set to NULL
+        cur.execute(
+            """
+            UPDATE comments c SET body = NULL, body_id = b.id
+            FROM bodies b WHERE c.body = b.body;
+            """
+        )
+        moved = cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM bodies b
+            WHERE b.body <> ALL(%s) AND NOT EXISTS (
+                SELECT 1 FROM comments c WHERE c.body_id = b.id
+            );
+            """,
+            (list(SEEDED_BODIES),),
+        )
+        dropped = cur.rowcount
+    return {"added": added, "moved": moved, "dropped": dropped}
+
+
+@with_resources(use_db=True, use_reddit=False)
+def migrate(
+    conn, min_repeats: int = MIN_REPEATS, min_length: int = MIN_BODY_LENGTH
+):
+    stats = migrate_bodies(conn, min_repeats, min_length)
+    return stats, space_report(conn)
+
+
+@with_resources(use_db=True, use_reddit=False)
+def report(conn) -> dict:
+    return space_report(conn)
+
+
+def _print_report(space: dict):
+    saved = space["saved_bytes"]
+    share = 100 * saved / space["inline_bytes"] if space["inline_bytes"] else 0
+    console.print(
+        f"{space['shared_comments']:,} comments share "
+        f"{space['bodies']:,} texts: {space['inline_bytes'] / 1e6:,.1f} MB "
+        f"of text stored as {space['stored_bytes'] / 1e6:,.1f} MB, "
+        f"[green]{saved / 1e6:,.1f} MB saved[/green] ({share:.0f}%)."
+    )
+    console.print(
+        f"comments: {space['comments_size'] / 1e6:,.1f} MB, "
+        f"bodies: {space['bodies_size'] / 1e6:,.1f} MB on disk."
+    )
+
+
+def bodies_migrate(
+    min_repeats: int = MIN_REPEATS,
+    min_length: int = MIN_BODY_LENGTH,
+    **kwargs,
+):
+    """Prompt command: share the repeated texts already stored."""
+    logger.info(
+        f"Migrating shared bodies | min_repeats={min_repeats} "
+        f"| min_length={min_length}"
+    )
+    start_time = time.perf_counter()
+    with console.status("Sharing repeated comment texts...", spinner="dots"):
+        stats, space = migrate(min_repeats, min_length)
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Migrated bodies {stats} in {elapsed:.2f}s | {space}")
+    console.print(
+        f"Added [green]{stats['added']:,}[/green] shared texts and moved "
+        f"{stats['moved']:,} comments onto them in {elapsed:.2f}s "
+        f"({stats['dropped']:,} unused texts dropped)."
+    )
+    _print_report(space)
+    if stats["moved"]:
+        console.print(
+            "The old row versions are reused after VACUUM; VACUUM FULL "
+            "comments returns the space to the OS."
+        )
+
+
+def bodies_report(**kwargs):
+    """Prompt command: print how much space shared texts save."""
+    _print_report(report())
@@ -0,0 +1,30 @@
+from importlib import import_module
+from typing import Any, Callable
+
+"""Lazily imported command functions for the prompt registry."""
+
+
+class LazyCommand:
+    """Stand-in for a command function that is imported on first call.
+
+    Registering commands as LazyCommand("scraping_utils", "scrape_subreddit")
+    keeps praw, psycopg and rich.progress out of the import path until a
+    command that needs them is actually run.
+    """
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+        self._func: Callable[..., Any] | None = None
+
+    def resolve(self) -> Callable[..., Any]:
+        if self._func is None:
+            module = import_module(f".{self.module}", __package__)
+            self._func = getattr(module, self.name)
+        return self._func
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"LazyCommand({self.module!r}, {self.name!r})"
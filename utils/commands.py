@@ -0,0 +1,690 @@
+import argparse
+import re
+import shlex
+from datetime import datetime
+from typing import Callable
+from .console import console
+from .jobs import jobs
+from .prompt_help_text import prompt_data
+
+"""Command parsing and dispatch shared by the prompt and headless CLI.
+
+Nothing here imports prompt_toolkit, and the command functions in
+prompt_data are only imported the first time they are dispatched, so a
+one-shot `main.py <command> --exit-after` starts without paying for
+praw, psycopg or the interactive prompt.
+"""
+
+UNKNOWN_COMMAND = (
+    "Unknown command. Try 'scrape', 'refresh', 'retry-failed', 'db', "
+    "'export', 'search', 'import-dump', 'delete', 'expand', 'graph', "
+    "'analyze', 'rollups', 'thread', 'bodies', 'jobs' or 'exit'."
+)
+
+
+def parse_limit(value: str | None) -> int | None:
+    """limit flag may be 'None' or an integer"""
+    if value is None or value.lower() == "none":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Invalid limit value: {value}")
+        return None
+
+
+def run_or_submit(
+    command: str, func: Callable, background: bool, exit_after: bool, **kwargs
+) -> bool:
+    """Run func now, or as a background job when called from the prompt.
+
+    With --exit-after the prompt waits for the job before exiting.
+    """
+    if not background:
+        func(**kwargs)
+        return exit_after
+    job = jobs.submit(command, func, **kwargs)
+    console.print(f"Started job #{job.id}: {command}")
+    if exit_after:
+        jobs.wait([job.id])
+    return exit_after
+
+
+def job_label(user_input: str) -> str:
+    return pop_flags(user_input, (), ("exit-after",))[0]
+
+
+def fresh_hours_kwarg(ns: argparse.Namespace) -> dict:
+    """--fresh-hours if given, so the command's own default applies."""
+    if ns.fresh_hours is None:
+        return {}
+    return {"fresh_hours": ns.fresh_hours}
+
+
+def run_scrape(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    if len(tokens) < 3:
+        console.print(prompt_data["scrape"]["error"]["desc"])
+        return False
+    target = tokens[1].lower()
+    arg = tokens[2]
+    # parse remaining tokens as flags
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-o", "--overwrite", action="store_true")
+    parser.add_argument("--limit", type=str)
+    parser.add_argument("--subs-only", action="store_true")
+    parser.add_argument("--comments-only", action="store_true")
+    parser.add_argument("--sort", type=str)
+    parser.add_argument("--threshold", type=int)
+    parser.add_argument("-w", "--max-workers", type=int)
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--full", action="store_true")
+    parser.add_argument("--raw", action="store_true")
+    parser.add_argument("--fresh-hours", type=float, dest="fresh_hours")
+    parser.add_argument(
+        "-s",
+        "--skip-existing",
+        action="store_true",
+        dest="skip_existing",
+    )
+    try:
+        ns, unknown = parser.parse_known_args(tokens[3:])
+    except Exception as e:
+        print("Error parsing flags:", e)
+        return False
+    limit = parse_limit(ns.limit)
+    # invoking scrape subreddit with no limit defaults to 10
+    if target in ("subreddit", "r") and limit is None:
+        limit = 10
+    for command in prompt_data["scrape"].values():
+        if command.get("func") and target in command["targets"]:
+            return run_or_submit(
+                job_label(user_input),
+                command["func"],
+                background,
+                bool(ns.exit_after),
+                post_id=arg,
+                subreddit_name=arg,
+                comment_id=arg,
+                user_id=arg,
+                sort=ns.sort if ns.sort is not None else "new",
+                limit=limit,
+                threshold=ns.threshold if ns.threshold is not None else 0,
+                overwrite=bool(ns.overwrite),
+                subs_only=bool(ns.subs_only),
+                comments_only=bool(ns.comments_only),
+                max_workers=(
+                    ns.max_workers if ns.max_workers is not None else 5
+                ),
+                skip_existing=bool(ns.skip_existing),
+                quiet=bool(ns.quiet),
+                full=bool(ns.full),
+                raw=bool(ns.raw),
+                **fresh_hours_kwarg(ns),
+            )
+    console.print(prompt_data["scrape"]["error"]["desc"])
+    return False
+
+
+def run_delete(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    if len(tokens) < 2:
+        print("Usage: delete <submissions|comments|all>")
+        return False
+    target = tokens[1].lower()
+    if target in prompt_data["delete"]["targets"]["submissions"]:
+        target = "submissions"
+    elif target in prompt_data["delete"]["targets"]["comments"]:
+        target = "comments"
+    elif target == prompt_data["delete"]["targets"]["all"]:
+        target = "all"
+    else:
+        print("Unknown delete target. Use submissions,")
+        print("comments or all.")
+        return False
+    answer = confirm(
+        "Type 'Yes' to confirm deletion (THIS CANNOT BE UNDONE): "
+    ).strip()
+    if answer != "Yes":
+        print("Aborted: confirmation not provided.")
+        return False
+    subs_del, comm_del = prompt_data["delete"]["func"](target)
+    console.print(f"Deleted: submissions={subs_del}, comments={comm_del}")
+    return False
+
+
+def pop_flags(text: str, options: tuple, switches: tuple) -> tuple:
+    """Pull --option VALUE and --switch flags out of free text such as SQL.
+
+    Returns (text without the flags, {name: value or True}). Used where
+    shlex would mangle the quoting of the remaining text.
+    """
+    names = "|".join(re.escape(o) for o in options) or "(?!)"
+    switch_names = "|".join(re.escape(s) for s in switches) or "(?!)"
+    pattern = re.compile(
+        rf"\s--({names})[ =](\S+)|\s--({switch_names})(?=\s|$)"
+    )
+    flags = {}
+    for match in pattern.finditer(" " + text):
+        if match.group(3):
+            flags[match.group(3)] = True
+        else:
+            flags[match.group(1)] = match.group(2)
+    return pattern.sub("", " " + text).strip(), flags
+
+
+def run_db(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    if " " not in user_input:
+        console.print(prompt_data["db"]["desc"])
+        return False
+    _, sql_str = user_input.split(" ", 1)
+    sql_str, flags = pop_flags(
+        sql_str, ("limit", "page-size"), ("exit-after",)
+    )
+    kwargs = {"limit": parse_limit(flags.get("limit"))}
+    if "page-size" in flags:
+        page_size = parse_limit(flags["page-size"])
+        if page_size is None or page_size < 1:
+            print("--page-size must be a positive integer")
+            return False
+        kwargs["page_size"] = page_size
+    prompt_data["db"]["func"](sql_str, **kwargs)
+    return bool(flags.get("exit-after"))
+
+
+def run_export(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    if " " not in user_input:
+        console.print(prompt_data["export"]["desc"])
+        return False
+    _, target = user_input.split(" ", 1)
+    target, flags = pop_flags(
+        target,
+        ("format", "split", "compression", "out"),
+        ("exit-after",),
+    )
+    if not target:
+        console.print(prompt_data["export"]["desc"])
+        return False
+    kwargs = {"fmt": flags.get("format", "csv")}
+    if "split" in flags:
+        kwargs["split"] = flags["split"]
+    if "compression" in flags:
+        kwargs["compression"] = flags["compression"]
+    if "out" in flags:
+        kwargs["out_dir"] = flags["out"]
+    prompt_data["export"]["func"](target, **kwargs)
+    return bool(flags.get("exit-after"))
+
+
+def run_search(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    if " " not in user_input:
+        console.print(prompt_data["search"]["desc"])
+        return False
+    _, query = user_input.split(" ", 1)
+    query, flags = pop_flags(
+        query,
+        (
+            "in",
+            "subreddit",
+            "author",
+            "since",
+            "until",
+            "limit",
+            "after",
+            "sort",
+        ),
+        ("like", "exit-after"),
+    )
+    if not query:
+        console.print(prompt_data["search"]["desc"])
+        return False
+    target = flags.get("in", "comments")
+    if target not in ("comments", "submissions"):
+        print("--in must be comments or submissions")
+        return False
+    sort = flags.get("sort", "rank")
+    if sort not in ("rank", "new"):
+        print("--sort must be rank or new")
+        return False
+    kwargs = {"target": target, "sort": sort, "like": bool(flags.get("like"))}
+    for name in ("since", "until"):
+        if name in flags:
+            try:
+                datetime.fromisoformat(flags[name])
+            except ValueError:
+                print(f"--{name} must be a date such as 2024-01-31")
+                return False
+            kwargs[name] = flags[name]
+    for name in ("subreddit", "author", "after"):
+        if name in flags:
+            kwargs[name] = flags[name]
+    if "limit" in flags:
+        limit = parse_limit(flags["limit"])
+        if limit is None or limit < 1:
+            print("--limit must be a positive integer")
+            return False
+        kwargs["limit"] = limit
+    prompt_data["search"]["func"](query, **kwargs)
+    return bool(flags.get("exit-after"))
+
+
+def run_expand(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--threshold", type=int, required=True)
+    parser.add_argument("--limit", type=int, required=False)
+    parser.add_argument("-w", "--max-workers", type=int, default=5)
+    parser.add_argument("--fresh-hours", type=float, dest="fresh_hours")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[1:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    return run_or_submit(
+        job_label(user_input),
+        prompt_data["expand"]["func"],
+        background,
+        bool(ns.exit_after),
+        threshold=ns.threshold,
+        limit=ns.limit,
+        max_workers=ns.max_workers,
+        quiet=bool(ns.quiet),
+        **fresh_hours_kwarg(ns),
+    )
+
+
+def run_refresh(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("subreddit", nargs="?")
+    parser.add_argument("--budget", type=int, default=100)
+    parser.add_argument("-w", "--max-workers", type=int, default=5)
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[1:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    return run_or_submit(
+        job_label(user_input),
+        prompt_data["refresh"]["func"],
+        background,
+        bool(ns.exit_after),
+        subreddit_name=ns.subreddit,
+        budget=ns.budget,
+        max_workers=ns.max_workers,
+        quiet=bool(ns.quiet),
+    )
+
+
+def run_retry_failed(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("kind", nargs="?", choices=("thread", "redditor"))
+    parser.add_argument("--max-attempts", type=int, dest="max_attempts")
+    parser.add_argument("-w", "--max-workers", type=int, default=5)
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[1:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    return run_or_submit(
+        job_label(user_input),
+        prompt_data["retry-failed"]["func"],
+        background,
+        bool(ns.exit_after),
+        kind=ns.kind,
+        max_attempts=ns.max_attempts,
+        max_workers=ns.max_workers,
+        quiet=bool(ns.quiet),
+    )
+
+
+def run_import_dump(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    if " " not in user_input:
+        console.print(prompt_data["import-dump"]["desc"])
+        return False
+    _, path = user_input.split(" ", 1)
+    path, flags = pop_flags(
+        path,
+        ("subreddit", "author", "since", "until", "workers"),
+        ("overwrite", "exit-after"),
+    )
+    if not path:
+        console.print(prompt_data["import-dump"]["desc"])
+        return False
+    kwargs = {"overwrite": bool(flags.get("overwrite"))}
+    for name in ("since", "until"):
+        if name in flags:
+            try:
+                datetime.fromisoformat(flags[name])
+            except ValueError:
+                print(f"--{name} must be a date such as 2024-01-31")
+                return False
+            kwargs[name] = flags[name]
+    for name in ("subreddit", "author"):
+        if name in flags:
+            kwargs[f"{name}s"] = flags[name].split(",")
+    if "workers" in flags:
+        workers = parse_limit(flags["workers"])
+        if workers is None or workers < 1:
+            print("--workers must be a positive integer")
+            return False
+        kwargs["workers"] = workers
+    prompt_data["import-dump"]["func"](path.strip("\"'"), **kwargs)
+    return bool(flags.get("exit-after"))
+
+
+def run_graph(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    target = tokens[1].lower() if len(tokens) > 1 else ""
+    command = next(
+        (c for c in prompt_data["graph"].values() if target in c["targets"]),
+        None,
+    )
+    if command is None:
+        print("Usage: graph <edges|communities|layout> [flags]")
+        return False
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--min-comments", type=int, default=200)
+    parser.add_argument("--min-weight", type=float, default=0.0)
+    parser.add_argument("--resolution", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--fresh", action="store_true")
+    parser.add_argument("--perms", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=64)
+    parser.add_argument("--min-shared", type=int, default=5)
+    parser.add_argument("--recall-sample", type=int, default=500)
+    parser.add_argument("--exact", action="store_true")
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[2:])
+    except Exception as e:
+        print("Error parsing flags:", e)
+        return False
+    command["func"](
+        min_comments=ns.min_comments,
+        min_weight=ns.min_weight,
+        resolution=ns.resolution,
+        seed=ns.seed,
+        iterations=ns.iterations,
+        fresh=ns.fresh,
+        perms=ns.perms,
+        bands=ns.bands,
+        min_shared=ns.min_shared,
+        recall_sample=ns.recall_sample,
+        exact=ns.exact,
+    )
+    return bool(ns.exit_after)
+
+
+def run_analyze(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    target = tokens[1].lower() if len(tokens) > 1 else ""
+    command = next(
+        (c for c in prompt_data["analyze"].values() if target in c["targets"]),
+        None,
+    )
+    if command is None:
+        console.print(prompt_data["analyze"]["base"]["desc"])
+        return False
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("subreddits", nargs="*")
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--top", type=int)
+    parser.add_argument("--passes", type=int, default=1)
+    parser.add_argument("--max-docs", type=int, dest="max_docs")
+    parser.add_argument("--terms", type=int, default=10)
+    parser.add_argument("--features", type=int, default=2**18)
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[2:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    command["func"](
+        subreddits=ns.subreddits,
+        top=ns.top,
+        n_topics=ns.topics,
+        n_features=ns.features,
+        n_terms=ns.terms,
+        passes=ns.passes,
+        max_docs=ns.max_docs,
+        workers=ns.workers,
+        seed=ns.seed,
+    )
+    return bool(ns.exit_after)
+
+
+def run_rollups(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = user_input.split()
+    if len(tokens) < 2 or tokens[1].lower() != "backfill":
+        console.print(prompt_data["rollups"]["desc"])
+        return False
+    prompt_data["rollups"]["func"]()
+    return "--exit-after" in tokens
+
+
+def run_thread(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("post_id", nargs="?")
+    parser.add_argument("--comment")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--limit", default="200")
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[1:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    if ns.post_id and ns.post_id.lower() == "backfill":
+        prompt_data["thread"]["backfill"]()
+        return bool(ns.exit_after)
+    if not ns.post_id and not ns.comment:
+        console.print(prompt_data["thread"]["desc"])
+        return False
+    prompt_data["thread"]["func"](
+        post_id=ns.post_id,
+        comment_id=ns.comment,
+        max_depth=ns.depth,
+        limit=parse_limit(ns.limit),
+    )
+    return bool(ns.exit_after)
+
+
+def run_bodies(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    tokens = shlex.split(user_input)
+    action = tokens[1].lower() if len(tokens) > 1 else ""
+    if action not in ("migrate", "report"):
+        console.print(prompt_data["bodies"]["desc"])
+        return False
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--min-repeats", type=int, default=2)
+    parser.add_argument("--min-length", type=int, default=32)
+    parser.add_argument("--exit-after", action="store_true", dest="exit_after")
+    try:
+        ns, unknown = parser.parse_known_args(tokens[2:])
+    except (Exception, SystemExit) as e:
+        print("Error parsing flags:", e)
+        return False
+    if action == "report":
+        prompt_data["bodies"]["report"]()
+    elif ns.min_repeats < 2:
+        print("--min-repeats must be at least 2")
+        return False
+    else:
+        prompt_data["bodies"]["migrate"](
+            min_repeats=ns.min_repeats, min_length=ns.min_length
+        )
+    return bool(ns.exit_after)
+
+
+def parse_job_ids(tokens: list[str]) -> list[int] | None:
+    try:
+        return [int(t.lstrip("#")) for t in tokens]
+    except ValueError:
+        print("Job ids must be integers, e.g. 'job 3'")
+        return None
+
+
+def run_jobs(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    all_jobs = jobs.all()
+    if not all_jobs:
+        console.print("No jobs.")
+    for job in all_jobs:
+        console.print(job.summary(), markup=False)
+    return False
+
+
+def run_job(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    ids = parse_job_ids(user_input.split()[1:])
+    if not ids:
+        console.print(prompt_data["jobs"]["job"]["desc"])
+        return False
+    for job_id in ids:
+        job = jobs.get(job_id)
+        if job is None:
+            console.print(f"No job #{job_id}")
+            continue
+        console.print(job.summary(), markup=False)
+        if job.total:
+            pct = 100 * job.current / job.total
+            console.print(
+                f"  progress: {job.current}/{job.total} ({pct:.0f}%)"
+            )
+    return False
+
+
+def run_cancel(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    ids = parse_job_ids(user_input.split()[1:])
+    if not ids:
+        console.print(prompt_data["jobs"]["cancel"]["desc"])
+        return False
+    for job_id in ids:
+        if jobs.cancel(job_id):
+            console.print(f"Cancelling job #{job_id}...")
+        else:
+            console.print(f"No active job #{job_id}")
+    return False
+
+
+def run_wait(
+    user_input: str, confirm: Callable[[str], str], background: bool = False
+) -> bool:
+    ids = parse_job_ids(user_input.split()[1:])
+    if ids is None:
+        return False
+    active = [j.id for j in jobs.active() if not ids or j.id in ids]
+    if not active:
+        console.print("No active jobs.")
+        return False
+    console.print(f"Waiting for {len(active)} job(s), Ctrl-C to stop waiting")
+    try:
+        jobs.wait(active)
+    except KeyboardInterrupt:
+        console.print("Stopped waiting, jobs are still running.")
+    return False
+
+
+# top-level command word -> handler(user_input, confirm, background) -> exit?
+handlers: dict[str, Callable[..., bool]] = {
+    "scrape": run_scrape,
+    "delete": run_delete,
+    "db": run_db,
+    "export": run_export,
+    "search": run_search,
+    "import-dump": run_import_dump,
+    "expand": run_expand,
+    "refresh": run_refresh,
+    "retry-failed": run_retry_failed,
+    "graph": run_graph,
+    "analyze": run_analyze,
+    "rollups": run_rollups,
+    "thread": run_thread,
+    "bodies": run_bodies,
+    "jobs": run_jobs,
+    "job": run_job,
+    "cancel": run_cancel,
+    "wait": run_wait,
+}
+
+
+def dispatch(
+    user_input: str,
+    confirm: Callable[[str], str] = input,
+    background: bool = False,
+) -> bool:
+    """Run one command line. Returns True if the caller should exit.
+
+    confirm is used for questions such as the delete confirmation, so
+    the interactive prompt can supply its own session.prompt. With
+    background, scrape, expand, refresh and retry-failed are submitted as
+    jobs instead of blocking.
+    """
+    user_input = user_input.strip()
+    if not user_input:
+        return False
+    if user_input in {"exit", "quit"}:
+        return True
+    cmd = user_input.split(maxsplit=1)[0].lower()
+    handler = handlers.get(cmd)
+    if handler is None:
+        print(UNKNOWN_COMMAND)
+        return False
+    return handler(user_input, confirm, background)
+
+
+def run_headless(args: list[str]) -> int:
+    """Run a single command from the command line without a prompt."""
+    try:
+        dispatch(" ".join(args).strip())
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+        return 1
+    return 0
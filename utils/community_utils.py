@@ -0,0 +1,293 @@
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from .console import console
+from .connection_utils import with_resources
+from .graph_utils import (
+    CACHE_DIR,
+    EDGES_PATH,
+    NODES_PATH,
+    CSRGraph,
+    content_hash,
+    load_graph,
+    subgraph,
+    update_node_table,
+)
+
+"""Utils for community detection on the subreddit network."""
+
+logger = logging.getLogger(__name__)
+
+
+def prune_graph(
+    graph: CSRGraph,
+    min_comments: int = 200,
+    min_weight: float = 0.0,
+    drop_isolates: bool = True,
+) -> CSRGraph:
+    """Drop small subreddits and light edges, as was done by hand in Gephi."""
+    counts = graph.node_attrs.get("comment_count")
+    keep = np.ones(graph.n_nodes, dtype=bool)
+    if counts is not None:
+        keep &= counts >= min_comments
+    pruned = subgraph(graph, keep, min_weight=min_weight)
+    if drop_isolates:
+        pruned = subgraph(pruned, pruned.degree() > 0)
+    return pruned
+
+
+def modularity(
+    graph: CSRGraph, labels: np.ndarray, resolution: float = 1.0
+) -> float:
+    """Newman modularity of a partition of the graph."""
+    k = graph.strength()
+    m2 = k.sum()
+    if m2 == 0:
+        return 0.0
+    rows = np.repeat(np.arange(graph.n_nodes), graph.degree())
+    same = labels[rows] == labels[graph.indices]
+    internal = graph.weights[same].sum()
+    tot = np.bincount(labels, weights=k)
+    return float(internal / m2 - resolution * np.sum((tot / m2) ** 2))
+
+
+def _move_nodes(indptr, indices, weights, k, m2, resolution, rng) -> tuple:
+    """Louvain local moving phase.
+
+    Greedily moves each node into the neighbouring community with the
+    best modularity gain until a sweep makes no moves. Returns
+    (labels, moved) where moved is True if any node changed community.
+    """
+    n = len(k)
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    weights = weights.tolist()
+    k = k.tolist()
+    comm = list(range(n))
+    tot = list(k)
+    order = rng.permutation(n).tolist()
+    moved_any = False
+    moved = True
+    while moved:
+        moved = False
+        for i in order:
+            ci = comm[i]
+            ki = k[i]
+            links: dict[int, float] = {}
+            for p in range(indptr[i], indptr[i + 1]):
+                c = comm[indices[p]]
+                links[c] = links.get(c, 0.0) + weights[p]
+            tot[ci] -= ki
+            scale = resolution * ki / m2
+            best = ci
+            best_gain = links.get(ci, 0.0) - tot[ci] * scale
+            for c, w in links.items():
+                gain = w - tot[c] * scale
+                if gain > best_gain + 1e-12:
+                    best, best_gain = c, gain
+            tot[best] += ki
+            if best != ci:
+                comm[i] = best
+                moved = moved_any = True
+    return np.asarray(comm, dtype=np.int64), moved_any
+
+
+def _aggregate(indptr, indices, weights, labels, n_comms):
+    """Collapse each community into one node, dropping internal edges."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    cu = labels[rows]
+    cv = labels[indices]
+    between = cu != cv
+    keys, inverse = np.unique(
+        cu[between] * n_comms + cv[between], return_inverse=True
+    )
+    agg_w = np.bincount(inverse, weights=weights[between])
+    agg_rows = keys // n_comms
+    new_indptr = np.zeros(n_comms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(agg_rows, minlength=n_comms), out=new_indptr[1:])
+    return new_indptr, keys % n_comms, agg_w
+
+
+def louvain(
+    graph: CSRGraph,
+    resolution: float = 1.0,
+    seed: int = 0,
+    max_levels: int = 20,
+) -> np.ndarray:
+    """Louvain modularity communities for every node of the graph.
+
+    Node visiting order is drawn from a seeded generator so results are
+    reproducible. Returns dense community ids, largest community first.
+    """
+    rng = np.random.default_rng(seed)
+    indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+    k = graph.strength()
+    m2 = float(k.sum())
+    labels = np.arange(graph.n_nodes)
+    if m2 == 0:
+        return labels
+    for _ in range(max_levels):
+        level, moved = _move_nodes(
+            indptr, indices, weights, k, m2, resolution, rng
+        )
+        if not moved:
+            break
+        _, level = np.unique(level, return_inverse=True)
+        n_comms = int(level.max()) + 1
+        labels = level[labels]
+        k = np.bincount(level, weights=k, minlength=n_comms)
+        indptr, indices, weights = _aggregate(
+            indptr, indices, weights, level, n_comms
+        )
+    # renumber so community 0 is the largest
+    sizes = np.bincount(labels)
+    rank = np.empty_like(sizes)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return rank[labels]
+
+
+def detect_communities(
+    edges_path: str = EDGES_PATH,
+    nodes_path: str = NODES_PATH,
+    min_comments: int = 200,
+    min_weight: float = 0.0,
+    resolution: float = 1.0,
+    seed: int = 0,
+    cache_dir: str | None = CACHE_DIR,
+) -> tuple[pd.DataFrame, str, bool]:
+    """Prune the graph and partition it, reusing a cached result if any.
+
+    The cache is keyed by a content hash of the pruned edge data plus
+    the detection parameters. Returns (partition, edge_hash, cached).
+    """
+    graph = prune_graph(
+        load_graph(edges_path, nodes_path),
+        min_comments=min_comments,
+        min_weight=min_weight,
+    )
+    edge_hash = content_hash(graph, "louvain", resolution, seed)
+    cache_path = (
+        os.path.join(cache_dir, f"communities_{edge_hash}.parquet")
+        if cache_dir
+        else None
+    )
+    if cache_path and os.path.exists(cache_path):
+        logger.info("Loaded cached communities from %s", cache_path)
+        return pd.read_parquet(cache_path), edge_hash, True
+
+    labels = louvain(graph, resolution=resolution, seed=seed)
+    partition = pd.DataFrame(
+        {
+            "subreddit": graph.labels,
+            "community": labels.astype(np.int32),
+            "comment_count": graph.node_attrs.get(
+                "comment_count", np.zeros(graph.n_nodes, dtype=np.int64)
+            ),
+        }
+    )
+    partition.attrs["modularity"] = modularity(graph, labels, resolution)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        partition.to_parquet(cache_path, index=False)
+        logger.info("Cached communities to %s", cache_path)
+    return partition, edge_hash, False
+
+
+@with_resources(use_db=True, use_reddit=False)
+def write_communities(conn, partition: pd.DataFrame, edge_hash: str) -> bool:
+    """Replace the subreddit_communities table with a partition.
+
+    Skips the write if the table already holds this edge_hash.
+    Returns True if rows were written.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM subreddit_communities WHERE edge_hash = %s LIMIT 1",
+            (edge_hash,),
+        )
+        if cur.fetchone():
+            return False
+        with conn.transaction():
+            cur.execute("DELETE FROM subreddit_communities;")
+            with cur.copy(
+                "COPY subreddit_communities "
+                "(subreddit, community, edge_hash) FROM STDIN"
+            ) as copy:
+                for subreddit, community in zip(
+                    partition["subreddit"].tolist(),
+                    partition["community"].tolist(),
+                ):
+                    copy.write_row((subreddit, community, edge_hash))
+    logger.info(
+        "Wrote %d community assignments (%s)", len(partition), edge_hash
+    )
+    return True
+
+
+def store_node_communities(partition: pd.DataFrame, nodes_path: str):
+    """Copy the partition into the node table's community column.
+
+    Subreddits pruned before detection get community -1.
+    """
+    nodes = pd.read_parquet(nodes_path, columns=["id", "subreddit"])
+    lookup = pd.Series(
+        partition["community"].to_numpy(),
+        index=partition["subreddit"].to_numpy(),
+    )
+    values = np.full(len(nodes), -1, dtype=np.int32)
+    values[nodes["id"].to_numpy()] = (
+        lookup.reindex(nodes["subreddit"].to_numpy())
+        .fillna(-1)
+        .to_numpy(dtype=np.int32)
+    )
+    update_node_table(nodes_path, {"community": values})
+
+
+def graph_communities(
+    min_comments: int = 200,
+    min_weight: float = 0.0,
+    resolution: float = 1.0,
+    seed: int = 0,
+    edges_path: str = EDGES_PATH,
+    nodes_path: str = NODES_PATH,
+    **kwargs,
+):
+    """Prompt command: detect communities and store the partition."""
+    logger.info(
+        f"Detecting communities | min_comments={min_comments} "
+        f"| min_weight={min_weight} | resolution={resolution} | seed={seed}"
+    )
+    start_time = time.perf_counter()
+    with console.status("Detecting communities...", spinner="dots"):
+        partition, edge_hash, cached = detect_communities(
+            edges_path=edges_path,
+            nodes_path=nodes_path,
+            min_comments=min_comments,
+            min_weight=min_weight,
+            resolution=resolution,
+            seed=seed,
+        )
+    detect_s = time.perf_counter() - start_time
+    written = write_communities(partition, edge_hash)
+    store_node_communities(partition, nodes_path)
+    elapsed = time.perf_counter() - start_time
+
+    sizes = partition["community"].value_counts()
+    console.print(
+        f"{len(partition)} subreddits in [green]{len(sizes)} communities"
+        f"[/green] ({'cached' if cached else 'computed'} in "
+        f"{detect_s:.2f}s, total {elapsed:.2f}s)"
+    )
+    if "modularity" in partition.attrs:
+        console.print(f"Modularity: {partition.attrs['modularity']:.4f}")
+    if not written:
+        console.print("Partition table already up to date.")
+    for community, size in sizes.head(5).items():
+        top = (
+            partition[partition["community"] == community]
+            .nlargest(5, "comment_count")["subreddit"]
+            .tolist()
+        )
+        console.print(f"  [{community}] {size} subreddits: {', '.join(top)}")
@@ -1,17 +1,91 @@
 import praw
+import prawcore
 import psycopg
+import requests
 from psycopg import sql
 import os
+import threading
+import time
 from contextlib import contextmanager
 from typing import Generator, Callable, Any, TypeVar
 import logging
+from . import load_env
+from .progress import current_bus
 
 logger = logging.getLogger(__name__)
 
+# Reddit allows 100 requests per minute per OAuth client
+REQUESTS_PER_MINUTE = 100
+RATE_BURST = 10
+# keep-alive connections shared by every Reddit instance in the process
+HTTP_POOL_SIZE = 32
+
+
+class RateLimiter:
+    """Token bucket shared by every thread (and job) in the process."""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, RATE_BURST)
+_http_session: requests.Session | None = None
+_http_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """requests session (and connection pool) shared by all Reddit calls."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4, pool_maxsize=HTTP_POOL_SIZE
+            )
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+
+class SharedRequestor(prawcore.Requestor):
+    """prawcore requestor that waits on the shared rate limiter.
+
+    Each reddit_session() builds its own praw.Reddit, so PRAW's own
+    per-instance rate limiting can't see requests made by other threads.
+    """
+
+    def request(self, *args, **kwargs):
+        rate_limiter.acquire()
+        response = super().request(*args, **kwargs)
+        if bus := current_bus():
+            bus.add(requests=1, rate_limited=int(response.status_code == 429))
+        return response
+
 
 @contextmanager
 def reddit_session() -> Generator[praw.Reddit, None, None]:
     """provide a reddit instance"""
+    load_env()
     reddit = praw.Reddit(
         username=os.getenv("USERNAME"),
         password=os.getenv("PASSWORD"),
@@ -19,6 +93,8 @@ def reddit_session() -> Generator[praw.Reddit, None, None]:
         # REDIRECT_URI = os.getenv("REDIRECT_URI")
         client_secret=os.getenv("SECRET_KEY"),
         user_agent=os.getenv("USER_AGENT"),
+        requestor_class=SharedRequestor,
+        requestor_kwargs={"session": http_session()},
     )
     try:
         yield reddit
@@ -33,7 +109,12 @@ def reddit_session() -> Generator[praw.Reddit, None, None]:
 def db_connection(
     schema: str = "test", auto_commit: bool = True
 ) -> Generator[psycopg.Connection, None, None]:
-    """provide a database connection"""
+    """provide a database connection
+
+    Errors raised while it is open are logged and re-raised, as in
+    reddit_session, so callers and retry_call see them.
+    """
+    load_env()
     db_string = os.getenv("DB_STRING") or "localhost"
     conn = psycopg.connect(
         db_string,
@@ -47,6 +128,7 @@ def db_connection(
         yield conn
     except Exception as e:
         logger.error("Database connection error: %s", e)
+        raise
     finally:
         conn.close()
 
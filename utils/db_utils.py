@@ -1,6 +1,22 @@
 import logging
+import time
+import uuid
+from concurrent.futures import Future
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from rich.markup import escape
+from rich.table import Table
+from .body_utils import (
+    MIN_BODY_LENGTH,
+    MIN_REPEATS,
+    SEEDED_BODIES,
+    SHARE_BODIES,
+    repeated_bodies,
+)
 from .console import console
 from .connection_utils import with_resources
+from .rollup_utils import rebuild_rollups
+from .writer import writer
 
 """
     Utils for purely database operations
@@ -9,22 +25,130 @@ from .connection_utils import with_resources
 logger = logging.getLogger(__name__)
 
 
+# rows fetched from the server and rendered per table
+DEFAULT_PAGE_SIZE = 200
+# statements that can be declared as a server-side cursor
+STREAMABLE = ("select", "with", "values", "table")
+# columns of format_comment rows and format_submission values, in order
+COMMENT_COLUMNS = (
+    "name",
+    "author",
+    "body",
+    "created_utc",
+    "edited",
+    "ups",
+    "parent_id",
+    "submission_id",
+    "subreddit",
+    "fingerprint",
+)
+SUBMISSION_COLUMNS = (
+    "name",
+    "author",
+    "title",
+    "selftext",
+    "url",
+    "created_utc",
+    "edited",
+    "ups",
+    "subreddit",
+    "permalink",
+    "fingerprint",
+)
+
+
+def _render_page(rows: list, columns: list[str], start: int) -> Table:
+    table = Table(
+        *columns,
+        title=f"Rows {start + 1}-{start + len(rows)}",
+        title_justify="left",
+    )
+    for row in rows:
+        table.add_row(
+            *(
+                "[dim]NULL[/dim]" if value is None else escape(str(value))
+                for value in row
+            )
+        )
+    return table
+
+
+def _fetch_pages(cur, limit: int | None, page_size: int):
+    """Yield lists of rows from an executed cursor, up to limit rows."""
+    fetched = 0
+    while limit is None or fetched < limit:
+        size = page_size if limit is None else min(page_size, limit - fetched)
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        fetched += len(rows)
+        yield rows
+
+
 @with_resources(use_db=True, use_reddit=False)
-def db_execute(conn, sql_str):
-    with conn.cursor() as cur:
+def db_execute(
+    conn,
+    sql_str,
+    limit: int | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+):
+    """Run SQL from the prompt, streaming any result set page by page.
+
+    Queries are declared as a named server-side cursor so only one page
+    is held in memory at a time. Ctrl-C sends a cancel to the server and
+    stops after the rows already shown.
+    """
+    start_time = time.perf_counter()
+    streamable = sql_str.lstrip().lower().startswith(STREAMABLE)
+    rows = 0
+
+    def show(cur):
+        nonlocal rows
+        columns = [col.name for col in cur.description]
         try:
-            cur.execute(sql_str)
-            logger.info("Executed SQL: %s", sql_str)
-            if cur.description is not None:
-                rows = cur.fetchall()
-                console.print(rows)
-            else:
-                console.print(f"Query OK, {cur.rowcount} rows affected.")
-        except Exception as e:
-            # get psycopg error rather than traceback
-            ename = f"{e.__class__.__module__}.{e.__class__.__name__}"
-            logger.error("SQL execution error: %s: %s", ename, e)
-            console.print(f"{ename}: {e}")
+            for page in _fetch_pages(cur, limit, page_size):
+                console.print(_render_page(page, columns, rows))
+                rows += len(page)
+        except KeyboardInterrupt:
+            # stop the query server side before the cursor is closed
+            conn.cancel_safe()
+            raise
+
+    try:
+        if streamable:
+            # server-side cursors only live inside a transaction
+            with conn.transaction(), conn.cursor(
+                name=f"db_{uuid.uuid4().hex[:8]}"
+            ) as cur:
+                cur.execute(sql_str)
+                logger.info("Executed SQL: %s", sql_str)
+                show(cur)
+        else:
+            with conn.cursor() as cur:
+                cur.execute(sql_str)
+                logger.info("Executed SQL: %s", sql_str)
+                if cur.description is None:
+                    elapsed = time.perf_counter() - start_time
+                    console.print(
+                        f"Query OK, {cur.rowcount} rows affected "
+                        f"in {elapsed:.2f}s."
+                    )
+                    return
+                show(cur)
+    except KeyboardInterrupt:
+        elapsed = time.perf_counter() - start_time
+        logger.info("Cancelled SQL after %d rows: %s", rows, sql_str)
+        console.print(f"Query cancelled after {rows} rows, {elapsed:.2f}s.")
+        return
+    except Exception as e:
+        # get psycopg error rather than traceback
+        ename = f"{e.__class__.__module__}.{e.__class__.__name__}"
+        logger.error("SQL execution error: %s: %s", ename, e)
+        console.print(f"{ename}: {e}")
+        return
+    elapsed = time.perf_counter() - start_time
+    capped = " (limit reached)" if limit is not None and rows >= limit else ""
+    console.print(f"{rows} rows{capped} in {elapsed:.2f}s.")
 
 
 @with_resources(use_db=True, use_reddit=False)
@@ -33,7 +157,8 @@ def clear_tables(conn, target: str = "all") -> tuple[int, int]:
 
     target: 'comments', 'submissions', or 'all'. Returns a tuple of
     deleted counts (submissions_deleted, comments_deleted).
-    This does NOT drop tables—only deletes rows.
+    This does NOT drop tables—only deletes rows. The rollups are rebuilt
+    from what is left, since deletes can't be subtracted from them.
     """
     submissions_deleted = 0
     comments_deleted = 0
@@ -42,10 +167,15 @@ def clear_tables(conn, target: str = "all") -> tuple[int, int]:
             cur.execute("DELETE FROM comments;")
             logger.info("Deleted %d rows from comments", cur.rowcount)
             comments_deleted = cur.rowcount
+            cur.execute(
+                "DELETE FROM bodies WHERE body <> ALL(%s);",
+                (list(SEEDED_BODIES),),
+            )
         if target in ("submissions", "all"):
             cur.execute("DELETE FROM submissions;")
             logger.info("Deleted %d rows from submissions", cur.rowcount)
             submissions_deleted = cur.rowcount
+    rebuild_rollups(conn)
     return submissions_deleted, comments_deleted
 
 
@@ -75,13 +205,16 @@ def db_get_redditors_from_subreddit(
     return redditors
 
 
+# single rows written directly rather than through the writer: callers
+# report the RETURNING row, and scrape_comments_in_thread reads the
+# submission back to schedule the thread
 @with_resources(use_db=True, use_reddit=False)
 def insert_submission(conn, submission, overwrite=False):
     cols = (
         "(name, author, title, selftext, url, created_utc, "
-        "edited, ups, subreddit, permalink)"
+        "edited, ups, subreddit, permalink, fingerprint)"
     )
-    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s"
+    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s"
     if overwrite:
         conflict_clause = (
             "ON CONFLICT (name) DO UPDATE SET "
@@ -93,7 +226,11 @@ def insert_submission(conn, submission, overwrite=False):
             "edited=EXCLUDED.edited, "
             "ups=EXCLUDED.ups, "
             "subreddit=EXCLUDED.subreddit, "
-            "permalink=EXCLUDED.permalink "
+            "permalink=EXCLUDED.permalink, "
+            "fingerprint=EXCLUDED.fingerprint "
+            # rows whose content hasn't changed are not rewritten
+            "WHERE submissions.fingerprint IS DISTINCT FROM "
+            "EXCLUDED.fingerprint "
             "RETURNING name;"
         )
     else:
@@ -116,9 +253,9 @@ def insert_submission(conn, submission, overwrite=False):
 def insert_comment(conn, comment, overwrite=False):
     cols = (
         "(name, author, body, created_utc, edited, ups, "
-        "parent_id, submission_id, subreddit)"
+        "parent_id, submission_id, subreddit, fingerprint)"
     )
-    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s"
+    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s"
     if overwrite:
         conflict_clause = (
             "ON CONFLICT (name) DO UPDATE SET "
@@ -126,7 +263,10 @@ def insert_comment(conn, comment, overwrite=False):
             "created_utc=EXCLUDED.created_utc, edited=EXCLUDED.edited, "
             "ups=EXCLUDED.ups, parent_id=EXCLUDED.parent_id, "
             "submission_id=EXCLUDED.submission_id, "
-            "subreddit=EXCLUDED.subreddit RETURNING name;"
+            "subreddit=EXCLUDED.subreddit, "
+            "fingerprint=EXCLUDED.fingerprint, body_id=EXCLUDED.body_id "
+            "WHERE comments.fingerprint IS DISTINCT FROM "
+            "EXCLUDED.fingerprint RETURNING name;"
         )
     else:
         conflict_clause = "ON CONFLICT (name) DO NOTHING RETURNING name;"
@@ -144,28 +284,246 @@ def insert_comment(conn, comment, overwrite=False):
     return res
 
 
+def conflict_clause(
+    table: str, columns: tuple[str, ...], overwrite: bool = False
+) -> str:
+    """ON CONFLICT (name) for table: update changed rows if overwrite."""
+    if not overwrite:
+        return "ON CONFLICT (name) DO NOTHING"
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in columns if c != "name")
+    if table == "comments":
+        # set on the proposed row by the share_body trigger
+        updates += ", body_id=EXCLUDED.body_id"
+    return (
+        f"ON CONFLICT (name) DO UPDATE SET {updates} "
+        # rows whose content hasn't changed are not rewritten
+        f"WHERE {table}.fingerprint IS DISTINCT FROM EXCLUDED.fingerprint"
+    )
+
+
+def comment_insert_statement(overwrite: bool = False) -> str:
+    """INSERT for format_comment rows, updating changed rows if overwrite."""
+    cols = ", ".join(COMMENT_COLUMNS)
+    placeholders = ",".join(["%s"] * len(COMMENT_COLUMNS))
+    return (
+        f"INSERT INTO comments ({cols})\nVALUES ({placeholders})\n"
+        + conflict_clause("comments", COMMENT_COLUMNS, overwrite)
+    )
+
+
+def copy_rows(
+    conn,
+    table: str,
+    columns: tuple[str, ...],
+    rows,
+    overwrite: bool = False,
+) -> int:
+    """Bulk-load rows into comments or submissions. Returns rows written.
+
+    rows are tuples in column order, or bytes already in COPY text
+    format. They are COPied into a temporary table and moved over with
+    one INSERT ... SELECT, so they get the same ON CONFLICT rule as the
+    row-at-a-time inserts and the insert triggers run once per call.
+    Repeated names keep their last row, and comment texts repeated among
+    the rows are shared (see body_utils) before they are moved over.
+    """
+    staging = sql.Identifier(f"{table}_staging")
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute(
+            sql.SQL(
+                "CREATE TEMP TABLE {} (ord BIGSERIAL, LIKE {}) ON COMMIT DROP"
+            ).format(staging, sql.Identifier(table))
+        )
+        with cur.copy(
+            sql.SQL("COPY {} ({}) FROM STDIN").format(staging, cols)
+        ) as copy:
+            if isinstance(rows, bytes):
+                # already in COPY text format
+                copy.write(rows)
+            else:
+                for row in rows:
+                    copy.write_row(row)
+        if table == "comments":
+            cur.execute(
+                sql.SQL(
+                    "INSERT INTO bodies (id, body) "
+                    "SELECT body_hash(body), body FROM {} "
+                    "WHERE length(body) >= %s "
+                    "GROUP BY body HAVING count(*) >= %s "
+                    "ON CONFLICT (id) DO NOTHING"
+                ).format(staging),
+                (MIN_BODY_LENGTH, MIN_REPEATS),
+            )
+        cur.execute(
+            sql.SQL(
+                "INSERT INTO {table} ({cols}) "
+                "SELECT DISTINCT ON (name) {cols} FROM {staging} "
+                "ORDER BY name, ord DESC "
+            ).format(table=sql.Identifier(table), cols=cols, staging=staging)
+            + sql.SQL(conflict_clause(table, columns, overwrite))
+        )
+        return cur.rowcount
+
+
 @with_resources(use_db=True, use_reddit=False)
 def batch_insert_comments(conn, comments, overwrite=False):
+    shared = repeated_bodies(row[2] for row in comments)
+    with conn.cursor() as cur:
+        if shared:
+            cur.execute(SHARE_BODIES, (shared,))
+        cur.executemany(comment_insert_statement(overwrite), comments)
+
+
+def queue_comments(comments, overwrite=False) -> Future:
+    """batch_insert_comments through the shared writer, without waiting.
+
+    The future completes once the rows are committed.
+    """
+    shared = repeated_bodies(row[2] for row in comments)
+    if shared:
+        # written first, in the same batch
+        writer().put(SHARE_BODIES, [(shared,)])
+    return writer().put(comment_insert_statement(overwrite), comments)
+
+
+@with_resources(use_db=True, use_reddit=False)
+def get_redditor_watermark(conn, user_id: str):
+    """(newest_name, newest_created_utc, last_scraped_at) or None."""
     with conn.cursor() as cur:
-        cols = (
-            "(name, author, body, created_utc, edited, ups, "
-            "parent_id, submission_id, subreddit)"
+        cur.execute(
+            """
+            SELECT newest_name, newest_created_utc, last_scraped_at
+            FROM redditor_watermarks
+            WHERE redditor = %s;
+            """,
+            (user_id,),
         )
-        placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s"
-        if overwrite:
-            conflict_clause = (
-                "ON CONFLICT (name) DO UPDATE SET "
-                "author=EXCLUDED.author, body=EXCLUDED.body, "
-                "created_utc=EXCLUDED.created_utc, edited=EXCLUDED.edited, "
-                "ups=EXCLUDED.ups, parent_id=EXCLUDED.parent_id, "
-                "submission_id=EXCLUDED.submission_id, "
-                "subreddit=EXCLUDED.subreddit"
+        return cur.fetchone()
+
+
+# advances a redditor's watermark, never moving it back
+REDDITOR_WATERMARK_UPSERT = """
+    INSERT INTO redditor_watermarks
+        (redditor, newest_name, newest_created_utc, last_scraped_at)
+    VALUES (%s, %s, %s, now())
+    ON CONFLICT (redditor) DO UPDATE SET
+        last_scraped_at = now(),
+        newest_name = CASE
+            WHEN EXCLUDED.newest_created_utc
+                > redditor_watermarks.newest_created_utc
+            OR redditor_watermarks.newest_created_utc IS NULL
+            THEN COALESCE(
+                EXCLUDED.newest_name, redditor_watermarks.newest_name
             )
-        else:
-            conflict_clause = "ON CONFLICT (name) DO NOTHING"
+            ELSE redditor_watermarks.newest_name
+        END,
+        newest_created_utc = GREATEST(
+            EXCLUDED.newest_created_utc,
+            redditor_watermarks.newest_created_utc
+        );
+"""
+
 
-        sql_stmt = (
-            "INSERT INTO comments " + cols + "\n"
-            "VALUES (" + placeholders + ")\n" + conflict_clause
+@with_resources(use_db=True, use_reddit=False)
+def set_redditor_watermark(conn, user_id: str, newest=None):
+    """Record a scrape of user_id, advancing the newest comment seen.
+
+    newest is (fullname, created_utc), or None to only update the time
+    of the scrape. The watermark never moves back.
+    """
+    newest_name, newest_created = newest or (None, None)
+    with conn.cursor() as cur:
+        cur.execute(
+            REDDITOR_WATERMARK_UPSERT, (user_id, newest_name, newest_created)
         )
-        cur.executemany(sql_stmt, comments)
+
+
+def queue_redditor_watermark(user_id: str, newest=None) -> Future:
+    """set_redditor_watermark through the shared writer.
+
+    Queued after the redditor's comments, so it is never committed
+    before them.
+    """
+    newest_name, newest_created = newest or (None, None)
+    return writer().put(
+        REDDITOR_WATERMARK_UPSERT, [(user_id, newest_name, newest_created)]
+    )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def record_failed_task(
+    conn,
+    kind: str,
+    target: str,
+    error: BaseException,
+    attempts: int,
+    params: dict | None = None,
+):
+    """Add a failed task (kind 'thread' or 'redditor') to failed_tasks.
+
+    attempts add up over runs; params are the keyword arguments to
+    replay it with.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO failed_tasks
+                (kind, target, params, error_class, error_message, attempts)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (kind, target) DO UPDATE SET
+                params = EXCLUDED.params,
+                error_class = EXCLUDED.error_class,
+                error_message = EXCLUDED.error_message,
+                attempts = failed_tasks.attempts + EXCLUDED.attempts,
+                last_failed_at = now();
+            """,
+            (
+                kind,
+                target,
+                Jsonb(params or {}),
+                error.__class__.__name__,
+                str(error),
+                attempts,
+            ),
+        )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def clear_failed_task(
+    conn, kind: str, target: str, attempts: int | None = None
+):
+    """Remove a task from failed_tasks.
+
+    With attempts, only while it still has that many: a failure recorded
+    meanwhile (e.g. rows the writer couldn't commit) keeps it.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM failed_tasks
+            WHERE kind = %s AND target = %s
+                AND (%s::int IS NULL OR attempts = %s);
+            """,
+            (kind, target, attempts, attempts),
+        )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def get_failed_tasks(
+    conn, kind: str | None = None, max_attempts: int | None = None
+) -> list[tuple]:
+    """(kind, target, params, error_class, attempts), oldest first.
+
+    Tasks that already failed max_attempts times or more are left out.
+    """
+    query = """
+        SELECT kind, target, params, error_class, attempts
+        FROM failed_tasks
+        WHERE (%s::text IS NULL OR kind = %s)
+          AND (%s::int IS NULL OR attempts < %s)
+        ORDER BY first_failed_at;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (kind, kind, max_attempts, max_attempts))
+        return cur.fetchall()
@@ -0,0 +1,396 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple
+from .console import console
+from .connection_utils import with_resources
+from .db_utils import COMMENT_COLUMNS, SUBMISSION_COLUMNS, copy_rows
+from .raw_utils import comment_row, submission_row
+from .thread_utils import fill_tree_columns
+
+try:
+    import zstandard
+except ImportError:  # in requirements.txt, only needed for .zst dumps
+    zstandard = None
+
+"""Utils for importing local Reddit dump files (NDJSON, optionally zstd).
+
+The monthly comment (RC_*) and submission (RS_*) dumps are one JSON
+object per line. A dump is decompressed as a stream and cut into blocks
+of whole lines, and a process pool parses, filters and maps each block
+into the same rows format_comment / format_submission produce, while the
+main process reads ahead and bulk-loads finished rows with COPY. Memory
+stays bounded by the blocks in flight and one load batch, whatever the
+size of the dump. Nothing is requested from Reddit.
+"""
+
+logger = logging.getLogger(__name__)
+
+DUMP_SUFFIXES = (".zst", ".gz", ".ndjson", ".jsonl", ".json")
+# decompressed bytes per parse task
+BLOCK_BYTES = 8 * 1024 * 1024
+# blocks parsed ahead of the one being loaded, per worker
+PREFETCH = 2
+# rows per COPY and commit
+LOAD_ROWS = 50_000
+# the dumps are compressed with a long window (--long=31)
+ZSTD_WINDOW = 2**31
+# COPY text format escapes; NUL can't be stored in a text column
+COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t", "\x00": ""}
+)
+
+
+class DumpFilter(NamedTuple):
+    """Which records to keep; empty sets and None bounds keep everything.
+
+    subreddits are bare lower-case names, authors lower-case, since and
+    until UNIX timestamps ([since, until)).
+    """
+
+    subreddits: frozenset = frozenset()
+    authors: frozenset = frozenset()
+    since: float | None = None
+    until: float | None = None
+
+    def keeps(self, data: dict) -> bool:
+        if self.subreddits and (
+            str(data.get("subreddit")).lower() not in self.subreddits
+        ):
+            return False
+        if self.authors and str(data.get("author")).lower() not in (
+            self.authors
+        ):
+            return False
+        created = data["created_utc"]
+        if self.since is not None and created < self.since:
+            return False
+        return self.until is None or created < self.until
+
+
+class ParsedBlock(NamedTuple):
+    """Rows of one block in COPY text format, line counts, and the
+    submissions the comments belong to."""
+
+    comments: bytes
+    submissions: bytes
+    n_comments: int
+    n_submissions: int
+    lines: int
+    skipped: int
+    malformed: int
+    threads: frozenset
+
+
+def make_filter(
+    subreddits: Iterable[str] = (),
+    authors: Iterable[str] = (),
+    since: str | None = None,
+    until: str | None = None,
+) -> DumpFilter:
+    """DumpFilter from user input: r/ or bare names, ISO dates (UTC)."""
+
+    def timestamp(value: str | None) -> float | None:
+        if not value:
+            return None
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+    return DumpFilter(
+        subreddits=frozenset(s.lower().removeprefix("r/") for s in subreddits),
+        authors=frozenset(a.lower().removeprefix("u/") for a in authors),
+        since=timestamp(since),
+        until=timestamp(until),
+    )
+
+
+def _normalise(data: dict, prefix: str) -> dict:
+    """Fill in the API fields the dumps leave out or name differently."""
+    if not data.get("name"):
+        data["name"] = f"{prefix}_{data.get('id')}"
+    if data.get("ups") is None:
+        data["ups"] = data.get("score")
+    if not data.get("subreddit_name_prefixed") and data.get("subreddit"):
+        data["subreddit_name_prefixed"] = f"r/{data['subreddit']}"
+    return data
+
+
+def copy_field(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_text(rows: Iterable[tuple]) -> bytes:
+    """Rows as COPY text format, one line per row."""
+    return "".join(
+        "\t".join(map(copy_field, row)) + "\n" for row in rows
+    ).encode("utf-8")
+
+
+def parse_block(block: bytes, dump_filter: DumpFilter) -> ParsedBlock:
+    """Comment and submission rows from a block of whole NDJSON lines.
+
+    Rows are returned as COPY text rather than tuples: it is about as
+    quick to build, and far cheaper to send back from a worker than
+    pickled tuples of strings and datetimes.
+    """
+    comments, submissions = [], []
+    lines = skipped = malformed = 0
+    # a kept line must contain a wanted name in quotes, which is much
+    # cheaper to test than parsing every line of a filtered import
+    needles = [
+        tuple(f'"{name}"'.encode() for name in names)
+        for names in (dump_filter.subreddits, dump_filter.authors)
+        if names
+    ]
+    for line in block.splitlines():
+        if not line.strip():
+            continue
+        lines += 1
+        if needles:
+            lowered = line.lower()
+            if not all(any(n in lowered for n in ns) for ns in needles):
+                skipped += 1
+                continue
+        try:
+            data = json.loads(line)
+            # older dumps store it as a string
+            data["created_utc"] = float(data.get("created_utc") or 0)
+        except (ValueError, TypeError, AttributeError):
+            malformed += 1
+            continue
+        if not dump_filter.keeps(data):
+            skipped += 1
+        elif "link_id" in data:
+            comments.append(comment_row(_normalise(data, "t1")))
+        elif "title" in data:
+            submissions.append(submission_row(_normalise(data, "t3")))
+        else:
+            skipped += 1
+    return ParsedBlock(
+        copy_text(comments),
+        copy_text(submissions),
+        len(comments),
+        len(submissions),
+        lines,
+        skipped,
+        malformed,
+        frozenset(row.submission_id for row in comments),
+    )
+
+
+def dump_files(path: str) -> list[str]:
+    """The dump at path, or every dump file in a directory, by name."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if name.endswith(DUMP_SUFFIXES)
+    )
+
+
+def open_dump(path: str):
+    """Binary stream of the decompressed dump."""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(
+                "Reading .zst dumps needs the zstandard package "
+                "(pip install zstandard)"
+            )
+        decompressor = zstandard.ZstdDecompressor(max_window_size=ZSTD_WINDOW)
+        return decompressor.stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_blocks(stream, block_bytes: int = BLOCK_BYTES) -> Iterator[bytes]:
+    """Blocks of about block_bytes that end on a line boundary."""
+    rest = b""
+    while chunk := stream.read(block_bytes):
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            rest += chunk
+            continue
+        end = cut + 1
+        yield rest + chunk[:end]
+        rest = chunk[end:]
+    if rest:
+        yield rest
+
+
+def parsed_blocks(
+    blocks: Iterable[bytes], dump_filter: DumpFilter, workers: int
+) -> Iterator[tuple[ParsedBlock, int]]:
+    """(parse_block result, block size) over blocks in a process pool.
+
+    At most PREFETCH blocks per worker are in flight, so decompression
+    stays only a little ahead of loading.
+    """
+    # spawn: forking the prompt's threads (writer, jobs) isn't safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        pending = deque()
+        for block in blocks:
+            pending.append(
+                (pool.submit(parse_block, block, dump_filter), len(block))
+            )
+            if len(pending) >= workers * PREFETCH:
+                future, size = pending.popleft()
+                yield future.result(), size
+        while pending:
+            future, size = pending.popleft()
+            yield future.result(), size
+
+
+def _all_blocks(paths: list[str]) -> Iterator[bytes]:
+    for path in paths:
+        logger.info("Reading dump %s", path)
+        with open_dump(path) as stream:
+            yield from read_blocks(stream)
+
+
+@with_resources(use_db=True, use_reddit=False)
+def load_dump(
+    conn,
+    paths: list[str],
+    dump_filter: DumpFilter,
+    workers: int = 4,
+    overwrite: bool = False,
+    status=None,
+) -> Counter:
+    """Parse the dumps in a process pool and COPY the kept rows.
+
+    Returns counts of lines, bytes, kept and written rows, skipped or
+    malformed lines and comments placed in (or missing from) threads.
+    """
+    stats = Counter()
+    pending = {"comments": [], "submissions": []}
+    pending_rows = Counter()
+    # submissions of the comments read, so only their threads are placed
+    threads = set()
+    columns = {"comments": COMMENT_COLUMNS, "submissions": SUBMISSION_COLUMNS}
+    start_time = time.perf_counter()
+
+    def load(table: str):
+        if pending_rows[table]:
+            stats[f"{table}_written"] += copy_rows(
+                conn,
+                table,
+                columns[table],
+                b"".join(pending[table]),
+                overwrite,
+            )
+            pending[table] = []
+            pending_rows[table] = 0
+
+    for block, size in parsed_blocks(_all_blocks(paths), dump_filter, workers):
+        stats["lines"] += block.lines
+        stats["bytes"] += size
+        stats["skipped"] += block.skipped
+        stats["malformed"] += block.malformed
+        threads |= block.threads
+        for table, text, n in (
+            ("comments", block.comments, block.n_comments),
+            ("submissions", block.submissions, block.n_submissions),
+        ):
+            stats[table] += n
+            pending_rows[table] += n
+            pending[table].append(text)
+            if pending_rows[table] >= LOAD_ROWS:
+                load(table)
+        if status is not None:
+            rate = stats["lines"] / (time.perf_counter() - start_time)
+            status.update(
+                f"Importing... {stats['lines']:,} lines ({rate:,.0f}/s), "
+                f"{stats['comments'] + stats['submissions']:,} kept"
+            )
+    load("submissions")
+    load("comments")
+    if stats["comments_written"]:
+        # dump records come without their thread: place the comments
+        # whose parents are stored now, in the threads this import touched
+        if status is not None:
+            status.update("Placing comments in their threads...")
+        stats["placed"], stats["unplaced"] = fill_tree_columns(
+            conn, sorted(threads)
+        )
+    return stats
+
+
+def import_dump(
+    path: str,
+    subreddits: Iterable[str] = (),
+    authors: Iterable[str] = (),
+    since: str | None = None,
+    until: str | None = None,
+    workers: int = 4,
+    overwrite: bool = False,
+    **kwargs,
+):
+    """Prompt command: import a dump file, or a directory of them."""
+    paths = dump_files(path)
+    missing = [p for p in paths if not os.path.isfile(p)]
+    if missing or not paths:
+        console.print(f"[red]No dump files at {path}[/red]")
+        return
+    if zstandard is None and any(p.endswith(".zst") for p in paths):
+        console.print(
+            "[red]Reading .zst dumps needs the zstandard package[/red] "
+            "(pip install zstandard)."
+        )
+        return
+    dump_filter = make_filter(subreddits, authors, since, until)
+    logger.info(
+        f"Importing {len(paths)} dump file(s) from {path} | {dump_filter} "
+        f"| workers={workers} | overwrite={overwrite}"
+    )
+    start_time = time.perf_counter()
+    with console.status("Importing...", spinner="dots") as status:
+        stats = load_dump(
+            paths, dump_filter, workers, overwrite, status=status
+        )
+    elapsed = time.perf_counter() - start_time
+    rate = stats["lines"] / elapsed if elapsed else 0.0
+    logger.info(f"Imported {dict(stats)} in {elapsed:.2f}s")
+
+    console.print(
+        f"Read [green]{stats['lines']:,}[/green] lines "
+        f"({stats['bytes'] / 1e6:,.1f} MB) from {len(paths)} file(s) in "
+        f"{elapsed:.2f}s: [green]{rate:,.0f} lines/s[/green]"
+    )
+    console.print(
+        f"Kept {stats['comments']:,} comments and "
+        f"{stats['submissions']:,} submissions; wrote "
+        f"{stats['comments_written']:,} and "
+        f"{stats['submissions_written']:,} (the rest were already stored)."
+    )
+    if stats["placed"] or stats["unplaced"]:
+        console.print(
+            f"Placed {stats['placed']:,} comments in their threads; "
+            f"{stats['unplaced']:,} wait for their parents "
+            "(placed by a later import or `thread backfill`)."
+        )
+    if stats["malformed"]:
+        console.print(
+            f"[yellow]{stats['malformed']:,} malformed lines skipped."
+            "[/yellow]"
+        )
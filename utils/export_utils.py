@@ -0,0 +1,377 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import psycopg
+import pyarrow as pa
+import pyarrow.parquet as pq
+from psycopg import sql
+from rich.markup import escape
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for exporting tables and query results to files.
+
+Rows are streamed from the database and written a chunk at a time, so
+memory use does not depend on the size of the export.
+"""
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = "exports"
+FORMATS = ("csv", "parquet", "jsonl")
+COMPRESSIONS = ("gzip", "none")
+# SQL producing the partition key of each row for --split
+SPLITS = {
+    "subreddit": "q.subreddit",
+    "month": "to_char(q.created_utc AT TIME ZONE 'UTC', 'YYYY-MM')",
+}
+# rows per fetch from the server, and per Parquet row group
+FETCH_ROWS = 50_000
+GZIP_LEVEL = 6
+# postgres type oid -> arrow type, anything else is written as a string
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1043: pa.string(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+_NO_KEY = object()
+TABLE_NAME = re.compile(r"^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)?$")
+
+
+def table_columns(conn, parts: list[str]) -> list[str]:
+    """Column names of a table ([schema, ]name), in table order."""
+    schema = parts[0] if len(parts) > 1 else None
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = %s "
+            "AND table_schema = coalesce(%s::text, current_schema()) "
+            "ORDER BY ordinal_position;",
+            (parts[-1], schema),
+        )
+        return [name for (name,) in cur.fetchall()]
+
+
+def export_source(target: str, conn=None) -> tuple[sql.Composable, str]:
+    """SQL for a table name or a query, plus a name for the output."""
+    target = target.strip().rstrip(";").strip()
+    if TABLE_NAME.match(target):
+        parts = target.split(".")
+        if parts[-1] == "comments" and conn is not None:
+            # shared texts (see body_utils) are exported as body, in the
+            # columns the table had without them
+            columns = [
+                (
+                    sql.SQL("coalesce(t.body, b.body) AS body")
+                    if name == "body"
+                    else sql.SQL("t.{}").format(sql.Identifier(name))
+                )
+                for name in table_columns(conn, parts)
+                if name != "body_id"
+            ]
+            return (
+                sql.SQL(
+                    "SELECT {} FROM {} t LEFT JOIN {} b ON b.id = t.body_id"
+                ).format(
+                    sql.SQL(", ").join(columns),
+                    sql.Identifier(*parts),
+                    sql.Identifier(*parts[:-1], "bodies"),
+                ),
+                target.replace(".", "_"),
+            )
+        return (
+            sql.SQL("SELECT * FROM {}").format(sql.Identifier(*parts)),
+            target.replace(".", "_"),
+        )
+    return sql.SQL(target), "query"
+
+
+def output_path(
+    out_dir: str, name: str, fmt: str, compression: str, key=None
+) -> str:
+    """exports/<name>.<fmt>[.gz], or exports/<name>/<key>... when split."""
+    ext = fmt
+    if fmt != "parquet" and compression == "gzip":
+        ext += ".gz"
+    if key is None:
+        return os.path.join(out_dir, f"{name}.{ext}")
+    safe_key = re.sub(r"[^\w.-]", "_", str(key)) or "_"
+    return os.path.join(out_dir, name, f"{safe_key}.{ext}")
+
+
+def _as_text(value) -> str | None:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _arrow_array(values, type_: pa.DataType) -> pa.Array:
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # unmapped types (numeric, json, arrays...) end up as text
+        return pa.array([_as_text(v) for v in values], type=type_)
+
+
+def _open_binary(path: str, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=GZIP_LEVEL)
+    return open(path, "wb")
+
+
+def arrow_schema(description) -> pa.Schema:
+    return pa.schema(
+        [
+            (col.name, ARROW_TYPES.get(col.type_code, pa.string()))
+            for col in description
+        ]
+    )
+
+
+class FileWriter:
+    """One output file, written to <path>.part and renamed on close."""
+
+    def __init__(self, path: str, fmt: str, compression: str, columns):
+        self.path = path
+        self.part = f"{path}.part"
+        self.fmt = fmt
+        self.rows = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if fmt == "parquet":
+            self.schema = arrow_schema(columns)
+            self.out = pq.ParquetWriter(
+                self.part, self.schema, compression="zstd"
+            )
+        else:
+            self.out = io.TextIOWrapper(
+                _open_binary(self.part, compression),
+                encoding="utf-8",
+                newline="",
+            )
+            if fmt == "csv":
+                self.csv = csv.writer(self.out)
+                self.csv.writerow([col.name for col in columns])
+
+    def write(self, rows: list):
+        if self.fmt == "parquet":
+            arrays = [
+                _arrow_array(values, field.type)
+                for values, field in zip(zip(*rows), self.schema)
+            ]
+            self.out.write_batch(
+                pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+            )
+        elif self.fmt == "csv":
+            self.csv.writerows(rows)
+        else:
+            # jsonl rows arrive already serialised by row_to_json
+            self.out.writelines(f"{row[0]}\n" for row in rows)
+        self.rows += len(rows)
+
+    def close(self) -> int:
+        """Finish the file and return its size in bytes."""
+        self.out.close()
+        os.replace(self.part, self.path)
+        return os.path.getsize(self.path)
+
+    def abort(self):
+        self.out.close()
+        if os.path.exists(self.part):
+            os.remove(self.part)
+
+
+def _copy_csv(conn, query, path: str, compression: str) -> tuple[int, int]:
+    """Fast path: COPY ... TO STDOUT straight into the (gzip) file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    part = f"{path}.part"
+    try:
+        with conn.cursor() as cur, _open_binary(part, compression) as out:
+            with cur.copy(
+                sql.SQL(
+                    "COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)"
+                ).format(query)
+            ) as copy:
+                for data in copy:
+                    out.write(data)
+            rows = cur.rowcount
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            conn.cancel_safe()
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    os.replace(part, path)
+    return rows, os.path.getsize(path)
+
+
+def _cursor_export(
+    conn,
+    query,
+    name: str,
+    fmt: str,
+    compression: str,
+    split: str | None,
+    out_dir: str,
+    status=None,
+) -> tuple[int, int, int]:
+    """Stream a named binary cursor into one file per split key.
+
+    The query is ordered by the split key so only one file is open at a
+    time. Returns (rows, bytes, files).
+    """
+    if fmt == "jsonl":
+        select = sql.SQL("row_to_json(q)::text AS row")
+    else:
+        select = sql.SQL("q.*")
+    if split:
+        query = sql.SQL(
+            "SELECT {} AS export_key, {} FROM ({}) q ORDER BY 1"
+        ).format(sql.SQL(SPLITS[split]), select, query)
+    else:
+        query = sql.SQL("SELECT {} FROM ({}) q").format(select, query)
+
+    rows = size = files = 0
+    writer, key = None, _NO_KEY
+    # server-side cursors only live inside a transaction
+    with conn.transaction(), conn.cursor(
+        name=f"export_{uuid.uuid4().hex[:8]}", binary=True
+    ) as cur:
+        try:
+            cur.execute(query)
+            columns = cur.description[1:] if split else cur.description
+            while batch := cur.fetchmany(FETCH_ROWS):
+                if not split:
+                    if writer is None:
+                        path = output_path(out_dir, name, fmt, compression)
+                        writer = FileWriter(path, fmt, compression, columns)
+                    writer.write(batch)
+                else:
+                    start = 0
+                    for i in range(len(batch) + 1):
+                        if i < len(batch) and batch[i][0] == key:
+                            continue
+                        if i > start and writer is not None:
+                            writer.write([row[1:] for row in batch[start:i]])
+                        if i == len(batch):
+                            break
+                        # key changed: finish the previous file
+                        if writer is not None:
+                            size += writer.close()
+                            files += 1
+                        key = batch[i][0]
+                        path = output_path(
+                            out_dir, name, fmt, compression, str(key)
+                        )
+                        writer = FileWriter(path, fmt, compression, columns)
+                        start = i
+                rows += len(batch)
+                if status is not None:
+                    status.update(f"Exported {rows:,} rows...")
+            if writer is None and not split:
+                # still write a file (header only) for an empty result
+                path = output_path(out_dir, name, fmt, compression)
+                writer = FileWriter(path, fmt, compression, columns)
+        except BaseException as e:
+            if isinstance(e, KeyboardInterrupt):
+                # stop the query server side before the cursor is closed
+                conn.cancel_safe()
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            size += writer.close()
+            files += 1
+    return rows, size, files
+
+
+@with_resources(use_db=True, use_reddit=False)
+def export_query(
+    conn,
+    target: str,
+    fmt: str = "csv",
+    split: str | None = None,
+    compression: str = "gzip",
+    out_dir: str = EXPORT_DIR,
+    status=None,
+) -> tuple[int, int, int]:
+    """Export a table or query to out_dir. Returns (rows, bytes, files).
+
+    Unsplit CSV is produced by COPY ... TO STDOUT; everything else goes
+    through a named binary cursor fetched FETCH_ROWS rows at a time.
+    """
+    query, name = export_source(target, conn)
+    if fmt == "csv" and not split:
+        path = output_path(out_dir, name, fmt, compression)
+        rows, size = _copy_csv(conn, query, path, compression)
+        return rows, size, 1
+    return _cursor_export(
+        conn, query, name, fmt, compression, split, out_dir, status
+    )
+
+
+def export(
+    target: str,
+    fmt: str = "csv",
+    split: str | None = None,
+    compression: str = "gzip",
+    out_dir: str = EXPORT_DIR,
+    **kwargs,
+):
+    """Prompt command: export a table or query and report throughput."""
+    if fmt not in FORMATS:
+        console.print(f"Unknown format {fmt}, use one of {', '.join(FORMATS)}")
+        return
+    if split is not None and split not in SPLITS:
+        console.print(f"Unknown split {split}, use one of {', '.join(SPLITS)}")
+        return
+    if compression not in COMPRESSIONS:
+        console.print(
+            f"Unknown compression {compression}, "
+            f"use one of {', '.join(COMPRESSIONS)}"
+        )
+        return
+    logger.info(
+        f"Exporting {target} | format={fmt} | split={split} "
+        f"| compression={compression} | out_dir={out_dir}"
+    )
+    start_time = time.perf_counter()
+    try:
+        with console.status("Exporting...", spinner="dots") as status:
+            result = export_query(
+                target,
+                fmt=fmt,
+                split=split,
+                compression=compression,
+                out_dir=out_dir,
+                status=status,
+            )
+    except KeyboardInterrupt:
+        console.print("Export cancelled, partial files removed.")
+        return
+    except psycopg.Error as e:
+        logger.error("Export of %s failed: %s", target, e)
+        console.print(f"[red]Export failed:[/red] {escape(str(e))}")
+        return
+    rows, size, files = result
+    elapsed = time.perf_counter() - start_time
+    console.print(
+        f"Exported [green]{rows:,} rows[/green] to {files} file(s) in "
+        f"{out_dir} ({size / 1e6:.1f} MB) in {elapsed:.2f}s "
+        f"({rows / max(elapsed, 1e-9):,.0f} rows/s, "
+        f"{size / 1e6 / max(elapsed, 1e-9):.1f} MB/s)"
+    )
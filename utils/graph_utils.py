@@ -0,0 +1,535 @@
+from dataclasses import dataclass, field
+from xml.sax.saxutils import escape, quoteattr
+import hashlib
+import logging
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+"""Utils for building and persisting the subreddit network graph."""
+
+logger = logging.getLogger(__name__)
+
+EDGE_SCHEMA = pa.schema(
+    [
+        ("sub1_id", pa.int32()),
+        ("sub2_id", pa.int32()),
+        ("weight", pa.float32()),
+    ]
+)
+NODE_SCHEMA = pa.schema(
+    [
+        ("id", pa.int32()),
+        ("subreddit", pa.string()),
+        ("comment_count", pa.int64()),
+    ]
+)
+
+# number of nodes/edges serialised per write when streaming xml
+WRITE_CHUNK = 10_000
+
+# hard caps on any view sent to a browser
+MAX_VIEW_NODES = 500
+MAX_VIEW_EDGES = 4_000
+
+# default locations of the graph artifacts, relative to the repo root
+DATA_DIR = "presentation/data"
+EDGES_PATH = f"{DATA_DIR}/subreddit_edges.parquet"
+NODES_PATH = f"{DATA_DIR}/subreddit_nodes.parquet"
+CACHE_DIR = f"{DATA_DIR}/cache"
+
+
+@dataclass
+class CSRGraph:
+    """Undirected weighted graph in compressed sparse row form.
+
+    Neighbours of node i are indices[indptr[i]:indptr[i + 1]] with the
+    matching weights; every edge is stored in both directions.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    labels: np.ndarray
+    node_attrs: dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices) // 2
+
+    def neighbors(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def strength(self) -> np.ndarray:
+        """Weighted degree of every node."""
+        rows = np.repeat(np.arange(self.n_nodes), self.degree())
+        return np.bincount(rows, weights=self.weights, minlength=self.n_nodes)
+
+    def edge_list(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return each undirected edge once as (src, dst, weight)."""
+        rows = np.repeat(np.arange(self.n_nodes), self.degree())
+        upper = rows < self.indices
+        return rows[upper], self.indices[upper], self.weights[upper]
+
+    def to_networkx(self):
+        """Materialise as a networkx Graph (only import nx when needed)."""
+        import networkx as nx
+
+        G = nx.Graph()
+        for i, label in enumerate(self.labels):
+            G.add_node(
+                label,
+                **{k: v[i].item() for k, v in self.node_attrs.items()},
+            )
+        src, dst, w = self.edge_list()
+        G.add_weighted_edges_from(
+            zip(self.labels[src], self.labels[dst], w.tolist())
+        )
+        return G
+
+
+def build_csr(
+    src: np.ndarray,
+    dst: np.ndarray,
+    weights: np.ndarray,
+    n_nodes: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Symmetrise an edge list and pack it into CSR arrays.
+
+    Self loops are dropped. Returns (indptr, indices, weights) with the
+    neighbours of each node sorted by index.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    keep = src != dst
+    src, dst, weights = src[keep], dst[keep], weights[keep]
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    w = np.concatenate([weights, weights])
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), w[order]
+
+
+def subgraph(
+    graph: CSRGraph, keep: np.ndarray, min_weight: float = 0.0
+) -> CSRGraph:
+    """Induced subgraph on the nodes where keep is True.
+
+    Edges lighter than min_weight are dropped; nodes are renumbered
+    densely in their original order.
+    """
+    keep = np.asarray(keep, dtype=bool)
+    new_id = np.full(graph.n_nodes, -1, dtype=np.int64)
+    new_id[keep] = np.arange(int(keep.sum()))
+    src, dst, w = graph.edge_list()
+    mask = keep[src] & keep[dst] & (w >= min_weight)
+    indptr, indices, weights = build_csr(
+        new_id[src[mask]], new_id[dst[mask]], w[mask], int(keep.sum())
+    )
+    return CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=graph.labels[keep],
+        node_attrs={k: v[keep] for k, v in graph.node_attrs.items()},
+    )
+
+
+def content_hash(graph: CSRGraph, *params) -> str:
+    """Stable hex digest of the graph's edges, labels and extra params."""
+    h = hashlib.blake2b(digest_size=16)
+    for arr in (graph.indptr, graph.indices, graph.weights):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    h.update("\0".join(graph.labels.tolist()).encode("utf-8"))
+    h.update(repr(params).encode("utf-8"))
+    return h.hexdigest()
+
+
+def k_core(graph: CSRGraph, k: int) -> np.ndarray:
+    """Mask of nodes in the k-core (every node has degree >= k)."""
+    keep = np.ones(graph.n_nodes, dtype=bool)
+    rows = np.repeat(np.arange(graph.n_nodes), graph.degree())
+    while True:
+        live = keep[rows] & keep[graph.indices]
+        degree = np.bincount(rows[live], minlength=graph.n_nodes)
+        drop = keep & (degree < k)
+        if not drop.any():
+            return keep
+        keep &= ~drop
+
+
+def top_k_edges(graph: CSRGraph, k: int) -> CSRGraph:
+    """Keep each node's k heaviest edges (an edge survives if it is in
+    the top k of either endpoint)."""
+    rows = np.repeat(np.arange(graph.n_nodes), graph.degree())
+    # rank neighbours by descending weight within each row
+    order = np.lexsort((-graph.weights, rows))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - graph.indptr[rows[order]]
+    chosen = rank < k
+    src, dst, w = rows[chosen], graph.indices[chosen], graph.weights[chosen]
+    # keep one direction per pair, then let build_csr symmetrise
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    pairs, first = np.unique(lo * graph.n_nodes + hi, return_index=True)
+    indptr, indices, weights = build_csr(
+        pairs // graph.n_nodes, pairs % graph.n_nodes, w[first], graph.n_nodes
+    )
+    return CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=graph.labels,
+        node_attrs=graph.node_attrs,
+    )
+
+
+def ego_network(graph: CSRGraph, node: int, radius: int = 1) -> np.ndarray:
+    """Mask of nodes within radius hops of node."""
+    keep = np.zeros(graph.n_nodes, dtype=bool)
+    keep[node] = True
+    frontier = np.array([node])
+    for _ in range(radius):
+        if not len(frontier):
+            break
+        nbrs = np.concatenate([graph.neighbors(i)[0] for i in frontier])
+        frontier = np.unique(nbrs[~keep[nbrs]])
+        keep[frontier] = True
+    return keep
+
+
+def bounded_view(
+    graph: CSRGraph,
+    max_nodes: int = MAX_VIEW_NODES,
+    max_edges: int = MAX_VIEW_EDGES,
+    core: int = 0,
+    top_k: int | None = None,
+    communities: list[int] | None = None,
+    focus: str | None = None,
+    radius: int = 1,
+) -> CSRGraph:
+    """Reduce the graph to a view small enough to render in a browser.
+
+    Filters are applied in order: ego network of focus, community
+    filter, k-core, top-k edges per node. The result is then capped at
+    max_nodes (highest comment count, or strength) and max_edges
+    (heaviest), which are themselves clamped to MAX_VIEW_NODES and
+    MAX_VIEW_EDGES so the browser load is bounded regardless of input.
+    """
+    max_nodes = min(max_nodes, MAX_VIEW_NODES)
+    max_edges = min(max_edges, MAX_VIEW_EDGES)
+    keep = np.ones(graph.n_nodes, dtype=bool)
+    if focus is not None:
+        matches = np.flatnonzero(graph.labels == focus)
+        if not len(matches):
+            raise ValueError(f"Unknown subreddit: {focus}")
+        keep &= ego_network(graph, int(matches[0]), radius)
+    if communities is not None and "community" in graph.node_attrs:
+        keep &= np.isin(graph.node_attrs["community"], communities)
+    view = subgraph(graph, keep)
+    if core > 0:
+        view = subgraph(view, k_core(view, core))
+    if top_k:
+        view = top_k_edges(view, top_k)
+    if view.n_nodes > max_nodes:
+        score = view.node_attrs.get("comment_count", view.strength())
+        top = np.argsort(-score, kind="stable")[:max_nodes]
+        if focus is not None:
+            # the focused node always stays in its own view
+            centre = np.flatnonzero(view.labels == focus)
+            top = np.union1d(top[: max_nodes - 1], centre)
+        mask = np.zeros(view.n_nodes, dtype=bool)
+        mask[top] = True
+        view = subgraph(view, mask)
+    if view.n_edges > max_edges:
+        # exactly max_edges: a weight cutoff would keep every tied edge
+        src, dst, w = view.edge_list()
+        heaviest = np.argsort(-w, kind="stable")[:max_edges]
+        indptr, indices, weights = build_csr(
+            src[heaviest], dst[heaviest], w[heaviest], view.n_nodes
+        )
+        view = CSRGraph(
+            indptr=indptr,
+            indices=indices,
+            weights=weights,
+            labels=view.labels,
+            node_attrs=view.node_attrs,
+        )
+    return view
+
+
+def to_vis_data(graph: CSRGraph) -> dict[str, list]:
+    """Nodes and edges in the shape vis-network's DataSets expect."""
+    counts = graph.node_attrs.get("comment_count")
+    community = graph.node_attrs.get("community")
+    xs = graph.node_attrs.get("x")
+    ys = graph.node_attrs.get("y")
+    nodes = []
+    for i, label in enumerate(graph.labels.tolist()):
+        node = {"id": i, "label": label}
+        if xs is not None:
+            # positions are precomputed, the browser runs no physics
+            node["x"] = float(xs[i])
+            node["y"] = float(ys[i])
+        if counts is not None:
+            node["value"] = int(counts[i])
+            node["title"] = f"{label}: {int(counts[i])} comments"
+        if community is not None:
+            node["group"] = int(community[i])
+        nodes.append(node)
+    src, dst, w = graph.edge_list()
+    edges = [
+        {"from": s, "to": t, "value": wt}
+        for s, t, wt in zip(src.tolist(), dst.tolist(), w.tolist())
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def update_node_table(nodes_path: str, columns: dict[str, np.ndarray]):
+    """Add or replace per-node columns in the node table.
+
+    Arrays are indexed by node id. The file is replaced atomically so
+    readers never see a partially written table.
+    """
+    nodes = pq.read_table(nodes_path)
+    ids = nodes["id"].to_numpy()
+    for name, values in columns.items():
+        column = pa.array(np.asarray(values)[ids])
+        if name in nodes.column_names:
+            nodes = nodes.set_column(
+                nodes.column_names.index(name), name, column
+            )
+        else:
+            nodes = nodes.append_column(name, column)
+    tmp_path = nodes_path + ".tmp"
+    pq.write_table(nodes, tmp_path)
+    os.replace(tmp_path, nodes_path)
+
+
+def build_graph_tables(
+    edge_df: pd.DataFrame,
+    comment_counts: pd.DataFrame | None = None,
+) -> tuple[pa.Table, pa.Table]:
+    """Turn a (sub1, sub2, weight) frame of names into typed tables.
+
+    comment_counts is an optional (subreddit, comment_count) frame used
+    to enrich the node table. Returns (edges, nodes) arrow tables.
+    """
+    names, codes = np.unique(
+        np.concatenate(
+            [edge_df["sub1"].to_numpy(str), edge_df["sub2"].to_numpy(str)]
+        ),
+        return_inverse=True,
+    )
+    n_edges = len(edge_df)
+    counts = np.zeros(len(names), dtype=np.int64)
+    if comment_counts is not None and len(comment_counts):
+        lookup = pd.Series(
+            comment_counts["comment_count"].to_numpy(),
+            index=comment_counts["subreddit"].to_numpy(),
+        )
+        found = lookup.reindex(names)
+        counts = found.fillna(0).to_numpy(dtype=np.int64)
+    edges = pa.table(
+        {
+            "sub1_id": codes[:n_edges].astype(np.int32),
+            "sub2_id": codes[n_edges:].astype(np.int32),
+            "weight": edge_df["weight"].to_numpy(dtype=np.float32),
+        },
+        schema=EDGE_SCHEMA,
+    )
+    nodes = pa.table(
+        {
+            "id": np.arange(len(names), dtype=np.int32),
+            "subreddit": names,
+            "comment_count": counts,
+        },
+        schema=NODE_SCHEMA,
+    )
+    return edges, nodes
+
+
+def write_graph_tables(
+    edges: pa.Table, nodes: pa.Table, edges_path: str, nodes_path: str
+) -> None:
+    pq.write_table(edges, edges_path)
+    pq.write_table(nodes, nodes_path)
+    logger.info(
+        "Wrote %d edges to %s and %d nodes to %s",
+        edges.num_rows,
+        edges_path,
+        nodes.num_rows,
+        nodes_path,
+    )
+
+
+def load_graph(edges_path: str, nodes_path: str) -> CSRGraph:
+    """Load the Parquet edge and node tables into a CSRGraph."""
+    edges = pq.read_table(edges_path, columns=["sub1_id", "sub2_id", "weight"])
+    nodes = pq.read_table(nodes_path)
+    ids = nodes["id"].to_numpy()
+    order = np.argsort(ids)
+    # ids are dense 0..n-1, so position in the sorted table is the id
+    labels = nodes["subreddit"].to_numpy(zero_copy_only=False)[order]
+    node_attrs = {
+        name: nodes[name].to_numpy()[order]
+        for name in nodes.column_names
+        if name not in ("id", "subreddit")
+    }
+    indptr, indices, weights = build_csr(
+        edges["sub1_id"].to_numpy(),
+        edges["sub2_id"].to_numpy(),
+        edges["weight"].to_numpy(),
+        len(ids),
+    )
+    return CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=labels.astype(str),
+        node_attrs=node_attrs,
+    )
+
+
+def _gexf_type(arr: np.ndarray) -> str:
+    if np.issubdtype(arr.dtype, np.integer):
+        return "long"
+    if np.issubdtype(arr.dtype, np.floating):
+        return "double"
+    return "string"
+
+
+def write_gexf(graph: CSRGraph, path: str) -> None:
+    """Stream the graph to a GEXF 1.2 file, chunk by chunk.
+
+    Nothing larger than WRITE_CHUNK elements is held in memory, unlike
+    nx.write_gexf which builds the full element tree first.
+    """
+    # precomputed layout coordinates become viz:position, not attributes
+    has_xy = "x" in graph.node_attrs and "y" in graph.node_attrs
+    attrs = [
+        (name, arr)
+        for name, arr in graph.node_attrs.items()
+        if not (has_xy and name in ("x", "y"))
+    ]
+    labels = [quoteattr(str(label)) for label in graph.labels]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<gexf xmlns="http://www.gexf.net/1.2draft" '
+            'xmlns:viz="http://www.gexf.net/1.2draft/viz" version="1.2">\n'
+            '  <graph defaultedgetype="undirected" mode="static">\n'
+        )
+        if attrs:
+            f.write('    <attributes class="node" mode="static">\n')
+            for i, (name, arr) in enumerate(attrs):
+                f.write(
+                    f'      <attribute id="{i}" title={quoteattr(name)} '
+                    f'type="{_gexf_type(arr)}" />\n'
+                )
+            f.write("    </attributes>\n")
+        f.write("    <nodes>\n")
+        for start in range(0, graph.n_nodes, WRITE_CHUNK):
+            lines = []
+            for i in range(start, min(start + WRITE_CHUNK, graph.n_nodes)):
+                values = "".join(
+                    f'<attvalue for="{a}" value={quoteattr(str(arr[i]))} />'
+                    for a, (_, arr) in enumerate(attrs)
+                )
+                if values:
+                    values = f"<attvalues>{values}</attvalues>"
+                if has_xy:
+                    values += (
+                        f'<viz:position x="{float(graph.node_attrs["x"][i])}" '
+                        f'y="{float(graph.node_attrs["y"][i])}" z="0.0" />'
+                    )
+                lines.append(
+                    f"      <node id={labels[i]} label={labels[i]}>"
+                    f"{values}</node>\n"
+                    if values
+                    else f"      <node id={labels[i]} label={labels[i]} />\n"
+                )
+            f.writelines(lines)
+        f.write("    </nodes>\n    <edges>\n")
+        src, dst, w = graph.edge_list()
+        for start in range(0, len(src), WRITE_CHUNK):
+            stop = start + WRITE_CHUNK
+            f.writelines(
+                f"      <edge source={labels[s]} target={labels[t]} "
+                f'id="{start + k}" weight="{float(wt)}" />\n'
+                for k, (s, t, wt) in enumerate(
+                    zip(
+                        src[start:stop].tolist(),
+                        dst[start:stop].tolist(),
+                        w[start:stop].tolist(),
+                    )
+                )
+            )
+        f.write("    </edges>\n  </graph>\n</gexf>\n")
+    logger.info(
+        "Wrote GEXF with %d nodes and %d edges to %s",
+        graph.n_nodes,
+        graph.n_edges,
+        path,
+    )
+
+
+def write_graphml(graph: CSRGraph, path: str) -> None:
+    """Stream the graph to a GraphML file, chunk by chunk."""
+    attrs = list(graph.node_attrs.items())
+    labels = [quoteattr(str(label)) for label in graph.labels]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        )
+        for i, (name, arr) in enumerate(attrs):
+            f.write(
+                f'  <key id="d{i}" for="node" attr.name={quoteattr(name)} '
+                f'attr.type="{_gexf_type(arr)}" />\n'
+            )
+        f.write(
+            '  <key id="weight" for="edge" attr.name="weight" '
+            'attr.type="double" />\n'
+            '  <graph edgedefault="undirected">\n'
+        )
+        for start in range(0, graph.n_nodes, WRITE_CHUNK):
+            lines = []
+            for i in range(start, min(start + WRITE_CHUNK, graph.n_nodes)):
+                values = "".join(
+                    f'<data key="d{a}">{escape(str(arr[i]))}</data>'
+                    for a, (_, arr) in enumerate(attrs)
+                )
+                lines.append(f"    <node id={labels[i]}>{values}</node>\n")
+            f.writelines(lines)
+        src, dst, w = graph.edge_list()
+        for start in range(0, len(src), WRITE_CHUNK):
+            stop = start + WRITE_CHUNK
+            f.writelines(
+                f"    <edge source={labels[s]} target={labels[t]}>"
+                f'<data key="weight">{float(wt)}</data></edge>\n'
+                for s, t, wt in zip(
+                    src[start:stop].tolist(),
+                    dst[start:stop].tolist(),
+                    w[start:stop].tolist(),
+                )
+            )
+        f.write("  </graph>\n</graphml>\n")
+    logger.info(
+        "Wrote GraphML with %d nodes and %d edges to %s",
+        graph.n_nodes,
+        graph.n_edges,
+        path,
+    )
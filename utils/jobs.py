@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator
+from .console import console
+
+"""Background jobs for the interactive prompt.
+
+Jobs run on a small pool of job threads. The per-thread / per-redditor
+work inside a job runs on one worker pool shared by every job, so
+concurrent scrapes compete for the same threads (and, through
+connection_utils, the same HTTP pool and rate limiter) instead of each
+starting their own.
+"""
+
+logger = logging.getLogger(__name__)
+
+# jobs running at once, further jobs queue
+JOB_SLOTS = 4
+# threads shared by all jobs for per-item work
+WORKER_THREADS = 16
+
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    status: str = "queued"  # queued, running, done, failed, cancelled
+    current: int = 0
+    total: int = 0
+    started: float | None = None
+    finished: float | None = None
+    error: str | None = None
+    result: Any = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    future: Future | None = None
+    # ProgressBus of the scrape running in this job, if any
+    bus: Any = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def progress(self, current: int, total: int | None = None):
+        """Called from inside the job as work completes."""
+        self.current = current
+        if total is not None:
+            self.total = total
+
+    def summary(self) -> str:
+        done = f"{self.current}/{self.total}" if self.total else "-"
+        line = (
+            f"#{self.id} {self.status:<9} {done:>9} "
+            f"{self.elapsed:7.1f}s  {self.command}"
+        )
+        if self.error:
+            line += f"  ({self.error})"
+        return line
+
+
+_local = threading.local()
+
+
+def current_job() -> Job | None:
+    """The job the calling thread is running, None in the foreground."""
+    return getattr(_local, "job", None)
+
+
+def status(message: str):
+    """console.status spinner in the foreground, nothing inside a job
+    (a live spinner would draw over the prompt)."""
+    if current_job() is not None:
+        return nullcontext()
+    return console.status(message, spinner="dots")
+
+
+class JobManager:
+    def __init__(self, slots: int = JOB_SLOTS):
+        self.slots = slots
+        self._executor: ThreadPoolExecutor | None = None
+        self._jobs: dict[int, Job] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def submit(self, command: str, func: Callable, **kwargs) -> Job:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.slots, thread_name_prefix="job"
+                )
+            job = Job(id=self._next_id, command=command)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, func, kwargs)
+        logger.info("Submitted job #%d: %s", job.id, command)
+        return job
+
+    def _run(self, job: Job, func: Callable, kwargs: dict):
+        if job.cancelled:
+            job.status = "cancelled"
+            return None
+        _local.job = job
+        job.status = "running"
+        job.started = time.perf_counter()
+        try:
+            job.result = func(**kwargs)
+            job.status = "cancelled" if job.cancelled else "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{e.__class__.__name__}: {e}"
+            logger.exception("Job #%d failed", job.id)
+        finally:
+            job.finished = time.perf_counter()
+            _local.job = None
+        logger.info("Job #%d %s in %.2fs", job.id, job.status, job.elapsed)
+        colour = {"done": "green", "failed": "red"}.get(job.status, "yellow")
+        console.print(
+            f"[{colour}]Job #{job.id} {job.status}[/{colour}] "
+            f"in {job.elapsed:.1f}s: {job.command}"
+        )
+        return job.result
+
+    def get(self, job_id: int) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def all(self) -> list[Job]:
+        return list(self._jobs.values())
+
+    def active(self) -> list[Job]:
+        return [job for job in self._jobs.values() if job.active]
+
+    def cancel(self, job_id: int) -> bool:
+        """Ask a job to stop. Queued jobs never start, running jobs stop
+        at their next checkpoint. Returns False for unknown/finished jobs.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+        return True
+
+    def wait(
+        self, job_ids: Iterable[int] | None = None, timeout=None
+    ) -> list[Job]:
+        """Block until the given (default: all active) jobs finish."""
+        if job_ids is None:
+            jobs = self.active()
+        else:
+            jobs = [self._jobs[i] for i in job_ids if i in self._jobs]
+        futures = [job.future for job in jobs if job.future is not None]
+        wait(futures, timeout=timeout)
+        return jobs
+
+    def shutdown(self):
+        """Cancel everything still active and wait for it to stop."""
+        for job in self.active():
+            self.cancel(job.id)
+        self.wait()
+
+
+jobs = JobManager()
+_worker_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def worker_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by every job (and foreground command)."""
+    global _worker_pool
+    with _pool_lock:
+        if _worker_pool is None:
+            _worker_pool = ThreadPoolExecutor(
+                max_workers=WORKER_THREADS, thread_name_prefix="worker"
+            )
+    return _worker_pool
+
+
+def map_unordered(
+    func: Callable,
+    items: Iterable,
+    max_in_flight: int,
+    job: Job | None = None,
+) -> Iterator[tuple[Any, Future]]:
+    """Run func over items on the shared worker pool.
+
+    At most max_in_flight items of this call are queued at once, so one
+    large scrape can't starve the others. Yields (item, future) as each
+    completes. If job is cancelled no new items are submitted and the
+    ones already running are allowed to finish.
+    """
+    pool = worker_pool()
+    items = iter(items)
+    pending: dict[Future, Any] = {}
+
+    def fill():
+        while len(pending) < max_in_flight:
+            if job is not None and job.cancelled:
+                return
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            pending[pool.submit(func, item)] = item
+
+    fill()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+        fill()
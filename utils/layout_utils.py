@@ -0,0 +1,244 @@
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from .console import console
+from .graph_utils import (
+    CACHE_DIR,
+    EDGES_PATH,
+    NODES_PATH,
+    CSRGraph,
+    load_graph,
+    update_node_table,
+)
+
+"""Utils for precomputing a static force-directed graph layout."""
+
+logger = logging.getLogger(__name__)
+
+# coordinates are rescaled to fit in [-LAYOUT_EXTENT, LAYOUT_EXTENT]
+LAYOUT_EXTENT = 1000.0
+LAYOUT_CACHE = f"{CACHE_DIR}/layout.parquet"
+
+
+def _accumulate(force: np.ndarray, idx: np.ndarray, vec: np.ndarray):
+    """force[idx] += vec with repeated indices (faster than np.add.at)."""
+    n = len(force)
+    force[:, 0] += np.bincount(idx, weights=vec[:, 0], minlength=n)
+    force[:, 1] += np.bincount(idx, weights=vec[:, 1], minlength=n)
+
+
+def _tree_depth(n: int) -> int:
+    """Quadtree depth giving a handful of points per leaf."""
+    return int(np.clip(np.ceil(np.log(max(n, 1) / 2) / np.log(4)), 1, 10))
+
+
+def repulsion(
+    pos: np.ndarray,
+    mass: np.ndarray,
+    theta: float = 0.8,
+    depth: int | None = None,
+) -> np.ndarray:
+    """Barnes-Hut approximation of m_i * m_j / d repulsion on every node.
+
+    The quadtree is a stack of regular grids, one per level, with cell
+    masses and centres of mass computed by bincount. All nodes walk the
+    tree together: (node, cell) pairs whose cell is far enough away
+    (width / distance < theta) are accepted as a single body, the rest
+    are split into their non-empty children. Pairs still open at the
+    leaf level are resolved exactly against the points in those leaves.
+    """
+    n = len(pos)
+    depth = depth or _tree_depth(n)
+    lo = pos.min(axis=0)
+    size = float(np.max(pos.max(axis=0) - lo)) * (1 + 1e-9) or 1.0
+    unit = (pos - lo) / size
+
+    # per-level cell ids, masses and centres of mass
+    cell_of, cell_mass, cell_centre = [], [], []
+    for level in range(depth + 1):
+        side = 1 << level
+        ij = np.minimum((unit * side).astype(np.int64), side - 1)
+        ids = ij[:, 0] * side + ij[:, 1]
+        m = np.bincount(ids, weights=mass, minlength=side * side)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centre = np.stack(
+                [
+                    np.bincount(ids, mass * pos[:, 0], side * side) / m,
+                    np.bincount(ids, mass * pos[:, 1], side * side) / m,
+                ],
+                axis=1,
+            )
+        cell_of.append(ids)
+        cell_mass.append(m)
+        cell_centre.append(centre)
+
+    force = np.zeros_like(pos)
+    pts = np.arange(n)
+    cells = np.zeros(n, dtype=np.int64)
+    for level in range(depth + 1):
+        side = 1 << level
+        width = size / side
+        delta = pos[pts] - cell_centre[level][cells]
+        dist = np.sqrt((delta**2).sum(axis=1))
+        own = cell_of[level][pts] == cells
+        far = ~own & (width < theta * dist)
+        if far.any():
+            p, d = pts[far], np.maximum(dist[far], 1e-3)
+            scale = mass[p] * cell_mass[level][cells[far]] / (d * d)
+            _accumulate(force, p, delta[far] * scale[:, None])
+        if level == depth:
+            pts, cells = pts[~far], cells[~far]
+            break
+        # open the near cells into their non-empty children
+        pts, cells = pts[~far], cells[~far]
+        ci, cj = cells // side, cells % side
+        child_side = side * 2
+        pts = np.repeat(pts, 4)
+        cells = (
+            (np.repeat(ci * 2, 4) + np.tile([0, 0, 1, 1], len(ci)))
+            * child_side
+            + np.repeat(cj * 2, 4)
+            + np.tile([0, 1, 0, 1], len(cj))
+        )
+        live = cell_mass[level + 1][cells] > 0
+        pts, cells = pts[live], cells[live]
+
+    # exact interactions with the points in each remaining near leaf
+    leaf = cell_of[depth]
+    order = np.argsort(leaf, kind="stable")
+    starts = np.searchsorted(leaf[order], cells, side="left")
+    counts = np.searchsorted(leaf[order], cells, side="right") - starts
+    src = np.repeat(pts, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    dst = order[np.repeat(starts, counts) + offsets]
+    other = src != dst
+    src, dst = src[other], dst[other]
+    delta = pos[src] - pos[dst]
+    d2 = np.maximum((delta**2).sum(axis=1), 1e-6)
+    _accumulate(force, src, delta * (mass[src] * mass[dst] / d2)[:, None])
+    return force
+
+
+def force_layout(
+    graph: CSRGraph,
+    iterations: int = 300,
+    seed: int = 0,
+    initial: np.ndarray | None = None,
+    theta: float = 0.8,
+    repulsion_strength: float = 1.0,
+    gravity: float = 1.0,
+) -> np.ndarray:
+    """ForceAtlas2-style layout with Barnes-Hut repulsion.
+
+    initial is an optional (n, 2) warm start; rows that are NaN are
+    placed next to their already positioned neighbours. A warm start
+    begins at a lower temperature so the existing layout is refined
+    rather than scrambled. Returns (n, 2) coordinates.
+    """
+    n = graph.n_nodes
+    rng = np.random.default_rng(seed)
+    if n == 0:
+        return np.zeros((0, 2))
+    mass = graph.degree().astype(np.float64) + 1.0
+    src, dst, w = graph.edge_list()
+    warm = initial is not None and not np.isnan(initial).all()
+    pos = _initial_positions(graph, initial, rng)
+    # natural scale of the layout, grows with sqrt(n)
+    scale = np.sqrt(n) * 10.0
+    temperature = scale * (0.05 if warm else 0.5)
+    cooling = temperature / max(iterations, 1)
+    for _ in range(iterations):
+        force = repulsion_strength * scale * repulsion(pos, mass, theta)
+        delta = pos[src] - pos[dst]
+        pull = delta * np.log1p(w)[:, None]
+        _accumulate(force, src, -pull)
+        _accumulate(force, dst, pull)
+        force -= gravity * mass[:, None] * pos / scale
+        length = np.sqrt((force**2).sum(axis=1))
+        step = np.minimum(length, temperature) / np.maximum(length, 1e-9)
+        pos += force * step[:, None]
+        temperature = max(temperature - cooling, scale * 1e-3)
+    return pos
+
+
+def _initial_positions(
+    graph: CSRGraph, initial: np.ndarray | None, rng
+) -> np.ndarray:
+    n = graph.n_nodes
+    spread = np.sqrt(n) * 10.0
+    if initial is None:
+        return rng.uniform(-spread, spread, size=(n, 2))
+    pos = np.array(initial, dtype=np.float64)
+    missing = np.isnan(pos).any(axis=1)
+    if missing.all():
+        return rng.uniform(-spread, spread, size=(n, 2))
+    # rescale the previous layout into the working scale
+    known = pos[~missing]
+    extent = np.abs(known).max() or 1.0
+    pos[~missing] = known / extent * spread
+    for i in np.flatnonzero(missing):
+        nbrs, _ = graph.neighbors(i)
+        nbrs = nbrs[~missing[nbrs]]
+        centre = pos[nbrs].mean(axis=0) if len(nbrs) else np.zeros(2)
+        pos[i] = centre + rng.normal(scale=spread * 0.01, size=2)
+    return pos
+
+
+def normalise(pos: np.ndarray, extent: float = LAYOUT_EXTENT) -> np.ndarray:
+    """Centre the layout and scale it to fit in [-extent, extent]."""
+    if not len(pos):
+        return pos
+    pos = pos - pos.mean(axis=0)
+    return pos / (np.abs(pos).max() or 1.0) * extent
+
+
+def previous_layout(graph: CSRGraph, cache_path: str) -> np.ndarray | None:
+    """Last saved coordinates aligned to the graph's nodes (NaN if new)."""
+    if not os.path.exists(cache_path):
+        return None
+    saved = pd.read_parquet(cache_path).set_index("subreddit")
+    return saved.reindex(graph.labels)[["x", "y"]].to_numpy(dtype=np.float64)
+
+
+def graph_layout(
+    iterations: int = 300,
+    seed: int = 0,
+    fresh: bool = False,
+    edges_path: str = EDGES_PATH,
+    nodes_path: str = NODES_PATH,
+    cache_path: str = LAYOUT_CACHE,
+    **kwargs,
+):
+    """Prompt command: lay out the graph and store x/y in the node table.
+
+    Unless fresh is set, the previous layout is used as a warm start so
+    unchanged parts of the graph keep their positions.
+    """
+    logger.info(
+        f"Computing layout | iterations={iterations} | seed={seed} "
+        f"| fresh={fresh}"
+    )
+    start_time = time.perf_counter()
+    graph = load_graph(edges_path, nodes_path)
+    initial = None if fresh else previous_layout(graph, cache_path)
+    with console.status("Computing layout...", spinner="dots"):
+        pos = normalise(
+            force_layout(
+                graph, iterations=iterations, seed=seed, initial=initial
+            )
+        )
+    update_node_table(nodes_path, {"x": pos[:, 0], "y": pos[:, 1]})
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    pd.DataFrame(
+        {"subreddit": graph.labels, "x": pos[:, 0], "y": pos[:, 1]}
+    ).to_parquet(cache_path, index=False)
+    elapsed = time.perf_counter() - start_time
+    warm = "warm-started" if initial is not None else "from scratch"
+    console.print(
+        f"Laid out {graph.n_nodes} nodes and {graph.n_edges} edges "
+        f"({warm}) in {elapsed:.2f}s"
+    )
@@ -0,0 +1,201 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable
+from rich.console import Group
+from rich.live import Live
+from rich.progress_bar import ProgressBar
+from rich.table import Table
+from .console import console
+
+"""Thread-safe progress counters for scrapes, with one live display.
+
+Workers never print per item. They bump counters on the ProgressBus of
+the scrape they belong to (bound to the thread with bus.bind()) and a
+single rich Live renders the bus a few times a second. The Reddit
+requestor counts requests and 429s on whichever bus the calling thread
+is bound to.
+"""
+
+# counters every bus keeps
+COUNTERS = (
+    "items",  # threads / redditors finished
+    "rows",  # rows inserted or updated
+    "unchanged",  # existing rows skipped, fingerprint unchanged
+    "skipped",  # items skipped as scraped recently
+    "requests",  # Reddit API requests
+    "comments",  # comments fetched
+    "errors",
+    "retries",  # transient failures tried again
+    "rate_limited",  # 429 responses
+)
+REFRESH_PER_SECOND = 4
+# workers shown in the live display
+MAX_WORKER_ROWS = 8
+
+_local = threading.local()
+
+
+def current_bus() -> "ProgressBus | None":
+    """The bus the calling thread reports to, if any."""
+    return getattr(_local, "bus", None)
+
+
+class ProgressBus:
+    def __init__(
+        self, label: str, total_items: int = 0, expected_comments: int = 0
+    ):
+        self.label = label
+        self.total_items = total_items
+        self.expected_comments = expected_comments
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        self._workers: dict[str, tuple[str, float]] = {}
+        self._listeners: list[Callable[["ProgressBus"], None]] = []
+
+    def add(self, **deltas: int):
+        """Atomically add to one or more counters."""
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counts[name] += delta
+        if "items" in deltas:
+            for listener in self._listeners:
+                listener(self)
+
+    def expect(self, items: int = 0, comments: int = 0):
+        """Raise the expected totals as work is discovered."""
+        with self._lock:
+            self.total_items += items
+            self.expected_comments += comments
+
+    def on_items(self, listener: Callable[["ProgressBus"], None]):
+        """Call listener(bus) whenever items completes (e.g. a job)."""
+        self._listeners.append(listener)
+
+    def worker(self, status: str | None):
+        """Set (or clear, with None) the calling thread's status line."""
+        name = threading.current_thread().name
+        with self._lock:
+            if status is None:
+                self._workers.pop(name, None)
+            else:
+                self._workers[name] = (status, time.perf_counter())
+
+    @contextmanager
+    def bind(self):
+        """Report to this bus from the calling thread."""
+        previous = current_bus()
+        _local.bus = self
+        try:
+            yield self
+        finally:
+            self.worker(None)
+            _local.bus = previous
+
+    def track(self, func: Callable) -> Callable:
+        """Wrap func so it runs bound to this bus on any thread."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.bind():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict:
+        """Consistent copy of the counters plus derived rates and ETA."""
+        with self._lock:
+            snap = dict(self._counts)
+            workers = dict(self._workers)
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        snap.update(
+            elapsed=elapsed,
+            total_items=self.total_items,
+            expected_comments=self.expected_comments,
+            rows_per_s=snap["rows"] / elapsed,
+            requests_per_s=snap["requests"] / elapsed,
+            workers=workers,
+            eta=None,
+        )
+        # prefer comments for the ETA, threads vary a lot in size
+        if self.expected_comments and snap["comments"]:
+            left = max(self.expected_comments - snap["comments"], 0)
+            snap["eta"] = left / (snap["comments"] / elapsed)
+        elif self.total_items and snap["items"]:
+            left = max(self.total_items - snap["items"], 0)
+            snap["eta"] = left / (snap["items"] / elapsed)
+        return snap
+
+    def render(self):
+        snap = self.snapshot()
+        stats = Table.grid(padding=(0, 2))
+        stats.add_row(
+            f"[bold]{self.label}[/bold]",
+            f"{snap['items']}/{snap['total_items']} done",
+            f"{snap['elapsed']:.0f}s elapsed",
+            f"ETA {_duration(snap['eta'])}",
+        )
+        comments = f"{snap['comments']:,}"
+        if snap["expected_comments"]:
+            pct = 100 * snap["comments"] / snap["expected_comments"]
+            comments += f"/{snap['expected_comments']:,} ({pct:.0f}%)"
+        stats.add_row(
+            f"comments {comments}",
+            f"rows {snap['rows']:,} ({snap['rows_per_s']:.0f}/s)",
+            f"requests {snap['requests']:,} "
+            f"({snap['requests_per_s']:.1f}/s)",
+            f"[red]429s {snap['rate_limited']}[/red]"
+            f"  [yellow]retries {snap['retries']}[/yellow]"
+            f"  [red]errors {snap['errors']}[/red]",
+        )
+        workers = Table.grid(padding=(0, 2))
+        now = time.perf_counter()
+        for name, (status, since) in sorted(snap["workers"].items())[
+            :MAX_WORKER_ROWS
+        ]:
+            workers.add_row(
+                f"[dim]{name}[/dim]", status, f"[dim]{now - since:.0f}s[/dim]"
+            )
+        bar = ProgressBar(
+            total=max(snap["total_items"], 1), completed=snap["items"]
+        )
+        return Group(bar, stats, workers)
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        line = (
+            f"{snap['rows']:,} rows ({snap['rows_per_s']:.0f}/s), "
+            f"{snap['requests']:,} requests "
+            f"({snap['requests_per_s']:.1f}/s), "
+            f"{snap['rate_limited']} rate-limited"
+        )
+        if snap["unchanged"]:
+            line += f", {snap['unchanged']:,} unchanged rows not rewritten"
+        if snap["skipped"]:
+            line += f", {snap['skipped']:,} skipped as fresh"
+        if snap["retries"]:
+            line += f", {snap['retries']:,} retries"
+        return line
+
+    def live(self, quiet: bool = False):
+        """Live display of this bus, or nothing when quiet."""
+        if quiet:
+            return nullcontext()
+        return Live(
+            get_renderable=self.render,
+            console=console,
+            refresh_per_second=REFRESH_PER_SECOND,
+            transient=True,
+        )
+
+
+def _duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
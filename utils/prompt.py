@@ -1,4 +1,3 @@
-import argparse
 import os
 import shlex
 import sys
@@ -7,10 +6,13 @@ from prompt_toolkit.history import FileHistory
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 from prompt_toolkit.application import get_app
 from prompt_toolkit.formatted_text import HTML
+from prompt_toolkit.formatted_text.html import html_escape as escape
 from prompt_toolkit.completion import NestedCompleter
-from .state import subreddit_progress
+from prompt_toolkit.patch_stdout import patch_stdout
 from .console import console
 from .prompt_help_text import prompt_data
+from .commands import dispatch
+from .jobs import jobs
 
 
 # TODO add unit tests for prompt loop (mocking input/output)
@@ -29,7 +31,27 @@ def prompt_loop():
                 targets for targets in prompt_data["delete"]["targets"].keys()
             },
             "expand": None,
+            "refresh": None,
+            "retry-failed": {"thread", "redditor"},
+            "graph": {
+                func for func in prompt_data["graph"].keys() if func != "base"
+            },
+            "analyze": {
+                func
+                for func in prompt_data["analyze"].keys()
+                if func != "base"
+            },
+            "rollups": {"backfill"},
+            "thread": {"backfill"},
+            "bodies": {"migrate", "report"},
             "db": None,
+            "export": None,
+            "search": None,
+            "import-dump": None,
+            "jobs": None,
+            "job": None,
+            "cancel": None,
+            "wait": None,
             "exit": None,
             "quit": None,
         }
@@ -55,7 +77,10 @@ def prompt_loop():
             )
 
     history = FileHistory(history_file)
-    session = PromptSession(history=history, completer=completer)
+    # redraw the toolbar while background jobs make progress
+    session = PromptSession(
+        history=history, completer=completer, refresh_interval=0.5
+    )
 
     def bottom_toolbar() -> HTML:
         """Return a small, fast context-sensitive help string for the
@@ -68,25 +93,25 @@ def prompt_loop():
         except ValueError:
             tokens = txt.split()
 
-        # show subreddit scraping progress if active
-        try:
-            prog = subreddit_progress
-            if prog and prog.get("enabled") and prog.get("total", 0) > 0:
-                cur = int(prog.get("current", 0))
-                tot = int(prog.get("total", 0))
-                width = 30
-                filled = int((cur / tot) * width) if tot else 0
-                bar = "█" * filled + "─" * (width - filled)
-                perc = int((cur / tot) * 100) if tot else 0
-                return HTML(f"Scraping: {cur}/{tot} [{bar}] {perc}%")
-        except Exception:
-            # fail silently on any error
-            pass
-
         if not tokens:
+            # show background job progress while nothing is typed
+            active = jobs.active()
+            if active:
+                parts = []
+                for job in active[:3]:
+                    if job.total:
+                        pct = int(100 * job.current / job.total)
+                        state = f"{job.current}/{job.total} {pct}%"
+                    else:
+                        state = job.status
+                    label = escape(job.command[:30])
+                    parts.append(f"#{job.id} {label} {state}")
+                more = f" (+{len(active) - 3})" if len(active) > 3 else ""
+                return HTML("Jobs: " + " | ".join(parts) + more)
             return HTML(
-                "Commands: <b>scrape</b>, <b>db</b>, "
-                "<b>delete</b>, <b>exit</b>"
+                "Commands: <b>scrape</b>, <b>db</b>, <b>export</b>, "
+                "<b>search</b>, <b>delete</b>, <b>graph</b>, <b>jobs</b>, "
+                "<b>exit</b>"
             )
 
         # TODO refactor to allow delete, db, and other commands
@@ -111,176 +136,80 @@ def prompt_loop():
             return HTML(s)
         if cmd == "expand":
             return HTML(prompt_data["expand"]["desc"])
+        if cmd == "refresh":
+            return HTML(prompt_data["refresh"]["desc"])
+        if cmd == "retry-failed":
+            return HTML(prompt_data["retry-failed"]["desc"])
+        if cmd == "graph":
+            if len(tokens) == 1:
+                return HTML(prompt_data["graph"]["base"]["desc"])
+            target = tokens[1].lower()
+            s = prompt_data["graph"]["base"]["desc"]
+            for graph_func in prompt_data["graph"].values():
+                if target in graph_func["targets"]:
+                    s = graph_func["desc"]
+            return HTML(s)
+        if cmd == "analyze":
+            if len(tokens) == 1:
+                return HTML(prompt_data["analyze"]["base"]["desc"])
+            target = tokens[1].lower()
+            s = prompt_data["analyze"]["base"]["desc"]
+            for analyze_func in prompt_data["analyze"].values():
+                if target in analyze_func["targets"]:
+                    s = analyze_func["desc"]
+            return HTML(s)
+        if cmd == "rollups":
+            return HTML(prompt_data["rollups"]["desc"])
+        if cmd == "thread":
+            return HTML(prompt_data["thread"]["desc"])
+        if cmd == "bodies":
+            return HTML(prompt_data["bodies"]["desc"])
         if cmd == "delete":
             # help for delete command
             return HTML(prompt_data["delete"]["desc"])
         # help for db command
         if cmd == "db":
             return HTML(prompt_data["db"]["desc"])
+        if cmd == "export":
+            return HTML(prompt_data["export"]["desc"])
+        if cmd == "search":
+            return HTML(prompt_data["search"]["desc"])
+        if cmd == "import-dump":
+            return HTML(prompt_data["import-dump"]["desc"])
+        if cmd in prompt_data["jobs"]:
+            return HTML(prompt_data["jobs"][cmd]["desc"])
         return HTML(prompt_data["unknown"])
 
     cli_input_executed = False
-    while True:
-        try:
-            # interactive prompt
-            if len(sys.argv) < 2 or cli_input_executed:
-                user_input = session.prompt(
-                    "scrapeddit> ",
-                    bottom_toolbar=bottom_toolbar,
-                    auto_suggest=AutoSuggestFromHistory(),
-                    wrap_lines=True,
-                ).strip()
-                if not user_input:
-                    continue
-            else:
-                # command line invocation
-                user_input = " ".join(sys.argv[1:]).strip()
-                cli_input_executed = True
+    # background jobs print above the prompt instead of through it
+    with patch_stdout(raw=True):
+        while True:
+            try:
+                # interactive prompt
+                if len(sys.argv) < 2 or cli_input_executed:
+                    user_input = session.prompt(
+                        "scrapeddit> ",
+                        bottom_toolbar=bottom_toolbar,
+                        auto_suggest=AutoSuggestFromHistory(),
+                        wrap_lines=True,
+                    ).strip()
+                else:
+                    # command line invocation
+                    user_input = " ".join(sys.argv[1:]).strip()
+                    cli_input_executed = True
                 if not user_input:
                     continue
-
-            # TODO refactor to accept none scrape commands
-            # TODO factor out argparse handling to separate function...
-            # ...returning args
-            if user_input.startswith("scrape "):
-
-                tokens = shlex.split(user_input)
-                if len(tokens) < 3:
-                    console.print(prompt_data["scrape"]["error"]["desc"])
-                    continue
-                _, target = tokens[0], tokens[1]
-                target = target.lower()
-                arg = tokens[2]
-                # defaults
-                overwrite = False
-                limit = None
-                threshold = 0
-                # parse remaining tokens as flags
-                flags = tokens[3:]
-                parser = argparse.ArgumentParser(add_help=False)
-                parser.add_argument("-o", "--overwrite", action="store_true")
-                parser.add_argument("--limit", type=str)
-                parser.add_argument("--subs-only", action="store_true")
-                parser.add_argument("--comments-only", action="store_true")
-                parser.add_argument("--sort", type=str)
-                parser.add_argument("--threshold", type=int)
-                parser.add_argument("-w", "--max-workers", type=int)
-                parser.add_argument(
-                    "--exit-after", action="store_true", dest="exit_after"
-                )
-                parser.add_argument(
-                    "-s",
-                    "--skip-existing",
-                    action="store_true",
-                    dest="skip_existing",
-                )
-                try:
-                    ns, unknown = parser.parse_known_args(flags)
-                except Exception as e:
-                    print("Error parsing flags:", e)
-                    continue
-                overwrite = bool(ns.overwrite)
-                exit_after = bool(getattr(ns, "exit_after", False))
-                # limit arg may be 'None' or an integer
-                if ns.limit is None:
-                    limit = None
-                else:
-                    if ns.limit.lower() == "none":
-                        limit = None
-                    else:
-                        try:
-                            limit = int(ns.limit)
-                        except ValueError:
-                            print(f"Invalid limit value: {ns.limit}")
-                            limit = None
-                # invoking scrape subreddit with no limit defaults to 10
-                if target in ("subreddit", "r") and limit is None:
-                    limit = 10
-                threshold = ns.threshold if ns.threshold is not None else 0
-                sort = ns.sort if ns.sort is not None else "new"
-                subs_only = bool(getattr(ns, "subs_only", False))
-                skip_existing = bool(getattr(ns, "skip_existing", False))
-                max_workers = (
-                    ns.max_workers
-                    if getattr(ns, "max_workers", None) is not None
-                    else 5
-                )
-                # TODO: clean up limit handling here and above
-                scrape_functions = [
-                    command_dict
-                    for name, command_dict in prompt_data["scrape"].items()
-                    if prompt_data["scrape"].get(name).get("func")
-                ]
-                for prompt in scrape_functions:
-                    if target in prompt["targets"]:
-                        func = prompt["func"]
-                        func(
-                            post_id=arg,
-                            subreddit_name=arg,
-                            comment_id=arg,
-                            user_id=arg,
-                            sort=sort,
-                            limit=limit,
-                            threshold=threshold,
-                            overwrite=overwrite,
-                            subs_only=subs_only,
-                            max_workers=max_workers,
-                            skip_existing=skip_existing,
-                        )
-                if exit_after:
+                if dispatch(
+                    user_input, confirm=session.prompt, background=True
+                ):
                     break
-            # delete command
-            elif user_input.startswith("delete ") or user_input == "delete":
-                tokens = shlex.split(user_input)
-                if len(tokens) < 2:
-                    print("Usage: delete <submissions|comments|all>")
-                    continue
-                target = tokens[1].lower()
-                if target in prompt_data["delete"]["targets"]["submissions"]:
-                    target = "submissions"
-                elif target in prompt_data["delete"]["targets"]["comments"]:
-                    target = "comments"
-                elif target == prompt_data["delete"]["targets"]["all"]:
-                    target = "all"
-                else:
-                    print("Unknown delete target. Use submissions,")
-                    print("comments or all.")
-                    continue
-                confirm = session.prompt(
-                    "Type 'Yes' to confirm deletion (THIS CANNOT BE UNDONE): "
-                ).strip()
-                if confirm != "Yes":
-                    print("Aborted: confirmation not provided.")
-                    continue
-                subs_del, comm_del = prompt_data["delete"]["func"](target)
-                console.print(
-                    f"Deleted: submissions={subs_del}, comments={comm_del}"
-                )
-            elif user_input.startswith("db "):
-                _, sql_str = user_input.split(" ", 1)
-                prompt_data["db"]["func"](sql_str)
-            elif user_input.startswith("expand "):
-                tokens = shlex.split(user_input)
-                flags = tokens[1:]
-                parser = argparse.ArgumentParser(add_help=False)
-                parser.add_argument("--threshold", type=int, required=True)
-                parser.add_argument("--limit", type=int, required=False)
-                try:
-                    ns, unknown = parser.parse_known_args(flags)
-                except Exception as e:
-                    print("Error parsing flags:", e)
-                    continue
-                threshold = ns.threshold
-                limit = ns.limit
-                prompt_data["expand"]["func"](threshold=threshold, limit=limit)
-            elif user_input in {"exit", "quit"}:
+            except KeyboardInterrupt:
+                break
+            except EOFError:
                 break
-            else:
-                print(
-                    "Unknown command. Try 'scrape', 'db', 'delete', "
-                    "'expand' or 'exit'."
-                )
-        except KeyboardInterrupt:
-            break
-        except EOFError:
-            break
+            except Exception as e:
+                # a failed foreground command shouldn't end the session
+                console.print(f"[red]Error: {e}[/red]")
+        if active := jobs.active():
+            console.print(f"Cancelling {len(active)} running job(s)...")
+            jobs.shutdown()
@@ -1,14 +1,6 @@
 """Help text for prompt commands."""
 
-from utils.db_utils import clear_tables, db_execute
-from utils.scraping_utils import (
-    scrape_comment,
-    scrape_entire_thread,
-    scrape_submission,
-    scrape_subreddit,
-    scrape_redditor,
-    expand_redditors_comments,
-)
+from .command_registry import LazyCommand
 
 # TODO add exit-after flag help
 # TODO add skip-existing flag help
@@ -36,9 +28,10 @@ prompt_data = {
             "targets": ("thread", "t", "entire", "entire_thread"),
             "desc": (
                 "thread: scrape submission + comments. Flags: \n"
-                "--overwrite/-o, --limit N (None=all), --threshold N"
+                "--overwrite/-o, --limit N (None=all), --threshold N,\n"
+                "--raw (read JSON directly, skipping PRAW objects)"
             ),
-            "func": scrape_entire_thread,
+            "func": LazyCommand("scraping_utils", "scrape_entire_thread"),
         },
         "submission": {
             "targets": ("submission", "s", "post"),
@@ -46,7 +39,7 @@ prompt_data = {
                 "submission: scrape submission only. Flags:\n "
                 "--overwrite/-o"
             ),
-            "func": scrape_submission,
+            "func": LazyCommand("scraping_utils", "scrape_submission"),
         },
         "comment": {
             "targets": ("comment", "c"),
@@ -54,16 +47,17 @@ prompt_data = {
                 "comment: scrape single comment only. Flags:\n "
                 "--overwrite/-o"
             ),
-            "func": scrape_comment,
+            "func": LazyCommand("scraping_utils", "scrape_comment"),
         },
         "redditor": {
             "targets": ("redditor", "user", "u"),
             "desc": (
                 "redditor: scrape comments from a redditor. Flags:\n "
                 "--overwrite/-o, --limit N (None=all)\n "
-                "--sort (new/top/hot/controversial)"
+                "--sort (new/top/hot/controversial),\n "
+                "--fresh-hours N (skip if scraped within, default 24)"
             ),
-            "func": scrape_redditor,
+            "func": LazyCommand("scraping_utils", "scrape_redditor"),
         },
         "subreddit": {
             "targets": ("subreddit", "sub", "r"),
@@ -71,9 +65,10 @@ prompt_data = {
                 "subreddit: scrape redditors from a subreddit.\n "
                 "Flags: --limit N, --overwrite/-o, --max-workers N,\n "
                 "--depth N, --sort (new/top/hot/controversial),\n"
-                "--subs-only, --comments-only, --skip-existing"
+                "--subs-only, --comments-only, --skip-existing, --quiet/-q,\n"
+                "--full (ignore the sort=new watermark), --raw"
             ),
-            "func": scrape_subreddit,
+            "func": LazyCommand("scraping_utils", "scrape_subreddit"),
         },
     },
     "expand": {
@@ -81,9 +76,112 @@ prompt_data = {
         "desc": (
             "expand: expand redditors comments with less"
             " than a threshold number of comments.\n "
-            "Flags: --threshold N, --max-workers N, --limit N"
+            "Flags: --threshold N, --max-workers N, --limit N, --quiet/-q,"
+            "\n --fresh-hours N"
         ),
-        "func": expand_redditors_comments,
+        "func": LazyCommand("scraping_utils", "expand_redditors_comments"),
+    },
+    "refresh": {
+        "desc": (
+            "<b>refresh [subreddit]</b>: rescrape comments of threads "
+            "that are due,\n most expected new comments first. "
+            "Flags: --budget N (requests, default 100),\n "
+            "--max-workers N, --quiet/-q"
+        ),
+        "func": LazyCommand("scraping_utils", "refresh"),
+    },
+    "retry-failed": {
+        "desc": (
+            "<b>retry-failed [thread|redditor]</b>: run tasks that failed "
+            "in earlier scrapes again.\n "
+            "Flags: --max-attempts N (skip tasks failed N times),\n "
+            "--max-workers N, --quiet/-q"
+        ),
+        "func": LazyCommand("scraping_utils", "retry_failed"),
+    },
+    "graph": {
+        "base": {
+            "targets": (),
+            "desc": (
+                "Usage: <b>graph &lt;edges|communities|layout&gt; [flags]</b>"
+            ),
+            "func": None,
+        },
+        "edges": {
+            "targets": ("edges", "edge", "minhash"),
+            "desc": (
+                "graph edges: build the graph tables from shared commenters\n "
+                "(MinHash/LSH estimate). Flags: --perms N (default 128),\n "
+                "--bands N (default 64), --min-shared N (default 5),\n "
+                "--recall-sample N (default 500), --exact, --seed N"
+            ),
+            "func": LazyCommand("similarity_utils", "graph_edges"),
+        },
+        "communities": {
+            "targets": ("communities", "community", "louvain"),
+            "desc": (
+                "graph communities: detect subreddit communities "
+                "(Louvain).\n "
+                "Flags: --min-comments N (default 200), --min-weight N,\n "
+                "--resolution R, --seed N"
+            ),
+            "func": LazyCommand("community_utils", "graph_communities"),
+        },
+        "layout": {
+            "targets": ("layout",),
+            "desc": (
+                "graph layout: precompute node positions (Barnes-Hut).\n "
+                "Flags: --iterations N (default 300), --seed N, --fresh"
+            ),
+            "func": LazyCommand("layout_utils", "graph_layout"),
+        },
+    },
+    "analyze": {
+        "base": {
+            "targets": (),
+            "desc": "Usage: <b>analyze topics [subreddit ...] [flags]</b>",
+            "func": None,
+        },
+        "topics": {
+            "targets": ("topics", "topic", "lda"),
+            "desc": (
+                "analyze topics: fit topics (online LDA) over comment "
+                "bodies,\n globally or per listed subreddit. "
+                "Flags: --topics K (default 20),\n --top N (the N biggest "
+                "subreddits), --passes N, --max-docs N,\n --terms N, "
+                "--features N, --workers N, --seed N"
+            ),
+            "func": LazyCommand("topic_utils", "analyze_topics"),
+        },
+    },
+    "rollups": {
+        "desc": (
+            "<b>rollups backfill</b>: rebuild the hourly and daily "
+            "subreddit rollups\n from the stored comments and submissions"
+        ),
+        "func": LazyCommand("rollup_utils", "rollups_backfill"),
+    },
+    "thread": {
+        "desc": (
+            "<b>thread &lt;submission id&gt;</b>: show a stored thread as "
+            "a tree, with its shape.\n "
+            "Flags: --comment ID (only that subtree), --depth N, "
+            "--limit N (default 200)\n "
+            "<b>thread backfill</b>: place stored comments that have no "
+            "path yet"
+        ),
+        "func": LazyCommand("thread_utils", "show_thread"),
+        "backfill": LazyCommand("thread_utils", "thread_backfill"),
+    },
+    "bodies": {
+        "desc": (
+            "<b>bodies migrate</b>: store comment texts repeated across the "
+            "table once.\n Flags: --min-repeats N (default 2), "
+            "--min-length N (default 32)\n "
+            "<b>bodies report</b>: show the space shared texts save"
+        ),
+        "migrate": LazyCommand("body_utils", "bodies_migrate"),
+        "report": LazyCommand("body_utils", "bodies_report"),
     },
     "delete": {
         "targets": {
@@ -96,16 +194,71 @@ prompt_data = {
             "&lt;submissions|comments|all&gt;. "
             "This prompts for confirmation."
         ),
-        "func": clear_tables,
+        "func": LazyCommand("db_utils", "clear_tables"),
     },
     # TODO wrap singleton commands in dict like scrape
     # TODO refactor unknown command handling to match (desc, func)
     "db": {
-        "desc": "<b>db &lt;SQL&gt;</b>: run SQL against DB",
-        "func": db_execute,
+        "desc": (
+            "<b>db &lt;SQL&gt;</b>: run SQL against DB, streaming results.\n "
+            "Flags: --limit N, --page-size N (default 200). "
+            "Ctrl-C cancels the query"
+        ),
+        "func": LazyCommand("db_utils", "db_execute"),
+    },
+    "export": {
+        "desc": (
+            "<b>export &lt;table|SQL&gt;</b>: stream rows to files in "
+            "exports/.\n "
+            "Flags: --format csv|parquet|jsonl, --split subreddit|month,\n "
+            "--compression gzip|none, --out DIR"
+        ),
+        "func": LazyCommand("export_utils", "export"),
+    },
+    "search": {
+        "desc": (
+            "<b>search &lt;query&gt;</b>: full-text search, best matches "
+            "first.\n "
+            "Flags: --in comments|submissions, --subreddit S, --author A,\n "
+            "--since DATE, --until DATE, --sort rank|new, --limit N,\n "
+            "--after CURSOR (next page), --like (substring match)"
+        ),
+        "func": LazyCommand("search_utils", "search"),
+    },
+    "import-dump": {
+        "desc": (
+            "<b>import-dump &lt;path&gt;</b>: load a local Reddit dump "
+            "(NDJSON, .zst or .gz),\n or every dump in a directory. "
+            "Flags: --subreddit S[,S...],\n --author A[,A...], "
+            "--since DATE, --until DATE, --workers N, --overwrite"
+        ),
+        "func": LazyCommand("dump_utils", "import_dump"),
+    },
+    "jobs": {
+        "jobs": {
+            "desc": (
+                "<b>jobs</b>: list background jobs. scrape, expand, "
+                "refresh and retry-failed run as jobs from the prompt"
+            ),
+        },
+        "job": {"desc": "<b>job &lt;id&gt;</b>: show a job's status"},
+        "cancel": {
+            "desc": (
+                "<b>cancel &lt;id&gt;</b>: stop a job after the threads "
+                "already running"
+            ),
+        },
+        "wait": {
+            "desc": (
+                "<b>wait [id ...]</b>: block until jobs finish "
+                "(all by default), Ctrl-C stops waiting"
+            ),
+        },
     },
     "unknown": (
         "Error: Unknown command. Available commands:"
-        " scrape, db, delete, expand, exit",
+        " scrape, refresh, retry-failed, db, export, search, import-dump,"
+        " delete, expand, graph, analyze, rollups, thread, bodies, jobs,"
+        " exit",
     ),
 }
@@ -0,0 +1,240 @@
+import heapq
+import itertools
+import logging
+from datetime import datetime, timezone
+from typing import Any, Iterator
+from .connection_utils import with_resources
+from .reddit_utils import (
+    COMMENT_CHUNK_SIZE,
+    CommentRow,
+    fingerprint,
+    score_bucket,
+)
+
+"""Utils for bulk reads that skip PRAW's object model.
+
+Listings, comment trees and morechildren are requested through the
+prawcore session of a praw.Reddit (so the shared requestor still rate
+limits and counts them) and the columns we store are projected straight
+from the JSON into the same tuples format_submission / format_comment
+produce. No Comment, Redditor or Subreddit objects are built.
+"""
+
+logger = logging.getLogger(__name__)
+
+# what PRAW asks for when it loads a submission's comments
+COMMENT_LIMIT = 2048
+COMMENT_SORT = "confidence"
+LISTING_PAGE_SIZE = 100
+# children per morechildren request (Reddit's maximum)
+MORECHILDREN_BATCH = 100
+
+
+class RawThing:
+    """Listing item backed by its JSON, with PRAW-like attribute access.
+
+    Enough for code that reads .id, .name, .created_utc or .num_comments
+    off a submission; the JSON itself is in .data.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def __getattr__(self, key: str):
+        try:
+            return self.data[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+
+def _author(data: dict) -> str:
+    # PRAW turns "[deleted]" into a None author, which we store as "None"
+    author = data.get("author")
+    return "None" if author in (None, "[deleted]") else author
+
+
+def submission_row(data: dict) -> tuple:
+    """Same tuple as tuple(format_submission(submission).values())."""
+    title, selftext = data.get("title"), data.get("selftext")
+    edited, ups = bool(data.get("edited")), data.get("ups")
+    return (
+        data.get("name"),
+        _author(data),
+        title,
+        selftext,
+        data.get("url"),
+        datetime.fromtimestamp(data.get("created_utc", 0), tz=timezone.utc),
+        edited,
+        ups,
+        str(data.get("subreddit")),
+        str(data.get("permalink")),
+        fingerprint(title, selftext, edited, score_bucket(ups)),
+    )
+
+
+def comment_row(data: dict) -> CommentRow:
+    """Same row as format_comment(comment)."""
+    body = data.get("body")
+    edited, ups = bool(data.get("edited")), data.get("ups")
+    return CommentRow(
+        data.get("name"),
+        _author(data),
+        body,
+        datetime.fromtimestamp(data.get("created_utc", 0), tz=timezone.utc),
+        edited,
+        ups,
+        data.get("parent_id"),
+        data.get("link_id"),
+        data.get("subreddit_name_prefixed"),
+        fingerprint(body, edited, score_bucket(ups)),
+    )
+
+
+def _get(reddit, path: str, params: dict | None = None) -> Any:
+    return reddit._core.request(method="GET", path=path, params=params)
+
+
+def listing(
+    reddit, path: str, limit: int | None = None, params: dict | None = None
+) -> Iterator[RawThing]:
+    """Page through a listing such as r/python/new, up to limit items.
+
+    Lazy like PRAW's ListingGenerator: the next page is only requested
+    once the previous one has been consumed.
+    """
+    params = dict(params or {})
+    after, yielded = None, 0
+    while limit is None or yielded < limit:
+        page_size = LISTING_PAGE_SIZE
+        if limit is not None:
+            page_size = min(page_size, limit - yielded)
+        data = _get(
+            reddit, path, {**params, "limit": page_size, "after": after}
+        )
+        children = data["data"]["children"]
+        for child in children:
+            yield RawThing(child["data"])
+        yielded += len(children)
+        after = data["data"].get("after")
+        if not children or after is None:
+            return
+
+
+def _walk(things: list[dict], mores: list, rows: list[tuple], order) -> None:
+    """Flatten comment JSON into rows, collecting "more" stubs."""
+    stack = list(reversed(things))
+    while stack:
+        thing = stack.pop()
+        data = thing["data"]
+        if thing["kind"] == "more":
+            # ordered like PRAW's replace_more: biggest first
+            heapq.heappush(mores, (-data.get("count", 0), next(order), data))
+            continue
+        rows.append(comment_row(data))
+        replies = data.get("replies")
+        if replies:
+            stack.extend(reversed(replies["data"]["children"]))
+
+
+def _chunks(rows: list, chunk_size: int) -> Iterator[list]:
+    """Take full chunks off the front of rows, leaving the remainder."""
+    while len(rows) >= chunk_size:
+        yield rows[:chunk_size]
+        del rows[:chunk_size]
+
+
+def iter_thread_comment_chunks(
+    reddit,
+    post_id: str,
+    limit: int | None = None,
+    threshold: int = 0,
+    chunk_size: int = COMMENT_CHUNK_SIZE,
+) -> Iterator[list[CommentRow]]:
+    """A thread's comments as format_comment rows, chunk_size at a time.
+
+    limit and threshold mean what they do for replace_more: at most
+    limit "load more" stubs are expanded (None for all), skipping those
+    hiding fewer than threshold comments. Only the stubs and the rows
+    not yet yielded are kept between requests.
+    """
+    _, comments = _get(
+        reddit,
+        f"/comments/{post_id}/",
+        {"limit": COMMENT_LIMIT, "sort": COMMENT_SORT},
+    )
+    rows: list[CommentRow] = []
+    mores: list = []
+    order = itertools.count()
+    _walk(comments["data"]["children"], mores, rows, order)
+    del comments
+    yield from _chunks(rows, chunk_size)
+    replaced = 0
+    while mores and (limit is None or replaced < limit):
+        _, _, more = heapq.heappop(mores)
+        if more.get("count", 0) < threshold:
+            continue
+        replaced += 1
+        children = more.get("children")
+        if children:
+            for start in range(0, len(children), MORECHILDREN_BATCH):
+                end = start + MORECHILDREN_BATCH
+                things = _get(
+                    reddit,
+                    "/api/morechildren/",
+                    {
+                        "api_type": "json",
+                        "link_id": f"t3_{post_id}",
+                        "children": ",".join(children[start:end]),
+                        "sort": COMMENT_SORT,
+                    },
+                )["json"]["data"]["things"]
+                # morechildren returns the subtree flat, parents first
+                _walk(things, mores, rows, order)
+                yield from _chunks(rows, chunk_size)
+        else:
+            # "continue this thread": load the parent's page instead
+            parent = more["parent_id"].split("_", 1)[1]
+            _, page = _get(
+                reddit,
+                f"/comments/{post_id}/_/{parent}/",
+                {"limit": COMMENT_LIMIT, "sort": COMMENT_SORT},
+            )
+            for child in page["data"]["children"]:
+                replies = child["data"].get("replies")
+                if replies:
+                    _walk(replies["data"]["children"], mores, rows, order)
+            yield from _chunks(rows, chunk_size)
+    if rows:
+        yield rows
+
+
+def thread_comment_rows(
+    reddit,
+    post_id: str,
+    limit: int | None = None,
+    threshold: int = 0,
+) -> list[CommentRow]:
+    """Every comment of a thread as format_comment rows, in one list."""
+    return [
+        row
+        for chunk in iter_thread_comment_chunks(
+            reddit, post_id, limit, threshold
+        )
+        for row in chunk
+    ]
+
+
+@with_resources(use_reddit=True, use_db=False)
+def get_thread_comment_chunks(
+    reddit,
+    post_id: str,
+    limit: int | None = None,
+    threshold: int = 0,
+    chunk_size: int = COMMENT_CHUNK_SIZE,
+) -> Iterator[list[CommentRow]]:
+    # errors propagate, so the caller can retry the thread
+    return iter_thread_comment_chunks(
+        reddit, post_id, limit, threshold, chunk_size
+    )
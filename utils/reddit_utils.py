@@ -1,6 +1,11 @@
 from datetime import datetime, timezone
+import hashlib
+import heapq
+import itertools
 import logging
-from typing import Any
+import math
+from typing import Any, Iterator, NamedTuple
+from praw.models import MoreComments
 from .connection_utils import with_resources
 from .console import console
 
@@ -8,6 +13,46 @@ from .console import console
 
 logger = logging.getLogger(__name__)
 
+# score buckets per doubling of |ups|: small scores are compared finely,
+# a comment going from 10,000 to 10,050 ups is not a change
+SCORE_BUCKETS_PER_DOUBLING = 2
+# formatted comments handed to the loader at a time
+COMMENT_CHUNK_SIZE = 1000
+
+
+class CommentRow(NamedTuple):
+    """One comments table row, in column order.
+
+    A tuple (no per-instance dict), so it is compact and goes straight
+    to executemany.
+    """
+
+    name: str | None
+    author: str
+    body: str | None
+    created_utc: datetime
+    edited: bool
+    ups: int | None
+    parent_id: str | None
+    submission_id: str | None
+    subreddit: str | None
+    fingerprint: int
+
+
+def score_bucket(ups: int | None) -> int:
+    if not ups:
+        return 0
+    bucket = int(math.log2(1 + abs(ups)) * SCORE_BUCKETS_PER_DOUBLING)
+    return bucket if ups > 0 else -bucket
+
+
+def fingerprint(*parts) -> int:
+    """64-bit content hash (fits a BIGINT column) of the given values."""
+    digest = hashlib.blake2b(
+        "\x1f".join(str(p) for p in parts).encode("utf-8"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
 
 def format_submission(submission: Any) -> dict[str, str | int | float | bool]:
     formatted_submission = {
@@ -24,6 +69,13 @@ def format_submission(submission: Any) -> dict[str, str | int | float | bool]:
         "subreddit": format(getattr(submission, "subreddit", None)),
         "permalink": format(getattr(submission, "permalink", None)),
     }
+    # what counts as a change when the submission is rescraped
+    formatted_submission["fingerprint"] = fingerprint(
+        formatted_submission["title"],
+        formatted_submission["selftext"],
+        formatted_submission["edited"],
+        score_bucket(formatted_submission["ups"]),
+    )
     return formatted_submission
 
 
@@ -61,7 +113,7 @@ def get_comment(reddit, comment_id: str) -> Any:
     return comment
 
 
-def format_comment(comment: Any) -> tuple:
+def format_comment(comment: Any) -> CommentRow:
     formatted_comment = (
         getattr(comment, "name", None),
         format(getattr(comment, "author", None)),
@@ -80,7 +132,11 @@ def format_comment(comment: Any) -> tuple:
         ),
         getattr(comment, "subreddit_name_prefixed", None),
     )
-    return formatted_comment
+    # what counts as a change when the comment is rescraped
+    _, _, body, _, edited, ups = formatted_comment[:6]
+    return CommentRow(
+        *formatted_comment, fingerprint(body, edited, score_bucket(ups))
+    )
 
 
 def get_comments_in_thread(
@@ -103,6 +159,69 @@ def get_comments_in_thread(
     return comments.list()
 
 
+def _forget_comments(submission: Any):
+    """Drop the submission's references to the comments loaded so far.
+
+    PRAW keeps every comment reachable from the submission (through its
+    CommentForest and _comments_by_id). We never relink the tree, so
+    clearing both lets comments be freed once they are formatted.
+    """
+    forest = getattr(submission, "_comments", None)
+    if forest is not None:
+        forest._comments = []
+    by_id = getattr(submission, "_comments_by_id", None)
+    if by_id:
+        by_id.clear()
+
+
+def iter_comments_in_thread(
+    post_id=None,
+    post_url=None,
+    limit: int | None = None,
+    threshold=0,
+    chunk_size: int = COMMENT_CHUNK_SIZE,
+) -> Iterator[list[CommentRow]]:
+    """Yield a thread's comments as formatted rows, chunk_size at a time.
+
+    Unlike get_comments_in_thread the forest is never resolved as a
+    whole: comments are formatted as they are reached and "load more"
+    stubs are expanded one at a time (biggest first, with the same limit
+    and threshold meaning as replace_more), so memory is bounded by the
+    chunk and the page being walked rather than by the thread. Errors
+    are raised rather than logged, so the thread can be retried.
+    """
+    submission = get_submission(post_id, post_url)
+    if submission is None:
+        return
+    pending = list(submission.comments)
+    _forget_comments(submission)
+    mores: list = []
+    order = itertools.count()
+    replaced = 0
+    chunk: list[CommentRow] = []
+    while True:
+        while pending:
+            item = pending.pop()
+            if isinstance(item, MoreComments):
+                heapq.heappush(mores, (-item.count, next(order), item))
+                continue
+            chunk.append(format_comment(item))
+            pending.extend(item.replies)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if not mores or (limit is not None and replaced >= limit):
+            break
+        _, _, more = heapq.heappop(mores)
+        if more.count < threshold:
+            continue
+        replaced += 1
+        pending.extend(more.comments())
+        _forget_comments(submission)
+    if chunk:
+        yield chunk
+
+
 @with_resources(use_reddit=True, use_db=False)
 def get_redditors_comments(
     reddit, user_id: str, limit: int = 100, sort: str = "new"
@@ -169,3 +288,58 @@ def get_redditors_from_subreddit(
         return []
     redditors = [format_submission(s)["author"] for s in submissions]
     return redditors
+
+
+# PRAW requests listings 100 items at a time
+LISTING_PAGE_SIZE = 100
+
+
+class ListingReader:
+    """Iterate a newest-first listing one page at a time.
+
+    watermark is the (fullname, created_utc) of the newest item stored by
+    a previous run. Reading stops at the first item at or before it, so
+    PRAW never requests the pages after it. The newest item seen is kept
+    to advance the watermark afterwards.
+    """
+
+    def __init__(
+        self,
+        listing,
+        watermark: tuple[str, datetime] | None = None,
+        page_size: int = LISTING_PAGE_SIZE,
+    ):
+        self.listing = listing
+        self.watermark = watermark
+        self.page_size = page_size
+        self.pages = 0
+        self.items = 0
+        self.hit_watermark = False
+        self.newest: tuple[str, datetime] | None = None
+
+    def _seen(self, name: str, created_utc: datetime) -> bool:
+        if self.watermark is None:
+            return False
+        newest_name, newest_created = self.watermark
+        return name == newest_name or created_utc < newest_created
+
+    def __iter__(self):
+        page = []
+        for item in self.listing:
+            created_utc = datetime.fromtimestamp(
+                item.created_utc, tz=timezone.utc
+            )
+            if self._seen(item.name, created_utc):
+                self.hit_watermark = True
+                break
+            if self.newest is None or created_utc > self.newest[1]:
+                self.newest = (item.name, created_utc)
+            page.append(item)
+            self.items += 1
+            if len(page) == self.page_size:
+                self.pages += 1
+                yield page
+                page = []
+        if page:
+            self.pages += 1
+            yield page
@@ -0,0 +1,102 @@
+import logging
+import random
+import time
+from typing import Any, Callable
+import prawcore
+import psycopg
+import requests
+from .progress import current_bus
+
+"""Retrying work lost to rate limits and network errors.
+
+A task (one thread's comments, one redditor) that fails with a transient
+error is retried in the same run after an exponentially growing delay
+with full jitter, so workers that hit a 429 together don't all come
+back at once. Tasks that still fail are written to failed_tasks by the
+caller (db_utils.record_failed_task) and picked up by `retry-failed`.
+"""
+
+logger = logging.getLogger(__name__)
+
+# tries per task within a run, the first included
+MAX_ATTEMPTS = 4
+# seconds before the first retry, doubling per attempt up to the cap
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 120.0
+
+# errors worth trying again, anything else (404, 403, bugs) fails at once
+TRANSIENT_ERRORS = (
+    prawcore.exceptions.TooManyRequests,
+    prawcore.exceptions.ServerError,
+    prawcore.exceptions.RequestException,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    psycopg.OperationalError,
+)
+
+
+class TaskFailed(Exception):
+    """A task gave up: error is the last exception, after attempts tries."""
+
+    def __init__(self, error: BaseException, attempts: int):
+        super().__init__(f"{error.__class__.__name__}: {error}")
+        self.error = error
+        self.attempts = attempts
+
+
+def is_transient(error: BaseException) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt: int, error: BaseException | None = None) -> float:
+    """Seconds to wait before retry number attempt (1 for the first).
+
+    Full jitter: uniform between 0 and the exponential backoff. A 429's
+    Retry-After header is honoured as a lower bound.
+    """
+    delay = random.uniform(
+        0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1))
+    )
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def retry_call(
+    func: Callable,
+    *args,
+    attempts: int = MAX_ATTEMPTS,
+    job: Any = None,
+    **kwargs,
+) -> Any:
+    """func(*args, **kwargs), retrying transient errors with backoff.
+
+    Raises TaskFailed once the error isn't transient, attempts are used
+    up or job is cancelled while waiting.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts or not is_transient(e):
+                raise TaskFailed(e, attempt) from e
+            delay = backoff_delay(attempt, e)
+            logger.warning(
+                "Attempt %d of %s failed (%s: %s), retrying in %.1fs",
+                attempt,
+                getattr(func, "__name__", func),
+                e.__class__.__name__,
+                e,
+                delay,
+            )
+            if bus := current_bus():
+                bus.add(retries=1)
+                bus.worker(f"{e.__class__.__name__}, retrying in {delay:.0f}s")
+            if job is None:
+                time.sleep(delay)
+            elif job.cancel_event.wait(delay):
+                raise TaskFailed(e, attempt) from e
@@ -0,0 +1,187 @@
+import logging
+import time
+import pandas as pd
+from psycopg import sql
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for the per-subreddit hourly and daily rollups.
+
+subreddit_rollups holds, per subreddit and hour or day, the number of
+comments and submissions, distinct authors and score sums. Triggers on
+comments and submissions (see schema.sql) keep it current on every
+insert and score update, whichever loader wrote the rows, so dashboard
+numbers are a lookup instead of a GROUP BY over every comment. The
+triggers are statement-level: a batched insert or COPY adds one delta
+per bucket touched, not one per row.
+
+backfill rebuilds both tables from scratch, for databases that had rows
+before the triggers existed or after rows were deleted.
+"""
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ("hour", "day")
+# comments store r/name, submissions the bare name
+SUBREDDIT = sql.SQL(
+    "CASE WHEN subreddit LIKE 'r/%' THEN subreddit "
+    "ELSE 'r/' || subreddit END"
+)
+ACTIVITY = sql.SQL(
+    """
+    SELECT TRUE AS is_comment, {subreddit} AS subreddit, created_utc,
+        author, coalesce(ups, 0) AS ups
+    FROM comments
+    UNION ALL
+    SELECT FALSE, {subreddit}, created_utc, author, coalesce(ups, 0)
+    FROM submissions
+    """
+).format(subreddit=SUBREDDIT)
+# deleted authors are stored as "None" (format(None) in format_comment,
+# raw_utils on purpose); "[deleted]" is excluded too in case one slips in
+UNCOUNTED_AUTHORS = ("None", "[deleted]")
+COUNTED_AUTHOR = sql.SQL("author IS NOT NULL AND author NOT IN ({})").format(
+    sql.SQL(", ").join(map(sql.Literal, UNCOUNTED_AUTHORS))
+)
+COLUMNS = (
+    "comments",
+    "submissions",
+    "authors",
+    "comment_score",
+    "submission_score",
+)
+
+
+def rebuild_rollups(conn) -> int:
+    """Recompute both rollup tables. Returns the rollup rows written.
+
+    Holds the rollup tables locked meanwhile, so inserts made during the
+    rebuild wait and add their deltas on top of it.
+    """
+    rows = 0
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("TRUNCATE subreddit_rollups, subreddit_rollup_authors;")
+        for grain in GRAINS:
+            bucket = sql.SQL("date_trunc({}, created_utc, 'UTC')").format(
+                sql.Literal(grain)
+            )
+            cur.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO subreddit_rollup_authors
+                        (grain, subreddit, bucket, author)
+                    SELECT DISTINCT {grain}, subreddit, {bucket}, author
+                    FROM ({activity}) a
+                    WHERE {counted};
+                    """
+                ).format(
+                    grain=sql.Literal(grain),
+                    bucket=bucket,
+                    activity=ACTIVITY,
+                    counted=COUNTED_AUTHOR,
+                )
+            )
+            cur.execute(
+                sql.SQL(
+                    """
+                    INSERT INTO subreddit_rollups (grain, subreddit, bucket,
+                        comments, submissions, authors, comment_score,
+                        submission_score)
+                    SELECT {grain}, subreddit, {bucket},
+                        count(*) FILTER (WHERE is_comment),
+                        count(*) FILTER (WHERE NOT is_comment),
+                        count(DISTINCT author) FILTER (WHERE {counted}),
+                        coalesce(sum(ups) FILTER (WHERE is_comment), 0),
+                        coalesce(sum(ups) FILTER (WHERE NOT is_comment), 0)
+                    FROM ({activity}) a
+                    GROUP BY 2, 3;
+                    """
+                ).format(
+                    grain=sql.Literal(grain),
+                    bucket=bucket,
+                    activity=ACTIVITY,
+                    counted=COUNTED_AUTHOR,
+                )
+            )
+            rows += cur.rowcount
+    return rows
+
+
+@with_resources(use_db=True, use_reddit=False)
+def backfill(conn) -> int:
+    return rebuild_rollups(conn)
+
+
+@with_resources(use_db=True, use_reddit=False)
+def get_rollups(
+    conn,
+    grain: str = "day",
+    subreddit: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> pd.DataFrame:
+    """Rollup rows of one grain, oldest bucket first."""
+    if grain not in GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+    where = ["grain = %s"]
+    params: list = [grain]
+    if subreddit:
+        where.append("lower(subreddit) = %s")
+        params.append(f"r/{subreddit.lower().removeprefix('r/')}")
+    if since:
+        where.append("bucket >= %s::timestamptz")
+        params.append(since)
+    if until:
+        where.append("bucket < %s::timestamptz")
+        params.append(until)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT subreddit, bucket, {', '.join(COLUMNS)} "
+            f"FROM subreddit_rollups WHERE {' AND '.join(where)} "
+            "ORDER BY bucket, subreddit;",
+            params,
+        )
+        rows = cur.fetchall()
+    return pd.DataFrame(rows, columns=["subreddit", "bucket", *COLUMNS])
+
+
+@with_resources(use_db=True, use_reddit=False)
+def subreddit_totals(conn) -> pd.DataFrame:
+    """Comments, submissions and scores per subreddit, from daily rows.
+
+    Distinct authors don't add up across days, so they are left out.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT subreddit, sum(comments), sum(submissions),
+                sum(comment_score), sum(submission_score)
+            FROM subreddit_rollups WHERE grain = 'day'
+            GROUP BY subreddit ORDER BY 2 DESC;
+            """
+        )
+        rows = cur.fetchall()
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "subreddit",
+            "comments",
+            "submissions",
+            "comment_score",
+            "submission_score",
+        ],
+    ).astype({column: "int64" for column in COLUMNS if column != "authors"})
+
+
+def rollups_backfill(**kwargs):
+    """Prompt command: rebuild the rollups from the stored rows."""
+    logger.info("Backfilling subreddit rollups")
+    start_time = time.perf_counter()
+    with console.status("Rebuilding rollups...", spinner="dots"):
+        rows = backfill()
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Backfilled {rows} rollup rows in {elapsed:.2f}s")
+    console.print(
+        f"Rebuilt [green]{rows:,}[/green] hourly and daily rollup rows "
+        f"in {elapsed:.2f}s."
+    )
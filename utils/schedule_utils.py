@@ -0,0 +1,100 @@
+import math
+from datetime import datetime, timedelta
+
+"""Utils for deciding when a thread is worth rescraping.
+
+Comment activity on a thread is modelled as decaying exponentially with
+the thread's age (half-life HALF_LIFE_HOURS). Given the number of
+comments seen at the last scrape and how old the thread was then, the
+model gives the expected number of new comments at any later time, and
+so when the thread will have gathered TARGET_NEW_COMMENTS more: that is
+its next_due. Between scrapes the same estimate ranks due threads.
+"""
+
+HALF_LIFE_HOURS = 8.0
+# new comments a rescrape should expect to find
+TARGET_NEW_COMMENTS = 10
+MIN_INTERVAL = timedelta(hours=1)
+# even dead threads are looked at again eventually (edits, scores)
+MAX_INTERVAL = timedelta(days=30)
+# comments returned with the submission, and per morechildren request
+FIRST_PAGE_COMMENTS = 200
+MORE_COMMENTS_PER_REQUEST = 100
+
+
+def _hours(delta: timedelta) -> float:
+    return max(delta.total_seconds() / 3600, 0.0)
+
+
+def _remaining(age_hours: float) -> float:
+    """Share of a thread's lifetime comments still to come at age_hours."""
+    return 2 ** (-age_hours / HALF_LIFE_HOURS)
+
+
+def expected_new_comments(
+    created_utc: datetime,
+    scraped_at: datetime,
+    num_comments: int | None,
+    now: datetime,
+) -> float:
+    """Comments expected to have arrived between scraped_at and now."""
+    seen = _remaining(_hours(scraped_at - created_utc))
+    left = _remaining(_hours(now - created_utc))
+    # +1 so a thread scraped with no comments yet isn't written off
+    return ((num_comments or 0) + 1) * (seen - left) / max(1 - seen, 1e-9)
+
+
+def next_due(
+    created_utc: datetime, scraped_at: datetime, num_comments: int | None
+) -> datetime:
+    """When the thread is expected to have TARGET_NEW_COMMENTS more."""
+    seen = _remaining(_hours(scraped_at - created_utc))
+    left = seen - TARGET_NEW_COMMENTS * (1 - seen) / ((num_comments or 0) + 1)
+    if left <= 0:
+        # the model says the thread won't get that many more
+        return scraped_at + MAX_INTERVAL
+    due_age = -HALF_LIFE_HOURS * math.log2(left)
+    interval = timedelta(hours=due_age - _hours(scraped_at - created_utc))
+    return scraped_at + min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+
+
+def estimated_requests(num_comments: int | None) -> int:
+    """API requests a full rescrape of the thread will take."""
+    extra = max((num_comments or 0) - FIRST_PAGE_COMMENTS, 0)
+    return 1 + math.ceil(extra / MORE_COMMENTS_PER_REQUEST)
+
+
+def plan_refresh(
+    rows: list[tuple], budget: int, now: datetime
+) -> tuple[list[tuple], int, float]:
+    """Pick due threads to rescrape, highest expected change first.
+
+    rows are (name, created_utc, last_scraped_at, num_comments). Threads
+    never scraped by the scheduler (no last_scraped_at) have no estimate
+    and come after the rest, newest first. Threads that don't fit in the
+    remaining budget are skipped in favour of cheaper ones further down.
+    Returns (planned rows, estimated requests, expected new comments).
+    """
+    tracked, untracked = [], []
+    for row in rows:
+        _, created_utc, scraped_at, num_comments = row
+        if scraped_at is None:
+            untracked.append(row)
+        else:
+            gain = expected_new_comments(
+                created_utc, scraped_at, num_comments, now
+            )
+            tracked.append((gain, row))
+    tracked.sort(key=lambda t: t[0], reverse=True)
+    untracked.sort(key=lambda row: row[1], reverse=True)
+    ranked = tracked + [(0.0, row) for row in untracked]
+
+    planned, cost, gain = [], 0, 0.0
+    for row_gain, row in ranked:
+        row_cost = estimated_requests(row[3])
+        if cost + row_cost > budget:
+            continue
+        planned.append(row)
+        cost += row_cost
+        gain += row_gain
+    return planned, cost, gain
@@ -5,20 +5,36 @@ from .reddit_utils import (
     format_submission,
     get_comment,
     format_comment,
-    get_comments_in_thread,
+    iter_comments_in_thread,
     get_redditors_comments,
     get_redditors_from_subreddit,
+    ListingReader,
 )
 from .connection_utils import with_resources
+from .body_utils import SHARE_BODIES, repeated_bodies
 from .db_utils import (
     insert_submission,
     insert_comment,
-    batch_insert_comments,
+    clear_failed_task,
+    get_failed_tasks,
+    get_redditor_watermark,
+    queue_comments,
+    queue_redditor_watermark,
+    record_failed_task,
 )
 import time
-from rich.progress import Progress, BarColumn, TimeRemainingColumn, TextColumn
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from .state import subreddit_progress
+from datetime import datetime, timedelta, timezone
+from .jobs import current_job, map_unordered, status
+from .progress import ProgressBus, current_bus
+from .raw_utils import (
+    get_thread_comment_chunks,
+    listing as raw_listing,
+    submission_row,
+)
+from .retry_utils import TaskFailed, retry_call
+from .schedule_utils import next_due, plan_refresh
+from .thread_utils import TreePlacer
+from .writer import on_failure, writer
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +62,7 @@ def scrape_submission(
     logger.info("transforming submission data...")
     submission = format_submission(submission)
     logger.info("loading submission data into DB...")
-    res = insert_submission(submission)
+    res = insert_submission(submission, overwrite=overwrite)
     if res:
         prefix = ""
         if index is not None and total is not None:
@@ -70,7 +86,7 @@ def scrape_comment(comment_id: str, overwrite: bool = False, **kwargs):
     logger.info("transforming comment data...")
     formatted_comment = format_comment(comment)
     logger.info("loading comment data into DB...")
-    res = insert_comment(formatted_comment)
+    res = insert_comment(formatted_comment, overwrite=overwrite)
     if res:
         console.print(f"Inserted/updated comment {res[0]}")
     else:
@@ -86,129 +102,179 @@ def scrape_comments_in_thread(
     limit: int | None = None,
     threshold=0,
     overwrite: bool = False,
+    raw: bool = False,
     **kwargs,
 ):
     """Scrape all comments in a thread and insert/update into DB.
 
-    If overwrite=True, existing comments will be updated.
+    Existing comments are rewritten only when their fingerprint changed,
+    or they aren't placed in the thread yet, whether or not overwrite is
+    set. raw reads the thread as JSON through raw_utils instead of PRAW
+    objects (post_id only). Returns (new, updated, unchanged).
     """
     logger.info(
         f"Scraping comments in thread {post_id} / {post_url} "
-        f"| overwrite={overwrite}"
+        f"| overwrite={overwrite} | raw={raw}"
     )
     logger.info("extracting comments data...")
-    comments = get_comments_in_thread(
-        post_id=post_id,
-        post_url=post_url,
-        limit=limit,
-        threshold=threshold,
-    )
-    total = len(comments)
-    logger.info(f"transforming {total} comments data...")
+    # the thread is walked and loaded a chunk at a time, so only one
+    # chunk of formatted rows is held however big the thread is
+    if raw and post_id:
+        chunks = get_thread_comment_chunks(
+            post_id, limit=limit, threshold=threshold
+        )
+    else:
+        chunks = iter_comments_in_thread(
+            post_id=post_id,
+            post_url=post_url,
+            limit=limit,
+            threshold=threshold,
+        )
     cols = (
         "(name, author, body, created_utc, edited, ups, "
-        "parent_id, submission_id, subreddit)"
+        "parent_id, submission_id, subreddit, fingerprint, "
+        "depth, root_id, path)"
     )
-    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s"
+    placeholders = "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s"
 
     logger.info("loading comments data into DB...")
-    # logic to see if comments need updating
+    total = new = updated = 0
+    # rows are committed by the writer after this returns
+    futures = []
+    # depth, root and path of every comment seen, so replies in later
+    # chunks are placed under their parents
+    placer = TreePlacer()
     with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT name, COALESCE(edited, FALSE), COALESCE(ups, 0)
-            FROM comments
-            WHERE submission_id = %s;
-            """,
-            ("t3_" + str(post_id),),
-        )
-        existing = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
-
-        formatted_comments = list(map(format_comment, comments))
-
-        new_rows = []
-        changed_rows = []
-
-        for row in formatted_comments:
-            (
-                name,
-                author,
-                body,
-                created_utc,
-                edited,
-                ups,
-                parent_id,
-                submission_id,
-                subreddit,
-            ) = row
-
-            # set defaults for comparison
-            prev = existing.get(name)
-            prev_edited = False
-            prev_ups = 0
-            if prev is not None:
-                prev_edited, prev_ups = prev
-
-            if name not in existing:
-                new_rows.append(row)
-            else:
-                if overwrite:
-                    changed_rows.append(row)
-                else:
-                    # update if edited changed from False to True,
-                    # or ups changed by >=5
-                    if bool(edited) and not bool(prev_edited):
-                        changed_rows.append(row)
-                    elif ups is not None and abs(ups - prev_ups) >= 5:
-                        changed_rows.append(row)
-
-        # insert new ones
-        if new_rows:
-            cur.executemany(
-                f"""
-                INSERT INTO comments {cols}
-                VALUES ({placeholders})
-                ON CONFLICT (name) DO NOTHING
+        for chunk in chunks:
+            total += len(chunk)
+            pairs = [(row.name, row.parent_id) for row in chunk]
+            missing = placer.missing_parents(pairs)
+            if missing:
+                # parents stored by an earlier, partial scrape
+                cur.execute(
+                    """
+                    SELECT name, depth, root_id, path
+                    FROM comments
+                    WHERE name = ANY(%s) AND path IS NOT NULL;
+                    """,
+                    (list(missing),),
+                )
+                placer.add(cur.fetchall())
+            trees = placer.place(pairs)
+            # only rows whose fingerprint (body, edited, score bucket)
+            # differs from the stored one are written
+            cur.execute(
+                """
+                SELECT name, fingerprint, path
+                FROM comments
+                WHERE name = ANY(%s);
                 """,
-                new_rows,
+                ([row.name for row in chunk],),
             )
+            existing = {name: (fp, path) for name, fp, path in cur.fetchall()}
+
+            new_rows = []
+            changed_rows = []
+
+            for row, tree in zip(chunk, trees):
+                if row.name not in existing:
+                    new_rows.append((*row, *tree))
+                    continue
+                stored_fingerprint, stored_path = existing[row.name]
+                # rows stored before fingerprints existed have NULL, and
+                # rows loaded without their thread have no path
+                if stored_fingerprint != row.fingerprint or (
+                    tree.path is not None and stored_path != tree.path
+                ):
+                    changed_rows.append((*row, *tree))
 
-        # update changed ones
-        if changed_rows:
-            # reorder params so name is last for WHERE clause
-            update_params = [
-                (
-                    c[1],  # author
-                    c[2],  # body
-                    c[3],  # created_utc
-                    c[4],  # edited
-                    c[5],  # ups
-                    c[6],  # parent_id
-                    c[7],  # submission_id
-                    c[8],  # subreddit
-                    c[0],  # name
+            if bus := current_bus():
+                bus.worker(
+                    f"{post_id} {total} comments, writing "
+                    f"{len(new_rows) + len(changed_rows)} rows"
                 )
-                for c in changed_rows
-            ]
-            cur.executemany(
-                """
-                UPDATE comments
-                SET author=%s, body=%s, created_utc=%s,
-                    edited=%s, ups=%s, parent_id=%s,
-                    submission_id=%s, subreddit=%s
-                WHERE name=%s;
-                """,
-                update_params,
+
+            # texts repeated in the chunk are stored once (body_utils)
+            shared = repeated_bodies(
+                row[2] for row in (*new_rows, *changed_rows)
             )
+            if shared:
+                futures.append(writer().put(SHARE_BODIES, [(shared,)]))
 
-    # commit if necessary
-    if not conn.autocommit:
-        conn.commit()
-    return (
-        len(new_rows),
-        len(changed_rows),
-        total - len(changed_rows) - len(new_rows),
-    )
+            # queued for the shared writer, which commits them in
+            # batches together with the other workers' rows
+            # insert new ones
+            if new_rows:
+                futures.append(
+                    writer().put(
+                        f"""
+                        INSERT INTO comments {cols}
+                        VALUES ({placeholders})
+                        ON CONFLICT (name) DO NOTHING
+                        """,
+                        new_rows,
+                    )
+                )
+
+            # update changed ones
+            if changed_rows:
+                # reorder params so name is last for WHERE clause
+                update_params = [c[1:] + c[:1] for c in changed_rows]
+                futures.append(
+                    writer().put(
+                        """
+                        UPDATE comments
+                        SET author=%s, body=%s, created_utc=%s,
+                            edited=%s, ups=%s, parent_id=%s,
+                            submission_id=%s, subreddit=%s,
+                            fingerprint=%s, depth=%s, root_id=%s, path=%s
+                        WHERE name=%s;
+                        """,
+                        update_params,
+                    )
+                )
+            new += len(new_rows)
+            updated += len(changed_rows)
+        logger.info(f"loaded {total} comments")
+
+        # schedule the next rescrape of this thread
+        submission_name = "t3_" + str(post_id)
+        scraped_at = datetime.now(timezone.utc)
+        cur.execute(
+            "SELECT created_utc FROM submissions WHERE name = %s;",
+            (submission_name,),
+        )
+        row = cur.fetchone()
+        if row is not None:
+            futures.append(
+                writer().put(
+                    """
+                    UPDATE submissions
+                    SET last_scraped_at=%s, num_comments=%s, next_due=%s
+                    WHERE name=%s;
+                    """,
+                    [
+                        (
+                            scraped_at,
+                            total,
+                            next_due(row[0], scraped_at, total),
+                            submission_name,
+                        )
+                    ],
+                )
+            )
+
+    if post_id:
+        params = {"overwrite": overwrite, "raw": raw}
+
+        def record_write_failure(error: BaseException):
+            # rows the writer couldn't commit, even one statement at a
+            # time: rescraping the thread writes them again
+            logger.error(f"Rows of thread {post_id} were not written: {error}")
+            record_failed_task("thread", str(post_id), error, 1, params)
+
+        on_failure(futures, record_write_failure)
+    return new, updated, total - updated - new
 
 
 @with_resources(use_reddit=False, use_db=True)
@@ -220,13 +286,14 @@ def scrape_entire_thread(
     threshold=0,
     overwrite: bool = False,
     index: int | None = None,
+    raw: bool = False,
     **kwargs,
 ):
     logger.info(
         f"Scraping entire thread {post_id} / {post_url} | "
         f"overwrite={overwrite}"
     )
-    with console.status("Scraping submission...", spinner="dots"):
+    with status("Scraping submission..."):
         scrape_submission(
             post_id=post_id,
             post_url=post_url,
@@ -234,12 +301,63 @@ def scrape_entire_thread(
             index=index,
             total=limit,
         )
-    with console.status("Scraping comments...", spinner="dots"):
+    with status("Scraping comments..."):
         scrape_comments_in_thread(
             post_id=post_id,
             post_url=post_url,
             threshold=threshold,
             overwrite=overwrite,
+            raw=raw,
+        )
+        writer().flush()
+
+
+# listings ordered newest first, where a watermark can end the read
+WATERMARK_SORTS = ("new",)
+
+
+def update_failed_tasks(update, *args) -> None:
+    """Call record_failed_task or clear_failed_task, logging its errors.
+
+    db_connection raises DB errors, and the bookkeeping for one task
+    failing shouldn't stop the scrape it is part of.
+    """
+    try:
+        update(*args)
+    except Exception as e:
+        logger.error(f"Could not update failed_tasks for {args[:2]}: {e}")
+
+
+def get_listing_watermark(conn, subreddit_name: str, sort: str):
+    """(fullname, created_utc) of the newest listing item stored, or None."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT newest_name, newest_created_utc FROM listing_watermarks
+            WHERE subreddit = %s AND sort = %s;
+            """,
+            (subreddit_name.lower(), sort),
+        )
+        row = cur.fetchone()
+    return tuple(row) if row else None
+
+
+def set_listing_watermark(conn, subreddit_name: str, sort: str, newest):
+    """Advance the watermark, never moving it back."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO listing_watermarks
+                (subreddit, sort, newest_name, newest_created_utc)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (subreddit, sort) DO UPDATE SET
+                newest_name = EXCLUDED.newest_name,
+                newest_created_utc = EXCLUDED.newest_created_utc,
+                updated_at = now()
+            WHERE listing_watermarks.newest_created_utc
+                < EXCLUDED.newest_created_utc;
+            """,
+            (subreddit_name.lower(), sort, *newest),
         )
 
 
@@ -256,16 +374,30 @@ def scrape_subreddit(
     comments_only: bool = False,
     max_workers: int = 5,  # set to respect rate limits
     skip_existing: bool = False,
+    quiet: bool = False,
+    full: bool = False,
+    raw: bool = False,
     **kwargs,
 ):
-    """Scrape submissions and comments from a subreddit."""
+    """Scrape submissions and comments from a subreddit.
+
+    With sort=new the listing is read only down to the newest submission
+    stored by the previous run (its watermark), unless overwrite or full
+    is set. raw reads the listing and comment trees as JSON through
+    raw_utils instead of building PRAW objects. Progress is shown in a
+    single live display; quiet prints only the final summary.
+    """
     logger.info(
         f"Scraping subreddit {subreddit_name} | sort={sort} | limit={limit} "
         f"| overwrite={overwrite} | subs_only={subs_only} | "
         f"comments_only={comments_only} | max_workers={max_workers}"
-        f" | skip_existing={skip_existing}"
+        f" | skip_existing={skip_existing} | full={full} | raw={raw}"
     )
     start_time = time.perf_counter()
+    job = current_job()
+    bus = ProgressBus(f"r/{subreddit_name}")
+    if job is not None:
+        job.bus = bus
     logger.info(f"extracting submissions from r/{subreddit_name}...")
     sub = reddit.subreddit(subreddit_name)
     sorter = sort.lower()
@@ -276,38 +408,62 @@ def scrape_subreddit(
         "rising": sub.rising,
         "controversial": sub.controversial,
     }
-    iterator = fetchers.get(sorter, sub.new)(limit=limit)
-    with console.status(
-        f"Fetching submissions from r/{subreddit_name}...", spinner="dots"
-    ):
-        submissions = list(iterator)
-    if not submissions:
-        console.print("No submissions found.")
-        return
+    if raw:
+        if sorter not in fetchers:
+            sorter = "new"
+        # top and controversial default to all time, as in PRAW
+        params = {"t": "all"} if sorter in ("top", "controversial") else {}
+        iterator = raw_listing(
+            reddit, f"/r/{subreddit_name}/{sorter}", limit, params
+        )
+    else:
+        iterator = fetchers.get(sorter, sub.new)(limit=limit)
+    watermark = None
+    if sorter in WATERMARK_SORTS and not (overwrite or full):
+        watermark = get_listing_watermark(conn, subreddit_name, sorter)
+    reader = ListingReader(iterator, watermark)
+    submissions = []
     skipped_count = 0
-    if skip_existing:
-        # filter out existing submissions
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT name FROM submissions
-                WHERE name = ANY(%s);
-                """,
-                ([s.name for s in submissions],),
-            )
-            existing = {r[0] for r in cur.fetchall()}
-        before_count = len(submissions)
-        submissions = [s for s in submissions if s.name not in existing]
-        skipped_count = before_count - len(submissions)
-        if skipped_count > 0:
-            console.print(f"Skipped {skipped_count} existing submissions.")
+    with status(
+        f"Fetching submissions from r/{subreddit_name}..."
+    ), bus.bind(), conn.cursor() as cur:
+        for page in reader:
+            if skip_existing:
+                # one lookup per listing page rather than one per run
+                cur.execute(
+                    """
+                    SELECT name FROM submissions
+                    WHERE name = ANY(%s);
+                    """,
+                    ([s.name for s in page],),
+                )
+                existing = {r[0] for r in cur.fetchall()}
+                skipped_count += len(existing)
+                page = [s for s in page if s.name not in existing]
+            submissions.extend(page)
+    if reader.hit_watermark and reader.items:
+        console.print(
+            f"Stopped at the last run's newest submission after "
+            f"{reader.items} new submissions ({reader.pages} pages)."
+        )
+    if skipped_count > 0:
+        console.print(f"Skipped {skipped_count} existing submissions.")
+    if reader.items == 0:
+        if reader.hit_watermark:
+            console.print("No new submissions since the last run.")
+        else:
+            console.print("No submissions found.")
+        return
 
     # insert formatted submissions batch
     if not comments_only:
         logger.info("transforming submissions data...")
-        formatted_rows = [
-            tuple(format_submission(s).values()) for s in submissions
-        ]
+        if raw:
+            formatted_rows = [submission_row(s.data) for s in submissions]
+        else:
+            formatted_rows = [
+                tuple(format_submission(s).values()) for s in submissions
+            ]
         cols = [
             "name",
             "author",
@@ -319,6 +475,7 @@ def scrape_subreddit(
             "ups",
             "subreddit",
             "permalink",
+            "fingerprint",
         ]
         placeholders = ", ".join(["%s"] * len(cols))
 
@@ -327,7 +484,10 @@ def scrape_subreddit(
         else:
             conflict_clause = (
                 "ON CONFLICT (name) DO UPDATE SET "
-                "author=EXCLUDED.author, title=EXCLUDED.title"
+                + ", ".join(f"{c}=EXCLUDED.{c}" for c in cols[1:])
+                # unchanged submissions are not rewritten
+                + "\nWHERE submissions.fingerprint IS DISTINCT FROM "
+                "EXCLUDED.fingerprint"
             )
 
         # build SQL statement in smaller parts to avoid long lines
@@ -339,9 +499,13 @@ def scrape_subreddit(
         logger.info("loading submissions data into DB...")
         with conn.cursor() as cur:
             cur.executemany(sql_stmt, formatted_rows)
+            written = cur.rowcount
         conn.commit()
+        bus.add(rows=written)
 
-        console.print(f"Inserted {len(submissions)} submissions.")
+        console.print(
+            f"Inserted/updated {written} of {len(submissions)} submissions."
+        )
 
     else:
         console.print("Skipping submission insertion as (comments only mode).")
@@ -365,66 +529,91 @@ def scrape_subreddit(
             Always return a tuple (info_tuple, err) where info_tuple is
             (new, updated, skipped, submission_id).
             """
+            bus.worker(f"{submission.id} fetching comments")
+            params = {"overwrite": overwrite, "raw": raw}
             try:
-                new, updated, skipped = scrape_comments_in_thread(
-                    submission.id, overwrite=overwrite
+                # transient errors (429s, timeouts) are retried in-run
+                new, updated, skipped = retry_call(
+                    scrape_comments_in_thread, submission.id, job=job, **params
+                )
+                bus.add(
+                    items=1,
+                    rows=new + updated,
+                    comments=new + updated + skipped,
+                    unchanged=skipped,
                 )
                 return (new, updated, skipped, submission.id), None
-            except Exception as e:
+            except TaskFailed as e:
                 logger.error(
                     f"Error scraping comments for submission "
-                    f"{submission.id}: {e}"
+                    f"{submission.id} after {e.attempts} attempts: {e}"
+                )
+                update_failed_tasks(
+                    record_failed_task,
+                    "thread",
+                    submission.id,
+                    e.error,
+                    e.attempts,
+                    params,
                 )
+                bus.add(items=1, errors=1)
                 return (0, 0, 0, submission.id), str(e)
 
-        # progress state for toolbar
-        subreddit_progress.update(
-            {
-                "enabled": True,
-                "current": 0,
-                "total": len(submissions),
-            }
+        bus.expect(
+            items=len(submissions),
+            comments=sum(
+                getattr(s, "num_comments", 0) or 0 for s in submissions
+            ),
         )
+        if job is not None:
+            job.progress(0, len(submissions))
 
-        # rich progress bar for main scraping loop
-        with Progress(
-            "Scraping threads...",
-            BarColumn(),
-            TextColumn("{task.completed}/{task.total}"),
-            TimeRemainingColumn(elapsed_when_finished=True),
-            console=console,
-        ) as progress:
-            task = progress.add_task("comments", total=len(submissions))
-
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(scrape_one, s): s.id for s in submissions
-                }
-                for future in as_completed(futures):
-                    info, err = future.result()
-                    # advance the rich progress bar and shared state
-                    progress.advance(task)
-                    subreddit_progress["current"] += 1
-
-                    if err:
-                        total_errors += 1
+        # one live display for all workers (background jobs report
+        # through the prompt toolbar instead)
+        with bus.live(quiet=quiet or job is not None):
+            # threads run on the worker pool shared with other jobs
+            for done, (_, future) in enumerate(
+                map_unordered(
+                    bus.track(scrape_one), submissions, max_workers, job
+                ),
+                start=1,
+            ):
+                info, err = future.result()
+                if job is not None:
+                    job.progress(done)
+                if err:
+                    total_errors += 1
+                    if not quiet:
                         console.print(
                             f"[red]Error scraping {info[3]}: {err}[/red]"
                         )
-                    else:
-                        console.print(
-                            f"[green]✔ {info[3]} done[/green] "
-                            f"{info[0]} new, {info[1]} updated, "
-                            f"{info[2]} skipped"
-                        )
-                        total_new += info[0]
-                        total_updated += info[1]
-                        total_skipped += info[2]
-                        submissions_scraped += 1
-
-        # disable the toolbar progress after scraping finishes
-        subreddit_progress["enabled"] = False
+                else:
+                    total_new += info[0]
+                    total_updated += info[1]
+                    total_skipped += info[2]
+                    submissions_scraped += 1
 
+    # the summary counts rows the writer has committed
+    writer().flush()
+    # only advance the watermark once both submissions and comments were
+    # scraped (a later full run would otherwise stop before threads whose
+    # comments were never fetched), and only if everything newer than the
+    # old one was read, otherwise --limit would leave a gap behind it.
+    # Threads that failed are in failed_tasks for retry-failed.
+    covered = (
+        watermark is None
+        or reader.hit_watermark
+        or limit is None
+        or reader.items < limit
+    )
+    if (
+        sorter in WATERMARK_SORTS
+        and not (subs_only or comments_only)
+        and covered
+        and reader.newest
+    ):
+        set_listing_watermark(conn, subreddit_name, sorter, reader.newest)
+        conn.commit()
     elapsed = time.perf_counter() - start_time
     total_ms = int(elapsed * 1000)
     hh = total_ms // 3600000
@@ -439,8 +628,15 @@ def scrape_subreddit(
         " \nComments: "
         f"[green]{total_new} new[/green], "
         f"[yellow]{total_updated} updated[/yellow], "
-        f"[red]{total_skipped} skipped[/red]"
+        f"[red]{total_skipped} unchanged[/red]"
     )
+    existing_rows = total_updated + total_skipped
+    if existing_rows:
+        # rows the fingerprint check kept from being rewritten
+        comment_summary += (
+            f" ({100 * total_skipped / existing_rows:.0f}% of existing rows "
+            "not rewritten)"
+        )
 
     if total_errors > 0:
         error_summary = f"[red]{total_errors} errors[/red]"
@@ -456,47 +652,320 @@ def scrape_subreddit(
         + "\nSubmissions: "
         + f"[green]{submissions_scraped} scraped[/green], "
         + f"[red]{skipped_count} skipped[/red]."
-        + (comment_summary if submissions_scraped > 0 else ""),
+        + (comment_summary if submissions_scraped > 0 else "")
+        + "\nThroughput: "
+        + bus.summary(),
         markup=True,
     )
 
 
-# TODO stop duplicate redditor scraping
+DEFAULT_REFRESH_BUDGET = 100  # one minute of the OAuth rate limit
+
+
+@with_resources(use_reddit=False, use_db=True)
+def refresh(
+    conn,
+    subreddit_name: str | None = None,
+    budget: int = DEFAULT_REFRESH_BUDGET,
+    max_workers: int = 5,
+    quiet: bool = False,
+    **kwargs,
+):
+    """Rescrape the comments of threads that are due, within budget.
+
+    Due threads (next_due passed, or never scheduled) are ranked by the
+    number of new comments schedule_utils expects them to have and taken
+    in that order while their estimated request cost fits the budget.
+    No new threads are started once the requests actually made reach
+    the budget.
+    """
+    logger.info(
+        f"Refreshing due threads | subreddit={subreddit_name} "
+        f"| budget={budget} | max_workers={max_workers}"
+    )
+    start_time = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    query = """
+        SELECT name, created_utc, last_scraped_at, num_comments
+        FROM submissions
+        WHERE (next_due IS NULL OR next_due <= %s)
+    """
+    params: list = [now]
+    if subreddit_name:
+        query += " AND lower(subreddit) = lower(%s)"
+        params.append(subreddit_name.removeprefix("r/"))
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        due = cur.fetchall()
+    if not due:
+        console.print("No threads are due for a rescrape.")
+        return
+    planned, est_requests, est_new = plan_refresh(due, budget, now)
+    console.print(
+        f"{len(due)} threads due, refreshing {len(planned)} "
+        f"(~{est_requests} requests, ~{est_new:.0f} new comments expected)."
+    )
+    if not planned:
+        return
+
+    job = current_job()
+    bus = ProgressBus("refresh", total_items=len(planned))
+    if job is not None:
+        job.bus = bus
+        job.progress(0, len(planned))
+    bus.expect(comments=sum(row[3] or 0 for row in planned))
+
+    def refresh_one(row):
+        post_id = row[0].removeprefix("t3_")
+        bus.worker(f"{post_id} fetching comments")
+        try:
+            new, updated, unchanged = retry_call(
+                scrape_comments_in_thread, post_id, job=job
+            )
+        except TaskFailed as e:
+            logger.error(f"Error refreshing thread {post_id}: {e}")
+            update_failed_tasks(
+                record_failed_task, "thread", post_id, e.error, e.attempts
+            )
+            bus.add(items=1, errors=1)
+            return 0, 0, 0
+        bus.add(
+            items=1,
+            rows=new + updated,
+            comments=new + updated + unchanged,
+            unchanged=unchanged,
+        )
+        return new, updated, unchanged
+
+    def within_budget():
+        for row in planned:
+            if bus.snapshot()["requests"] >= budget:
+                return
+            yield row
+
+    totals = [0, 0, 0]
+    refreshed = 0
+    with bus.live(quiet=quiet or job is not None):
+        for refreshed, (_, future) in enumerate(
+            map_unordered(
+                bus.track(refresh_one), within_budget(), max_workers, job
+            ),
+            start=1,
+        ):
+            for i, count in enumerate(future.result()):
+                totals[i] += count
+            if job is not None:
+                job.progress(refreshed)
+
+    writer().flush()
+    elapsed = time.perf_counter() - start_time
+    requests = bus.snapshot()["requests"]
+    console.print(
+        f"Refreshed {refreshed} threads in {elapsed:.2f}s "
+        f"({len(due) - refreshed} still due). "
+        f"Comments: [green]{totals[0]} new[/green], "
+        f"[yellow]{totals[1]} updated[/yellow], "
+        f"{totals[2]} unchanged. "
+        f"Requests: {requests}/{budget}."
+    )
+
+
+def retry_failed(
+    kind: str | None = None,
+    max_attempts: int | None = None,
+    max_workers: int = 5,
+    quiet: bool = False,
+    **kwargs,
+):
+    """Run the tasks in failed_tasks again, with the same retries.
+
+    kind limits it to 'thread' or 'redditor' tasks, max_attempts skips
+    tasks that have already failed that many times. Tasks that succeed
+    are removed; the rest stay with their attempt count increased.
+    """
+    logger.info(
+        f"Retrying failed tasks | kind={kind} | max_attempts={max_attempts}"
+        f" | max_workers={max_workers}"
+    )
+    start_time = time.perf_counter()
+    tasks = get_failed_tasks(kind, max_attempts)
+    if not tasks:
+        console.print("No failed tasks to retry.")
+        return
+    console.print(f"Retrying {len(tasks)} failed tasks...")
+
+    job = current_job()
+    bus = ProgressBus("retry failed", total_items=len(tasks))
+    if job is not None:
+        job.bus = bus
+        job.progress(0, len(tasks))
+
+    def retry_one(task):
+        task_kind, target, params = task[:3]
+        bus.worker(f"{task_kind} {target}")
+        if task_kind == "redditor":
+            # scrape_redditor retries and records failures itself
+            ok = scrape_redditor(target, fresh_hours=0, **params)
+            bus.add(items=1)
+        else:
+            try:
+                new, updated, unchanged = retry_call(
+                    scrape_comments_in_thread, target, job=job, **params
+                )
+                ok = True
+                bus.add(
+                    items=1,
+                    rows=new + updated,
+                    comments=new + updated + unchanged,
+                    unchanged=unchanged,
+                )
+            except TaskFailed as e:
+                logger.error(f"Error retrying thread {target}: {e}")
+                update_failed_tasks(
+                    record_failed_task,
+                    "thread",
+                    target,
+                    e.error,
+                    e.attempts,
+                    params,
+                )
+                bus.add(items=1, errors=1)
+                ok = False
+        if ok:
+            # a write failure of the rescraped rows re-records the task
+            update_failed_tasks(clear_failed_task, task_kind, target, task[4])
+        return ok
+
+    succeeded = 0
+    with bus.live(quiet=quiet or job is not None):
+        for done, (_, future) in enumerate(
+            map_unordered(bus.track(retry_one), tasks, max_workers, job),
+            start=1,
+        ):
+            succeeded += bool(future.result())
+            if job is not None:
+                job.progress(done)
+
+    writer().flush()
+    elapsed = time.perf_counter() - start_time
+    console.print(
+        f"Retried {len(tasks)} tasks in {elapsed:.2f}s: "
+        f"[green]{succeeded} succeeded[/green], "
+        f"[red]{len(tasks) - succeeded} still failing[/red]. " + bus.summary()
+    )
+
+
+# redditors scraped more recently than this are skipped
+REDDITOR_FRESH_HOURS = 24.0
+
+
 def scrape_redditor(
     user_id,
     limit: int = 100,
     overwrite: bool = False,
     sort: str = "new",
+    fresh_hours: float = REDDITOR_FRESH_HOURS,
     **kwargs,
 ):
     """
     Given a redditor, scrape the last n (default: 100) comments they made
+
+    Redditors scraped within fresh_hours are skipped, and with sort=new
+    only comments newer than the newest one stored by the last scrape
+    are fetched. overwrite refetches regardless. Transient errors are
+    retried; a redditor that still fails is added to failed_tasks and
+    False is returned.
     """
     logger.info(
         f"Scraping comments for u/{user_id} | limit={limit} "
-        f"| overwrite={overwrite} | sort={sort}"
+        f"| overwrite={overwrite} | sort={sort} | fresh_hours={fresh_hours}"
     )
-    print(f"Scraping comments for u/{user_id}...")
+    # inside a larger scrape, report to its progress bus instead
+    bus = current_bus()
+    watermark = None if overwrite else get_redditor_watermark(user_id)
+    if watermark is not None and fresh_hours > 0:
+        age = datetime.now(timezone.utc) - watermark[2]
+        if age < timedelta(hours=fresh_hours):
+            logger.info(f"Skipping u/{user_id}, scraped {age} ago")
+            if bus is not None:
+                bus.add(skipped=1)
+            else:
+                console.print(
+                    f"Skipped u/{user_id}, scraped within {fresh_hours:g}h."
+                )
+            return True
+    if bus is not None:
+        bus.worker(f"u/{user_id} fetching comments")
+    else:
+        print(f"Scraping comments for u/{user_id}...")
+    newest_stored = None
+    if watermark is not None and watermark[0] is not None and sort == "new":
+        newest_stored = watermark[:2]
+
+    def fetch():
+        # newest first, so paging stops at the newest comment stored
+        reader = ListingReader(
+            get_redditors_comments(user_id, limit, sort=sort), newest_stored
+        )
+        return reader, [comment for page in reader for comment in page]
+
     try:
-        comments = get_redditors_comments(user_id, limit, sort=sort)
-    except Exception as e:
+        reader, comments = retry_call(fetch)
+    except TaskFailed as e:
         logger.error(f"Error scraping u/{user_id}: {e}")
-        console.print(f"[red]Error scraping u/{user_id}: {e}[/red]")
-        return
+        update_failed_tasks(
+            record_failed_task,
+            "redditor",
+            user_id,
+            e.error,
+            e.attempts,
+            {"limit": limit, "sort": sort, "overwrite": overwrite},
+        )
+        if bus is not None:
+            bus.add(errors=1)
+        else:
+            console.print(f"[red]Error scraping u/{user_id}: {e}[/red]")
+        return False
     formatted_rows = [format_comment(c) for c in comments]
     logger.info(
         f"Inserting {len(formatted_rows)} comments for "
         f"u/{user_id} into the database."
     )
-    batch_insert_comments(comments=formatted_rows, overwrite=overwrite)
-    console.print(f"Inserted {len(formatted_rows)} comments for u/{user_id}.")
+    if bus is not None:
+        bus.worker(f"u/{user_id} writing {len(formatted_rows)} rows")
+    # both go through the shared writer, the watermark after the rows
+    if formatted_rows:
+        queue_comments(formatted_rows, overwrite=overwrite)
+    # as for listings, only advance past content that was all read
+    covered = (
+        newest_stored is None
+        or reader.hit_watermark
+        or limit is None
+        or reader.items < limit
+    )
+    queue_redditor_watermark(
+        user_id,
+        reader.newest if sort == "new" and covered else None,
+    )
+    if bus is not None:
+        bus.add(rows=len(formatted_rows), comments=len(formatted_rows))
+    else:
+        writer().flush()
+        console.print(
+            f"Inserted {len(formatted_rows)} comments for u/{user_id}."
+        )
+    return True
 
 
 # TODO add multithreading option
 
 
 def scrape_redditors(
-    redditors, limit: int = 100, overwrite: bool = False, sort: str = "new"
+    redditors,
+    limit: int = 100,
+    overwrite: bool = False,
+    sort: str = "new",
+    fresh_hours: float = REDDITOR_FRESH_HOURS,
 ):
     """
     Given a list of redditors, scrape the last n comments they made
@@ -509,16 +978,31 @@ def scrape_redditors(
         try:
             console.print(f"Scraping redditor: u/{redditor}")
             scrape_redditor(
-                redditor, limit=limit, overwrite=overwrite, sort=sort
+                redditor,
+                limit=limit,
+                overwrite=overwrite,
+                sort=sort,
+                fresh_hours=fresh_hours,
             )
         except Exception as e:
             console.print(f"[red]Error scraping u/{redditor}: {e}[/red]")
 
 
 @with_resources(use_reddit=False, use_db=True)
-def expand_redditors_comments(conn, threshold, limit, max_workers=5, **kwargs):
+def expand_redditors_comments(
+    conn,
+    threshold,
+    limit,
+    max_workers=5,
+    quiet: bool = False,
+    fresh_hours: float = REDDITOR_FRESH_HOURS,
+    **kwargs,
+):
     """get more comments from redditors in the
-    database with less than threshold comments"""
+    database with less than threshold comments
+
+    Redditors scraped within fresh_hours are skipped, the rest only
+    fetch comments newer than their watermark."""
     logger.info(f"Expanding redditors with less than {threshold} comments ")
     with conn.cursor() as cur:
         cur.execute(
@@ -537,33 +1021,37 @@ def expand_redditors_comments(conn, threshold, limit, max_workers=5, **kwargs):
         f"{threshold} comments. Expanding..."
     )
 
-    # rich progress bar for main scraping loop
-    with Progress(
-        "expanding redditors...",
-        BarColumn(),
-        TextColumn("{task.completed}/{task.total}"),
-        TimeRemainingColumn(elapsed_when_finished=True),
-        console=console,
-    ) as progress:
-        task = progress.add_task("redditors", total=len(redditors))
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(
-                    scrape_redditor, redditor, limit=limit
-                ): redditor
-                for redditor in redditors
-            }
-            for future in as_completed(futures):
-                redditor = futures[future]
-                try:
-                    future.result()
-                    console.print(f"[green]✔ u/{redditor} done[/green]")
-                except Exception as e:
+    job = current_job()
+    bus = ProgressBus("expand redditors", total_items=len(redditors))
+    if job is not None:
+        job.bus = bus
+        job.progress(0, len(redditors))
+
+    def expand_one(redditor):
+        try:
+            return scrape_redditor(
+                redditor, limit=limit, fresh_hours=fresh_hours
+            )
+        finally:
+            bus.add(items=1)
+
+    # one live display for all workers
+    with bus.live(quiet=quiet or job is not None):
+        for done, (redditor, future) in enumerate(
+            map_unordered(bus.track(expand_one), redditors, max_workers, job),
+            start=1,
+        ):
+            try:
+                future.result()
+            except Exception as e:
+                if not quiet:
                     console.print(
                         f"[red]Error expanding u/{redditor}: {e}[/red]"
                     )
-                progress.advance(task)
+            if job is not None:
+                job.progress(done)
+    writer().flush()
+    console.print(f"Expanded {len(redditors)} redditors: {bus.summary()}")
 
 
 @with_resources(use_reddit=False, use_db=True)
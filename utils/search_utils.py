@@ -0,0 +1,235 @@
+import logging
+import time
+from datetime import datetime
+import psycopg
+from rich.markup import escape
+from rich.table import Table
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for full-text search over comments and submissions.
+
+Matching uses the generated tsvector columns (comments.body_tsv,
+submissions.search_tsv, title weighted above selftext) and their GIN
+indexes, so a search reads the index instead of scanning every body.
+Comments that share their text (see body_utils) are matched through
+bodies.body_tsv and joined back by body_id.
+Results are ranked with ts_rank_cd, or sorted newest first, and paged
+with a keyset: each page ends with a cursor (the last row's sort value
+and name) that the next page starts after, so deep pages cost the same
+as the first. like does a plain substring match instead, which the
+optional pg_trgm indexes serve.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+TS_CONFIG = "english"
+SORTS = ("rank", "new")
+# table, tsvector column, text the snippet is cut from, ILIKE columns
+TARGETS = {
+    "comments": {
+        "table": "comments",
+        "vector": "body_tsv",
+        "text": "t.body",
+        "like": ("body",),
+        # shared texts (see body_utils) are matched in bodies, which has
+        # the same columns
+        "shared": "comments t JOIN bodies s ON s.id = t.body_id",
+    },
+    "submissions": {
+        "table": "submissions",
+        "vector": "search_tsv",
+        "text": ("coalesce(t.title, '') || ' | ' || coalesce(t.selftext, '')"),
+        "like": ("title", "selftext"),
+    },
+}
+HEADLINE_OPTIONS = (
+    "StartSel=<<, StopSel=>>, MaxWords=30, MinWords=10, MaxFragments=1"
+)
+
+
+def encode_cursor(row_key, name: str) -> str:
+    """Cursor for the page after a row: its sort value and name."""
+    if isinstance(row_key, datetime):
+        row_key = row_key.isoformat()
+    return f"{row_key},{name}"
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    key, name = cursor.rsplit(",", 1)
+    if sort == "new":
+        return datetime.fromisoformat(key), name
+    return float(key), name
+
+
+def _like_pattern(text: str) -> str:
+    escaped = (
+        text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    return f"%{escaped}%"
+
+
+def build_search(
+    query: str,
+    target: str = "comments",
+    subreddit: str | None = None,
+    author: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    after: str | None = None,
+    sort: str = "rank",
+    like: bool = False,
+) -> tuple[str, list]:
+    """SQL and params for one page of results.
+
+    Rows are (name, subreddit, author, created_utc, ups, rank, snippet).
+    """
+    spec = TARGETS[target]
+    sources = [(f"{spec['table']} t", "t", spec["text"])]
+    if "shared" in spec:
+        sources.append((spec["shared"], "s", "s.body"))
+    filters: list = []
+    filter_params: list = []
+    if subreddit:
+        # comments store r/name, submissions the bare name
+        name = subreddit.lower().removeprefix("r/")
+        filters.append("lower(t.subreddit) IN (%s, %s)")
+        filter_params += [name, f"r/{name}"]
+    if author:
+        filters.append("t.author = %s")
+        filter_params.append(author.removeprefix("u/"))
+    if since:
+        filters.append("t.created_utc >= %s::timestamptz")
+        filter_params.append(since)
+    if until:
+        filters.append("t.created_utc < %s::timestamptz")
+        filter_params.append(until)
+    if like:
+        # substring matches have no rank
+        sort = "new"
+    hits = []
+    params: list = []
+    for source, alias, text in sources:
+        if like:
+            match = " OR ".join(
+                f"{alias}.{col} ILIKE %s" for col in spec["like"]
+            )
+            where = [f"({match})"]
+            params += [_like_pattern(query)] * len(spec["like"])
+            rank = "0::real"
+        else:
+            where = [f"{alias}.{spec['vector']} @@ q.q"]
+            rank = f"ts_rank_cd({alias}.{spec['vector']}, q.q)::real"
+        params += filter_params
+        conditions = " AND ".join(where + filters)
+        hits.append(
+            f"""
+                SELECT t.name, t.subreddit, t.author, t.created_utc,
+                    t.ups, {rank} AS rank, {text} AS text
+                FROM {source}, q
+                WHERE {conditions}"""
+        )
+    key = "rank" if sort == "rank" else "created_utc"
+    keyset = ""
+    if after:
+        cast = "real" if sort == "rank" else "timestamptz"
+        keyset = f"WHERE (hits.{key}, hits.name) < (%s::{cast}, %s)"
+        params += list(decode_cursor(after, sort))
+    params.append(limit)
+    # a comment holds its text inline or shares it, never both
+    union = "\n                UNION ALL".join(hits)
+    statement = f"""
+        WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', %s) AS q)
+        SELECT page.name, page.subreddit, page.author, page.created_utc,
+            page.ups, page.rank,
+            ts_headline('{TS_CONFIG}', page.text, q.q, %s) AS snippet
+        FROM (
+            SELECT * FROM ({union}
+            ) hits
+            {keyset}
+            ORDER BY hits.{key} DESC, hits.name DESC
+            LIMIT %s
+        ) page, q
+        ORDER BY page.{key} DESC, page.name DESC;
+    """
+    return statement, [query, HEADLINE_OPTIONS, *params]
+
+
+def _snippet(text: str | None) -> str:
+    # escape first, the highlight markers contain no brackets
+    text = escape(" ".join((text or "").split()))
+    return text.replace("<<", "[bold yellow]").replace(">>", "[/bold yellow]")
+
+
+@with_resources(use_db=True, use_reddit=False)
+def search(
+    conn,
+    query: str,
+    target: str = "comments",
+    subreddit: str | None = None,
+    author: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    after: str | None = None,
+    sort: str = "rank",
+    like: bool = False,
+) -> tuple[list, str | None]:
+    """Search comments or submissions and print one page of results.
+
+    query uses web search syntax ("quoted phrase", or, -exclude). Returns
+    (rows, cursor for the next page or None).
+    """
+    statement, params = build_search(
+        query,
+        target,
+        subreddit,
+        author,
+        since,
+        until,
+        limit,
+        after,
+        sort,
+        like,
+    )
+    start_time = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(statement, params)
+            rows = cur.fetchall()
+    except psycopg.errors.UndefinedColumn as e:
+        logger.error("Search columns missing: %s", e)
+        console.print(
+            "[red]Search columns are missing.[/red] Run the full-text "
+            "search migration in the README first."
+        )
+        return [], None
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Searched {target} for {query!r} | rows={len(rows)} "
+        f"| {elapsed * 1000:.1f}ms"
+    )
+
+    table = Table("rank", "subreddit", "author", "created", "ups", target)
+    for name, sub, author_, created, ups, rank, snippet in rows:
+        table.add_row(
+            f"{rank:.3f}",
+            escape(str(sub)),
+            escape(str(author_)),
+            f"{created:%Y-%m-%d}",
+            str(ups),
+            _snippet(snippet),
+        )
+    if rows:
+        console.print(table)
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        key = last[5] if sort == "rank" and not like else last[3]
+        next_cursor = encode_cursor(key, last[0])
+    console.print(f"{len(rows)} results in {elapsed * 1000:.0f} ms.")
+    if next_cursor:
+        console.print(f"Next page: --after {next_cursor}", markup=False)
+    return rows, next_cursor
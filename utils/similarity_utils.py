@@ -0,0 +1,420 @@
+import logging
+import time
+import uuid
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import psycopg
+from .console import console
+from .connection_utils import with_resources
+from .graph_utils import (
+    EDGES_PATH,
+    NODES_PATH,
+    build_graph_tables,
+    write_graph_tables,
+)
+from .rollup_utils import UNCOUNTED_AUTHORS, subreddit_totals
+
+"""Utils for approximate subreddit similarity (MinHash and LSH).
+
+Counting shared commenters exactly means visiting every pair of
+subreddits each author commented in, which grows with the square of an
+author's subreddit count. Here each subreddit's commenter set is reduced
+to a MinHash signature of num_perm values: the minimum of a random
+universal hash over its commenters, once per hash function. The share
+of equal values between two signatures estimates the sets' Jaccard
+similarity J, and the overlap follows as J / (1 + J) * (|A| + |B|).
+
+Candidate pairs come from LSH banding: signatures are cut into bands of
+rows = num_perm / bands values, and subreddits whose values agree in
+all rows of any band become a candidate. Pairs with Jaccard above about
+(1 / bands) ** (1 / rows) are found with high probability. More bands
+find weaker pairs at the cost of more candidates; more permutations
+make the estimates tighter and signatures slower to build. Pairs whose
+overlap is small next to their sizes (a big subreddit and a small one)
+are missed by design; recall_report measures how many on a sample.
+"""
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 64
+# shared commenters for an edge, as in the exact transformation ETL
+MIN_SHARED = 5
+RECALL_SAMPLE = 500
+# universal hashes (a * x + b) mod p; a * x stays below 2**62
+HASH_PRIME = (1 << 31) - 1
+# signature values compared at once
+BLOCK_ELEMENTS = 1 << 24
+FETCH_ROWS = 50_000
+
+
+class Memberships(NamedTuple):
+    """Commenter sets in compressed sparse row form.
+
+    Commenters of subreddit i are authors[indptr[i]:indptr[i + 1]], as
+    dense author ids in ascending order.
+    """
+
+    subreddits: np.ndarray
+    indptr: np.ndarray
+    authors: np.ndarray
+
+    @property
+    def n_subreddits(self) -> int:
+        return len(self.indptr) - 1
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def rows(self) -> np.ndarray:
+        """Subreddit id of every entry of authors."""
+        return np.repeat(np.arange(self.n_subreddits), self.sizes())
+
+
+def build_memberships(
+    subreddits, authors, min_commenters: int = 1
+) -> Memberships:
+    """Memberships from parallel (subreddit, author) sequences.
+
+    Duplicate pairs are dropped, and subreddits with fewer than
+    min_commenters distinct commenters are left out.
+    """
+    sub_codes, names = pd.factorize(np.asarray(subreddits), sort=True)
+    author_codes, _ = pd.factorize(np.asarray(authors))
+    keys = np.unique(
+        sub_codes.astype(np.int64) << 32 | author_codes.astype(np.int64)
+    )
+    subs = keys >> 32
+    sizes = np.bincount(subs, minlength=len(names))
+    keep = sizes >= max(min_commenters, 1)
+    members = (keys & 0xFFFFFFFF)[keep[subs]]
+    # keep author ids dense after the filter
+    _, members = np.unique(members, return_inverse=True)
+    indptr = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(sizes[keep], out=indptr[1:])
+    return Memberships(
+        subreddits=np.asarray(names, dtype=str)[keep],
+        indptr=indptr,
+        authors=members.astype(np.int32),
+    )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def load_memberships(conn, min_commenters: int = MIN_SHARED) -> Memberships:
+    """Distinct commenters of every r/ subreddit, from a named cursor."""
+    subreddits, authors = [], []
+    with conn.transaction(), conn.cursor(
+        name=f"similarity_{uuid.uuid4().hex[:8]}"
+    ) as cur:
+        cur.itersize = FETCH_ROWS
+        # a deleted author would be a commenter of almost every subreddit
+        cur.execute(
+            """
+            SELECT subreddit, author FROM comments
+            WHERE author IS NOT NULL AND author <> ALL(%s)
+                AND subreddit LIKE 'r/%%'
+            GROUP BY 1, 2;
+            """,
+            (list(UNCOUNTED_AUTHORS),),
+        )
+        while batch := cur.fetchmany(FETCH_ROWS):
+            subs, names = zip(*batch)
+            subreddits.extend(subs)
+            authors.extend(names)
+    return build_memberships(subreddits, authors, min_commenters)
+
+
+def minhash_signatures(
+    memberships: Memberships, num_perm: int = NUM_PERM, seed: int = 0
+) -> np.ndarray:
+    """(n_subreddits, num_perm) MinHash signatures as uint32.
+
+    Every subreddit needs at least one commenter. Each hash function is
+    evaluated once per author, then gathered per membership and reduced
+    per subreddit. Going one function at a time keeps the hashed authors
+    in cache, which the random gather needs far more than wide blocks.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, HASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, HASH_PRIME, num_perm, dtype=np.uint64)
+    authors = memberships.authors.astype(np.intp)
+    x = np.arange(int(authors.max()) + 1, dtype=np.uint64)
+    starts = memberships.indptr[:-1]
+    values = np.empty(len(authors), dtype=np.uint32)
+    signatures = np.empty(
+        (memberships.n_subreddits, num_perm), dtype=np.uint32
+    )
+    for perm in range(num_perm):
+        hashed = ((a[perm] * x + b[perm]) % HASH_PRIME).astype(np.uint32)
+        np.take(hashed, authors, out=values)
+        signatures[:, perm] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def group_pairs(
+    groups: np.ndarray, members: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Every (i, j) pair of members sharing a group, with i < j.
+
+    Members must be unique within a group. After sorting, members of a
+    group are a contiguous run, so the pairs d apart are found with one
+    vectorised comparison per distance d up to the largest group.
+    """
+    order = np.lexsort((members, groups))
+    groups, members = groups[order], members[order]
+    firsts, seconds = [], []
+    for d in range(1, len(groups)):
+        same = groups[d:] == groups[:-d]
+        if not same.any():
+            break
+        firsts.append(members[:-d][same])
+        seconds.append(members[d:][same])
+    if not firsts:
+        empty = np.empty(0, dtype=members.dtype)
+        return empty, empty
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def lsh_candidates(
+    signatures: np.ndarray, bands: int = BANDS
+) -> tuple[np.ndarray, np.ndarray]:
+    """Pairs of subreddits whose signatures agree in at least one band."""
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"bands ({bands}) must divide perms ({num_perm})")
+    rows = num_perm // bands
+    # odd multipliers; the sum wraps modulo 2**64
+    mixers = np.random.default_rng(rows).integers(
+        1, 1 << 63, rows, dtype=np.uint64
+    ) | np.uint64(1)
+    ids = np.arange(n, dtype=np.int64)
+    codes = []
+    for values in np.hsplit(signatures, bands):
+        keys = (values.astype(np.uint64) * mixers).sum(axis=1, dtype=np.uint64)
+        first, second = group_pairs(keys, ids)
+        codes.append(first * n + second)
+    codes = np.unique(np.concatenate(codes))
+    return codes // n, codes % n
+
+
+def estimate_similarity(
+    signatures: np.ndarray,
+    sizes: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Estimated (jaccard, shared commenters) for pairs of subreddits."""
+    num_perm = signatures.shape[1]
+    jaccard = np.empty(len(first), dtype=np.float64)
+    block = max(1, BLOCK_ELEMENTS // num_perm)
+    for start in range(0, len(first), block):
+        pairs = slice(start, start + block)
+        jaccard[pairs] = (
+            signatures[first[pairs]] == signatures[second[pairs]]
+        ).mean(axis=1)
+    shared = jaccard / (1 + jaccard) * (sizes[first] + sizes[second])
+    return jaccard, shared
+
+
+def exact_overlap(
+    memberships: Memberships, subset: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Exact shared commenters of every pair, or of pairs touching subset.
+
+    Returns (first, second, shared) for pairs sharing anyone.
+    """
+    rows = memberships.rows()
+    authors = memberships.authors
+    if subset is not None:
+        # every membership of anyone who commented in the subset
+        chosen = np.isin(authors, authors[np.isin(rows, subset)])
+        rows, authors = rows[chosen], authors[chosen]
+    first, second = group_pairs(authors, rows)
+    if subset is not None:
+        touching = np.isin(first, subset) | np.isin(second, subset)
+        first, second = first[touching], second[touching]
+    n = memberships.n_subreddits
+    codes, shared = np.unique(
+        first.astype(np.int64) * n + second, return_counts=True
+    )
+    return codes // n, codes % n, shared
+
+
+def lsh_threshold(num_perm: int = NUM_PERM, bands: int = BANDS) -> float:
+    """Jaccard at which a pair becomes a candidate about half the time."""
+    return (1 / bands) ** (bands / num_perm)
+
+
+def similar_pairs(
+    memberships: Memberships,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+    min_shared: int = MIN_SHARED,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Approximate (sub1, sub2, weight, jaccard) edges.
+
+    weight is the estimated number of shared commenters; pairs estimated
+    below min_shared are dropped. sub1 < sub2, as subreddit ids.
+    """
+    signatures = minhash_signatures(memberships, num_perm, seed)
+    first, second = lsh_candidates(signatures, bands)
+    jaccard, shared = estimate_similarity(
+        signatures, memberships.sizes(), first, second
+    )
+    weight = np.rint(shared)
+    keep = weight >= min_shared
+    edges = pd.DataFrame(
+        {
+            "sub1": first[keep],
+            "sub2": second[keep],
+            "weight": weight[keep],
+            "jaccard": jaccard[keep],
+        }
+    )
+    edges.attrs["candidates"] = len(first)
+    return edges
+
+
+def recall_report(
+    memberships: Memberships,
+    edges: pd.DataFrame,
+    sample: int = RECALL_SAMPLE,
+    min_shared: int = MIN_SHARED,
+    threshold: float = 0.0,
+    seed: int = 0,
+) -> dict:
+    """Compare approximate edges with exact counts on sampled subreddits.
+
+    recall is the share of exact edges (at least min_shared commenters)
+    of sampled subreddits that edges contains; recall_above the
+    same for exact edges with Jaccard >= threshold, the pairs LSH is
+    tuned to find. weight_error is the mean relative error of the
+    estimated weights of the edges found.
+    """
+    n = memberships.n_subreddits
+    rng = np.random.default_rng(seed)
+    subset = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+    first, second, shared = exact_overlap(memberships, subset)
+    sizes = memberships.sizes()
+    keep = shared >= min_shared
+    first, second, shared = first[keep], second[keep], shared[keep]
+    jaccard = shared / (sizes[first] + sizes[second] - shared)
+    in_sample = np.isin(edges["sub1"], subset) | np.isin(edges["sub2"], subset)
+    found = edges[in_sample]
+    estimated = pd.Series(
+        found["weight"].to_numpy(),
+        index=found["sub1"].to_numpy(np.int64) * n + found["sub2"].to_numpy(),
+    )
+    matched = estimated.reindex(first.astype(np.int64) * n + second)
+    hit = matched.notna().to_numpy()
+    above = jaccard >= threshold
+    error = np.abs(matched.to_numpy()[hit] - shared[hit]) / shared[hit]
+    return {
+        "sampled": len(subset),
+        "exact_edges": int(len(shared)),
+        "recall": float(hit.mean()) if len(hit) else 1.0,
+        "exact_above": int(above.sum()),
+        "recall_above": float(hit[above].mean()) if above.any() else 1.0,
+        "weight_error": float(error.mean()) if len(error) else 0.0,
+    }
+
+
+def _comment_counts() -> pd.DataFrame | None:
+    try:
+        totals = subreddit_totals()
+    except psycopg.errors.UndefinedTable as e:
+        logger.warning("No subreddit rollups for comment counts: %s", e)
+        return None
+    return totals.rename(columns={"comments": "comment_count"})
+
+
+def graph_edges(
+    perms: int = NUM_PERM,
+    bands: int = BANDS,
+    min_shared: int = MIN_SHARED,
+    recall_sample: int = RECALL_SAMPLE,
+    exact: bool = False,
+    seed: int = 0,
+    edges_path: str = EDGES_PATH,
+    nodes_path: str = NODES_PATH,
+    **kwargs,
+):
+    """Prompt command: build the subreddit graph tables from the DB.
+
+    Edges join subreddits sharing at least min_shared commenters,
+    estimated with MinHash/LSH unless exact is set.
+    """
+    method = "exact" if exact else f"minhash perms={perms} bands={bands}"
+    logger.info(f"Building subreddit edges | {method} | min={min_shared}")
+    if not exact and perms % bands:
+        console.print(f"[red]--bands ({bands}) must divide --perms.[/red]")
+        return
+    start_time = time.perf_counter()
+    with console.status("Loading commenters...", spinner="dots"):
+        memberships = load_memberships(min_shared)
+    load_s = time.perf_counter() - start_time
+    if memberships.n_subreddits < 2:
+        console.print("Not enough subreddits with commenters for edges.")
+        return
+    with console.status("Finding similar subreddits...", spinner="dots"):
+        if exact:
+            first, second, shared = exact_overlap(memberships)
+            keep = shared >= min_shared
+            edges = pd.DataFrame(
+                {
+                    "sub1": first[keep],
+                    "sub2": second[keep],
+                    "weight": shared[keep],
+                }
+            )
+        else:
+            edges = similar_pairs(
+                memberships, perms, bands, min_shared, seed=seed
+            )
+    pairs_s = time.perf_counter() - start_time - load_s
+    names = memberships.subreddits
+    named = pd.DataFrame(
+        {
+            "sub1": names[edges["sub1"].to_numpy(np.int64)],
+            "sub2": names[edges["sub2"].to_numpy(np.int64)],
+            "weight": edges["weight"].to_numpy(),
+        }
+    ).sort_values(["sub1", "sub2"])
+    write_graph_tables(
+        *build_graph_tables(named, _comment_counts()), edges_path, nodes_path
+    )
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Built {len(edges)} edges in {elapsed:.2f}s")
+
+    console.print(
+        f"{memberships.n_subreddits:,} subreddits, "
+        f"{len(memberships.authors):,} memberships (loaded in {load_s:.2f}s)"
+    )
+    if not exact:
+        console.print(
+            f"{edges.attrs['candidates']:,} LSH candidates, Jaccard "
+            f"threshold ~{lsh_threshold(perms, bands):.2f}"
+        )
+    console.print(
+        f"[green]{len(edges):,} edges[/green] ({method}) in {pairs_s:.2f}s, "
+        f"total {elapsed:.2f}s"
+    )
+    if exact or recall_sample <= 0:
+        return
+    with console.status("Counting exact overlaps...", spinner="dots"):
+        report = recall_report(
+            memberships,
+            edges,
+            sample=recall_sample,
+            min_shared=min_shared,
+            threshold=lsh_threshold(perms, bands),
+            seed=seed,
+        )
+    console.print(
+        f"Recall vs exact on {report['sampled']:,} sampled subreddits: "
+        f"{report['recall']:.1%} of {report['exact_edges']:,} edges, "
+        f"{report['recall_above']:.1%} of {report['exact_above']:,} above "
+        f"the threshold; mean weight error {report['weight_error']:.1%}"
+    )
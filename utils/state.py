@@ -1,5 +0,0 @@
-subreddit_progress = {
-    "enabled": True,
-    "current": 0,
-    "total": 0,
-}
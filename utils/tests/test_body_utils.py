@@ -0,0 +1,98 @@
+import importlib
+from unittest.mock import MagicMock
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.body_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+NOTICE = "Your post has been removed. Please read the rules of the sub."
+
+
+def test_repeated_bodies_keeps_long_repeated_texts(mock_with_resources):
+    mod = mock_with_resources
+
+    shared = mod.repeated_bodies(
+        [NOTICE, "thanks!", None, NOTICE, "thanks!", "once " * 10, NOTICE]
+    )
+
+    # short texts cost about what a reference does
+    assert shared == [NOTICE]
+    assert mod.repeated_bodies([NOTICE, NOTICE], min_repeats=3) == []
+
+
+def test_migrate_bodies_shares_moves_and_drops(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    counts = iter([40, 2, 900, 3])
+    type(cur).rowcount = property(lambda self: next(counts))
+
+    stats = mod.migrate_bodies(conn, min_repeats=3, min_length=16)
+
+    assert stats == {"added": 42, "moved": 900, "dropped": 3}
+    conn.transaction.assert_called_once()
+    repeated, seeded, moved, dropped = (
+        c.args for c in cur.execute.call_args_list
+    )
+    assert "HAVING count(*) >= %s" in repeated[0]
+    assert repeated[1] == (16, 3)
+    assert seeded == (mod.SHARE_BODIES, (list(mod.SEEDED_BODIES),))
+    assert "SET body = NULL, body_id = b.id" in moved[0]
+    assert "NOT EXISTS" in dropped[0]
+
+
+def test_space_report_counts_bytes_saved(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    # 1,000 comments holding 500 KB of text, stored as 2 KB in bodies
+    cur.fetchone.side_effect = [(1000, 500_000), (4, 2_000), (9e6, 16384)]
+
+    space = mod.space_report(conn)
+
+    assert space["saved_bytes"] == 500_000 - 2_000 - 8 * 1000
+    assert space["bodies"] == 4 and space["comments_size"] == 9e6
+
+
+def test_bodies_migrate_prints_space_saved(mock_with_resources, monkeypatch):
+    mod = mock_with_resources
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    space = {
+        "shared_comments": 1000,
+        "bodies": 4,
+        "inline_bytes": 5_000_000,
+        "stored_bytes": 2_000,
+        "saved_bytes": 4_990_000,
+        "comments_size": 9_000_000,
+        "bodies_size": 16_384,
+    }
+    migrate = MagicMock(
+        return_value=({"added": 4, "moved": 1000, "dropped": 0}, space)
+    )
+    monkeypatch.setattr(mod, "migrate", migrate)
+
+    mod.bodies_migrate(min_repeats=5)
+
+    migrate.assert_called_once_with(5, mod.MIN_BODY_LENGTH)
+    printed = " ".join(c.args[0] for c in console.print.call_args_list)
+    assert "1,000 comments" in printed
+    assert "5.0 MB saved" in printed and "(100%)" in printed
+    assert "VACUUM" in printed
@@ -0,0 +1,252 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+import scrapeddit
+import scrapeddit.utils.commands as mod
+from scrapeddit.utils.command_registry import LazyCommand
+
+# modules a one-shot command must not pay for at import time
+HEAVY_MODULES = ("praw", "psycopg", "prompt_toolkit", "rich.progress")
+# generous ceiling, in microseconds, for importing the dispatcher
+IMPORT_BUDGET_US = 500_000
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative import time per module from python -X importtime."""
+    root = Path(scrapeddit.__file__).absolute().parents[1]
+    env = dict(os.environ, PYTHONPATH=str(root))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=root,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_dispatcher_import_budget():
+    times = import_times("scrapeddit.utils.commands")
+
+    heavy = [m for m in times if m.split(".")[0] in HEAVY_MODULES]
+    heavy += [m for m in times if m in HEAVY_MODULES]
+    assert heavy == []
+    assert times["scrapeddit.utils.commands"] < IMPORT_BUDGET_US
+
+
+def test_lazy_command_imports_on_first_call():
+    command = LazyCommand("console", "get_console")
+
+    assert command._func is None
+    assert command() is command.resolve()()
+    assert command._func is not None
+
+
+def test_dispatch_exit():
+    assert mod.dispatch("exit") is True
+    assert mod.dispatch("quit") is True
+    assert mod.dispatch("   ") is False
+
+
+def test_dispatch_unknown(capsys):
+    assert mod.dispatch("frobnicate") is False
+    assert "Unknown command" in capsys.readouterr().out
+
+
+def test_dispatch_scrape_calls_registered_func():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["scrape"]["subreddit"], {"func": func}):
+        exit_after = mod.dispatch("scrape subreddit python --exit-after")
+
+    assert exit_after is True
+    kwargs = func.call_args.kwargs
+    assert kwargs["subreddit_name"] == "python"
+    assert kwargs["limit"] == 10
+    assert kwargs["max_workers"] == 5
+
+
+def test_dispatch_refresh_parses_budget():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["refresh"], {"func": func}):
+        mod.dispatch("refresh python --budget 40 -w 2")
+
+    func.assert_called_once_with(
+        subreddit_name="python", budget=40, max_workers=2, quiet=False
+    )
+
+
+def test_dispatch_retry_failed_parses_kind():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["retry-failed"], {"func": func}):
+        mod.dispatch("retry-failed thread --max-attempts 6 -q")
+
+    func.assert_called_once_with(
+        kind="thread", max_attempts=6, max_workers=5, quiet=True
+    )
+
+
+def test_dispatch_delete_requires_confirmation(capsys):
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["delete"], {"func": func}):
+        mod.dispatch("delete comments", confirm=lambda _: "no")
+
+    func.assert_not_called()
+    assert "Aborted" in capsys.readouterr().out
+
+
+def test_dispatch_db_strips_flags():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["db"], {"func": func}):
+        exit_after = mod.dispatch(
+            "db SELECT * FROM comments --limit 50 --page-size 10 --exit-after"
+        )
+
+    assert exit_after is True
+    func.assert_called_once_with(
+        "SELECT * FROM comments", limit=50, page_size=10
+    )
+
+
+def test_dispatch_search_parses_filters(capsys):
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["search"], {"func": func}):
+        mod.dispatch(
+            'search "rust borrow" -unsafe --in submissions '
+            "--subreddit python --since 2024-01-01 --limit 5 --like"
+        )
+        mod.dispatch("search async --since yesterday")
+
+    func.assert_called_once_with(
+        '"rust borrow" -unsafe',
+        target="submissions",
+        sort="rank",
+        like=True,
+        since="2024-01-01",
+        subreddit="python",
+        limit=5,
+    )
+    assert "--since must be a date" in capsys.readouterr().out
+
+
+def test_dispatch_analyze_topics_per_subreddit():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["analyze"]["topics"], {"func": func}):
+        mod.dispatch("analyze topics python rust --topics 8 -w 2")
+
+    func.assert_called_once_with(
+        subreddits=["python", "rust"],
+        top=None,
+        n_topics=8,
+        n_features=2**18,
+        n_terms=10,
+        passes=1,
+        max_docs=None,
+        workers=2,
+        seed=0,
+    )
+
+
+def test_dispatch_background_submits_job():
+    func = MagicMock()
+    with patch.dict(
+        mod.prompt_data["scrape"]["subreddit"], {"func": func}
+    ), patch.object(mod, "jobs") as mock_jobs:
+        mod.dispatch("scrape subreddit python --limit 5", background=True)
+
+    func.assert_not_called()
+    command, submitted = mock_jobs.submit.call_args.args
+    assert command == "scrape subreddit python --limit 5"
+    assert submitted is func
+    assert mock_jobs.submit.call_args.kwargs["limit"] == 5
+
+
+def test_run_headless_dispatches_once():
+    with patch.object(mod, "dispatch") as mock_dispatch:
+        code = mod.run_headless(["db", "SELECT", "1;", "--exit-after"])
+
+    assert code == 0
+    mock_dispatch.assert_called_once_with("db SELECT 1; --exit-after")
+
+
+def test_dispatch_rollups_backfill():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["rollups"], {"func": func}):
+        assert mod.dispatch("rollups backfill --exit-after") is True
+        assert mod.dispatch("rollups") is False
+
+    func.assert_called_once_with()
+
+
+def test_dispatch_thread_shows_tree_or_backfills():
+    show, backfill = MagicMock(), MagicMock()
+    with patch.dict(
+        mod.prompt_data["thread"], {"func": show, "backfill": backfill}
+    ):
+        mod.dispatch("thread abc123 --depth 2 --limit none")
+        mod.dispatch("thread --comment t1_xyz")
+        assert mod.dispatch("thread backfill --exit-after") is True
+        assert mod.dispatch("thread") is False
+
+    first, second = (c.kwargs for c in show.call_args_list)
+    assert first == {
+        "post_id": "abc123",
+        "comment_id": None,
+        "max_depth": 2,
+        "limit": None,
+    }
+    assert second["comment_id"] == "t1_xyz" and second["limit"] == 200
+    backfill.assert_called_once_with()
+
+
+def test_dispatch_bodies_migrate_and_report():
+    migrate, report = MagicMock(), MagicMock()
+    with patch.dict(
+        mod.prompt_data["bodies"], {"migrate": migrate, "report": report}
+    ):
+        mod.dispatch("bodies migrate --min-repeats 5")
+        assert mod.dispatch("bodies report --exit-after") is True
+        mod.dispatch("bodies migrate --min-repeats 1")
+        assert mod.dispatch("bodies") is False
+
+    migrate.assert_called_once_with(min_repeats=5, min_length=32)
+    report.assert_called_once_with()
+
+
+def test_dispatch_graph_edges_passes_minhash_flags():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["graph"]["edges"], {"func": func}):
+        mod.dispatch("graph edges --perms 64 --bands 16 --recall-sample 0")
+
+    kwargs = func.call_args.kwargs
+    assert kwargs["perms"] == 64
+    assert kwargs["bands"] == 16
+    assert kwargs["recall_sample"] == 0
+    assert kwargs["min_shared"] == 5
+    assert kwargs["exact"] is False
+
+
+def test_dispatch_import_dump_passes_filters():
+    func = MagicMock()
+    with patch.dict(mod.prompt_data["import-dump"], {"func": func}):
+        mod.dispatch(
+            "import-dump dumps/RC 2024-01.zst --subreddit python,rust "
+            "--since 2024-01-02 --workers 2 --overwrite"
+        )
+
+    func.assert_called_once_with(
+        "dumps/RC 2024-01.zst",
+        overwrite=True,
+        since="2024-01-02",
+        subreddits=["python", "rust"],
+        workers=2,
+    )
@@ -0,0 +1,145 @@
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock, patch
+import importlib
+import scrapeddit.utils.graph_utils as graph_utils
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.community_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def two_cliques():
+    """Two 4-cliques joined by one light edge."""
+    edges = []
+    for offset in (0, 4):
+        for i in range(4):
+            for j in range(i + 1, 4):
+                edges.append((offset + i, offset + j, 10.0))
+    edges.append((3, 4, 1.0))
+    src, dst, w = (np.array(x) for x in zip(*edges))
+    indptr, indices, weights = graph_utils.build_csr(src, dst, w, 8)
+    return graph_utils.CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=np.array([f"r/{i}" for i in range(8)]),
+        node_attrs={"comment_count": np.array([500] * 7 + [10])},
+    )
+
+
+def write_tables(graph, tmp_path):
+    src, dst, w = graph.edge_list()
+    edge_df = pd.DataFrame(
+        {"sub1": graph.labels[src], "sub2": graph.labels[dst], "weight": w}
+    )
+    counts = pd.DataFrame(
+        {
+            "subreddit": graph.labels,
+            "comment_count": graph.node_attrs["comment_count"],
+        }
+    )
+    edges, nodes = graph_utils.build_graph_tables(edge_df, counts)
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    graph_utils.write_graph_tables(edges, nodes, edges_path, nodes_path)
+    return edges_path, nodes_path
+
+
+def test_louvain_finds_cliques(mock_with_resources):
+    mod = mock_with_resources
+
+    labels = mod.louvain(two_cliques(), seed=0)
+
+    assert len(set(labels[:4])) == 1
+    assert len(set(labels[4:])) == 1
+    assert labels[0] != labels[4]
+    assert mod.modularity(two_cliques(), labels) > 0.4
+
+
+def test_louvain_seeded_is_deterministic(mock_with_resources):
+    mod = mock_with_resources
+
+    first = mod.louvain(two_cliques(), seed=3)
+    second = mod.louvain(two_cliques(), seed=3)
+
+    assert first.tolist() == second.tolist()
+
+
+def test_prune_graph(mock_with_resources):
+    mod = mock_with_resources
+
+    pruned = mod.prune_graph(two_cliques(), min_comments=200, min_weight=5)
+
+    # node 7 is too small and the 3-4 bridge is too light
+    assert pruned.n_nodes == 7
+    assert pruned.n_edges == 6 + 3
+
+
+def test_detect_communities_uses_cache(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    edges_path, nodes_path = write_tables(two_cliques(), tmp_path)
+
+    first, edge_hash, cached = mod.detect_communities(
+        edges_path, nodes_path, min_comments=0, cache_dir=str(tmp_path)
+    )
+    with patch.object(mod, "louvain") as mock_louvain:
+        second, second_hash, second_cached = mod.detect_communities(
+            edges_path, nodes_path, min_comments=0, cache_dir=str(tmp_path)
+        )
+
+    assert cached is False
+    assert second_cached is True
+    assert edge_hash == second_hash
+    mock_louvain.assert_not_called()
+    assert first["community"].tolist() == second["community"].tolist()
+
+
+def test_write_communities_skips_same_hash(mock_with_resources):
+    mod = mock_with_resources
+    mock_conn = MagicMock()
+    mock_cur = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cur
+    mock_cur.fetchone.return_value = (1,)
+
+    written = mod.write_communities(
+        mock_conn, pd.DataFrame({"subreddit": [], "community": []}), "abc"
+    )
+
+    assert written is False
+    mock_cur.copy.assert_not_called()
+
+
+def test_write_communities_copies_rows(mock_with_resources):
+    mod = mock_with_resources
+    mock_conn = MagicMock()
+    mock_cur = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cur
+    mock_cur.fetchone.return_value = None
+    mock_copy = mock_cur.copy.return_value.__enter__.return_value
+    partition = pd.DataFrame(
+        {"subreddit": ["r/a", "r/b"], "community": [0, 1]}
+    )
+
+    written = mod.write_communities(mock_conn, partition, "abc")
+
+    assert written is True
+    mock_cur.execute.assert_any_call("DELETE FROM subreddit_communities;")
+    assert mock_copy.write_row.call_count == 2
+    mock_copy.write_row.assert_any_call(("r/b", 1, "abc"))
@@ -1,5 +1,7 @@
+import time
 import pytest
 from unittest.mock import MagicMock, patch
+from psycopg import sql
 import scrapeddit.utils.connection_utils as mod
 
 
@@ -14,6 +16,34 @@ def test_reddit_session_success():
             assert reddit == mock_reddit
 
 
+def test_reddit_session_shares_rate_limited_requestor():
+    with patch("scrapeddit.utils.connection_utils.praw.Reddit") as reddit:
+        with mod.reddit_session():
+            pass
+        with mod.reddit_session():
+            pass
+
+    first, second = (c.kwargs for c in reddit.call_args_list)
+    assert first["requestor_class"] is mod.SharedRequestor
+    # one HTTP connection pool for every session
+    assert first["requestor_kwargs"]["session"] is (
+        second["requestor_kwargs"]["session"]
+    )
+
+
+def test_rate_limiter_waits_when_bucket_empty():
+    # 100 requests per second, burst of 2
+    limiter = mod.RateLimiter(per_minute=6000, burst=2)
+
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+
+    # the burst is free, the other 3 wait ~10ms each
+    assert 0.02 <= elapsed < 0.5
+
+
 def test_db_connection_success():
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
@@ -26,7 +56,9 @@ def test_db_connection_success():
         with mod.db_connection(schema="test_schema") as conn:
             assert conn == mock_conn
             mock_cursor.execute.assert_called_once_with(
-                'SET search_path TO "test_schema"'
+                sql.SQL("SET search_path TO {}").format(
+                    sql.Identifier("test_schema")
+                )
             )
     mock_conn.close.assert_called_once()
 
@@ -34,18 +34,69 @@ def test_db_execute(mock_with_resources):
     mock_conn.cursor.return_value.__exit__.return_value = False
 
     mock_cursor.execute = MagicMock()
-    mock_cursor.fetchall.return_value = []
-    mock_cursor.description = ("col",)
+    mock_cursor.fetchmany.return_value = []
+    mock_cursor.description = (MagicMock(),)
 
     sql = "SELECT 1;"
 
     mod.db_execute(mock_conn, sql)
 
     mock_cursor.execute.assert_called_once_with(sql)
+    # queries are declared as a named server-side cursor
+    assert mock_conn.cursor.call_args.kwargs["name"].startswith("db_")
+    mock_conn.transaction.assert_called_once()
 
 
 @patch("scrapeddit.utils.db_utils.console")
-def test_db_execute_prints_rows_affected(mock_console, mock_with_resources):
+def test_db_execute_streams_pages(mock_console, mock_with_resources):
+    mod = mock_with_resources
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    col = MagicMock()
+    col.name = "n"
+    mock_cursor.description = (col,)
+    mock_cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)]]
+
+    mod.db_execute(mock_conn, "SELECT n FROM t", limit=3, page_size=2)
+
+    assert [c.args[0] for c in mock_cursor.fetchmany.call_args_list] == [
+        2,
+        1,
+    ]
+    tables = [c.args[0] for c in mock_console.print.call_args_list[:-1]]
+    assert [t.row_count for t in tables] == [2, 1]
+    assert mock_console.print.call_args.args[0].startswith(
+        "3 rows (limit reached) in"
+    )
+
+
+@patch("scrapeddit.utils.db_utils.console")
+def test_db_execute_ctrl_c_cancels_query(mock_console, mock_with_resources):
+    mod = mock_with_resources
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_cursor.description = (MagicMock(),)
+    mock_cursor.fetchmany.side_effect = [[(1,)], KeyboardInterrupt]
+
+    mod.db_execute(mock_conn, "SELECT * FROM comments")
+
+    mock_conn.cancel_safe.assert_called_once()
+    assert mock_console.print.call_args.args[0].startswith(
+        "Query cancelled after 1 rows"
+    )
+
+
+@patch("scrapeddit.utils.db_utils.time")
+@patch("scrapeddit.utils.db_utils.console")
+def test_db_execute_prints_rows_affected(
+    mock_console, mock_time, mock_with_resources
+):
     mod = mock_with_resources
 
     mock_conn = MagicMock()
@@ -54,10 +105,13 @@ def test_db_execute_prints_rows_affected(mock_console, mock_with_resources):
     mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
     mock_cursor.description = None
     mock_cursor.rowcount = 3
+    mock_time.perf_counter.side_effect = [0.0, 0.25]
 
     mod.db_execute(mock_conn, "UPDATE x")
 
-    mock_console.print.assert_called_once_with("Query OK, 3 rows affected.")
+    mock_console.print.assert_called_once_with(
+        "Query OK, 3 rows affected in 0.25s."
+    )
 
 
 @patch("scrapeddit.utils.db_utils.console")
@@ -326,3 +380,84 @@ def test_batch_insert_comments_overwrite(mock_with_resources):
     mod.batch_insert_comments(mock_conn, comments_data, overwrite=True)
 
     mock_cursor.executemany.assert_called_once()
+
+
+def test_comment_insert_statement_updates_changed_rows(mock_with_resources):
+    mod = mock_with_resources
+
+    statement = mod.comment_insert_statement(overwrite=True)
+
+    assert statement.startswith("INSERT INTO comments (name, author, body,")
+    assert "body=EXCLUDED.body" in statement
+    assert "name=EXCLUDED" not in statement
+    assert statement.endswith(
+        "WHERE comments.fingerprint IS DISTINCT FROM EXCLUDED.fingerprint"
+    )
+    assert mod.comment_insert_statement().endswith(
+        "ON CONFLICT (name) DO NOTHING"
+    )
+
+
+def test_copy_rows_stages_then_upserts(mock_with_resources):
+    mod = mock_with_resources
+
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    copy = mock_cursor.copy.return_value.__enter__.return_value
+    mock_cursor.rowcount = 2
+    rows = [("t3_a",) + ("x",) * 10, ("t3_b",) + ("y",) * 10]
+
+    written = mod.copy_rows(
+        mock_conn, "submissions", mod.SUBMISSION_COLUMNS, rows, True
+    )
+
+    assert written == 2
+    mock_conn.transaction.assert_called_once()
+    assert copy.write_row.call_count == 2
+    create, insert = [
+        c.args[0].as_string(None) for c in mock_cursor.execute.call_args_list
+    ]
+    assert 'CREATE TEMP TABLE "submissions_staging"' in create
+    assert "ON COMMIT DROP" in create
+    assert "SELECT DISTINCT ON (name)" in insert
+    assert "submissions.fingerprint IS DISTINCT FROM" in insert
+
+    mod.copy_rows(mock_conn, "comments", mod.COMMENT_COLUMNS, b"t1_a\t...\n")
+
+    copy.write.assert_called_once_with(b"t1_a\t...\n")
+    # texts repeated in the batch are shared before the rows move over
+    share, insert = [
+        c.args[0].as_string(None)
+        for c in mock_cursor.execute.call_args_list[3:]
+    ]
+    assert share.startswith("INSERT INTO bodies")
+    assert "HAVING count(*) >= %s" in share
+    assert "body_id=EXCLUDED.body_id" not in insert
+
+
+def test_queue_comments_shares_repeated_bodies(
+    mock_with_resources, monkeypatch
+):
+    mod = mock_with_resources
+    writer = MagicMock()
+    monkeypatch.setattr(mod, "writer", lambda: writer)
+    notice = "I am a bot, and this action was performed automatically."
+
+    def row(name, body):
+        return (name, "u", body, 0, False, 1, "t3_s", "t3_s", "r/s", 1)
+
+    rows = [row("t1_a", notice), row("t1_b", notice), row("t1_c", "hi")]
+    mod.queue_comments(rows, overwrite=True)
+
+    (share, shared), (insert, written) = (
+        c.args for c in writer.put.call_args_list
+    )
+    assert share == mod.SHARE_BODIES and shared == [([notice],)]
+    assert written == rows
+    # an upsert keeps the reference the trigger set on the new row
+    assert "body_id=EXCLUDED.body_id" in insert
+
+    writer.reset_mock()
+    mod.queue_comments(rows[2:])
+    assert writer.put.call_count == 1
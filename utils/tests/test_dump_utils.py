@@ -0,0 +1,323 @@
+import gzip
+import importlib
+import io
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import pytest
+import zstandard
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.dump_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def comment(i, subreddit="python", author="Alice", **extra):
+    return {
+        "id": f"c{i}",
+        "author": author,
+        "body": f"line one\ttab\nline {i}\\",
+        "created_utc": 1704067200 + i,
+        "edited": False,
+        "score": i,
+        "parent_id": "t3_s1",
+        "link_id": "t3_s1",
+        "subreddit": subreddit,
+        **extra,
+    }
+
+
+def submission(i, subreddit="python"):
+    return {
+        "id": f"s{i}",
+        "author": "[deleted]",
+        "title": f"title {i}",
+        "selftext": "",
+        "url": "https://example.com",
+        "permalink": f"/r/{subreddit}/comments/s{i}/",
+        "created_utc": str(1704067200 + i),
+        "edited": 1704070000,
+        "score": 3,
+        "subreddit": subreddit,
+    }
+
+
+def ndjson(records) -> bytes:
+    return b"".join(json.dumps(r).encode() + b"\n" for r in records)
+
+
+def copy_lines(text: bytes) -> list[list[str]]:
+    return [line.split("\t") for line in text.decode().splitlines()]
+
+
+def test_make_filter_normalises_names_and_dates(mock_with_resources):
+    mod = mock_with_resources
+
+    dump_filter = mod.make_filter(
+        ["r/Python", "rust"], ["u/Alice"], since="2024-01-01"
+    )
+
+    assert dump_filter.subreddits == {"python", "rust"}
+    assert dump_filter.authors == {"alice"}
+    assert dump_filter.since == 1704067200.0
+    assert dump_filter.until is None
+
+
+def test_parse_block_maps_dump_records_to_rows(mock_with_resources):
+    mod = mock_with_resources
+    block = ndjson([comment(1), submission(2)]) + b"{not json\n\n"
+
+    parsed = mod.parse_block(block, mod.make_filter())
+
+    assert (parsed.lines, parsed.malformed, parsed.skipped) == (3, 1, 0)
+    assert (parsed.n_comments, parsed.n_submissions) == (1, 1)
+    assert parsed.threads == {"t3_s1"}
+    expected = mod.comment_row(
+        {
+            **comment(1),
+            "name": "t1_c1",
+            "ups": 1,
+            "subreddit_name_prefixed": "r/python",
+        }
+    )
+    (row,) = copy_lines(parsed.comments)
+    assert row[0] == "t1_c1"
+    assert row[2] == "line one\\ttab\\nline 1\\\\"
+    assert row[3] == "2024-01-01T00:00:01+00:00"
+    assert row[4] == "f"
+    assert row[8] == "r/python"
+    assert row[9] == str(expected.fingerprint)
+    (row,) = copy_lines(parsed.submissions)
+    assert row[0] == "t3_s2"
+    assert row[1] == "None"
+    assert row[6] == "t"
+    assert row[8] == "python"
+
+
+def test_parse_block_filters_records(mock_with_resources):
+    mod = mock_with_resources
+    block = ndjson(
+        [
+            comment(1),
+            comment(2, subreddit="rust"),
+            comment(3, author="bob"),
+            # mentions python, but in another field
+            comment(4, subreddit="golang", author="python"),
+            comment(5, author="ALICE"),
+        ]
+    )
+    dump_filter = mod.make_filter(
+        ["python"], ["alice"], until="2024-01-01T00:00:05"
+    )
+
+    parsed = mod.parse_block(block, dump_filter)
+
+    assert parsed.skipped == 4
+    assert [row[0] for row in copy_lines(parsed.comments)] == ["t1_c1"]
+
+
+def test_copy_field_formats_values(mock_with_resources):
+    mod = mock_with_resources
+
+    assert mod.copy_field(None) == "\\N"
+    assert mod.copy_field(True) == "t"
+    assert mod.copy_field(0) == "0"
+    assert mod.copy_field("a\x00b\rc") == "ab\\rc"
+    assert (
+        mod.copy_field(datetime(2024, 1, 2, tzinfo=timezone.utc))
+        == "2024-01-02T00:00:00+00:00"
+    )
+
+
+def test_read_blocks_end_on_line_boundaries(mock_with_resources):
+    mod = mock_with_resources
+    data = b"".join(b"x" * (i % 7) + b"\n" for i in range(100)) + b"tail"
+
+    blocks = list(mod.read_blocks(io.BytesIO(data), block_bytes=16))
+
+    assert b"".join(blocks) == data
+    assert all(block.endswith(b"\n") for block in blocks[:-1])
+    assert blocks[-1].endswith(b"tail")
+
+
+def test_dump_files_and_open_dump(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    (tmp_path / "RS_2024-02.gz").write_bytes(gzip.compress(b"{}\n"))
+    (tmp_path / "RC_2024-01.ndjson").write_bytes(b"{}\n")
+    (tmp_path / "notes.txt").write_text("not a dump")
+
+    paths = mod.dump_files(str(tmp_path))
+
+    assert [p.rsplit("/", 1)[-1] for p in paths] == [
+        "RC_2024-01.ndjson",
+        "RS_2024-02.gz",
+    ]
+    with mod.open_dump(paths[1]) as stream:
+        assert stream.read() == b"{}\n"
+
+
+def test_load_dump_copies_in_batches(mock_with_resources, monkeypatch):
+    mod = mock_with_resources
+    monkeypatch.setattr(mod, "LOAD_ROWS", 2)
+    blocks = [
+        ndjson([comment(1), comment(2, link_id="t3_s2")]),
+        ndjson([submission(3)]),
+    ]
+    monkeypatch.setattr(mod, "_all_blocks", lambda paths: iter(blocks))
+    monkeypatch.setattr(
+        mod,
+        "parsed_blocks",
+        lambda blocks, dump_filter, workers: (
+            (mod.parse_block(b, dump_filter), len(b)) for b in blocks
+        ),
+    )
+    copies = []
+
+    def fake_copy_rows(conn, table, columns, rows, overwrite):
+        copies.append((table, len(rows.splitlines())))
+        return len(rows.splitlines())
+
+    monkeypatch.setattr(mod, "copy_rows", fake_copy_rows)
+    fill = MagicMock(return_value=(2, 0))
+    monkeypatch.setattr(mod, "fill_tree_columns", fill)
+
+    stats = mod.load_dump(MagicMock(), ["RC"], mod.make_filter())
+
+    assert copies == [("comments", 2), ("submissions", 1)]
+    assert stats["lines"] == 3
+    assert stats["comments_written"] == 2
+    assert stats["submissions_written"] == 1
+    # the new comments are placed afterwards, only in their threads
+    fill.assert_called_once()
+    assert fill.call_args.args[1] == ["t3_s1", "t3_s2"]
+    assert (stats["placed"], stats["unplaced"]) == (2, 0)
+
+
+def test_import_dump_reports_lines_per_second(
+    mock_with_resources, monkeypatch, tmp_path
+):
+    mod = mock_with_resources
+    path = tmp_path / "RC_2024-01.ndjson"
+    path.write_bytes(b"{}\n")
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    load_dump = MagicMock(
+        return_value=Counter(lines=1000, comments=10, comments_written=4)
+    )
+    monkeypatch.setattr(mod, "load_dump", load_dump)
+
+    mod.import_dump(str(path), subreddits=["python"], workers=2)
+
+    paths, dump_filter, workers, overwrite = load_dump.call_args.args
+    assert paths == [str(path)] and workers == 2 and not overwrite
+    assert dump_filter.subreddits == {"python"}
+    printed = " ".join(c.args[0] for c in console.print.call_args_list)
+    assert "1,000" in printed and "lines/s" in printed
+
+
+def test_load_dump_reads_zst_and_places_comments(
+    mock_with_resources, monkeypatch, tmp_path
+):
+    mod = mock_with_resources
+    # a reply, its parent and a top-level comment in another thread
+    records = [
+        comment(2, parent_id="t1_c1"),
+        comment(1),
+        comment(3, link_id="t3_s9", parent_id="t3_s9"),
+        submission(4),
+    ]
+    path = tmp_path / "RC_2024-01.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(ndjson(records)))
+    stored = {}
+
+    def fake_copy_rows(conn, table, columns, rows, overwrite):
+        lines = [line.split("\t") for line in rows.decode().splitlines()]
+        if table == "comments":
+            for line in lines:
+                row = dict(zip(columns, line))
+                stored[row["name"]] = (row["submission_id"], row["parent_id"])
+        return len(lines)
+
+    monkeypatch.setattr(mod, "copy_rows", fake_copy_rows)
+    conn = MagicMock()
+    read_cur, write_cur = MagicMock(), MagicMock()
+    conn.cursor.side_effect = lambda **kw: MagicMock(
+        __enter__=MagicMock(return_value=read_cur if kw else write_cur)
+    )
+
+    def read(statement, params):
+        (threads,) = params
+        read_cur.__iter__.return_value = iter(
+            sorted(
+                (sub, name, parent, None)
+                for name, (sub, parent) in stored.items()
+                if sub in threads
+            )
+        )
+
+    read_cur.execute.side_effect = read
+    written = []
+    copy = write_cur.copy.return_value.__enter__.return_value
+    copy.write_row.side_effect = lambda row: written.append(row)
+    write_cur.rowcount = 3
+
+    stats = mod.load_dump(conn, [str(path)], mod.make_filter(), workers=1)
+
+    assert (stats["lines"], stats["comments"], stats["submissions"]) == (
+        4,
+        3,
+        1,
+    )
+    assert sorted(stored) == ["t1_c1", "t1_c2", "t1_c3"]
+    assert read_cur.execute.call_args.args[1] == [["t3_s1", "t3_s9"]]
+    assert sorted(written) == [
+        ("t1_c1", 0, "t1_c1", "000000c1"),
+        ("t1_c2", 1, "t1_c1", "000000c1/000000c2"),
+        ("t1_c3", 0, "t1_c3", "000000c3"),
+    ]
+    assert (stats["placed"], stats["unplaced"]) == (3, 0)
+
+
+def test_import_dump_needs_zstandard_for_zst(
+    mock_with_resources, monkeypatch, tmp_path
+):
+    mod = mock_with_resources
+    path = tmp_path / "RC_2024-01.zst"
+    path.write_bytes(b"")
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    monkeypatch.setattr(mod, "zstandard", None)
+    load_dump = MagicMock()
+    monkeypatch.setattr(mod, "load_dump", load_dump)
+
+    mod.import_dump(str(path))
+
+    load_dump.assert_not_called()
+    assert "zstandard" in console.print.call_args.args[0]
+
+
+def test_parsed_blocks_keeps_block_order(mock_with_resources):
+    mod = mock_with_resources
+    blocks = [ndjson([comment(i)]) for i in range(5)]
+
+    parsed = list(mod.parsed_blocks(blocks, mod.make_filter(), workers=2))
+
+    assert [size for _, size in parsed] == [len(b) for b in blocks]
+    names = [copy_lines(p.comments)[0][0] for p, _ in parsed]
+    assert names == [f"t1_c{i}" for i in range(5)]
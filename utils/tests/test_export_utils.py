@@ -0,0 +1,181 @@
+import gzip
+import importlib
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import psycopg
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.export_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def column(name, type_code):
+    col = MagicMock()
+    col.name = name
+    col.type_code = type_code
+    return col
+
+
+def mock_conn(description, batches):
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cursor.description = description
+    cursor.fetchmany.side_effect = [*batches, []]
+    return conn, cursor
+
+
+def test_export_source(mock_with_resources):
+    mod = mock_with_resources
+
+    query, name = mod.export_source("test.comments;")
+    assert name == "test_comments"
+    assert "Identifier" in repr(query)
+
+    query, name = mod.export_source("SELECT * FROM comments WHERE ups > 5")
+    assert name == "query"
+
+
+def test_export_source_comments_reads_shared_texts(mock_with_resources):
+    mod = mock_with_resources
+    conn, cursor = mock_conn(None, [])
+    cursor.fetchall.return_value = [("name",), ("body",), ("body_id",)]
+
+    query, name = mod.export_source("comments", conn)
+
+    text = repr(query)
+    assert "coalesce(t.body, b.body) AS body" in text
+    assert "'body_id'" not in text and "shared_body" not in text
+    assert cursor.execute.call_args.args[1] == ("comments", None)
+
+
+def test_output_path(mock_with_resources):
+    mod = mock_with_resources
+
+    assert mod.output_path("out", "comments", "csv", "gzip") == (
+        "out/comments.csv.gz"
+    )
+    assert mod.output_path("out", "comments", "parquet", "gzip", "r/py") == (
+        "out/comments/r_py.parquet"
+    )
+
+
+def test_split_export_one_file_per_key(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    description = [column("export_key", 25), column("name", 25)]
+    # keys are ordered by the query; a key spans the batch boundary
+    batches = [
+        [("r/a", "t1_1"), ("r/a", "t1_2"), ("r/b", "t1_3")],
+        [("r/b", "t1_4"), ("r/c", "t1_5")],
+    ]
+    conn, cursor = mock_conn(description, batches)
+
+    rows, size, files = mod.export_query(
+        conn,
+        "comments",
+        fmt="csv",
+        split="subreddit",
+        compression="none",
+        out_dir=str(tmp_path),
+    )
+
+    assert (rows, files) == (5, 3)
+    assert "ORDER BY 1" in repr(cursor.execute.call_args.args[0])
+    written = {
+        p.name: p.read_text().split()
+        for p in (tmp_path / "comments").iterdir()
+    }
+    assert written == {
+        "r_a.csv": ["name", "t1_1", "t1_2"],
+        "r_b.csv": ["name", "t1_3", "t1_4"],
+        "r_c.csv": ["name", "t1_5"],
+    }
+    assert size == sum(
+        p.stat().st_size for p in (tmp_path / "comments").iterdir()
+    )
+
+
+def test_parquet_export_typed(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    description = [
+        column("name", 25),
+        column("ups", 23),
+        column("created_utc", 1184),
+        column("meta", 3802),
+    ]
+    batches = [[("t1_1", 5, created, {"a": 1})], [("t1_2", None, None, None)]]
+    conn, _ = mock_conn(description, batches)
+
+    rows, _, files = mod.export_query(
+        conn, "comments", fmt="parquet", out_dir=str(tmp_path)
+    )
+    table = pq.read_table(tmp_path / "comments.parquet")
+
+    assert (rows, files) == (2, 1)
+    assert table.schema.field("ups").type == pa.int32()
+    assert table["ups"].to_pylist() == [5, None]
+    assert table["created_utc"].to_pylist()[0] == created
+    assert table["meta"].to_pylist() == ['{"a": 1}', None]
+
+
+def test_csv_export_uses_copy(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    conn, cursor = mock_conn([], [])
+    copy = cursor.copy.return_value.__enter__.return_value
+    copy.__iter__.return_value = iter([b"name\n", b"t1_1\n"])
+    cursor.rowcount = 1
+
+    rows, _, files = mod.export_query(conn, "comments", out_dir=str(tmp_path))
+
+    assert (rows, files) == (1, 1)
+    assert "COPY" in repr(cursor.copy.call_args.args[0])
+    with gzip.open(tmp_path / "comments.csv.gz") as f:
+        assert f.read() == b"name\nt1_1\n"
+
+
+def test_cancel_removes_partial_file(mock_with_resources, tmp_path):
+    mod = mock_with_resources
+    conn, cursor = mock_conn([column("name", 25)], [])
+    cursor.fetchmany.side_effect = [[("t1_1",)], KeyboardInterrupt]
+
+    with pytest.raises(KeyboardInterrupt):
+        mod.export_query(conn, "comments", fmt="jsonl", out_dir=str(tmp_path))
+
+    conn.cancel_safe.assert_called_once()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_export_reports_database_errors(mock_with_resources, monkeypatch):
+    mod = mock_with_resources
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    monkeypatch.setattr(
+        mod,
+        "export_query",
+        MagicMock(side_effect=psycopg.errors.SyntaxError("near [x]")),
+    )
+
+    mod.export("SELEC 1")
+
+    assert console.print.call_args.args[0] == (
+        "[red]Export failed:[/red] near \\[x]"
+    )
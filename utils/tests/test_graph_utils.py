@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+import scrapeddit.utils.graph_utils as mod
+
+
+def make_tables():
+    edge_df = pd.DataFrame(
+        {
+            "sub1": ["r/a", "r/a", "r/b"],
+            "sub2": ["r/b", "r/c", "r/c"],
+            "weight": [5, 7, 9],
+        }
+    )
+    counts = pd.DataFrame(
+        {"subreddit": ["r/a", "r/b", "r/c"], "comment_count": [10, 20, 30]}
+    )
+    return mod.build_graph_tables(edge_df, counts)
+
+
+def test_build_graph_tables_types():
+    edges, nodes = make_tables()
+
+    assert edges.schema == mod.EDGE_SCHEMA
+    assert nodes.schema == mod.NODE_SCHEMA
+    assert nodes["subreddit"].to_pylist() == ["r/a", "r/b", "r/c"]
+    assert nodes["comment_count"].to_pylist() == [10, 20, 30]
+    assert edges["sub1_id"].to_pylist() == [0, 0, 1]
+    assert edges["sub2_id"].to_pylist() == [1, 2, 2]
+
+
+def test_build_graph_tables_missing_counts():
+    edge_df = pd.DataFrame({"sub1": ["r/a"], "sub2": ["r/b"], "weight": [1]})
+
+    _, nodes = mod.build_graph_tables(edge_df)
+
+    assert nodes["comment_count"].to_pylist() == [0, 0]
+
+
+def test_build_csr_symmetric_and_drops_self_loops():
+    indptr, indices, weights = mod.build_csr(
+        np.array([0, 0, 1]), np.array([1, 1, 1]), np.array([2, 3, 4]), 3
+    )
+
+    assert indptr.tolist() == [0, 2, 4, 4]
+    assert indices.tolist() == [1, 1, 0, 0]
+    assert sorted(weights.tolist()) == [2, 2, 3, 3]
+
+
+def test_load_graph_round_trip(tmp_path):
+    edges, nodes = make_tables()
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    mod.write_graph_tables(edges, nodes, edges_path, nodes_path)
+
+    graph = mod.load_graph(edges_path, nodes_path)
+
+    assert graph.n_nodes == 3
+    assert graph.n_edges == 3
+    nbrs, w = graph.neighbors(0)
+    assert nbrs.tolist() == [1, 2]
+    assert w.tolist() == [5.0, 7.0]
+    assert graph.strength().tolist() == [12.0, 14.0, 16.0]
+    G = graph.to_networkx()
+    assert G["r/b"]["r/c"]["weight"] == 9.0
+    assert G.nodes["r/c"]["comment_count"] == 30
+
+
+def test_write_gexf_readable_by_networkx(tmp_path, monkeypatch):
+    edges, nodes = make_tables()
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    mod.write_graph_tables(edges, nodes, edges_path, nodes_path)
+    graph = mod.load_graph(edges_path, nodes_path)
+    # force several chunks
+    monkeypatch.setattr(mod, "WRITE_CHUNK", 2)
+
+    mod.write_gexf(graph, str(tmp_path / "g.gexf"))
+    G = nx.read_gexf(str(tmp_path / "g.gexf"))
+
+    assert set(G.nodes) == {"r/a", "r/b", "r/c"}
+    assert G.number_of_edges() == 3
+    assert G["r/a"]["r/c"]["weight"] == 7.0
+    assert G.nodes["r/a"]["comment_count"] == 10
+
+
+def test_write_graphml_readable_by_networkx(tmp_path):
+    edges, nodes = make_tables()
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    mod.write_graph_tables(edges, nodes, edges_path, nodes_path)
+    graph = mod.load_graph(edges_path, nodes_path)
+
+    mod.write_graphml(graph, str(tmp_path / "g.graphml"))
+    G = nx.read_graphml(str(tmp_path / "g.graphml"))
+
+    assert G.number_of_edges() == 3
+    assert G["r/a"]["r/b"]["weight"] == 5.0
+    assert G.nodes["r/b"]["comment_count"] == 20
+
+
+def star_and_triangle():
+    """Node 0 is a hub of 1..4; 5, 6, 7 form a triangle hanging off 4."""
+    src = np.array([0, 0, 0, 0, 4, 5, 5, 6])
+    dst = np.array([1, 2, 3, 4, 5, 6, 7, 7])
+    w = np.array([1, 2, 3, 4, 5, 6, 7, 8], dtype=float)
+    indptr, indices, weights = mod.build_csr(src, dst, w, 8)
+    return mod.CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=np.array([f"r/{i}" for i in range(8)]),
+        node_attrs={
+            "comment_count": np.arange(8, 0, -1),
+            "community": np.array([0, 0, 0, 0, 0, 1, 1, 1]),
+        },
+    )
+
+
+def test_k_core():
+    keep = mod.k_core(star_and_triangle(), 2)
+
+    assert np.flatnonzero(keep).tolist() == [5, 6, 7]
+
+
+def test_top_k_edges():
+    view = mod.top_k_edges(star_and_triangle(), 1)
+
+    nbrs, _ = view.neighbors(0)
+    # hub keeps only its heaviest edge, leaves keep their only edge
+    assert nbrs.tolist() == [1, 2, 3, 4]
+    assert view.n_edges < star_and_triangle().n_edges
+
+
+def test_ego_network():
+    keep = mod.ego_network(star_and_triangle(), 4, radius=1)
+
+    assert np.flatnonzero(keep).tolist() == [0, 4, 5]
+
+
+def test_bounded_view_caps_nodes_and_keeps_focus():
+    view = mod.bounded_view(
+        star_and_triangle(), max_nodes=2, focus="r/5", radius=2
+    )
+
+    assert view.n_nodes == 2
+    assert "r/5" in view.labels.tolist()
+
+
+def test_bounded_view_filters_community(monkeypatch):
+    monkeypatch.setattr(mod, "MAX_VIEW_EDGES", 2)
+
+    view = mod.bounded_view(star_and_triangle(), communities=[1])
+
+    assert view.labels.tolist() == ["r/5", "r/6", "r/7"]
+    assert view.n_edges == 2
+
+
+def test_bounded_view_caps_tied_edges_exactly():
+    # complete graph on 100 nodes, every weight equal
+    src, dst = np.triu_indices(100, k=1)
+    indptr, indices, weights = mod.build_csr(src, dst, np.ones(len(src)), 100)
+    graph = mod.CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=np.array([f"r/{i}" for i in range(100)]),
+    )
+
+    view = mod.bounded_view(graph, max_edges=1000)
+
+    assert view.n_nodes == 100
+    assert view.n_edges == 1000
+
+
+def test_to_vis_data():
+    data = mod.to_vis_data(star_and_triangle())
+
+    assert len(data["nodes"]) == 8
+    assert data["nodes"][5]["group"] == 1
+    assert {"from": 0, "to": 1, "value": 1.0} in data["edges"]
+
+
+def test_update_node_table(tmp_path):
+    edges, nodes = make_tables()
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    mod.write_graph_tables(edges, nodes, edges_path, nodes_path)
+
+    mod.update_node_table(nodes_path, {"community": np.array([2, 1, 0])})
+    mod.update_node_table(nodes_path, {"community": np.array([0, 1, 2])})
+    graph = mod.load_graph(edges_path, nodes_path)
+
+    assert graph.node_attrs["community"].tolist() == [0, 1, 2]
@@ -0,0 +1,88 @@
+import threading
+import scrapeddit.utils.jobs as mod
+
+
+def test_job_runs_and_reports_progress():
+    manager = mod.JobManager(slots=1)
+
+    def work(n):
+        job = mod.current_job()
+        for i in range(n):
+            job.progress(i + 1, n)
+        return "ok"
+
+    job = manager.submit("work 3", work, n=3)
+    manager.wait([job.id])
+
+    assert job.status == "done"
+    assert job.result == "ok"
+    assert (job.current, job.total) == (3, 3)
+    assert manager.active() == []
+    assert mod.current_job() is None
+
+
+def test_failed_job_keeps_error():
+    manager = mod.JobManager(slots=1)
+
+    def boom():
+        raise ValueError("bad")
+
+    job = manager.submit("boom", boom)
+    manager.wait()
+
+    assert job.status == "failed"
+    assert job.error == "ValueError: bad"
+
+
+def test_cancel_queued_job_never_runs():
+    manager = mod.JobManager(slots=1)
+    release = threading.Event()
+    ran = []
+
+    first = manager.submit("block", release.wait)
+    second = manager.submit("queued", lambda: ran.append(1))
+
+    assert manager.cancel(second.id)
+    release.set()
+    manager.wait([first.id, second.id])
+
+    assert second.status == "cancelled"
+    assert ran == []
+    assert not manager.cancel(second.id)
+
+
+def test_map_unordered_bounds_in_flight_and_stops_on_cancel():
+    job = mod.Job(id=1, command="test")
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work(item):
+        with lock:
+            running.append(item)
+            peak.append(len(running))
+        with lock:
+            running.remove(item)
+        return item * 2
+
+    results = []
+    for item, future in mod.map_unordered(work, range(20), 3, job):
+        results.append(future.result())
+        if len(results) == 5:
+            job.cancel_event.set()
+
+    assert max(peak) <= 3
+    # items already submitted finish, nothing new is started
+    assert 5 <= len(results) <= 5 + 3
+    assert all(r % 2 == 0 for r in results)
+
+
+def test_status_is_silent_inside_a_job():
+    manager = mod.JobManager(slots=1)
+    seen = []
+
+    job = manager.submit("s", lambda: seen.append(mod.status("x")))
+    manager.wait([job.id])
+
+    assert type(seen[0]).__name__ == "nullcontext"
+    assert type(mod.status("x")).__name__ == "Status"
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+from unittest.mock import patch
+import scrapeddit.utils.graph_utils as graph_utils
+import scrapeddit.utils.layout_utils as mod
+
+
+def two_cliques():
+    edges = []
+    for offset in (0, 6):
+        for i in range(6):
+            for j in range(i + 1, 6):
+                edges.append((offset + i, offset + j, 10.0))
+    edges.append((5, 6, 1.0))
+    src, dst, w = (np.array(x) for x in zip(*edges))
+    indptr, indices, weights = graph_utils.build_csr(src, dst, w, 12)
+    return graph_utils.CSRGraph(
+        indptr=indptr,
+        indices=indices,
+        weights=weights,
+        labels=np.array([f"r/{i}" for i in range(12)]),
+        node_attrs={"comment_count": np.arange(12)},
+    )
+
+
+def exact_repulsion(pos, mass):
+    delta = pos[:, None, :] - pos[None, :, :]
+    d2 = (delta**2).sum(axis=-1)
+    np.fill_diagonal(d2, np.inf)
+    return (delta * (mass[:, None] * mass[None, :] / d2)[..., None]).sum(1)
+
+
+def test_repulsion_matches_exact():
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(-50, 50, size=(400, 2))
+    mass = rng.integers(1, 5, 400).astype(float)
+
+    approx = mod.repulsion(pos, mass, theta=0.5)
+    exact = exact_repulsion(pos, mass)
+
+    err = np.linalg.norm(approx - exact) / np.linalg.norm(exact)
+    assert err < 0.02
+
+
+def test_repulsion_theta_zero_is_exact():
+    rng = np.random.default_rng(1)
+    pos = rng.uniform(-50, 50, size=(100, 2))
+    mass = np.ones(100)
+
+    approx = mod.repulsion(pos, mass, theta=0.0)
+
+    assert np.allclose(approx, exact_repulsion(pos, mass))
+
+
+def test_force_layout_is_seeded_and_separates_cliques():
+    first = mod.force_layout(two_cliques(), iterations=100, seed=2)
+    second = mod.force_layout(two_cliques(), iterations=100, seed=2)
+
+    assert np.array_equal(first, second)
+    within = np.linalg.norm(first[0] - first[1])
+    between = np.linalg.norm(first[:6].mean(0) - first[6:].mean(0))
+    assert between > within
+
+
+def test_force_layout_warm_start_places_new_nodes_near_neighbours():
+    graph = two_cliques()
+    pos = mod.force_layout(graph, iterations=100, seed=0)
+    initial = pos.copy()
+    initial[11] = np.nan
+
+    warm = mod.force_layout(graph, iterations=10, seed=0, initial=initial)
+
+    # known nodes barely move, the new one joins its own clique
+    scale = np.abs(pos).max()
+    known = warm[:11] / np.abs(warm[:11]).max() * scale
+    assert np.abs(known - pos[:11]).mean() < 0.25 * scale
+    to_own = np.linalg.norm(warm[11] - warm[6:11].mean(0))
+    to_other = np.linalg.norm(warm[11] - warm[:6].mean(0))
+    assert to_own < to_other
+
+
+def test_normalise():
+    pos = mod.normalise(np.array([[0.0, 0.0], [10.0, 4.0]]), extent=100)
+
+    assert np.abs(pos).max() == 100
+    assert np.allclose(pos.mean(axis=0), 0)
+
+
+@patch("scrapeddit.utils.layout_utils.console")
+def test_graph_layout_writes_node_table(mock_console, tmp_path):
+    graph = two_cliques()
+    src, dst, w = graph.edge_list()
+    edges, nodes = graph_utils.build_graph_tables(
+        pd.DataFrame(
+            {"sub1": graph.labels[src], "sub2": graph.labels[dst], "weight": w}
+        )
+    )
+    edges_path = str(tmp_path / "edges.parquet")
+    nodes_path = str(tmp_path / "nodes.parquet")
+    cache_path = str(tmp_path / "cache" / "layout.parquet")
+    graph_utils.write_graph_tables(edges, nodes, edges_path, nodes_path)
+
+    mod.graph_layout(
+        iterations=20,
+        edges_path=edges_path,
+        nodes_path=nodes_path,
+        cache_path=cache_path,
+    )
+    laid_out = graph_utils.load_graph(edges_path, nodes_path)
+
+    assert np.abs(laid_out.node_attrs["x"]).max() <= mod.LAYOUT_EXTENT
+    assert mod.previous_layout(laid_out, cache_path).shape == (12, 2)
+
+    graph_utils.write_gexf(laid_out, str(tmp_path / "g.gexf"))
+    G = nx.read_gexf(str(tmp_path / "g.gexf"))
+    assert "viz" in G.nodes["r/0"]
+    assert "x" not in G.nodes["r/0"]
@@ -0,0 +1,55 @@
+import threading
+import scrapeddit.utils.progress as mod
+
+
+def test_counters_are_atomic_across_threads():
+    bus = mod.ProgressBus("test")
+
+    def work():
+        for _ in range(1000):
+            bus.add(rows=2, requests=1)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = bus.snapshot()
+
+    assert snap["rows"] == 16_000
+    assert snap["requests"] == 8_000
+
+
+def test_bind_sets_current_bus_and_clears_worker():
+    bus = mod.ProgressBus("test")
+
+    @bus.track
+    def work():
+        mod.current_bus().worker("busy")
+        return dict(bus.snapshot()["workers"])
+
+    workers = work()
+
+    assert [status for status, _ in workers.values()] == ["busy"]
+    assert bus.snapshot()["workers"] == {}
+    assert mod.current_bus() is None
+
+
+def test_eta_from_expected_comments():
+    bus = mod.ProgressBus("test", total_items=4, expected_comments=1000)
+    bus.add(items=1, comments=250)
+
+    snap = bus.snapshot()
+
+    # 750 left at the observed rate is 3x the elapsed time
+    assert abs(snap["eta"] - 3 * snap["elapsed"]) < 0.1 * snap["elapsed"]
+
+
+def test_render_and_summary():
+    bus = mod.ProgressBus("r/python", total_items=2, expected_comments=10)
+    bus.add(items=1, rows=5, comments=5, rate_limited=1)
+
+    mod.console.print(bus.render())
+
+    assert "1 rate-limited" in bus.summary()
+    assert isinstance(bus.live(quiet=True), mod.nullcontext)
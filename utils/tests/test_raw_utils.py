@@ -0,0 +1,266 @@
+import copy
+import time
+import tracemalloc
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import praw
+import pytest
+import scrapeddit.utils.raw_utils as mod
+from scrapeddit.utils.reddit_utils import format_comment, format_submission
+
+LINK = "t3_s1"
+
+
+def _comment(i: int, parent: str = LINK, replies=None) -> dict:
+    data = {
+        "id": f"c{i}",
+        "name": f"t1_c{i}",
+        "author": "[deleted]" if i % 7 == 0 else f"user{i % 13}",
+        "body": f"comment &amp; body {i}",
+        "created_utc": 1_700_000_000.0 + i,
+        "edited": 1_700_000_500.0 if i % 5 == 0 else False,
+        "ups": i * 3,
+        "parent_id": parent,
+        "link_id": LINK,
+        "subreddit": "python",
+        "subreddit_name_prefixed": "r/python",
+        "permalink": f"/r/python/comments/s1/_/c{i}/",
+        "replies": "",
+    }
+    if replies:
+        data["replies"] = {
+            "kind": "Listing",
+            "data": {"children": replies, "after": None},
+        }
+    return {"kind": "t1", "data": data}
+
+
+def _more(children: list[str], parent: str = LINK) -> dict:
+    return {
+        "kind": "more",
+        "data": {
+            "count": len(children),
+            "children": children,
+            "parent_id": parent,
+            "id": children[0] if children else "_",
+            "name": "t1__",
+        },
+    }
+
+
+def _submission() -> dict:
+    return {
+        "kind": "t3",
+        "data": {
+            "id": "s1",
+            "name": LINK,
+            "author": "op",
+            "title": "A title",
+            "selftext": "Some text",
+            "url": "https://example.com",
+            "created_utc": 1_700_000_000.0,
+            "edited": False,
+            "ups": 42,
+            "num_comments": 5,
+            "subreddit": "python",
+            "permalink": "/r/python/comments/s1/a_title/",
+        },
+    }
+
+
+def _listing(children: list[dict]) -> dict:
+    return {"kind": "Listing", "data": {"children": children, "after": None}}
+
+
+@pytest.fixture
+def reddit():
+    # offline instance, only used to build PRAW objects from JSON
+    return praw.Reddit(
+        client_id="x", client_secret="x", user_agent="scrapeddit tests"
+    )
+
+
+def _praw_comments(reddit, things: list[dict]) -> list:
+    """Comments PRAW builds from the JSON, flattened depth first."""
+    out = []
+    stack = list(
+        reversed(reddit._objector.objectify(data=copy.deepcopy(things)))
+    )
+    while stack:
+        comment = stack.pop()
+        if isinstance(comment, praw.models.MoreComments):
+            continue
+        out.append(comment)
+        stack.extend(reversed(list(comment.replies)))
+    return out
+
+
+def test_comment_row_matches_format_comment(reddit):
+    things = [
+        _comment(1, replies=[_comment(2, "t1_c1"), _comment(7, "t1_c1")]),
+        _comment(5),
+    ]
+
+    raw = []
+    mod._walk(things, [], raw, iter(range(10)))
+    expected = [format_comment(c) for c in _praw_comments(reddit, things)]
+
+    assert raw == expected
+
+
+def test_submission_row_matches_format_submission(reddit):
+    thing = _submission()
+    submission = reddit._objector.objectify(data=copy.deepcopy(thing))
+
+    row = mod.submission_row(thing["data"])
+
+    assert row == tuple(format_submission(submission).values())
+
+
+def test_thread_comment_rows_expands_more_stubs():
+    thread = [
+        _listing([_submission()]),
+        _listing(
+            [
+                _comment(1, replies=[_more(["c9"], "t1_c1")]),
+                _more(["c3", "c4"]),
+            ]
+        ),
+    ]
+
+    def request(method, path, params):
+        if path == "/comments/s1/":
+            return thread
+        ids = params["children"].split(",")
+        things = [_comment(int(i[1:])) for i in ids]
+        return {"json": {"data": {"things": things}}}
+
+    reddit = MagicMock()
+    reddit._core.request.side_effect = request
+
+    rows = mod.thread_comment_rows(reddit, "s1")
+
+    assert sorted(row[0] for row in rows) == [
+        "t1_c1",
+        "t1_c3",
+        "t1_c4",
+        "t1_c9",
+    ]
+    # the biggest stub is expanded first
+    first_more = reddit._core.request.call_args_list[1].kwargs["params"]
+    assert first_more["children"] == "c3,c4"
+
+
+def test_thread_comment_rows_respects_threshold():
+    reddit = MagicMock()
+    reddit._core.request.return_value = [
+        _listing([_submission()]),
+        _listing([_comment(1), _more(["c2"])]),
+    ]
+
+    rows = mod.thread_comment_rows(reddit, "s1", threshold=2)
+
+    assert [row[0] for row in rows] == ["t1_c1"]
+    reddit._core.request.assert_called_once()
+
+
+def test_thread_comment_chunks_are_bounded():
+    reddit = MagicMock()
+    reddit._core.request.return_value = [
+        _listing([_submission()]),
+        _listing([_comment(i) for i in range(5)]),
+    ]
+
+    chunks = list(mod.iter_thread_comment_chunks(reddit, "s1", chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0][0].name == "t1_c0"
+
+
+def _big_thread(n: int):
+    """Offline reddit whose n comments sit behind a chain of stubs, a
+    page of 100 each (like "load more" at the bottom of a big thread)."""
+
+    def page(start: int) -> list[dict]:
+        ids = [f"c{i}" for i in range(start, min(start + 100, n))]
+        return [_more(ids)] if ids else []
+
+    def request(method, path, params):
+        if path == "/comments/s1/":
+            return [_listing([_submission()]), _listing(page(0))]
+        ids = params["children"].split(",")
+        things = [_comment(int(i[1:])) for i in ids]
+        return {
+            "json": {"data": {"things": things + page(int(ids[-1][1:]) + 1)}}
+        }
+
+    return SimpleNamespace(_core=SimpleNamespace(request=request))
+
+
+def _peak(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_chunked_thread_memory_does_not_grow_with_thread():
+    def consume(n):
+        def run():
+            for chunk in mod.iter_thread_comment_chunks(
+                _big_thread(n), "s1", chunk_size=500
+            ):
+                pass
+
+        return run
+
+    small = _peak(consume(2_000))
+    large = _peak(consume(16_000))
+    whole = _peak(lambda: mod.thread_comment_rows(_big_thread(16_000), "s1"))
+
+    # 8x the comments, same rows held at once
+    assert large < 2 * small
+    assert large * 4 < whole
+
+
+def test_listing_pages_lazily():
+    pages = [
+        {
+            "data": {
+                "children": [_submission(), _submission()],
+                "after": "t3_x",
+            }
+        },
+        {"data": {"children": [_submission()], "after": None}},
+    ]
+    reddit = MagicMock()
+    reddit._core.request.side_effect = pages
+
+    items = mod.listing(reddit, "/r/python/new", limit=None)
+    first = next(items)
+
+    assert first.name == LINK and first.num_comments == 5
+    assert reddit._core.request.call_count == 1
+    assert len(list(items)) == 2
+    assert reddit._core.request.call_args.kwargs["params"]["after"] == "t3_x"
+
+
+def test_raw_path_uses_less_cpu_than_praw(reddit):
+    """CPU per 10k comments: PRAW objects + format_comment vs raw JSON."""
+    things = [
+        _comment(i, replies=[_comment(10_000 + i, f"t1_c{i}")])
+        for i in range(5_000)
+    ]
+
+    start = time.process_time()
+    _praw_rows = [format_comment(c) for c in _praw_comments(reddit, things)]
+    praw_cpu = time.process_time() - start
+    start = time.process_time()
+    raw_rows = []
+    mod._walk(things, [], raw_rows, iter(range(10)))
+    raw_cpu = time.process_time() - start
+
+    assert len(raw_rows) == len(_praw_rows) == 10_000
+    assert raw_cpu < praw_cpu
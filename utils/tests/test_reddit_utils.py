@@ -173,6 +173,7 @@ def test_format_comment():
     assert formatted[6] == "t3_abcdef"
     assert formatted[7] == "t3_abcdef"
     assert formatted[8] == "r/testsubreddit"
+    assert isinstance(formatted[9], int)
 
 
 def test_format_comment_with_submission_id():
@@ -195,6 +196,22 @@ def test_format_comment_with_submission_id():
     assert formatted[7] == "submission_id"
 
 
+def test_fingerprint_ignores_small_score_changes():
+    base = mod.fingerprint("body", False, mod.score_bucket(1000))
+
+    assert base == mod.fingerprint("body", False, mod.score_bucket(1001))
+    assert base != mod.fingerprint("body", False, mod.score_bucket(2000))
+    assert base != mod.fingerprint("body", True, mod.score_bucket(1000))
+    assert base != mod.fingerprint("edited", False, mod.score_bucket(1000))
+    assert -(2**63) <= base < 2**63
+
+
+def test_score_bucket_sign():
+    assert mod.score_bucket(None) == 0
+    assert mod.score_bucket(0) == 0
+    assert mod.score_bucket(-5) == -mod.score_bucket(5) < 0
+
+
 def test_get_comments_in_thread_by_post_id():
     mock_submission = MagicMock()
     mock_comment1 = MagicMock()
@@ -276,6 +293,66 @@ def test_get_comments_in_thread_by_post_url():
         assert comments == [mock_comment1, mock_comment2]
 
 
+def _tree_comment(name, replies=()):
+    comment = MagicMock()
+    comment.name = name
+    comment.replies = list(replies)
+    return comment
+
+
+def _more_comments(count, comments):
+    more = MagicMock(spec=mod.MoreComments)
+    more.count = count
+    more.comments.return_value = comments
+    return more
+
+
+def test_iter_comments_in_thread_chunks_and_expands_biggest_first():
+    small = _more_comments(1, [_tree_comment("e")])
+    big = _more_comments(5, [_tree_comment("c", [_tree_comment("d")])])
+    submission = MagicMock()
+    submission.comments = [
+        _tree_comment("a", [_tree_comment("b"), small]),
+        big,
+    ]
+
+    with patch(
+        "scrapeddit.utils.reddit_utils.get_submission",
+        return_value=submission,
+    ), patch(
+        "scrapeddit.utils.reddit_utils.format_comment",
+        side_effect=lambda c: c.name,
+    ):
+        chunks = list(mod.iter_comments_in_thread(post_id="s", chunk_size=2))
+
+    assert chunks == [["a", "b"], ["c", "d"], ["e"]]
+    # the forest no longer holds the comments already handed out
+    assert submission._comments._comments == []
+    submission._comments_by_id.clear.assert_called()
+
+
+def test_iter_comments_in_thread_respects_limit_and_threshold():
+    skipped = _more_comments(1, [_tree_comment("x")])
+    second = _more_comments(2, [_tree_comment("y")])
+    first = _more_comments(3, [_tree_comment("z")])
+    submission = MagicMock()
+    submission.comments = [_tree_comment("a"), skipped, second, first]
+
+    with patch(
+        "scrapeddit.utils.reddit_utils.get_submission",
+        return_value=submission,
+    ), patch(
+        "scrapeddit.utils.reddit_utils.format_comment",
+        side_effect=lambda c: c.name,
+    ):
+        limited = list(mod.iter_comments_in_thread(post_id="s", limit=1))
+        above = list(mod.iter_comments_in_thread(post_id="s", threshold=2))
+
+    assert limited == [["a", "z"]]
+    assert above == [["a", "z", "y"]]
+    skipped.comments.assert_not_called()
+
+
 def test_get_redditor_comments():
     mock_redditor = MagicMock()
     mock_comment1 = MagicMock()
@@ -524,3 +601,34 @@ def test_get_redditors_from_subreddit_fetch_exception_logged():
         mock_reddit.subreddit.assert_called_once_with("testsubreddit")
         mock_logger.error.assert_called_once()
         assert redditors == []
+
+
+def _listing(n):
+    for i in range(n):
+        item = MagicMock(created_utc=1_000_000 - i)
+        item.name = f"t3_{i}"
+        yield item
+
+
+def test_listing_reader_pages():
+    reader = mod.ListingReader(_listing(5), page_size=2)
+
+    pages = [[item.name for item in page] for page in reader]
+
+    assert pages == [["t3_0", "t3_1"], ["t3_2", "t3_3"], ["t3_4"]]
+    assert reader.pages == 3
+    assert not reader.hit_watermark
+    assert reader.newest[0] == "t3_0"
+
+
+def test_listing_reader_stops_at_watermark():
+    listing = _listing(10)
+    stored = mod.datetime.fromtimestamp(1_000_000 - 3, tz=mod.timezone.utc)
+    reader = mod.ListingReader(listing, ("t3_3", stored), page_size=2)
+
+    names = [item.name for page in reader for item in page]
+
+    assert names == ["t3_0", "t3_1", "t3_2"]
+    assert reader.hit_watermark
+    # nothing past the watermark was pulled from the listing
+    assert next(listing).name == "t3_4"
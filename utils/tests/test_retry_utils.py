@@ -0,0 +1,68 @@
+import threading
+from unittest.mock import MagicMock, patch
+import prawcore
+import pytest
+import scrapeddit.utils.retry_utils as mod
+
+
+def _too_many_requests(retry_after=None):
+    response = MagicMock(status_code=429, text="")
+    response.headers = {"retry-after": retry_after} if retry_after else {}
+    return prawcore.exceptions.TooManyRequests(response)
+
+
+def test_backoff_delay_is_jittered_below_the_exponential_cap():
+    delays = [mod.backoff_delay(3) for _ in range(200)]
+
+    assert all(0 <= d <= mod.BACKOFF_BASE * 4 for d in delays)
+    assert len(set(delays)) > 1
+    assert mod.backoff_delay(50) <= mod.BACKOFF_CAP
+
+
+def test_backoff_delay_honours_retry_after():
+    assert mod.backoff_delay(1, _too_many_requests("30")) >= 30
+
+
+@patch("scrapeddit.utils.retry_utils.time.sleep")
+def test_retry_call_retries_transient_errors(mock_sleep):
+    func = MagicMock(side_effect=[_too_many_requests(), "ok"])
+
+    assert mod.retry_call(func, "s1", raw=True) == "ok"
+    assert func.call_count == 2
+    func.assert_called_with("s1", raw=True)
+    mock_sleep.assert_called_once()
+
+
+@patch("scrapeddit.utils.retry_utils.time.sleep")
+def test_retry_call_gives_up_after_max_attempts(mock_sleep):
+    error = prawcore.exceptions.ServerError(MagicMock(status_code=503))
+    func = MagicMock(side_effect=error)
+
+    with pytest.raises(mod.TaskFailed) as info:
+        mod.retry_call(func, attempts=3)
+
+    assert info.value.error is error
+    assert info.value.attempts == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch("scrapeddit.utils.retry_utils.time.sleep")
+def test_retry_call_does_not_retry_other_errors(mock_sleep):
+    func = MagicMock(side_effect=ValueError("bad"))
+
+    with pytest.raises(mod.TaskFailed) as info:
+        mod.retry_call(func)
+
+    assert info.value.attempts == 1
+    mock_sleep.assert_not_called()
+
+
+def test_retry_call_stops_waiting_when_job_is_cancelled():
+    job = MagicMock(cancel_event=threading.Event())
+    job.cancel_event.set()
+    func = MagicMock(side_effect=_too_many_requests())
+
+    with pytest.raises(mod.TaskFailed):
+        mod.retry_call(func, job=job)
+
+    func.assert_called_once()
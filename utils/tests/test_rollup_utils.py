@@ -0,0 +1,122 @@
+import importlib
+import os
+import re
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.rollup_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def mock_conn(rows=()):
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cursor.fetchall.return_value = list(rows)
+    cursor.rowcount = 3
+    return conn, cursor
+
+
+def test_get_rollups_filters_and_frames(mock_with_resources):
+    mod = mock_with_resources
+    bucket = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    conn, cursor = mock_conn([("r/python", bucket, 5, 1, 4, 20, 3)])
+
+    df = mod.get_rollups(conn, "hour", subreddit="Python", since="2024-03-01")
+
+    statement, params = cursor.execute.call_args.args
+    assert "FROM subreddit_rollups" in statement
+    assert "lower(subreddit) = %s" in statement
+    assert "bucket >= %s::timestamptz" in statement
+    assert "bucket < " not in statement
+    assert params == ["hour", "r/python", "2024-03-01"]
+    assert list(df.columns) == ["subreddit", "bucket", *mod.COLUMNS]
+    assert df.loc[0, "comments"] == 5
+
+
+def test_get_rollups_rejects_unknown_grain(mock_with_resources):
+    mod = mock_with_resources
+    conn, cursor = mock_conn()
+
+    with pytest.raises(ValueError):
+        mod.get_rollups(conn, "week")
+
+    cursor.execute.assert_not_called()
+
+
+def test_rebuild_rollups_truncates_then_fills_each_grain(
+    mock_with_resources,
+):
+    mod = mock_with_resources
+    conn, cursor = mock_conn()
+
+    rows = mod.rebuild_rollups(conn)
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    assert statements[0].startswith("TRUNCATE subreddit_rollups")
+    assert len(statements) == 1 + 2 * len(mod.GRAINS)
+    conn.transaction.assert_called_once()
+    # rowcount of the two rollup inserts
+    assert rows == 3 * len(mod.GRAINS)
+
+
+def test_rebuild_rollups_skips_deleted_authors(mock_with_resources):
+    mod = mock_with_resources
+    from scrapeddit.utils.raw_utils import _author
+    from scrapeddit.utils.reddit_utils import format_comment
+
+    comment = MagicMock(author=None, created_utc=0, ups=1)
+    deleted = {format_comment(comment).author, _author({"author": None})}
+    assert deleted == {"None"} <= set(mod.UNCOUNTED_AUTHORS)
+
+    conn, cursor = mock_conn()
+    mod.rebuild_rollups(conn)
+
+    for call in cursor.execute.call_args_list[1:]:
+        # the author set and the distinct author count both skip them
+        assert repr(mod.COUNTED_AUTHOR) in repr(call.args[0])
+    assert "Literal('None')" in repr(mod.COUNTED_AUTHOR)
+
+
+def test_rollups_backfill_reports_rows(mock_with_resources, monkeypatch):
+    mod = mock_with_resources
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    monkeypatch.setattr(mod, "backfill", lambda: 1234)
+
+    mod.rollups_backfill()
+
+    printed = console.print.call_args.args[0]
+    assert "1,234" in printed
+
+
+def test_rollup_updated_counts_null_ups_as_zero():
+    # an update from NULL ups to a value (or back) must add a score
+    # delta, not NULL, which would abort the whole UPDATE
+    schema = os.path.join(os.path.dirname(__file__), "..", "..", "schema.sql")
+    with open(schema) as f:
+        text = f.read()
+    body = re.search(
+        r"CREATE FUNCTION rollup_updated\(\).*?END \$\$;", text, re.S
+    ).group()
+
+    deltas = re.findall(r"sum\((.*?)\) (?:ELSE|END)", body)
+    assert deltas == ["coalesce(n.ups, 0) - coalesce(o.ups, 0)"] * 2
+    assert "n.ups IS DISTINCT FROM o.ups" in body
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+import scrapeddit.utils.schedule_utils as mod
+
+CREATED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def test_next_due_young_active_thread_is_soon():
+    due = mod.next_due(CREATED, CREATED + 2 * HOUR, 300)
+    assert due == CREATED + 2 * HOUR + mod.MIN_INTERVAL
+
+
+def test_next_due_old_thread_waits_longest():
+    scraped = CREATED + 72 * HOUR
+    assert mod.next_due(CREATED, scraped, 500) == scraped + mod.MAX_INTERVAL
+
+
+def test_next_due_grows_with_age():
+    intervals = [
+        mod.next_due(CREATED, CREATED + age * HOUR, 50)
+        - (CREATED + age * HOUR)
+        for age in (1, 6, 12, 24)
+    ]
+    assert intervals == sorted(intervals)
+    assert mod.MIN_INTERVAL <= intervals[0] < intervals[-1]
+
+
+def test_expected_new_comments_reaches_target_at_next_due():
+    scraped = CREATED + 10 * HOUR
+    due = mod.next_due(CREATED, scraped, 100)
+    expected = mod.expected_new_comments(CREATED, scraped, 100, due)
+    assert abs(expected - mod.TARGET_NEW_COMMENTS) < 1e-6
+
+
+def test_estimated_requests():
+    assert mod.estimated_requests(None) == 1
+    assert mod.estimated_requests(200) == 1
+    assert mod.estimated_requests(201) == 2
+    assert mod.estimated_requests(1000) == 9
+
+
+def test_plan_refresh_ranks_by_expected_change_and_fits_budget():
+    now = CREATED + 100 * HOUR
+    rows = [
+        ("t3_quiet", CREATED, CREATED + 90 * HOUR, 10),
+        ("t3_busy", now - 3 * HOUR, now - 2 * HOUR, 150),
+        ("t3_huge", now - 3 * HOUR, now - 2 * HOUR, 5000),
+        ("t3_untracked", CREATED, None, None),
+    ]
+    planned, cost, gain = mod.plan_refresh(rows, budget=3, now=now)
+
+    # huge would gain most but costs 49 requests, so it is skipped
+    assert [row[0] for row in planned] == [
+        "t3_busy",
+        "t3_quiet",
+        "t3_untracked",
+    ]
+    assert cost == 3
+    assert gain > 0
@@ -1,7 +1,11 @@
+import psycopg
 import pytest
+from concurrent.futures import Future
 from unittest.mock import MagicMock, patch
 import scrapeddit.utils.scraping_utils as mod
 import importlib
+from datetime import datetime, timedelta, timezone
+from scrapeddit.utils.reddit_utils import CommentRow
 
 
 # patch decorator
@@ -24,6 +28,14 @@ def mock_with_resources(monkeypatch):
     return mod  # return patched module
 
 
+# rows are queued for the shared writer, never a real connection
+@pytest.fixture(autouse=True)
+def mock_writer(mock_with_resources, monkeypatch):
+    writer = MagicMock()
+    monkeypatch.setattr(mock_with_resources, "writer", lambda: writer)
+    return writer
+
+
 # functions must be patched from where they are used,
 #  not where they are defined
 @patch("scrapeddit.utils.scraping_utils.console")
@@ -44,7 +56,9 @@ def test_scrape_submission_success(
 
     mock_get.assert_called_once_with("abc", None)
     mock_format.assert_called_once_with({"id": "abc"})
-    mock_insert.assert_called_once_with({"id": "abc", "formatted": True})
+    mock_insert.assert_called_once_with(
+        {"id": "abc", "formatted": True}, overwrite=False
+    )
     mock_console.print.assert_called_once_with(
         "Inserted/updated submission abc"
     )
@@ -106,7 +120,7 @@ def test_scrape_comment(
     mock_get_comment.assert_called_once_with("def")
     mock_format_comment.assert_called_once_with({"id": "def"})
     mock_insert_comment.assert_called_once_with(
-        {"id": "def", "formatted": True}
+        {"id": "def", "formatted": True}, overwrite=False
     )
     mock_console.print.assert_called_once_with("Inserted/updated comment def")
 
@@ -131,13 +145,9 @@ def test_scrape_comment_no_change(
 
 
 @patch("scrapeddit.utils.scraping_utils.console")
-@patch("scrapeddit.utils.scraping_utils.insert_comment")
-@patch("scrapeddit.utils.scraping_utils.format_comment")
-@patch("scrapeddit.utils.scraping_utils.get_comments_in_thread")
+@patch("scrapeddit.utils.scraping_utils.iter_comments_in_thread")
 def test_scrape_comments_in_thread_success(
-    mock_get_comments_in_thread,
-    mock_format_comment,
-    mock_insert_comment,
+    mock_iter_comments_in_thread,
     mock_console,
     mock_with_resources,
 ):
@@ -145,25 +155,164 @@ def test_scrape_comments_in_thread_success(
     mock_cur = MagicMock()
     mock_conn.cursor.return_value.__enter__.return_value = mock_cur
     mock_cur.execute = MagicMock()
+    # submission row not stored yet, nothing to schedule
+    mock_cur.fetchone.return_value = None
     mod = mock_with_resources
-    mock_get_comments_in_thread.return_value = {"id": "def"}
-    mock_format_comment.return_value = {
-        "name": "x",
-        "author": "y",
-        "body": "z",
-        "created_utc": 1234567890,
-        "edited": False,
-        "ups": 10,
-        "parent_id": "t1_abc",
-        "submission_id": "ghi",
-        "subreddit": "testsub",
-    }
-    mock_insert_comment.return_value = ("def",)
+    row = CommentRow(
+        "x",
+        "y",
+        "z",
+        1234567890,
+        False,
+        10,
+        "t1_abc",
+        "ghi",
+        "testsub",
+        123,
+    )
+    mock_iter_comments_in_thread.return_value = iter([[row]])
+
+    result = mod.scrape_comments_in_thread(mock_conn, post_id="ghi", limit=5)
+
+    mock_iter_comments_in_thread.assert_called_once()
+    assert result == (1, 0, 0)
+
+
+@patch("scrapeddit.utils.scraping_utils.iter_comments_in_thread")
+def test_scrape_comments_in_thread_only_rewrites_changed_fingerprints(
+    mock_iter_comments_in_thread, mock_with_resources, mock_writer
+):
+    mod = mock_with_resources
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    # stored: a unchanged, b edited since, c scraped before fingerprints
+    mock_cur.fetchall.side_effect = [
+        [("a", 1, "0000000a"), ("b", 2, "0000000b")],
+        [("c", None, None)],
+    ]
+    created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    mock_cur.fetchone.return_value = (created,)
+    rows = [
+        CommentRow("a", "u", "x", 0, False, 1, "t3_s", "t3_s", "r/s", 1),
+        CommentRow("b", "u", "y", 0, True, 1, "t3_s", "t3_s", "r/s", 3),
+        CommentRow("c", "u", "z", 0, False, 1, "t3_s", "t3_s", "r/s", 4),
+        CommentRow("d", "u", "w", 0, False, 1, "t3_s", "t3_s", "r/s", 5),
+    ]
+    # two chunks, each loaded on its own
+    mock_iter_comments_in_thread.return_value = iter([rows[:2], rows[2:]])
 
-    mod.scrape_comments_in_thread(mock_conn, post_id="ghi", limit=5)
+    result = mod.scrape_comments_in_thread(mock_conn, post_id="s")
 
-    mock_get_comments_in_thread.assert_called_once()
-    mock_format_comment.assert_called_once()
+    assert result == (1, 2, 1)
+    updated, inserted, updated_too, scheduled = (
+        c.args[1] for c in mock_writer.put.call_args_list
+    )
+    assert [r[0] for r in inserted] == ["d"]
+    # name moves last for the WHERE clause
+    assert [r[-1] for r in updated + updated_too] == ["b", "c"]
+    # only the chunk's names are looked up
+    lookup = mock_cur.execute.call_args_list[1].args[1]
+    assert lookup == (["c", "d"],)
+    # the thread's next rescrape is scheduled
+    [(scraped_at, num_comments, due, name)] = scheduled
+    assert (num_comments, name) == (4, "t3_s")
+    assert due > scraped_at
+
+
+@patch("scrapeddit.utils.scraping_utils.record_failed_task")
+@patch("scrapeddit.utils.scraping_utils.iter_comments_in_thread")
+def test_scrape_comments_in_thread_records_rows_that_fail_to_write(
+    mock_iter_comments_in_thread,
+    mock_record_failed_task,
+    mock_with_resources,
+    mock_writer,
+):
+    mod = mock_with_resources
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cur.fetchall.return_value = []
+    mock_cur.fetchone.return_value = None
+    mock_iter_comments_in_thread.return_value = iter(
+        [[CommentRow("a", "u", "x", 0, False, 1, "t3_s", "t3_s", "r/s", 1)]]
+    )
+    future = Future()
+    mock_writer.put.return_value = future
+
+    mod.scrape_comments_in_thread(mock_conn, post_id="s", raw=False)
+    mock_record_failed_task.assert_not_called()
+    # the writer gives up on the rows after the scrape returned
+    error = ValueError("bad row")
+    future.set_exception(error)
+
+    mock_record_failed_task.assert_called_once_with(
+        "thread", "s", error, 1, {"overwrite": False, "raw": False}
+    )
+
+
+@patch("scrapeddit.utils.scraping_utils.iter_comments_in_thread")
+def test_scrape_comments_in_thread_places_comments_in_the_tree(
+    mock_iter_comments_in_thread, mock_with_resources, mock_writer
+):
+    mod = mock_with_resources
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cur.fetchone.return_value = None
+    mock_cur.fetchall.side_effect = [
+        [],  # first chunk: nothing stored
+        # second chunk: t1_p's parent was stored by an earlier scrape
+        [("t1_old", 0, "t1_old", "00000old")],
+        [],
+    ]
+
+    def row(name, parent):
+        return CommentRow(
+            name, "u", "x", 0, False, 1, parent, "t3_s", "r/s", 1
+        )
+
+    mock_iter_comments_in_thread.return_value = iter(
+        [
+            [row("t1_a", "t3_s"), row("t1_b", "t1_a")],
+            # a reply to the first chunk, one to a stored comment
+            [row("t1_c", "t1_b"), row("t1_p", "t1_old")],
+        ]
+    )
+
+    mod.scrape_comments_in_thread(mock_conn, post_id="s")
+
+    first, second = (c.args[1] for c in mock_writer.put.call_args_list[:2])
+    assert [r[-3:] for r in first + second] == [
+        (0, "t1_a", "0000000a"),
+        (1, "t1_a", "0000000a/0000000b"),
+        (2, "t1_a", "0000000a/0000000b/0000000c"),
+        (1, "t1_old", "00000old/0000000p"),
+    ]
+    # only the unknown parent is looked up
+    lookup = mock_cur.execute.call_args_list[1].args[1]
+    assert lookup == (["t1_old"],)
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.scrape_comments_in_thread")
+def test_refresh_scrapes_most_active_due_threads_within_budget(
+    mock_scrape_comments, mock_console, mock_with_resources
+):
+    mod = mock_with_resources
+    now = datetime.now(timezone.utc)
+    hour = timedelta(hours=1)
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cur.fetchall.return_value = [
+        # quiet old thread, busy young thread, untracked thread
+        ("t3_old", now - 200 * hour, now - 100 * hour, 40),
+        ("t3_busy", now - 3 * hour, now - 2 * hour, 150),
+        ("t3_new", now - hour, None, None),
+    ]
+    mock_scrape_comments.return_value = (5, 1, 100)
+
+    mod.refresh(mock_conn, budget=2, max_workers=1, quiet=True)
+
+    scraped = [c.args[0] for c in mock_scrape_comments.call_args_list]
+    assert scraped == ["busy", "old"]
 
 
 @patch("scrapeddit.utils.scraping_utils.scrape_submission")
@@ -179,21 +328,32 @@ def test_scrape_entire_thread(
     mock_scrape_comments_in_thread.assert_called_once()
 
 
+def _user_comments(n, start=1_000_000):
+    for i in range(n):
+        comment = MagicMock(created_utc=start - i)
+        comment.name = f"t1_{i}"
+        yield comment
+
+
 @patch("scrapeddit.utils.scraping_utils.console")
-@patch("scrapeddit.utils.scraping_utils.batch_insert_comments")
+@patch("scrapeddit.utils.scraping_utils.queue_redditor_watermark")
+@patch(
+    "scrapeddit.utils.scraping_utils.get_redditor_watermark",
+    return_value=None,
+)
+@patch("scrapeddit.utils.scraping_utils.queue_comments")
 @patch("scrapeddit.utils.scraping_utils.format_comment")
 @patch("scrapeddit.utils.scraping_utils.get_redditors_comments")
 def test_scrape_redditor(
     mock_get_redditors_comments,
     mock_format_comment,
-    mock_batch_insert_comments,
+    mock_queue_comments,
+    mock_get_watermark,
+    mock_set_watermark,
     mock_console,
 ):
 
-    mock_get_redditors_comments.return_value = [
-        {"id": "a"},
-        {"id": "b"},
-    ]
+    mock_get_redditors_comments.return_value = _user_comments(2)
 
     mod.scrape_redditor("test_user")
 
@@ -203,25 +363,114 @@ def test_scrape_redditor(
 
     assert mock_format_comment.call_count == 2
 
-    mock_batch_insert_comments.assert_called_once()
+    mock_queue_comments.assert_called_once()
 
     mock_console.print.assert_called()
+    # first scrape sets the watermark to the newest comment
+    user_id, newest = mock_set_watermark.call_args.args
+    assert (user_id, newest[0]) == ("test_user", "t1_0")
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.queue_redditor_watermark")
+@patch("scrapeddit.utils.scraping_utils.get_redditor_watermark")
+@patch("scrapeddit.utils.scraping_utils.queue_comments")
+@patch("scrapeddit.utils.scraping_utils.format_comment")
+@patch("scrapeddit.utils.scraping_utils.get_redditors_comments")
+def test_scrape_redditor_fetches_only_new_comments(
+    mock_get_redditors_comments,
+    mock_format_comment,
+    mock_queue_comments,
+    mock_get_watermark,
+    mock_set_watermark,
+    mock_console,
+):
+    comments = _user_comments(10)
+    mock_get_redditors_comments.return_value = comments
+    stored = datetime.fromtimestamp(1_000_000 - 3, tz=timezone.utc)
+    last_scraped = datetime.now(timezone.utc) - timedelta(days=2)
+    mock_get_watermark.return_value = ("t1_3", stored, last_scraped)
+
+    mod.scrape_redditor("test_user")
+
+    assert mock_format_comment.call_count == 3
+    # stopped paging at the stored comment
+    assert next(comments).name == "t1_4"
+    assert mock_set_watermark.call_args.args[1][0] == "t1_0"
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.get_redditor_watermark")
+@patch("scrapeddit.utils.scraping_utils.get_redditors_comments")
+def test_scrape_redditor_skips_fresh_redditor(
+    mock_get_redditors_comments, mock_get_watermark, mock_console
+):
+    just_now = datetime.now(timezone.utc) - timedelta(hours=1)
+    mock_get_watermark.return_value = ("t1_0", just_now, just_now)
+
+    mod.scrape_redditor("test_user", fresh_hours=24)
+
+    mock_get_redditors_comments.assert_not_called()
+    mock_console.print.assert_called_once_with(
+        "Skipped u/test_user, scraped within 24h."
+    )
 
 
 @patch("scrapeddit.utils.scraping_utils.console")
-@patch("scrapeddit.utils.scraping_utils.batch_insert_comments")
+@patch("scrapeddit.utils.scraping_utils.record_failed_task")
+@patch(
+    "scrapeddit.utils.scraping_utils.get_redditor_watermark",
+    return_value=None,
+)
+@patch("scrapeddit.utils.scraping_utils.queue_comments")
 @patch("scrapeddit.utils.scraping_utils.format_comment")
 @patch("scrapeddit.utils.scraping_utils.get_redditors_comments")
 def test_scrape_redditor_get_comment_exception(
     mock_get_redditors_comments,
     mock_format_comment,
-    mock_batch_insert_comments,
+    mock_queue_comments,
+    mock_get_watermark,
+    mock_record_failed_task,
     mock_console,
 ):
     mock_get_redditors_comments.side_effect = Exception("fail")
-    mod.scrape_redditor("test_user")
+    assert mod.scrape_redditor("test_user") is False
     mock_console.print.assert_called_once_with(
-        "[red]Error scraping u/test_user: fail[/red]"
+        "[red]Error scraping u/test_user: Exception: fail[/red]"
+    )
+    # not transient, so recorded after one attempt
+    kind, user, error, attempts, _ = mock_record_failed_task.call_args.args
+    assert (kind, user, str(error), attempts) == (
+        "redditor",
+        "test_user",
+        "fail",
+        1,
+    )
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch(
+    "scrapeddit.utils.scraping_utils.record_failed_task",
+    side_effect=psycopg.OperationalError("server closed the connection"),
+)
+@patch(
+    "scrapeddit.utils.scraping_utils.get_redditor_watermark",
+    return_value=None,
+)
+@patch("scrapeddit.utils.scraping_utils.get_redditors_comments")
+def test_scrape_redditor_survives_failed_task_write(
+    mock_get_redditors_comments,
+    mock_get_watermark,
+    mock_record_failed_task,
+    mock_console,
+):
+    mock_get_redditors_comments.side_effect = Exception("fail")
+
+    # the DB error is logged, the redditor reported as failed as before
+    assert mod.scrape_redditor("test_user") is False
+    mock_record_failed_task.assert_called_once()
+    mock_console.print.assert_called_once_with(
+        "[red]Error scraping u/test_user: Exception: fail[/red]"
     )
 
 
@@ -242,3 +491,96 @@ def test_scrape_redditors_exception(mock_console, mock_scrape_redditor):
     mock_console.print.assert_called_with(
         "[red]Error scraping u/user2: fail[/red]"
     )
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.scrape_comments_in_thread")
+def test_scrape_subreddit_quiet_prints_summary_only(
+    mock_scrape_comments, mock_console
+):
+    submissions = [
+        MagicMock(id=f"s{i}", num_comments=3, created_utc=1e9 - i)
+        for i in range(3)
+    ]
+    reddit = MagicMock()
+    reddit.subreddit.return_value.new.return_value = submissions
+    mock_scrape_comments.return_value = (2, 0, 1)
+    conn = MagicMock()
+    # no watermark stored yet
+    conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (
+        None
+    )
+
+    mod.scrape_subreddit(
+        reddit, conn, "python", comments_only=True, quiet=True
+    )
+
+    assert mock_scrape_comments.call_count == 3
+    summary = mock_console.print.call_args.args[0]
+    assert "3 scraped" in summary
+    assert "6 new" in summary
+    assert "6 rows" in summary
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.scrape_comments_in_thread")
+@patch(
+    "scrapeddit.utils.scraping_utils.format_submission",
+    side_effect=lambda s: {"name": s.name},
+)
+def test_scrape_subreddit_new_stops_at_watermark(
+    mock_format_submission, mock_scrape_comments, mock_console
+):
+    def listing():
+        for i in range(5):
+            submission = MagicMock(
+                id=f"s{i}", num_comments=1, created_utc=1e9 - i
+            )
+            submission.name = f"t3_s{i}"
+            yield submission
+        pytest.fail("read past the watermark")
+
+    reddit = MagicMock()
+    reddit.subreddit.return_value.new.return_value = listing()
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    stored = datetime.fromtimestamp(1e9 - 2, tz=timezone.utc)
+    cur.fetchone.return_value = ("t3_s2", stored)
+    cur.rowcount = 2
+    mock_scrape_comments.return_value = (1, 0, 0)
+
+    mod.scrape_subreddit(reddit, conn, "Python", quiet=True)
+
+    inserted = cur.executemany.call_args.args[1]
+    assert inserted == [("t3_s0",), ("t3_s1",)]
+    assert mock_scrape_comments.call_count == 2
+    # watermark moves to the newest submission read
+    sql, params = cur.execute.call_args.args
+    assert "listing_watermarks" in sql
+    assert params[:3] == ("python", "new", "t3_s0")
+
+
+@patch("scrapeddit.utils.scraping_utils.console")
+@patch("scrapeddit.utils.scraping_utils.set_listing_watermark")
+@patch(
+    "scrapeddit.utils.scraping_utils.format_submission",
+    side_effect=lambda s: {"name": s.name},
+)
+def test_scrape_subreddit_subs_only_keeps_watermark(
+    mock_format_submission, mock_set_watermark, mock_console
+):
+    submissions = [
+        MagicMock(id=f"s{i}", created_utc=1e9 - i) for i in range(3)
+    ]
+    reddit = MagicMock()
+    reddit.subreddit.return_value.new.return_value = submissions
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchone.return_value = None
+    cur.rowcount = 3
+
+    mod.scrape_subreddit(reddit, conn, "python", subs_only=True, quiet=True)
+
+    # a later full run must still reach these threads for their comments
+    cur.executemany.assert_called_once()
+    mock_set_watermark.assert_not_called()
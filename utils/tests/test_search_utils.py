@@ -0,0 +1,131 @@
+import importlib
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import psycopg
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.search_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def mock_conn(rows):
+    conn = MagicMock()
+    cursor = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cursor.fetchall.return_value = rows
+    return conn, cursor
+
+
+def row(name, rank, created=datetime(2024, 3, 1, tzinfo=timezone.utc)):
+    return (name, "r/python", "alice", created, 10, rank, "a <<match>> [x]")
+
+
+def test_build_search_uses_index_and_filters(mock_with_resources):
+    mod = mock_with_resources
+
+    statement, params = mod.build_search(
+        "borrow checker",
+        subreddit="r/Python",
+        author="u/alice",
+        since="2024-01-01",
+        limit=5,
+    )
+
+    assert "t.body_tsv @@ q.q" in statement
+    assert "ts_rank_cd(t.body_tsv, q.q)" in statement
+    assert "ORDER BY hits.rank DESC, hits.name DESC" in statement
+    assert "hits.rank, hits.name) <" not in statement
+    # shared texts are matched in bodies, with the same filters
+    assert "FROM comments t JOIN bodies s ON s.id = t.body_id" in statement
+    assert "s.body_tsv @@ q.q" in statement and "UNION ALL" in statement
+    filters = ["python", "r/python", "alice", "2024-01-01"]
+    assert params == [
+        "borrow checker",
+        mod.HEADLINE_OPTIONS,
+        *filters,
+        *filters,
+        5,
+    ]
+
+
+def test_build_search_keyset_after_cursor(mock_with_resources):
+    mod = mock_with_resources
+    created = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+    statement, params = mod.build_search(
+        "rust",
+        target="submissions",
+        sort="new",
+        after=mod.encode_cursor(created, "t3_abc"),
+    )
+
+    assert "t.search_tsv @@ q.q" in statement
+    assert "UNION ALL" not in statement
+    assert "(hits.created_utc, hits.name) < (%s::timestamptz, %s)" in statement
+    assert params[-3:] == [created, "t3_abc", mod.DEFAULT_LIMIT]
+
+
+def test_build_search_like_escapes_wildcards(mock_with_resources):
+    mod = mock_with_resources
+
+    statement, params = mod.build_search("100%_sure", like=True)
+
+    assert "t.body ILIKE %s" in statement and "s.body ILIKE %s" in statement
+    assert "@@" not in statement
+    assert params[2] == "%100\\%\\_sure%"
+    assert "ORDER BY hits.created_utc DESC" in statement
+
+
+def test_search_returns_next_cursor_for_full_page(
+    mock_with_resources, monkeypatch
+):
+    mod = mock_with_resources
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    conn, cursor = mock_conn([row("t1_b", 0.5), row("t1_a", 0.25)])
+
+    rows, cursor_token = mod.search(conn, "match", limit=2)
+
+    assert len(rows) == 2
+    assert cursor_token == "0.25,t1_a"
+    assert console.print.call_args.args[0] == "Next page: --after 0.25,t1_a"
+    assert mod.decode_cursor(cursor_token, "rank") == (0.25, "t1_a")
+
+    conn, cursor = mock_conn([row("t1_a", 0.25)])
+    _, cursor_token = mod.search(conn, "match", limit=2)
+    assert cursor_token is None
+
+
+def test_snippet_highlights_and_escapes(mock_with_resources):
+    mod = mock_with_resources
+
+    snippet = mod._snippet("a <<match>>\n [x]")
+
+    assert snippet == "a [bold yellow]match[/bold yellow] \\[x]"
+
+
+def test_search_reports_missing_columns(mock_with_resources, monkeypatch):
+    mod = mock_with_resources
+    console = MagicMock()
+    monkeypatch.setattr(mod, "console", console)
+    conn, cursor = mock_conn([])
+    cursor.execute.side_effect = psycopg.errors.UndefinedColumn("body_tsv")
+
+    assert mod.search(conn, "match") == ([], None)
+    assert "migration" in console.print.call_args.args[0]
@@ -0,0 +1,173 @@
+import importlib
+from unittest.mock import MagicMock
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.similarity_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def memberships_of(mod, sets: dict, min_commenters: int = 1):
+    subreddits = [sub for sub, authors in sets.items() for _ in authors]
+    authors = [author for authors in sets.values() for author in authors]
+    return mod.build_memberships(subreddits, authors, min_commenters)
+
+
+def clustered_sets(n_clusters=20, per_cluster=5, seed=0):
+    """Subreddits in clusters sharing most commenters, plus noise."""
+    rng = np.random.default_rng(seed)
+    sets = {}
+    for c in range(n_clusters):
+        core = [f"core{c}_{i}" for i in range(40)]
+        for s in range(per_cluster):
+            noise = rng.integers(0, 10_000, 10)
+            sets[f"r/c{c}s{s}"] = core + [f"u{n}" for n in noise]
+    return sets
+
+
+def test_build_memberships_dedups_and_drops_small(mock_with_resources):
+    mod = mock_with_resources
+
+    m = memberships_of(
+        mod,
+        {"r/b": ["x", "y", "y", "z"], "r/a": ["y", "w"], "r/c": ["x"]},
+        min_commenters=2,
+    )
+
+    assert m.subreddits.tolist() == ["r/a", "r/b"]
+    assert m.sizes().tolist() == [2, 3]
+    assert m.authors.max() == 3
+    # authors ascending within each subreddit
+    assert np.all(np.diff(m.authors[2:]) > 0)
+
+
+def test_load_memberships_skips_deleted_authors(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchmany.side_effect = [
+        [("r/a", "u1"), ("r/a", "u2"), ("r/b", "u1"), ("r/b", "u2")],
+        [],
+    ]
+
+    memberships = mod.load_memberships(conn, min_commenters=1)
+
+    statement, (excluded,) = cursor.execute.call_args.args
+    assert "author <> ALL(%s)" in statement
+    # deleted authors are stored as "None"
+    assert {"None", "[deleted]"} <= set(excluded)
+    assert memberships.subreddits.tolist() == ["r/a", "r/b"]
+
+
+def test_group_pairs_pairs_members_of_each_group(mock_with_resources):
+    mod = mock_with_resources
+
+    first, second = mod.group_pairs(
+        np.array([7, 3, 7, 7, 3, 9]), np.array([2, 1, 0, 1, 4, 5])
+    )
+
+    pairs = sorted(zip(first.tolist(), second.tolist()))
+    assert pairs == [(0, 1), (0, 2), (1, 2), (1, 4)]
+
+
+def test_exact_overlap_counts_shared_commenters(mock_with_resources):
+    mod = mock_with_resources
+    m = memberships_of(
+        mod,
+        {"r/a": ["x", "y", "z"], "r/b": ["y", "z"], "r/c": ["z", "q"]},
+    )
+
+    first, second, shared = mod.exact_overlap(m)
+    counts = dict(zip(zip(first.tolist(), second.tolist()), shared.tolist()))
+    assert counts == {(0, 1): 2, (0, 2): 1, (1, 2): 1}
+
+    first, second, shared = mod.exact_overlap(m, np.array([2]))
+    assert sorted(zip(first.tolist(), second.tolist())) == [(0, 2), (1, 2)]
+
+
+def test_signatures_estimate_jaccard(mock_with_resources):
+    mod = mock_with_resources
+    m = memberships_of(
+        mod,
+        {
+            "r/a": [f"u{i}" for i in range(100)],
+            "r/b": [f"u{i}" for i in range(50, 150)],
+            "r/c": [f"u{i}" for i in range(100)],
+            "r/d": [f"v{i}" for i in range(100)],
+        },
+    )
+
+    signatures = mod.minhash_signatures(m, num_perm=256)
+    jaccard, shared = mod.estimate_similarity(
+        signatures, m.sizes(), np.array([0, 0, 0]), np.array([1, 2, 3])
+    )
+
+    assert signatures.shape == (4, 256)
+    assert jaccard[0] == pytest.approx(1 / 3, abs=0.1)
+    assert shared[0] == pytest.approx(50, abs=10)
+    assert jaccard[1] == 1.0 and shared[1] == 100
+    assert jaccard[2] < 0.05
+
+
+def test_lsh_candidates_pair_similar_signatures(mock_with_resources):
+    mod = mock_with_resources
+    m = memberships_of(mod, clustered_sets())
+    signatures = mod.minhash_signatures(m)
+
+    first, second = mod.lsh_candidates(signatures, bands=32)
+
+    same_cluster = (first // 5) == (second // 5)
+    # 10 pairs per cluster, Jaccard ~0.6 is far above the threshold
+    assert same_cluster.sum() == 20 * 10
+    assert np.all(first < second)
+    with pytest.raises(ValueError):
+        mod.lsh_candidates(signatures, bands=3)
+
+
+def test_similar_pairs_and_recall_report(mock_with_resources):
+    mod = mock_with_resources
+    m = memberships_of(mod, clustered_sets())
+
+    # noise overlaps are 1 or 2 commenters, estimates can reach 5
+    edges = mod.similar_pairs(m, min_shared=10)
+    report = mod.recall_report(
+        m, edges, sample=30, min_shared=10, threshold=mod.lsh_threshold()
+    )
+
+    assert len(edges) == 20 * 10
+    assert edges.attrs["candidates"] >= len(edges)
+    assert edges["weight"].between(30, 55).all()
+    assert report["sampled"] == 30
+    assert report["recall"] == 1.0
+    assert report["recall_above"] == 1.0
+    assert report["weight_error"] < 0.2
+
+
+def test_recall_report_counts_missed_edges(mock_with_resources):
+    mod = mock_with_resources
+    m = memberships_of(mod, clustered_sets(n_clusters=2))
+    edges = pd.DataFrame(
+        {"sub1": [0], "sub2": [1], "weight": [40.0], "jaccard": [0.6]}
+    )
+
+    report = mod.recall_report(m, edges, sample=10)
+
+    assert report["exact_edges"] == 20
+    assert report["recall"] == pytest.approx(1 / 20)
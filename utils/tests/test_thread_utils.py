@@ -0,0 +1,179 @@
+import importlib
+from unittest.mock import MagicMock
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.thread_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+# t3_s
+# ├── a
+# │   ├── b
+# │   │   └── d
+# │   └── c
+# └── e
+ROWS = [
+    ("t1_a", "u1", "top", 5, "t3_s", 0),
+    ("t1_b", "u2", "reply", 3, "t1_a", 1),
+    ("t1_d", "u3", "deep\nsecond line", 1, "t1_b", 2),
+    ("t1_c", "u4", None, None, "t1_a", 1),
+    ("t1_e", "u5", "other", 2, "t3_s", 0),
+]
+
+
+def test_placer_places_chunks_and_out_of_order_replies(mock_with_resources):
+    mod = mock_with_resources
+    placer = mod.TreePlacer()
+
+    first = placer.place([("t1_b", "t1_a"), ("t1_a", "t3_s")])
+    # later chunk: replies to the first, to a stored and to an unknown
+    # comment
+    placer.add(
+        [("t1_old", 3, "t1_top", "0000000x/0000000y/0000000z/00000old")]
+    )
+    pairs = [("t1_c", "t1_b"), ("t1_n", "t1_old"), ("t1_o", "t1_gone")]
+    assert placer.missing_parents(pairs) == {"t1_gone"}
+    second = placer.place(pairs)
+
+    assert first == [
+        (1, "t1_a", "0000000a/0000000b"),
+        (0, "t1_a", "0000000a"),
+    ]
+    assert second[0] == (2, "t1_a", "0000000a/0000000b/0000000c")
+    assert second[1].depth == 4 and second[1].root_id == "t1_top"
+    assert second[1].path.endswith("/00000old/0000000n")
+    assert second[2] == mod.UNPLACED
+
+
+def test_path_order_is_depth_first_with_older_siblings_first(
+    mock_with_resources,
+):
+    mod = mock_with_resources
+    placer = mod.TreePlacer()
+    pairs = [
+        ("t1_zz", "t3_s"),
+        ("t1_10a", "t3_s"),
+        ("t1_zz1", "t1_zz"),
+        ("t1_9", "t1_10a"),
+    ]
+    paths = {name: t.path for (name, _), t in zip(pairs, placer.place(pairs))}
+
+    # ids are base36 and grow over time: zz is older than 10a
+    assert sorted(paths, key=paths.get) == [
+        "t1_zz",
+        "t1_zz1",
+        "t1_10a",
+        "t1_9",
+    ]
+    # a subtree is the range [path, path + "0")
+    top = paths["t1_zz"]
+    inside = [n for n, p in paths.items() if top <= p < top + "0"]
+    assert inside == ["t1_zz", "t1_zz1"]
+
+
+def test_build_tree_sizes_children_and_shape(mock_with_resources):
+    mod = mock_with_resources
+
+    tree = mod.build_tree(ROWS)
+
+    assert tree.parents.tolist() == [-1, 0, 1, 0, -1]
+    assert tree.sizes.tolist() == [4, 2, 1, 1, 1]
+    assert list(tree.children(0)) == [1, 3]
+    assert tree.ups.tolist() == [5, 3, 1, 0, 2]
+    assert mod.thread_shape(tree) == {
+        "comments": 5,
+        "top_level": 2,
+        "max_depth": 2,
+        "widest_level": 0,
+        "widest": 2,
+        "leaves": 3,
+        "branching": 1.5,
+        "largest_subtree": 4,
+    }
+    assert mod.thread_shape(mod.build_tree([])) == {"comments": 0}
+
+
+def test_render_thread_cuts_depth_and_limit(mock_with_resources):
+    mod = mock_with_resources
+    tree = mod.build_tree(ROWS)
+
+    def labels(node):
+        return [str(node.label)] + [
+            label for child in node.children for label in labels(child)
+        ]
+
+    shallow = labels(mod.render_thread(tree, "t3_s", max_depth=1))
+    assert len(shallow) == 6
+    assert any("1 more replies" in label for label in shallow)
+    assert not any("deep" in label for label in shallow)
+
+    limited = labels(mod.render_thread(tree, "t3_s", limit=2))
+    assert "3 more comments" in limited[-1]
+
+
+def test_load_thread_and_subtree_are_one_query(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = ROWS
+
+    tree = mod.load_thread(conn, "s")
+    statement, params = cursor.execute.call_args.args
+    assert "ORDER BY c.path" in statement and params == ("t3_s",)
+    assert tree.names[0] == "t1_a"
+
+    mod.load_subtree(conn, "abc")
+    statement, params = cursor.execute.call_args.args
+    assert "c.path < top.path || '0'" in statement
+    assert params == ("t1_abc",)
+    assert cursor.execute.call_count == 2
+
+
+def test_fill_tree_columns_writes_only_changed_paths(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    write_cur, read_cur = MagicMock(), MagicMock()
+    conn.cursor.return_value.__enter__.return_value = write_cur
+    conn.cursor.side_effect = lambda **kw: (
+        MagicMock(__enter__=MagicMock(return_value=read_cur))
+        if "name" in kw
+        else conn.cursor.return_value
+    )
+    # thread s: a placed, b not yet, c's parent isn't stored; thread t
+    read_cur.__iter__.return_value = iter(
+        [
+            ("t3_s", "t1_a", "t3_s", "0000000a"),
+            ("t3_s", "t1_b", "t1_a", None),
+            ("t3_s", "t1_c", "t1_gone", None),
+            ("t3_t", "t1_d", "t3_t", None),
+        ]
+    )
+    write_cur.rowcount = 2
+    copy = write_cur.copy.return_value.__enter__.return_value
+
+    placed, left = mod.fill_tree_columns(conn, ["t3_s", "t3_t"])
+
+    assert (placed, left) == (2, 1)
+    written = [c.args[0] for c in copy.write_row.call_args_list]
+    assert written == [
+        ("t1_b", 1, "t1_a", "0000000a/0000000b"),
+        ("t1_d", 0, "t1_d", "0000000d"),
+    ]
+    _, params = read_cur.execute.call_args.args
+    assert params == [["t3_s", "t3_t"]]
@@ -0,0 +1,139 @@
+import importlib
+import random
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+
+VOCAB = {
+    "python": "python django flask pandas numpy script module pip".split(),
+    "food": "pizza pasta recipe cheese tomato garlic oven flour".split(),
+    "games": "nintendo playstation controller boss quest steam level".split(),
+}
+# words per synthetic comment, few enough that no word is in most comments
+DOC_WORDS = 6
+
+
+@pytest.fixture(autouse=True)
+def mock_with_resources(monkeypatch):
+    def fake_with_resources(*a, **kw):
+        def decorator(func):
+            return func
+
+        return decorator
+
+    monkeypatch.setattr(
+        "scrapeddit.utils.connection_utils.with_resources", fake_with_resources
+    )
+
+    import scrapeddit.utils.topic_utils as mod
+
+    importlib.reload(mod)
+
+    return mod
+
+
+def corpus(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choices(VOCAB[rng.choice(list(VOCAB))], k=DOC_WORDS))
+        for _ in range(n)
+    ]
+
+
+def test_tokenize_drops_noise_and_stop_words(mock_with_resources):
+    mod = mock_with_resources
+
+    tokens = mod.tokenize(
+        "I don't think Python's GIL is [slow](https://x.io) &amp; r/python"
+    )
+
+    assert tokens == ["python", "gil", "slow"]
+
+
+def test_hash_chunk_builds_csr(mock_with_resources):
+    mod = mock_with_resources
+
+    chunk = mod.hash_chunk(
+        ["pizza pizza pasta cheese", "lol", None, "python django flask"], 1024
+    )
+
+    assert chunk.n_docs == 2
+    assert chunk.indptr.tolist() == [0, 3, 6]
+    assert chunk.counts[:3].tolist() == [2, 1, 1]
+    assert chunk.indices.max() < 1024
+    assert chunk.terms[int(chunk.indices[0])] == "pizza"
+    # features are stable across processes (no salted hash())
+    again = mod.hash_chunk(["pizza pizza pasta cheese"], 1024)
+    assert again.indices.tolist() == chunk.indices[:3].tolist()
+
+
+def test_digamma_matches_known_values(mock_with_resources):
+    mod = mock_with_resources
+
+    values = mod.digamma(np.array([1.0, 0.5, 10.0, 0.001]))
+
+    np.testing.assert_allclose(
+        values,
+        [-0.5772156649, -1.9635100260, 2.2517525891, -1000.5756],
+        rtol=1e-6,
+    )
+
+
+def test_online_lda_separates_topics(mock_with_resources):
+    mod = mock_with_resources
+    docs = corpus(3000)
+    model = mod.OnlineLDA(n_topics=3, n_features=2**12, n_docs=len(docs))
+    terms, doc_freq = {}, np.zeros(2**12, dtype=np.int64)
+
+    for _ in range(2):
+        for start in range(0, len(docs), 500):
+            end = start + 500
+            chunk = mod.hash_chunk(docs[start:end], 2**12)
+            terms.update(chunk.terms)
+            doc_freq += np.bincount(chunk.indices, minlength=2**12)
+            gamma = model.partial_fit(chunk)
+
+    assert gamma.shape == (500, 3)
+    topics = mod.top_terms(model, terms, doc_freq // 2, len(docs), 5)
+    found = {
+        next(k for k, words in VOCAB.items() if topic[0][0] in words)
+        for topic in topics
+    }
+    assert found == set(VOCAB)
+    for topic in topics:
+        home = next(k for k, words in VOCAB.items() if topic[0][0] in words)
+        assert all(term in VOCAB[home] for term, _ in topic)
+
+
+def test_fit_topics_streams_chunks_through_pool(mock_with_resources):
+    mod = mock_with_resources
+    docs = corpus(1200, seed=1)
+    # the last chunk has no usable comment and is skipped
+    chunks = [docs[:400], docs[400:800], docs[800:], ["ok"]]
+
+    model, summary = mod.fit_topics(
+        [iter(chunks)], len(docs) + 1, n_topics=3, n_features=2**12, workers=2
+    )
+
+    assert summary["docs"] == 1200
+    assert summary["shares"].sum() == pytest.approx(1.0)
+    assert model.updates == 3
+
+
+def test_write_topics_replaces_scope(mock_with_resources):
+    mod = mock_with_resources
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchone.return_value = (7,)
+    copy = cur.copy.return_value.__enter__.return_value
+    topics = [[("pizza", 0.5), ("pasta", 0.3)], [("python", 0.6)]]
+
+    model_id = mod.write_topics(
+        conn, "r/food", topics, np.array([0.7, 0.3]), 100, {"seed": 0}
+    )
+
+    assert model_id == 7
+    assert cur.execute.call_args_list[0].args[1] == ("r/food",)
+    rows = cur.executemany.call_args.args[1]
+    assert rows[0] == (7, 0, pytest.approx(0.7), "pizza pasta")
+    assert copy.write_row.call_count == 3
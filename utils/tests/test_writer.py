@@ -0,0 +1,184 @@
+import threading
+import time
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+import psycopg
+import pytest
+import scrapeddit.utils.writer as mod
+
+
+class FakeDB:
+    """Connection factory recording each committed transaction."""
+
+    def __init__(self, commit_seconds: float = 0.0):
+        self.commit_seconds = commit_seconds
+        self.transactions: list[list[tuple[str, list]]] = []
+        self.pending: list[tuple[str, list]] = []
+        self.fail = None  # statement whose executemany raises
+        self.conn = MagicMock()
+        cur = self.conn.cursor.return_value.__enter__.return_value
+        cur.executemany.side_effect = self._executemany
+        self.conn.commit.side_effect = self._commit
+        self.conn.rollback.side_effect = self.pending.clear
+
+    def _executemany(self, statement, rows):
+        if statement == self.fail:
+            raise ValueError("bad row")
+        self.pending.append((statement, list(rows)))
+
+    def _commit(self):
+        time.sleep(self.commit_seconds)
+        self.transactions.append(list(self.pending))
+        self.pending.clear()
+
+    @contextmanager
+    def connect(self, auto_commit=True):
+        assert auto_commit is False
+        yield self.conn
+
+
+@pytest.fixture
+def db():
+    return FakeDB()
+
+
+def test_puts_from_many_workers_share_one_transaction(db):
+    writer = mod.BatchWriter(db.connect, max_delay=60)
+
+    futures = [writer.put("INSERT a", [(i,)]) for i in range(3)]
+    futures.append(writer.put("UPDATE b", [(9,)]))
+    writer.flush()
+
+    assert db.transactions == [
+        [("INSERT a", [(0,), (1,), (2,)]), ("UPDATE b", [(9,)])]
+    ]
+    assert all(f.done() and f.exception() is None for f in futures)
+    writer.close()
+
+
+def test_only_neighbouring_statements_are_merged():
+    batch = [
+        mod._Item(statement, [(i,)], 8, i, 0.0)
+        for i, statement in enumerate(["U", "I", "U"])
+    ]
+
+    assert list(mod._runs(batch)) == [
+        ("U", [(0,)]),
+        ("I", [(1,)]),
+        ("U", [(2,)]),
+    ]
+
+
+def test_flushes_when_batch_is_full_or_old(db):
+    writer = mod.BatchWriter(db.connect, batch_rows=2, max_delay=0.05)
+
+    writer.put("INSERT a", [(1,), (2,)]).result(timeout=5)
+    writer.put("INSERT a", [(3,)]).result(timeout=5)
+
+    assert [len(t[0][1]) for t in db.transactions] == [2, 1]
+    writer.close()
+
+
+def test_close_writes_what_is_still_queued(db):
+    writer = mod.BatchWriter(db.connect, max_delay=60)
+    future = writer.put("INSERT a", [(1,)])
+
+    writer.close()
+
+    assert future.done()
+    assert db.transactions == [[("INSERT a", [(1,)])]]
+    with pytest.raises(RuntimeError):
+        writer.put("INSERT a", [(2,)])
+
+
+def test_batch_size_follows_commit_latency():
+    slow = FakeDB(commit_seconds=0.05)
+    writer = mod.BatchWriter(slow.connect, batch_rows=400, target_commit=0.01)
+    writer.put("INSERT a", [(1,)])
+    writer.flush()
+    assert writer.batch_rows == 200
+    writer.close()
+
+    fast = FakeDB()
+    writer = mod.BatchWriter(fast.connect, batch_rows=200, max_delay=60)
+    writer.put("INSERT a", [(i,) for i in range(200)])
+    writer.flush()
+    assert writer.batch_rows == 300
+    writer.close()
+
+
+def test_put_blocks_while_writer_is_behind(monkeypatch):
+    db = FakeDB()
+    gate = threading.Event()
+    db.conn.commit.side_effect = lambda: (gate.wait(), db._commit())
+    monkeypatch.setattr(mod, "QUEUE_BATCHES", 1)
+    writer = mod.BatchWriter(db.connect, batch_rows=2, max_delay=60)
+    # taken by the writer, which then waits on the commit
+    writer.put("INSERT a", [(1,), (2,)])
+    writer.put("INSERT a", [(3,), (4,)])
+    admitted = threading.Event()
+
+    def producer():
+        writer.put("INSERT a", [(5,)])
+        admitted.set()
+
+    threading.Thread(target=producer).start()
+
+    assert not admitted.wait(0.2)
+    gate.set()
+    assert admitted.wait(5)
+    writer.close()
+    assert writer.stats["blocked_seconds"] > 0
+
+
+def test_bad_rows_fail_alone(db):
+    db.fail = "INSERT bad"
+    writer = mod.BatchWriter(db.connect, max_delay=60)
+
+    good = writer.put("INSERT a", [(1,)])
+    bad = writer.put("INSERT bad", [(2,)])
+    writer.flush()
+
+    assert good.exception() is None
+    assert isinstance(bad.exception(), ValueError)
+    assert db.transactions == [[("INSERT a", [(1,)])]]
+    assert writer.stats["failed_rows"] == 1
+    writer.close()
+
+
+def test_on_failure_reports_once_per_group(db):
+    db.fail = "INSERT bad"
+    writer = mod.BatchWriter(db.connect, max_delay=60)
+    errors = []
+
+    futures = [writer.put("INSERT bad", [(i,)]) for i in range(2)]
+    mod.on_failure(futures, errors.append)
+    fine = writer.put("INSERT a", [(1,)])
+    mod.on_failure([fine], errors.append)
+    writer.flush()
+
+    # both rows failed, the group is reported once; the good one never
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+    writer.close()
+
+
+def test_lost_connection_is_retried_on_a_new_one(db, monkeypatch):
+    monkeypatch.setattr(mod.time, "sleep", lambda s: None)
+    connects = []
+
+    @contextmanager
+    def flaky(auto_commit=True):
+        connects.append(auto_commit)
+        if len(connects) == 1:
+            raise psycopg.OperationalError("server closed the connection")
+        yield db.conn
+
+    writer = mod.BatchWriter(flaky, max_delay=60)
+    future = writer.put("INSERT a", [(1,)])
+    writer.flush()
+
+    assert future.exception() is None
+
+    assert len(connects) == 2
+    assert db.transactions == [[("INSERT a", [(1,)])]]
+    writer.close()
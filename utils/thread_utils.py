@@ -0,0 +1,410 @@
+import logging
+import time
+import uuid
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, NamedTuple
+import numpy as np
+from rich.markup import escape
+from rich.tree import Tree
+from .body_utils import COMMENT_BODY, COMMENTS_WITH_BODIES
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for comment trees: where each comment sits in its thread.
+
+Besides parent_id, comments store their depth (0 for top-level), the
+name of their top-level ancestor (root_id) and a materialised path: the
+ids of their ancestors and their own, each zero-padded to PATH_WIDTH
+and joined by "/". Reddit ids only grow, so sorting a thread by path
+(byte order, the column is COLLATE "C") lists it depth first with
+siblings oldest first, and the subtree of a comment is the range of
+paths from its own up to its path + "0".
+
+The thread loader fills the columns from the rows it holds (TreePlacer);
+fill_tree_columns places rows that were stored without them, such as
+dump imports and redditor scrapes, once their parents are stored.
+load_thread reads a thread or a subtree with one query into a
+ThreadTree, arrays in path order on which shape and rendering are
+linear.
+"""
+
+logger = logging.getLogger(__name__)
+
+# digits per path segment; ids are 7 base36 digits today
+PATH_WIDTH = 8
+# stored rows placed and written back per statement
+FILL_ROWS = 50_000
+BODY_PREVIEW = 80
+THREAD_COLUMNS = ("name", "author", "body", "ups", "parent_id", "depth")
+# of comments c, with shared texts filled in
+THREAD_SELECT = ", ".join(
+    COMMENT_BODY if column == "body" else f"c.{column}"
+    for column in THREAD_COLUMNS
+)
+
+
+class TreeColumns(NamedTuple):
+    depth: int | None
+    root_id: str | None
+    path: str | None
+
+
+# for comments whose parent isn't known
+UNPLACED = TreeColumns(None, None, None)
+
+
+def segment(name: str) -> str:
+    """Path segment of a comment: its id, zero-padded."""
+    return name.split("_", 1)[-1].zfill(PATH_WIDTH)
+
+
+class TreePlacer:
+    """Tree columns of one thread's comments, as its rows arrive.
+
+    Every comment placed is remembered, so replies in later chunks find
+    their parents. A comment whose parent is neither placed nor among
+    the rows (a partial scrape) is left UNPLACED, like its replies; add()
+    places parents looked up in the DB beforehand.
+    """
+
+    def __init__(self):
+        self.placed: dict[str, TreeColumns] = {}
+
+    def add(self, rows: Iterable[tuple]):
+        """Place (name, depth, root_id, path) rows, e.g. stored parents."""
+        for name, depth, root_id, path in rows:
+            self.placed[name] = TreeColumns(depth, root_id, path)
+
+    def missing_parents(self, pairs: list[tuple]) -> set[str]:
+        """Parent comments of (name, parent_id) pairs not known here."""
+        names = {name for name, _ in pairs}
+        return {
+            parent
+            for _, parent in pairs
+            if parent
+            and parent.startswith("t1_")
+            and parent not in self.placed
+            and parent not in names
+        }
+
+    def place(self, pairs: list[tuple]) -> list[TreeColumns]:
+        """Tree columns of (name, parent_id) pairs, in order.
+
+        Replies may come before their parents among the pairs; every
+        comment is still placed once.
+        """
+        parents = dict(pairs)
+        return [self._place(name, parents) for name, _ in pairs]
+
+    def _place(self, name: str, parents: dict) -> TreeColumns:
+        # climb to a placed ancestor or the submission, then place the
+        # comments on the way back down
+        chain = []
+        node = name
+        while node not in self.placed:
+            if node not in parents:
+                above = UNPLACED
+                break
+            chain.append(node)
+            parent = parents[node]
+            if parent is None:
+                above = UNPLACED
+                break
+            if not parent.startswith("t1_"):
+                above = None
+                break
+            node = parent
+        else:
+            above = self.placed[node]
+        for node in reversed(chain):
+            if above is None:
+                above = TreeColumns(0, node, segment(node))
+            elif above.path is not None:
+                above = TreeColumns(
+                    above.depth + 1,
+                    above.root_id,
+                    f"{above.path}/{segment(node)}",
+                )
+            self.placed[node] = above
+        return self.placed.get(name, UNPLACED)
+
+
+class ThreadTree(NamedTuple):
+    """Comments of a thread in path order, as parallel arrays.
+
+    parents[i] is the row of comment i's parent (-1 at the top of the
+    tree) and the subtree of comment i is rows i to i + sizes[i] - 1, so
+    a subtree is a slice and skipping one is a jump.
+    """
+
+    names: list[str]
+    authors: list[str]
+    bodies: list[str | None]
+    ups: np.ndarray
+    depths: np.ndarray
+    parents: np.ndarray
+    sizes: np.ndarray
+
+    def children(self, i: int) -> Iterator[int]:
+        j, end = i + 1, i + int(self.sizes[i])
+        while j < end:
+            yield j
+            j += int(self.sizes[j])
+
+
+def build_tree(rows: list[tuple]) -> ThreadTree:
+    """ThreadTree from rows of THREAD_COLUMNS in path order."""
+    names, authors, bodies, ups, parent_ids, depths = (
+        map(list, zip(*rows)) if rows else ([] for _ in range(6))
+    )
+    index: dict[str, int] = {}
+    parents = []
+    for i, (name, parent_id) in enumerate(zip(names, parent_ids)):
+        parents.append(index.get(parent_id, -1))
+        index[name] = i
+    # replies come after their parents, so one backward pass adds each
+    # finished subtree to its parent
+    sizes = [1] * len(names)
+    for i in range(len(names) - 1, -1, -1):
+        if parents[i] >= 0:
+            sizes[parents[i]] += sizes[i]
+    return ThreadTree(
+        names=names,
+        authors=authors,
+        bodies=bodies,
+        ups=np.array([u or 0 for u in ups], dtype=np.int64),
+        depths=np.array(depths, dtype=np.int32),
+        parents=np.array(parents, dtype=np.int32),
+        sizes=np.array(sizes, dtype=np.int32),
+    )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def load_thread(conn, post_id: str) -> ThreadTree:
+    """The placed comments of a thread, with one range query."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {THREAD_SELECT} FROM {COMMENTS_WITH_BODIES}
+            WHERE c.submission_id = %s AND c.path IS NOT NULL
+            ORDER BY c.path;
+            """,
+            (f"t3_{post_id.removeprefix('t3_')}",),
+        )
+        return build_tree(cur.fetchall())
+
+
+@with_resources(use_db=True, use_reddit=False)
+def load_subtree(conn, comment_id: str) -> ThreadTree:
+    """A comment and its replies, with one range query on its path."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {THREAD_SELECT} FROM {COMMENTS_WITH_BODIES}
+            JOIN comments top ON top.name = %s
+                AND c.submission_id = top.submission_id
+            -- "0" is the first byte after "/", so this ends the subtree
+            WHERE c.path >= top.path AND c.path < top.path || '0'
+            ORDER BY c.path;
+            """,
+            (f"t1_{comment_id.removeprefix('t1_')}",),
+        )
+        return build_tree(cur.fetchall())
+
+
+def thread_shape(tree: ThreadTree) -> dict:
+    """Size, depth and branching of a tree, in one pass over its arrays."""
+    n = len(tree.names)
+    if not n:
+        return {"comments": 0}
+    top = tree.parents < 0
+    leaves = int((tree.sizes == 1).sum())
+    levels = np.bincount(tree.depths - tree.depths.min())
+    return {
+        "comments": n,
+        "top_level": int(top.sum()),
+        "max_depth": len(levels) - 1,
+        "widest_level": int(levels.argmax()),
+        "widest": int(levels.max()),
+        "leaves": leaves,
+        # replies per comment that has any
+        "branching": (n - int(top.sum())) / max(n - leaves, 1),
+        "largest_subtree": int(tree.sizes[top].max()),
+    }
+
+
+def _label(tree: ThreadTree, i: int) -> str:
+    body = (tree.bodies[i] or "").strip().split("\n", 1)[0]
+    if len(body) > BODY_PREVIEW:
+        body = body[: BODY_PREVIEW - 1] + "…"
+    return (
+        f"[bold]{escape(tree.authors[i])}[/bold] "
+        f"[dim]{tree.ups[i]} ups[/dim] {escape(body)}"
+    )
+
+
+def render_thread(
+    tree: ThreadTree,
+    title: str = "",
+    max_depth: int | None = None,
+    limit: int | None = None,
+) -> Tree:
+    """Rich Tree of up to limit comments, max_depth levels deep.
+
+    Subtrees below max_depth are skipped whole and counted.
+    """
+    root = Tree(title)
+    nodes: list = [None] * len(tree.names)
+    base = int(tree.depths.min()) if len(tree.names) else 0
+    i = shown = 0
+    while i < len(tree.names) and (limit is None or shown < limit):
+        parent = tree.parents[i]
+        nodes[i] = (nodes[parent] if parent >= 0 else root).add(
+            _label(tree, i)
+        )
+        shown += 1
+        size = int(tree.sizes[i])
+        if max_depth is not None and tree.depths[i] - base >= max_depth:
+            if size > 1:
+                nodes[i].add(f"[dim]… {size - 1} more replies[/dim]")
+            i += size
+        else:
+            i += 1
+    if i < len(tree.names):
+        root.add(f"[dim]… {len(tree.names) - i} more comments[/dim]")
+    return root
+
+
+def _write_tree(cur, rows: list[tuple]) -> int:
+    cur.execute("TRUNCATE comment_tree_staging;")
+    with cur.copy("COPY comment_tree_staging FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+    cur.execute(
+        """
+        UPDATE comments c
+        SET depth = s.depth, root_id = s.root_id, path = s.path
+        FROM comment_tree_staging s
+        WHERE c.name = s.name;
+        """
+    )
+    return cur.rowcount
+
+
+def fill_tree_columns(
+    conn, submission_ids: list[str] | None = None
+) -> tuple[int, int]:
+    """Place stored comments that have no path. Returns (placed, left).
+
+    Threads with an unplaced comment (of submission_ids, or all) are
+    read a thread at a time in submission order and placed with the
+    same TreePlacer as the loader. Comments whose parent isn't stored
+    are left unplaced until it is.
+    """
+    where = "path IS NULL"
+    params: list = []
+    if submission_ids is not None:
+        where += " AND submission_id = ANY(%s)"
+        params.append(list(submission_ids))
+    placed = left = 0
+    pending: list[tuple] = []
+    with conn.transaction(), conn.cursor() as write_cur, conn.cursor(
+        name=f"tree_{uuid.uuid4().hex[:8]}"
+    ) as cur:
+        write_cur.execute(
+            """
+            CREATE TEMP TABLE comment_tree_staging (
+                name TEXT, depth INT, root_id TEXT, path TEXT
+            ) ON COMMIT DROP;
+            """
+        )
+        cur.itersize = FILL_ROWS
+        cur.execute(
+            f"""
+            SELECT submission_id, name, parent_id, path FROM comments
+            WHERE submission_id IN (
+                SELECT DISTINCT submission_id FROM comments WHERE {where}
+            )
+            ORDER BY submission_id;
+            """,
+            params,
+        )
+        for _, thread in groupby(cur, key=itemgetter(0)):
+            thread = list(thread)
+            columns = TreePlacer().place([(n, p) for _, n, p, _ in thread])
+            for (_, name, _, stored), tree in zip(thread, columns):
+                if tree.path is None:
+                    left += 1
+                elif tree.path != stored:
+                    pending.append((name, *tree))
+            if len(pending) >= FILL_ROWS:
+                placed += _write_tree(write_cur, pending)
+                pending = []
+        if pending:
+            placed += _write_tree(write_cur, pending)
+    return placed, left
+
+
+@with_resources(use_db=True, use_reddit=False)
+def backfill(conn, submission_ids: list[str] | None = None):
+    return fill_tree_columns(conn, submission_ids)
+
+
+def show_thread(
+    post_id: str | None = None,
+    comment_id: str | None = None,
+    max_depth: int | None = None,
+    limit: int | None = 200,
+    **kwargs,
+):
+    """Prompt command: print a thread's (or subtree's) shape and tree."""
+    start_time = time.perf_counter()
+    if comment_id:
+        tree = load_subtree(comment_id)
+        title = f"t1_{comment_id.removeprefix('t1_')}"
+    else:
+        # comments stored before their parents are placed first
+        post_name = f"t3_{post_id.removeprefix('t3_')}"
+        backfill([post_name])
+        tree = load_thread(post_id)
+        title = post_name
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Loaded {len(tree.names)} comments of {title}")
+    shape = thread_shape(tree)
+    if not shape["comments"]:
+        console.print(f"No placed comments for {title}.")
+        return
+    console.print(
+        render_thread(tree, title=title, max_depth=max_depth, limit=limit)
+    )
+    console.print(
+        f"[green]{shape['comments']:,}[/green] comments, "
+        f"{shape['top_level']:,} at the top, "
+        f"{shape['max_depth']} levels deep "
+        f"(widest: {shape['widest']:,} at depth {shape['widest_level']}), "
+        f"{shape['leaves']:,} without replies, "
+        f"{shape['branching']:.2f} replies per replied-to comment, "
+        f"largest subtree {shape['largest_subtree']:,}. "
+        f"Loaded in {elapsed:.2f}s."
+    )
+
+
+def thread_backfill(**kwargs):
+    """Prompt command: place every stored comment that has no path."""
+    logger.info("Backfilling comment tree columns")
+    start_time = time.perf_counter()
+    with console.status(
+        "Placing comments in their threads...", spinner="dots"
+    ):
+        placed, left = backfill()
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Placed {placed} comments, {left} left, in {elapsed:.2f}s")
+    console.print(
+        f"Placed [green]{placed:,}[/green] comments in their threads in "
+        f"{elapsed:.2f}s."
+    )
+    if left:
+        console.print(
+            f"[yellow]{left:,} comments have no stored parent yet.[/yellow]"
+        )
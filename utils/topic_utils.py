@@ -0,0 +1,520 @@
+import logging
+import multiprocessing
+import re
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, NamedTuple
+import numpy as np
+from psycopg.types.json import Jsonb
+from .body_utils import COMMENT_BODY, COMMENTS_WITH_BODIES
+from .console import console
+from .connection_utils import with_resources
+
+"""Utils for topic extraction over comment bodies (online LDA).
+
+The corpus doesn't fit in memory, so nothing here ever holds more than
+a few chunks of it. Bodies are streamed from a named server-side cursor
+CHUNK_DOCS rows at a time, tokenised in a process pool while the next
+chunk is read, and turned into a hashed sparse term matrix (CSR arrays,
+a token's feature is its crc32 modulo n_features, so there is no
+vocabulary to build or share between processes). Each chunk is then one
+minibatch of online variational Bayes LDA (Hoffman, Blei & Bach 2010),
+vectorised over the whole chunk with NumPy.
+
+Models are fitted globally or per subreddit and written to topic_models,
+topics and topic_terms, replacing the previous model for the same scope.
+"""
+
+logger = logging.getLogger(__name__)
+
+N_TOPICS = 20
+# hashed feature space, a power of two
+N_FEATURES = 2**18
+# comment bodies per chunk: one tokenise task and one LDA minibatch
+CHUNK_DOCS = 5_000
+# chunks tokenised ahead of the one being fitted, per worker
+PREFETCH = 2
+TOP_TERMS = 10
+# docs with fewer tokens carry no topic signal ("lol", "this")
+MIN_DOC_TOKENS = 3
+# terms in more than this share of documents are left out of topic terms,
+# once there are enough documents for the share to mean something
+MAX_DF = 0.3
+MAX_DF_MIN_DOCS = 1_000
+# online LDA learning rate (tau0 + t) ** -kappa and E-step convergence
+TAU0 = 10.0
+KAPPA = 0.7
+E_STEP_ITERATIONS = 50
+E_STEP_TOLERANCE = 1e-3
+
+SKIPPED_BODIES = ("[deleted]", "[removed]")
+NOISE = re.compile(r"https?://\S+|www\.\S+|\b[ru]/\w+|&\w+;|\[|\]\(\S*\)")
+TOKEN = re.compile(r"[a-z][a-z']+[a-z]")
+STOP_WORDS = frozenset(
+    """
+    about above after again against all also and any are aren't because
+    been before being below between both but can can't cannot could
+    couldn't did didn't does doesn't doing don't down during each even
+    ever every few for from further get gets getting got had hadn't has
+    hasn't have haven't having her here hers herself him himself his how
+    i'd i'll i'm i've into isn't it's its itself just let's like lot make
+    many may maybe might more most much must mustn't myself need never
+    not now off once one only other ought our ours ourselves out over own
+    per pretty probably quite rather really said same say says see seem
+    she she'd she'll she's should shouldn't since some something still
+    such sure take than that that's the their theirs them themselves then
+    there there's these they they'd they'll they're they've thing things
+    think this those though through too two under until use used using
+    very want was wasn't way we'd we'll we're we've well were weren't
+    what what's when where which while who whom why will with won't would
+    wouldn't yeah yes yet you you'd you'll you're you've your yours
+    yourself yourselves
+    """.split()
+)
+
+
+class HashedChunk(NamedTuple):
+    """A chunk of documents as a CSR term-count matrix.
+
+    Row i holds indices[indptr[i]:indptr[i + 1]] with those counts.
+    terms maps the features seen in the chunk to a token hashed to them.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    counts: np.ndarray
+    terms: dict[int, str]
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.indptr) - 1
+
+
+def tokenize(text: str) -> list[str]:
+    text = NOISE.sub(" ", text.lower())
+    tokens = []
+    for token in TOKEN.findall(text):
+        token = token.removesuffix("'s")
+        if len(token) > 2 and token not in STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+
+def hash_chunk(bodies: Iterable[str], n_features: int) -> HashedChunk:
+    """Tokenise and hash bodies into a CSR chunk (run in the pool).
+
+    Documents with fewer than MIN_DOC_TOKENS tokens are dropped.
+    """
+    mask = n_features - 1
+    features: dict[str, int] = {}
+    indptr, indices, counts = [0], [], []
+    for body in bodies:
+        tokens = tokenize(body or "")
+        if len(tokens) < MIN_DOC_TOKENS:
+            continue
+        row = Counter()
+        for token in tokens:
+            feature = features.get(token)
+            if feature is None:
+                feature = features[token] = zlib.crc32(token.encode()) & mask
+            row[feature] += 1
+        indices.extend(row.keys())
+        counts.extend(row.values())
+        indptr.append(len(indices))
+    return HashedChunk(
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int32),
+        np.asarray(counts, dtype=np.float64),
+        {feature: token for token, feature in features.items()},
+    )
+
+
+def hashed_chunks(
+    chunks: Iterable[list[str]], n_features: int, workers: int
+) -> Iterator[HashedChunk]:
+    """hash_chunk over chunks in a process pool, in order.
+
+    At most PREFETCH chunks per worker are in flight, so reading from
+    the database stays only a little ahead of fitting.
+    """
+    # spawn: forking the prompt's threads (writer, jobs) isn't safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        pending = deque()
+        for bodies in chunks:
+            pending.append(pool.submit(hash_chunk, bodies, n_features))
+            if len(pending) >= workers * PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def digamma(x: np.ndarray) -> np.ndarray:
+    """Digamma function for positive x (NumPy has none)."""
+    x = np.array(x, dtype=np.float64)
+    result = np.zeros_like(x)
+    # psi(x) = psi(x + 1) - 1/x until the asymptotic series is accurate
+    while (small := x < 6.0).any():
+        result[small] -= 1.0 / x[small]
+        x[small] += 1.0
+    f = 1.0 / (x * x)
+    series = f * (
+        1 / 12 - f * (1 / 120 - f * (1 / 252 - f * (1 / 240 - f / 132)))
+    )
+    return result + np.log(x) - 0.5 / x - series
+
+
+def dirichlet_expectation(alpha: np.ndarray) -> np.ndarray:
+    """E[log theta] for theta ~ Dirichlet(alpha), one row per Dirichlet."""
+    return digamma(alpha) - digamma(alpha.sum(axis=1, keepdims=True))
+
+
+class OnlineLDA:
+    """Online variational Bayes LDA over hashed term counts.
+
+    n_docs is the (estimated) corpus size, which scales each minibatch's
+    sufficient statistics up to the whole corpus.
+    """
+
+    def __init__(
+        self,
+        n_topics: int = N_TOPICS,
+        n_features: int = N_FEATURES,
+        n_docs: int = 1,
+        seed: int = 0,
+    ):
+        self.n_topics = n_topics
+        self.n_features = n_features
+        self.n_docs = max(n_docs, 1)
+        self.alpha = 1.0 / n_topics
+        self.eta = 1.0 / n_topics
+        self.rng = np.random.default_rng(seed)
+        self.lam = self.rng.gamma(100.0, 0.01, (n_topics, n_features))
+        self.exp_elog_beta = np.exp(dirichlet_expectation(self.lam))
+        self.updates = 0
+
+    def e_step(self, chunk: HashedChunk) -> tuple[np.ndarray, tuple]:
+        """Fit topic weights of every document in the chunk at once.
+
+        Returns (gamma, (cols, sstats)): per-document topic weights and
+        the chunk's expected topic-term counts for the features in cols.
+        """
+        lengths = np.diff(chunk.indptr)
+        rows = np.repeat(np.arange(chunk.n_docs), lengths)
+        cols, local = np.unique(chunk.indices, return_inverse=True)
+        beta = self.exp_elog_beta[:, cols].T  # cols x topics
+        word_beta = beta[local]  # nnz x topics
+        gamma = self.rng.gamma(100.0, 0.01, (chunk.n_docs, self.n_topics))
+        exp_elog_theta = np.exp(dirichlet_expectation(gamma))
+        for _ in range(E_STEP_ITERATIONS):
+            previous = gamma
+            phinorm = (exp_elog_theta[rows] * word_beta).sum(axis=1) + 1e-100
+            weighted = (chunk.counts / phinorm)[:, None] * word_beta
+            gamma = self.alpha + exp_elog_theta * np.add.reduceat(
+                weighted, chunk.indptr[:-1], axis=0
+            )
+            exp_elog_theta = np.exp(dirichlet_expectation(gamma))
+            if np.abs(gamma - previous).mean() < E_STEP_TOLERANCE:
+                break
+        phinorm = (exp_elog_theta[rows] * word_beta).sum(axis=1) + 1e-100
+        weighted = exp_elog_theta[rows] * (chunk.counts / phinorm)[:, None]
+        sstats = np.empty((self.n_topics, len(cols)))
+        for k in range(self.n_topics):
+            sstats[k] = np.bincount(
+                local, weights=weighted[:, k], minlength=len(cols)
+            )
+        sstats *= beta.T
+        return gamma, (cols, sstats)
+
+    def partial_fit(self, chunk: HashedChunk) -> np.ndarray:
+        """One online update from a chunk. Returns the chunk's gamma."""
+        gamma, (cols, sstats) = self.e_step(chunk)
+        rho = (TAU0 + self.updates) ** -KAPPA
+        scale = self.n_docs / chunk.n_docs
+        self.lam *= 1 - rho
+        self.lam += rho * self.eta
+        self.lam[:, cols] += rho * scale * sstats
+        self.exp_elog_beta = np.exp(dirichlet_expectation(self.lam))
+        self.updates += 1
+        return gamma
+
+    def topic_terms(self) -> np.ndarray:
+        """Topic-term distributions, topics x features."""
+        return self.lam / self.lam.sum(axis=1, keepdims=True)
+
+
+def top_terms(
+    model: OnlineLDA,
+    terms: dict[int, str],
+    doc_freq: np.ndarray,
+    n_docs: int,
+    n_terms: int = TOP_TERMS,
+) -> list[list[tuple[str, float]]]:
+    """The n_terms heaviest named terms of each topic.
+
+    Terms in more than MAX_DF of the documents say little about any one
+    topic and are skipped (from MAX_DF_MIN_DOCS documents on), as are
+    features no token was seen for.
+    """
+    beta = model.topic_terms()
+    usable = np.zeros(model.n_features, dtype=bool)
+    named = np.fromiter(terms.keys(), dtype=np.int64, count=len(terms))
+    usable[named] = True
+    if n_docs >= MAX_DF_MIN_DOCS:
+        usable &= doc_freq <= MAX_DF * n_docs
+    beta = np.where(usable, beta, 0.0)
+    topics = []
+    for weights in beta:
+        top = np.argpartition(-weights, n_terms)[:n_terms]
+        top = top[np.argsort(-weights[top], kind="stable")]
+        topics.append(
+            [(terms[int(f)], float(weights[f])) for f in top if weights[f]]
+        )
+    return topics
+
+
+def _scope_filter(scope: str | None) -> tuple[str, list]:
+    where = f"{COMMENT_BODY} IS NOT NULL AND {COMMENT_BODY} <> ALL(%s)"
+    params: list = [list(SKIPPED_BODIES)]
+    if scope is not None:
+        name = scope.lower().removeprefix("r/")
+        # comments store subreddits as r/name
+        where += " AND lower(c.subreddit) IN (%s, %s)"
+        params += [name, f"r/{name}"]
+    return where, params
+
+
+def count_bodies(conn, scope: str | None = None) -> int:
+    where, params = _scope_filter(scope)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT count(*) FROM {COMMENTS_WITH_BODIES} WHERE {where};",
+            params,
+        )
+        return cur.fetchone()[0]
+
+
+@with_resources(use_db=True, use_reddit=False)
+def top_subreddits(conn, n: int) -> list[str]:
+    """The n subreddits with the most stored comments."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT subreddit FROM comments GROUP BY subreddit "
+            "ORDER BY count(*) DESC LIMIT %s;",
+            (n,),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def stream_bodies(
+    conn,
+    scope: str | None = None,
+    max_docs: int | None = None,
+    chunk_docs: int = CHUNK_DOCS,
+) -> Iterator[list[str]]:
+    """Comment bodies, chunk_docs at a time, from a server-side cursor."""
+    where, params = _scope_filter(scope)
+    query = f"SELECT {COMMENT_BODY} FROM {COMMENTS_WITH_BODIES} WHERE {where}"
+    if max_docs is not None:
+        query += " LIMIT %s"
+        params.append(max_docs)
+    # server-side cursors only live inside a transaction
+    with conn.transaction(), conn.cursor(
+        name=f"topics_{uuid.uuid4().hex[:8]}"
+    ) as cur:
+        cur.itersize = chunk_docs
+        cur.execute(query, params)
+        while batch := cur.fetchmany(chunk_docs):
+            yield [row[0] for row in batch]
+
+
+def fit_topics(
+    chunks: Iterable[Iterable[list[str]]],
+    n_docs: int,
+    n_topics: int = N_TOPICS,
+    n_features: int = N_FEATURES,
+    workers: int = 4,
+    seed: int = 0,
+    status=None,
+) -> tuple[OnlineLDA, dict]:
+    """Fit a model over one or more passes of body chunks.
+
+    chunks yields one iterable of chunks per pass. Returns (model,
+    summary) where summary has terms, doc_freq, shares and counts from
+    the last pass.
+    """
+    model = OnlineLDA(n_topics, n_features, n_docs, seed)
+    terms: dict[int, str] = {}
+    summary: dict = {}
+    for epoch, pass_chunks in enumerate(chunks, start=1):
+        doc_freq = np.zeros(n_features, dtype=np.int64)
+        shares = np.zeros(n_topics)
+        docs = nnz = 0
+        for chunk in hashed_chunks(pass_chunks, n_features, workers):
+            if not chunk.n_docs:
+                continue
+            for feature, token in chunk.terms.items():
+                terms.setdefault(feature, token)
+            gamma = model.partial_fit(chunk)
+            shares += (gamma / gamma.sum(axis=1, keepdims=True)).sum(axis=0)
+            doc_freq += np.bincount(chunk.indices, minlength=n_features)
+            docs += chunk.n_docs
+            nnz += len(chunk.indices)
+            if status is not None:
+                status.update(f"Pass {epoch}: fitted {docs:,} comments...")
+        summary = {
+            "terms": terms,
+            "doc_freq": doc_freq,
+            "shares": shares / max(docs, 1),
+            "docs": docs,
+            "nnz": nnz,
+        }
+    return model, summary
+
+
+@with_resources(use_db=True, use_reddit=False)
+def fit_scope(
+    conn,
+    scope: str | None,
+    passes: int = 1,
+    max_docs: int | None = None,
+    status=None,
+    **fit_kwargs,
+) -> tuple[OnlineLDA, dict] | None:
+    """fit_topics over the comments of one subreddit, or all of them.
+
+    Returns None when there is nothing to fit.
+    """
+    n_docs = count_bodies(conn, scope)
+    if max_docs is not None:
+        n_docs = min(n_docs, max_docs)
+    if not n_docs:
+        return None
+    return fit_topics(
+        (stream_bodies(conn, scope, max_docs) for _ in range(passes)),
+        n_docs,
+        status=status,
+        **fit_kwargs,
+    )
+
+
+@with_resources(use_db=True, use_reddit=False)
+def write_topics(
+    conn,
+    scope: str,
+    topics: list[list[tuple[str, float]]],
+    shares: np.ndarray,
+    n_docs: int,
+    params: dict,
+) -> int:
+    """Replace the stored model for scope. Returns the new model id."""
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("DELETE FROM topic_models WHERE scope = %s;", (scope,))
+        cur.execute(
+            "INSERT INTO topic_models (scope, n_topics, n_docs, params) "
+            "VALUES (%s, %s, %s, %s) RETURNING id;",
+            (scope, len(topics), n_docs, Jsonb(params)),
+        )
+        model_id = cur.fetchone()[0]
+        cur.executemany(
+            "INSERT INTO topics (model_id, topic, share, label) "
+            "VALUES (%s, %s, %s, %s);",
+            [
+                (
+                    model_id,
+                    topic,
+                    float(shares[topic]),
+                    " ".join(term for term, _ in words[:3]),
+                )
+                for topic, words in enumerate(topics)
+            ],
+        )
+        with cur.copy(
+            "COPY topic_terms (model_id, topic, rank, term, weight) "
+            "FROM STDIN"
+        ) as copy:
+            for topic, words in enumerate(topics):
+                for rank, (term, weight) in enumerate(words):
+                    copy.write_row((model_id, topic, rank, term, weight))
+    logger.info("Wrote topic model %d for %s", model_id, scope)
+    return model_id
+
+
+def analyze_topics(
+    subreddits: list[str] | None = None,
+    top: int | None = None,
+    n_topics: int = N_TOPICS,
+    n_features: int = N_FEATURES,
+    n_terms: int = TOP_TERMS,
+    passes: int = 1,
+    max_docs: int | None = None,
+    workers: int = 4,
+    seed: int = 0,
+    **kwargs,
+):
+    """Prompt command: fit topics globally or per subreddit and store them."""
+    if n_features & (n_features - 1):
+        console.print("--features must be a power of two, e.g. 262144")
+        return
+    if top:
+        subreddits = top_subreddits(top)
+    scopes = subreddits or [None]
+    for scope in scopes:
+        # one name per subreddit, however it was typed or stored
+        label = f"r/{scope.lower().removeprefix('r/')}" if scope else "global"
+        logger.info(
+            f"Fitting topics | scope={label} | topics={n_topics} "
+            f"| features={n_features} | passes={passes} | workers={workers}"
+        )
+        start_time = time.perf_counter()
+        with console.status(f"Fitting topics for {label}...") as status:
+            fitted = fit_scope(
+                scope,
+                passes=passes,
+                max_docs=max_docs,
+                status=status,
+                n_topics=n_topics,
+                n_features=n_features,
+                workers=workers,
+                seed=seed,
+            )
+        if fitted is None or not fitted[1]["docs"]:
+            console.print(f"No comments to analyze for {label}.")
+            continue
+        model, summary = fitted
+        topics = top_terms(
+            model,
+            summary["terms"],
+            summary["doc_freq"],
+            summary["docs"],
+            n_terms,
+        )
+        write_topics(
+            label,
+            topics,
+            summary["shares"],
+            summary["docs"],
+            {
+                "n_features": n_features,
+                "passes": passes,
+                "max_docs": max_docs,
+                "seed": seed,
+            },
+        )
+        elapsed = time.perf_counter() - start_time
+        console.print(
+            f"[green]{label}[/green]: {n_topics} topics from "
+            f"{summary['docs']:,} comments ({summary['nnz']:,} terms) in "
+            f"{elapsed:.1f}s, {summary['docs'] * passes / elapsed:,.0f} "
+            "comments/s"
+        )
+        order = np.argsort(-summary["shares"])
+        for topic in order[:10]:
+            words = ", ".join(term for term, _ in topics[topic][:6])
+            console.print(
+                f"  [{topic}] {summary['shares'][topic]:.1%}: {words}",
+                markup=False,
+            )
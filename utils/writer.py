@@ -0,0 +1,363 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator
+from .connection_utils import db_connection
+from .retry_utils import backoff_delay, is_transient
+
+"""Write-behind batching for rows produced by scrape workers.
+
+Workers queue (statement, rows) with writer().put() and carry on
+scraping. A single writer thread, with its own connection outside
+autocommit, coalesces everything queued by every worker into one
+transaction per batch, so a scrape pays one commit (and one fsync) per
+few thousand rows instead of one per thread or statement.
+
+A batch is written once BATCH_ROWS rows or BATCH_BYTES bytes are queued,
+the oldest row has waited MAX_DELAY seconds, or someone calls flush().
+The row threshold follows commit latency: it halves when a commit takes
+longer than TARGET_COMMIT_SECONDS and grows by half while commits of
+full batches stay well under it. put() blocks while more than
+QUEUE_BATCHES batches are waiting, so workers slow down to the speed of
+the database instead of buffering without bound. Anything still queued
+is written when the writer is closed, including at interpreter exit.
+"""
+
+logger = logging.getLogger(__name__)
+
+BATCH_ROWS = 2_000
+MIN_BATCH_ROWS = 100
+MAX_BATCH_ROWS = 50_000
+BATCH_BYTES = 8 * 1024 * 1024
+# seconds a queued row may wait for a batch to fill
+MAX_DELAY = 1.0
+TARGET_COMMIT_SECONDS = 0.25
+# batches' worth of rows that may wait before put() blocks
+QUEUE_BATCHES = 4
+# tries per batch when the connection fails
+WRITE_ATTEMPTS = 4
+
+
+@dataclass
+class _Item:
+    statement: str
+    rows: list
+    nbytes: int
+    seq: int
+    queued: float
+    future: Future = field(default_factory=Future)
+
+
+def _row_bytes(row: Iterable) -> int:
+    # rough payload size: text as is, everything else as 8 bytes
+    return sum(len(v) if isinstance(v, str) else 8 for v in row)
+
+
+def _runs(batch: list[_Item]) -> Iterator[tuple[str, list]]:
+    """Merge consecutive items with the same statement.
+
+    Only neighbours are merged, so statements still run in the order
+    they were queued (an UPDATE never overtakes the INSERT before it).
+    """
+    statement, rows = None, []
+    for item in batch:
+        if item.statement != statement and rows:
+            yield statement, rows
+            rows = []
+        statement = item.statement
+        rows.extend(item.rows)
+    if rows:
+        yield statement, rows
+
+
+class BatchWriter:
+    """Writer thread coalescing queued rows into batched transactions."""
+
+    def __init__(
+        self,
+        connect: Callable = db_connection,
+        batch_rows: int = BATCH_ROWS,
+        batch_bytes: int = BATCH_BYTES,
+        max_delay: float = MAX_DELAY,
+        target_commit: float = TARGET_COMMIT_SECONDS,
+    ):
+        self._connect = connect
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        self.max_delay = max_delay
+        self.target_commit = target_commit
+        self._cond = threading.Condition()
+        self._items: deque[_Item] = deque()
+        self._queued_rows = 0
+        self._queued_bytes = 0
+        self._seq = 0
+        self._done = 0
+        self._flushing = 0
+        self._closed = False
+        self.stats = {
+            "rows": 0,
+            "commits": 0,
+            "commit_seconds": 0.0,
+            "blocked_seconds": 0.0,
+            "failed_rows": 0,
+        }
+        self._thread = threading.Thread(
+            target=self._run, name="writer", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def capacity(self) -> int:
+        return self.batch_rows * QUEUE_BATCHES
+
+    def put(self, statement: str, rows: Iterable) -> Future:
+        """Queue rows for executemany(statement, rows).
+
+        Blocks while the writer is behind. The future completes when the
+        rows are committed, or with the error if they couldn't be.
+        """
+        rows = list(rows)
+        if not rows:
+            future: Future = Future()
+            future.set_result(None)
+            return future
+        nbytes = sum(map(_row_bytes, rows))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            start = time.perf_counter()
+            # always admit into an empty queue, however big the put
+            while (
+                self._queued_rows
+                and self._queued_rows + len(rows) > self.capacity
+            ):
+                self._cond.wait()
+            self.stats["blocked_seconds"] += time.perf_counter() - start
+            self._seq += 1
+            item = _Item(statement, rows, nbytes, self._seq, time.monotonic())
+            self._items.append(item)
+            self._queued_rows += len(rows)
+            self._queued_bytes += nbytes
+            self._cond.notify_all()
+        return item.future
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Write everything queued so far now and wait for it.
+
+        Returns False if timeout passed first.
+        """
+        with self._cond:
+            target = self._seq
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: self._done >= target, timeout
+                )
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        """Write what is still queued and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _due(self) -> bool:
+        if not self._items:
+            return False
+        return bool(
+            self._closed
+            or self._flushing
+            or self._queued_rows >= self.batch_rows
+            or self._queued_bytes >= self.batch_bytes
+            or time.monotonic() - self._items[0].queued >= self.max_delay
+        )
+
+    def _next_batch(self) -> list[_Item] | None:
+        """Wait for a batch to be due and take it off the queue."""
+        with self._cond:
+            while not self._due():
+                if self._closed:
+                    return None
+                timeout = None
+                if self._items:
+                    age = time.monotonic() - self._items[0].queued
+                    timeout = max(self.max_delay - age, 0)
+                self._cond.wait(timeout)
+            batch, rows, nbytes = [], 0, 0
+            while self._items and (
+                not batch
+                or (rows < self.batch_rows and nbytes < self.batch_bytes)
+            ):
+                item = self._items.popleft()
+                batch.append(item)
+                rows += len(item.rows)
+                nbytes += item.nbytes
+            self._queued_rows -= rows
+            self._queued_bytes -= nbytes
+            # room for blocked producers
+            self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        connection = ExitStack()
+        conn = None
+        batch, attempt = None, 0
+        while True:
+            if batch is None:
+                batch, attempt = self._next_batch(), 0
+                if batch is None:
+                    connection.close()
+                    return
+            attempt += 1
+            try:
+                if conn is None:
+                    conn = connection.enter_context(
+                        self._connect(auto_commit=False)
+                    )
+                self._write(conn, batch)
+            except Exception as e:
+                # drop the connection, the next attempt opens a new one
+                connection.close()
+                conn = None
+                if attempt < WRITE_ATTEMPTS and is_transient(e):
+                    logger.warning(
+                        "Writing a batch failed (%s), attempt %d", e, attempt
+                    )
+                    time.sleep(backoff_delay(attempt, e))
+                    continue
+                logger.error(
+                    "Dropping %d queued rows after %d attempts: %s",
+                    sum(len(item.rows) for item in batch),
+                    attempt,
+                    e,
+                )
+                self._fail(batch, e)
+            self._finish(batch)
+            batch = None
+
+    def _write(self, conn, batch: list[_Item]):
+        # items already written by _write_each before a retry
+        batch = [item for item in batch if not item.future.done()]
+        start = time.perf_counter()
+        rows = sum(len(item.rows) for item in batch)
+        try:
+            with conn.cursor() as cur:
+                for statement, run in _runs(batch):
+                    cur.executemany(statement, run)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if is_transient(e):
+                raise
+            # one bad statement shouldn't lose the other workers' rows
+            logger.error("Batch failed (%s), writing items one by one", e)
+            self._write_each(conn, batch)
+            return
+        elapsed = time.perf_counter() - start
+        self.stats["rows"] += rows
+        self.stats["commits"] += 1
+        self.stats["commit_seconds"] += elapsed
+        self._adapt(rows, elapsed)
+        for item in batch:
+            item.future.set_result(None)
+
+    def _write_each(self, conn, batch: list[_Item]):
+        for item in batch:
+            try:
+                with conn.cursor() as cur:
+                    cur.executemany(item.statement, item.rows)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                if is_transient(e):
+                    raise
+                logger.error(
+                    "Dropping %d rows that failed to write: %s",
+                    len(item.rows),
+                    e,
+                )
+                self._fail([item], e)
+            else:
+                self.stats["rows"] += len(item.rows)
+                self.stats["commits"] += 1
+                item.future.set_result(None)
+
+    def _adapt(self, rows: int, seconds: float):
+        """Size the next batches from how long this commit took."""
+        with self._cond:
+            if seconds > self.target_commit:
+                self.batch_rows = max(MIN_BATCH_ROWS, self.batch_rows // 2)
+            elif seconds < self.target_commit / 2 and rows >= self.batch_rows:
+                self.batch_rows = min(MAX_BATCH_ROWS, self.batch_rows * 3 // 2)
+
+    def _fail(self, batch: list[_Item], error: Exception):
+        for item in batch:
+            if not item.future.done():
+                self.stats["failed_rows"] += len(item.rows)
+                item.future.set_exception(error)
+
+    def _finish(self, batch: list[_Item]):
+        with self._cond:
+            self._done = batch[-1].seq
+            self._cond.notify_all()
+
+
+def on_failure(
+    futures: Iterable[Future], callback: Callable[[BaseException], None]
+):
+    """Call callback(error) once, from the writer thread, if any of the
+    futures put() returned fails to write.
+
+    Callers that don't wait for their rows use it to record the work as
+    failed (e.g. in failed_tasks) instead of losing it to the log.
+    """
+    lock = threading.Lock()
+    called = False
+
+    def done(future: Future):
+        nonlocal called
+        if future.cancelled() or future.exception() is None:
+            return
+        with lock:
+            if called:
+                return
+            called = True
+        try:
+            callback(future.exception())
+        except Exception:
+            # the writer thread must keep going whatever the callback does
+            logger.exception("Write failure callback failed")
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+_writer: BatchWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def writer() -> BatchWriter:
+    """Writer shared by every job and worker, started on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BatchWriter()
+            atexit.register(close_writer)
+    return _writer
+
+
+def close_writer():
+    """Flush and stop the shared writer, if it was started."""
+    global _writer
+    with _writer_lock:
+        current, _writer = _writer, None
+    if current is not None:
+        current.close()